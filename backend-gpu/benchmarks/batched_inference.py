@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.batched_inference
+    ~~~~~~~
+
+    This module benchmarks the throughput of a local model serving concurrent
+    conversations, with and without the batching inference worker. It runs on a
+    CPU with a tiny model by default.
+
+    Usage:
+        python -m benchmarks.batched_inference [turns_per_conversation]
+"""
+
+
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.llm_classes.llm_level import LocalLLM, LocalMistralGPTQ
+
+BENCHMARK_MODEL = os.getenv(
+    "BENCHMARK_MODEL", "hf-internal-testing/tiny-random-LlamaForCausalLM"
+)
+CONCURRENCY = [1, 8, 32]
+CHAT_TEMPLATE = "{% for message in messages %}{{ message['role'] }}: {{ message['content'] }}\n{% endfor %}"
+
+
+class BenchmarkLLM(LocalMistralGPTQ):
+    DEVICE = os.getenv("LOCAL_MODEL_DEVICE", "cpu")
+    GENERATION_KWARGS = {**LocalLLM.GENERATION_KWARGS, "max_new_tokens": 32}
+
+    def load(self):
+        model, tokenizer = super().load()
+        tokenizer.chat_template = tokenizer.chat_template or CHAT_TEMPLATE
+        return model, tokenizer
+
+
+class UnbatchedBenchmarkLLM(BenchmarkLLM):
+    BATCHING = False
+
+
+class BatchedBenchmarkLLM(BenchmarkLLM):
+    BATCHING = True
+
+
+def conversation(llm: LocalLLM, index: int, turns: int) -> list[float]:
+    """Holds one conversation with the model.
+
+    Args:
+        llm (LocalLLM): The local model.
+        index (int): Index of the conversation.
+        turns (int): Number of replies to generate.
+
+    Returns:
+        list[float]: Latency of each reply in seconds.
+    """
+    messages = [{"role": "system", "content": f"You are interviewer {index}."}]
+    latencies = []
+    for turn in range(turns):
+        messages.append({"role": "user", "content": f"Answer {turn} to question."})
+        start = time.perf_counter()
+        reply = llm.run(messages, seed=10000)
+        latencies.append(time.perf_counter() - start)
+        messages.append({"role": "assistant", "content": reply})
+    return latencies
+
+
+def measure(llm: LocalLLM, conversations: int, turns: int) -> dict[str, float]:
+    """Runs concurrent conversations against a model.
+
+    Args:
+        llm (LocalLLM): The local model.
+        conversations (int): Number of concurrent conversations.
+        turns (int): Replies per conversation.
+
+    Returns:
+        dict[str, float]: Replies per second and latency percentiles.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=conversations) as executor:
+        results = list(
+            executor.map(
+                lambda index: conversation(llm, index, turns), range(conversations)
+            )
+        )
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(latency for result in results for latency in result)
+    return {
+        "replies_per_s": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(0.99 * (len(latencies) - 1))] * 1000,
+    }
+
+
+def run(turns: int = 3) -> dict[str, dict[str, float]]:
+    """Measures throughput at 1, 8 and 32 concurrent conversations, with and without batching.
+
+    Args:
+        turns (int, optional): Replies per conversation. Defaults to 3.
+
+    Returns:
+        dict[str, dict[str, float]]: Results per mode and number of conversations.
+    """
+    results = {}
+    for mode, llm in (
+        ("unbatched", UnbatchedBenchmarkLLM(BENCHMARK_MODEL)),
+        ("batched", BatchedBenchmarkLLM(BENCHMARK_MODEL)),
+    ):
+        # Load the model before measuring
+        llm.loaded()
+        for conversations in CONCURRENCY:
+            results[f"{mode}_{conversations}"] = measure(llm, conversations, turns)
+    return results
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:2]]
+    for key, value in run(*args).items():
+        print(
+            f"{key}: "
+            + ", ".join(f"{metric}={number:.1f}" for metric, number in value.items())
+        )
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.exit_agreement
+    ~~~~~~~
+
+    This module evaluates the logit-scored exit check of local models against the
+    generative exit check. Both answer the exit query for the same conversations,
+    and their agreement, their latency and the agreement at several thresholds are
+    reported. It runs on a CPU with a tiny model by default, which only exercises
+    the code; set BENCHMARK_MODEL to the served model to evaluate agreement.
+
+    Usage:
+        python -m benchmarks.exit_agreement [conversations.json]
+
+    The optional JSON file holds a list of message lists, e.g. exported chat logs.
+"""
+
+
+import json
+import os
+import statistics
+import sys
+import time
+
+from src.llm_classes.chatlog import ChatLog
+from src.llm_classes.functions import EXIT_THRESHOLD, parse_exit
+from src.llm_classes.llm_level import LocalLLM, LocalMistralGPTQ
+
+BENCHMARK_MODEL = os.getenv(
+    "BENCHMARK_MODEL", "hf-internal-testing/tiny-random-LlamaForCausalLM"
+)
+THRESHOLDS = [0.3, 0.4, 0.5, 0.6, 0.7]
+CHAT_TEMPLATE = "{% for message in messages %}{{ message['role'] }}: {{ message['content'] }}\n{% endfor %}{% if add_generation_prompt %}assistant: {% endif %}"
+
+SURVEY = [
+    {
+        "role": "system",
+        "content": "Survey responses:\n1. How did you find us?\nAnswer:\nAdvert",
+    },
+    {"role": "assistant", "content": "1. What made the advert stand out?"},
+    {"role": "system", "content": "Now, begin the interview."},
+    {"role": "assistant", "content": "What made the advert stand out to you?"},
+    {"role": "user", "content": "It had a discount code."},
+]
+ENDINGS = [
+    ("Did you use the discount code at checkout?", False),
+    ("Was the checkout easy to use?", False),
+    ("Thank you for your time, that is all my questions. The interview is over.", True),
+    ("Thanks for your answers! I will end the interview here. Goodbye.", True),
+]
+
+
+class BenchmarkLLM(LocalMistralGPTQ):
+    DEVICE = os.getenv("LOCAL_MODEL_DEVICE", "cpu")
+    GENERATION_KWARGS = {**LocalLLM.GENERATION_KWARGS, "max_new_tokens": 64}
+
+    def load(self):
+        model, tokenizer = super().load()
+        tokenizer.chat_template = tokenizer.chat_template or CHAT_TEMPLATE
+        return model, tokenizer
+
+
+def sample_conversations() -> list[list[dict[str, str]]]:
+    """Returns conversations ending with a question or with a goodbye."""
+    return [
+        SURVEY + [{"role": "assistant", "content": content}] for content, _ in ENDINGS
+    ]
+
+
+def evaluate(llm: LocalLLM, conversations: list[list]) -> dict[str, float]:
+    """Answers the exit query of every conversation with both exit checks.
+
+    Args:
+        llm (LocalLLM): The local model.
+        conversations (list[list]): Message lists to check.
+
+    Returns:
+        dict[str, float]: Agreement at EXIT_THRESHOLD and each of THRESHOLDS, and
+            median latency of both checks.
+    """
+    generated, scored, generate_seconds, score_seconds = [], [], [], []
+    for messages in conversations:
+        exit = messages + [ChatLog.END_QUERY]
+
+        start = time.perf_counter()
+        generated.append(parse_exit(llm.run(exit, seed=10000)))
+        generate_seconds.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        scored.append(llm.score_exit(exit))
+        score_seconds.append(time.perf_counter() - start)
+
+    def agreement(threshold: float) -> float:
+        return statistics.mean(
+            (probability >= threshold) == answer
+            for probability, answer in zip(scored, generated)
+        )
+
+    return {
+        "conversations": len(conversations),
+        "generated_yes": sum(generated),
+        "agreement": agreement(EXIT_THRESHOLD),
+        **{f"agreement_{threshold}": agreement(threshold) for threshold in THRESHOLDS},
+        "generate_p50_ms": statistics.median(generate_seconds) * 1000,
+        "score_p50_ms": statistics.median(score_seconds) * 1000,
+    }
+
+
+def run(path: str = "") -> dict[str, float]:
+    """Evaluates the exit checks on the conversations in a JSON file, or on sample conversations.
+
+    Args:
+        path (str, optional): Path of a JSON list of message lists. Defaults to the sample conversations.
+
+    Returns:
+        dict[str, float]: See evaluate().
+    """
+    if path:
+        with open(path) as file:
+            conversations = json.load(file)
+    else:
+        conversations = sample_conversations()
+    llm = BenchmarkLLM(BENCHMARK_MODEL)
+    # Load the model before measuring
+    llm.loaded()
+    return evaluate(llm, conversations)
+
+
+if __name__ == "__main__":
+    for key, value in run(*sys.argv[1:2]).items():
+        print(f"{key}: {value}")
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+    src.llm_classes.batching
+    ~~~~~~~
+
+    This module implements an inference worker that batches the generate calls
+    of concurrent requests to a local model. Chat turns, exit checks and summaries
+    running on different request threads submit their conversations to the worker
+    of their model, which pads waiting conversations into one generate call and
+    routes each output back to its caller.
+"""
+
+
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Dict, Optional, Protocol
+
+logger = logging.getLogger(__name__)
+
+
+class BatchGenerator(Protocol):
+    def generate_batch(self, conversations: list[list], sample: bool) -> list[str]:
+        """Generates one reply per conversation in a single generate call."""
+
+
+class InferenceRequest:
+    """A conversation waiting to be generated, and the future its output is delivered to."""
+
+    def __init__(self, messages: list, sample: bool):
+        self.messages = messages
+        self.sample = sample
+        self.future: Future = Future()
+        self.submitted_at = time.perf_counter()
+
+
+class BatchingWorker:
+    """A thread that collects pending requests to one model and runs them in batches.
+
+    The worker waits for a request, then keeps collecting requests for at most
+    `max_wait_ms` milliseconds or until `max_batch_size` requests are waiting. The batch
+    is split by sampling mode, since do_sample applies to a whole generate call.
+    """
+
+    def __init__(
+        self,
+        llm: BatchGenerator,
+        max_batch_size: int = 8,
+        max_wait_ms: float = 10,
+        name: str = "model",
+    ):
+        self.llm = llm
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self._queue: queue.Queue[Optional[InferenceRequest]] = queue.Queue()
+        self._lock = threading.Lock()
+        self._stats = {
+            "requests": 0,
+            "batches": 0,
+            "max_batch_size": 0,
+            "queue_seconds": 0.0,
+            "generate_seconds": 0.0,
+        }
+        self._thread = threading.Thread(
+            target=self._loop, name=f"inference-{name}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, messages: list, sample: bool) -> Future:
+        """Queues a conversation for generation.
+
+        Args:
+            messages (list): A list of messages tied to a ChatLog instance.
+            sample (bool): Whether to sample or decode greedily.
+
+        Returns:
+            Future: A future holding the generated text.
+        """
+        request = InferenceRequest(messages, sample)
+        self._queue.put(request)
+        return request.future
+
+    def run(self, messages: list, sample: bool) -> str:
+        """Generates a reply to a conversation, batched with other waiting conversations.
+
+        Args:
+            messages (list): A list of messages tied to a ChatLog instance.
+            sample (bool): Whether to sample or decode greedily.
+
+        Returns:
+            str: text output from the Large Language Model.
+        """
+        return self.submit(messages, sample).result()
+
+    def metrics(self) -> Dict[str, float]:
+        """Returns the number of requests and batches, and the average batch size and times.
+
+        Returns:
+            Dict[str, float]: Request and batch counts, average and maximum batch size, and
+                average time per request spent queueing and generating, in seconds.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        requests, batches = stats["requests"], stats["batches"]
+        stats["avg_batch_size"] = requests / batches if batches else 0.0
+        stats["avg_queue_seconds"] = stats.pop("queue_seconds") / (requests or 1)
+        stats["avg_generate_seconds"] = stats.pop("generate_seconds") / (batches or 1)
+        stats["waiting"] = self._queue.qsize()
+        return stats
+
+    def close(self) -> None:
+        """Stops the worker once the requests queued so far are done."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _collect(self) -> Optional[list[InferenceRequest]]:
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if request is None:
+                # Finish this batch before stopping
+                self._queue.put(None)
+                break
+            batch.append(request)
+        return batch
+
+    def _loop(self) -> None:
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            for sample in (False, True):
+                group = [request for request in batch if request.sample == sample]
+                if group:
+                    self._generate(group, sample)
+
+    def _generate(self, group: list[InferenceRequest], sample: bool) -> None:
+        start = time.perf_counter()
+        try:
+            outputs = self.llm.generate_batch(
+                [request.messages for request in group], sample
+            )
+        except Exception as e:
+            logger.error(f"Batched generation of {len(group)} requests failed: {e}")
+            for request in group:
+                request.future.set_exception(e)
+            return
+
+        end = time.perf_counter()
+        for request, output in zip(group, outputs):
+            request.future.set_result(output)
+        with self._lock:
+            self._stats["requests"] += len(group)
+            self._stats["batches"] += 1
+            self._stats["max_batch_size"] = max(
+                self._stats["max_batch_size"], len(group)
+            )
+            self._stats["queue_seconds"] += sum(
+                start - request.submitted_at for request in group
+            )
+            self._stats["generate_seconds"] += end - start
+
+
+_workers: Dict[str, BatchingWorker] = {}
+_workers_lock = threading.Lock()
+
+
+def get_worker(name: str, llm: BatchGenerator) -> BatchingWorker:
+    """Returns the process-wide batching worker of a model, starting it on first use.
+
+    The batch size and waiting window are configured through the LOCAL_MODEL_MAX_BATCH_SIZE
+    and LOCAL_MODEL_MAX_WAIT_MS environment variables.
+
+    Args:
+        name (str): Name of the model in the model registry.
+        llm (BatchGenerator): Generates the batches. Only used when the worker is started.
+
+    Returns:
+        BatchingWorker: The batching worker of the model.
+    """
+    worker = _workers.get(name)
+    if worker is None:
+        with _workers_lock:
+            worker = _workers.get(name)
+            if worker is None:
+                worker = _workers[name] = BatchingWorker(
+                    llm,
+                    max_batch_size=int(
+                        os.environ.get("LOCAL_MODEL_MAX_BATCH_SIZE", "8")
+                    ),
+                    max_wait_ms=float(os.environ.get("LOCAL_MODEL_MAX_WAIT_MS", "10")),
+                    name=name,
+                )
+    return worker
+
+
+def worker_metrics() -> Dict[str, Any]:
+    """Returns the metrics of the batching worker of every model.
+
+    Returns:
+        Dict[str, Any]: See BatchingWorker.metrics(), per model.
+    """
+    with _workers_lock:
+        workers = dict(_workers)
+    return {name: worker.metrics() for name, worker in workers.items()}
@@ -1,4 +1,5 @@
 import logging
+import os
 import random
 import re
 
@@ -16,6 +17,9 @@ formatter = logging.Formatter(
 file_handler.setFormatter(formatter)
 logger.addHandler(file_handler)
 
+# Minimum probability of "Yes" for LLMs that score exit queries
+EXIT_THRESHOLD = float(os.environ.get("LOCAL_EXIT_THRESHOLD", "0.5"))
+
 
 def construct_chatlog(
     survey_initial_responses: str, llm: LLM = GPT(), seed: int = random.randint(1, 9999)
@@ -82,19 +86,36 @@ def format_responses_for_gpt(response: dict[str, object]) -> str:
     return "\n".join(formatted)
 
 
+def parse_exit(result: str, delim: str = ChatLog.EXIT_DELIM) -> bool:
+    """Parses the answer to an exit query from a generated reasoning and answer.
+
+    Args:
+        result (str): The generated reply, e.g. "I have thanked the user -- Yes."
+        delim (str, optional): A delimiter between the reasoning and the answer. Defaults to ChatLog.EXIT_DELIM.
+
+    Returns:
+        bool: Whether the answer is yes.
+    """
+    return bool(re.search(r"[yY]es", result.split(delim)[-1]))
+
+
 def check_exit(
     updated_message_list: list[dict[str, str]],
     llm: LLM,
     seed: int = random.randint(1, 9999),
     delim: str = ChatLog.EXIT_DELIM,
+    threshold: float = EXIT_THRESHOLD,
 ) -> bool:
     """Checks if the interactive survey has come to a conclusion. Returns a boolean.
+    LLMs that score exit queries answer with one forward pass, and the others generate
+    a reasoning followed by the answer.
 
     Args:
         updated_message_list (list[dict[str, str]]): A message list tied to the ChatLog instance.
         llm (LLM): A LLM object.
         seed (int, optional): An random integer controlling pseudo-randomness. Defaults to a random integer from 1 to 9998
         delim (str, optional): A delimiter to parse a formatted LLM output. Defaults to ChatLog.EXIT_DELIM, which defaults to "--".
+        threshold (float, optional): Minimum probability of "Yes" for LLMs that score exit queries. Defaults to EXIT_THRESHOLD.
 
     Returns:
         bool: _description_
@@ -105,8 +126,12 @@ def check_exit(
         return False
     exit = updated_message_list.copy()
     exit.append(ChatLog.END_QUERY)
-    result = llm.run(exit, seed=seed, with_moderation=False)
-
-    is_last = bool(re.search(r"[yY]es", result.split(delim)[-1]))
-    logger.info(f"exit: {is_last}, Reasoning: {result}")
+    probability = llm.exit_probability(exit)
+    if probability is not None:
+        is_last = probability >= threshold
+        logger.info(f"exit: {is_last}, Probability: {probability:.3f}")
+    else:
+        result = llm.run(exit, seed=seed, with_moderation=False)
+        is_last = parse_exit(result, delim)
+        logger.info(f"exit: {is_last}, Reasoning: {result}")
     return is_last or (len(updated_message_list) > ChatLog.MAX_LEN)
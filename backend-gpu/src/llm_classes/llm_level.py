@@ -1,12 +1,24 @@
 import os
 import random
+import time
 from abc import ABC, abstractmethod
+from threading import Thread
+from typing import Any, Dict, Iterator, Optional
 
 import torch
 from dotenv import load_dotenv
 from openai import OpenAI
 from peft import AutoPeftModelForCausalLM
-from transformers import AutoModelForCausalLM, AutoTokenizer
+from transformers import (
+    AutoModelForCausalLM,
+    AutoTokenizer,
+    DynamicCache,
+    TextIteratorStreamer,
+)
+
+from .batching import get_worker, worker_metrics
+from .model_registry import LoadedModel, get_registry
+from .prefix_cache import conversation_key, get_prefix_cache
 
 
 class LLM(ABC):
@@ -20,6 +32,47 @@ class LLM(ABC):
     ) -> str:
         return
 
+    def stream(
+        self, messages: list, seed: int = random.randint(1, 9999)
+    ) -> Iterator[str]:
+        """Runs the llm given a current conversation and seed, and yields the output text in chunks as it is generated.
+        LLMs that cannot stream yield their whole output as one chunk.
+        Content moderation is not applied, call moderate() on the accumulated text instead.
+
+        Args:
+            messages (list): A list of messages tied to a ChatLog instance.
+            seed (int, optional): A random integer. Defaults to a random integer from 1 to 9998.
+
+        Yields:
+            str: chunks of text output from the Large Language Model.
+        """
+        yield self.run(messages, seed=seed, with_moderation=False)
+
+    def moderate(self, text: str) -> str:
+        """Returns the text, or a default reply if the text is inappropriate.
+        LLMs without content moderation return the text unchanged.
+
+        Args:
+            text (str): Text to check.
+
+        Returns:
+            str: The text, or a default reply.
+        """
+        return text
+
+    def exit_probability(self, messages: list) -> Optional[float]:
+        """Scores the probability that the model answers "Yes" to an exit query, without
+        generating a reply. LLMs that cannot score answers return None, and the exit query
+        is answered by run() instead.
+
+        Args:
+            messages (list): A list of messages ending with the exit query.
+
+        Returns:
+            Optional[float]: Probability of "Yes" between 0 and 1, or None.
+        """
+        return None
+
 
 class ContentModeration:
     """A wrapper class around a content filter, for added security measures.
@@ -78,75 +131,302 @@ class GPT(LLM):
             seed=seed,
         )
         output_text = output.choices[0].message.content
-        if with_moderation and self.content_moderation.is_harmful(output_text):
-            return self.content_moderation.default
+        if with_moderation:
+            return self.moderate(output_text)
         else:
             return output_text
 
+    def stream(
+        self, messages: list, seed: int = random.randint(1, 9999)
+    ) -> Iterator[str]:
+        """Runs the llm given a current conversation and seed, and yields the output text in chunks as it is generated.
+        Content moderation is not applied, call moderate() on the accumulated text instead.
 
-class LocalMistralGPTQ(LLM):
-    """A class for GPTQ-quantised LLM"""
+        Args:
+            messages (list): A list of messages tied to a ChatLog instance.
+            seed (int, optional): A random integer. Defaults to a random integer from 1 to 9998.
 
-    def __init__(self):
-        self.path = "./models/dolphin-2.2.1-mistral-7B-GPTQ"
+        Yields:
+            str: chunks of text output from the Large Language Model.
+        """
+        output = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            temperature=0.4,
+            top_p=0.4,
+            seed=seed,
+        )
+        for chunk in output:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
 
-    def run(
-        self,
-        messages: list,
-        seed: int = random.randint(1, 9999),
-        with_moderation: bool = True,
-    ):
-        """Runs the llm given a current conversation and seed and outputs a string.
-        The transformers library does NOT support setseed in the conventional sense, and instead expects a boolean in do_sample.
-        For deterministic results, set a seed that is GREATER than 9999.
+    def moderate(self, text: str) -> str:
+        """Returns the text, or a default reply if the content moderation module flags it.
 
         Args:
-            messages (list): A list of messages tied to a ChatLog instance.
-            seed (int, optional): A random integer. Defaults to a random integer from 1 to 9998.
-            with_moderation (bool, optional): Whether to activate moderation module to filter content. Defaults to True.
+            text (str): Text to check.
 
         Returns:
-            str: text output from the Large Language Model.
+            str: The text, or a default reply.
         """
-        model = AutoModelForCausalLM.from_pretrained(
-            self.path,
-            low_cpu_mem_usage=True,
-            return_dict=True,
-            torch_dtype=torch.float16,
-            device_map="cuda",
+        if self.content_moderation.is_harmful(text):
+            return self.content_moderation.default
+        return text
+
+
+def free_device_memory() -> None:
+    """Releases cached GPU memory, e.g. after a model is evicted from the model registry."""
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def model_metrics() -> Dict[str, Any]:
+    """Returns the load time and per-call time of the loaded local models, the
+    batch sizes of their inference workers and the prefix cache counters.
+
+    Returns:
+        Dict[str, Any]: See ModelRegistry.metrics(), with the BatchingWorker.metrics() of
+            each model under "batching" and PrefixCache.metrics() under "prefix_cache".
+    """
+    return {
+        **get_registry(on_evict=free_device_memory).metrics(),
+        "batching": worker_metrics(),
+        "prefix_cache": get_prefix_cache().metrics(),
+    }
+
+
+class LocalLLM(LLM):
+    """Base class for local LLMs run with the transformers library.
+    Models and tokenizers are loaded once per process by the model registry, and shared
+    by all instances and request threads.
+    """
+
+    DEVICE = os.environ.get("LOCAL_MODEL_DEVICE", "cuda")
+    BATCHING = os.environ.get("LOCAL_MODEL_BATCHING", "true").lower() == "true"
+    PREFIX_CACHING = os.environ.get("LOCAL_PREFIX_CACHE", "true").lower() == "true"
+    GENERATION_KWARGS = {
+        "temperature": 0.7,
+        "top_p": 0.95,
+        "top_k": 40,
+        "repetition_penalty": 1,
+        "max_new_tokens": 512,
+    }
+    # "logits" answers exit queries with score_exit(), "generate" with run()
+    EXIT_SCORING = os.environ.get("LOCAL_EXIT_SCORING", "generate").lower()
+    # The answer follows the delimiter of ChatLog.EXIT_DELIM in generated replies
+    EXIT_ANSWER_PREFIX = "-- "
+    EXIT_ANSWERS = {"yes": ("Yes", "yes"), "no": ("No", "no")}
+
+    # Name of the model in the model registry
+    name: str
+
+    @abstractmethod
+    def load(self) -> tuple[Any, Any]:
+        """Loads the model and its tokenizer. Called by the model registry.
+
+        Returns:
+            tuple[Any, Any]: The model and its tokenizer.
+        """
+
+    def loaded(self) -> LoadedModel:
+        """Returns the loaded model and tokenizer, loading them on first use.
+
+        Returns:
+            LoadedModel: The loaded model.
+        """
+        return get_registry(on_evict=free_device_memory).get(
+            self.name, lambda: self.prepare(*self.load())
         )
 
-        tokenizer = AutoTokenizer.from_pretrained(self.path)
+    @staticmethod
+    def prepare(model: Any, tokenizer: Any) -> tuple[Any, Any]:
+        """Configures a freshly loaded tokenizer to pad batches on the left.
 
-        sample = True if 1 <= seed <= 9999 else False
-        text = tokenizer.apply_chat_template(messages, tokenize=False)
-        tokenised = tokenizer(text, return_tensors="pt")
-        input_ids = tokenised.input_ids.cuda()
-        attention_mask = tokenised.attention_mask.cuda()
-        output = model.generate(
-            inputs=input_ids,
-            attention_mask=attention_mask,
-            temperature=0.7,
-            do_sample=sample,
-            top_p=0.95,
-            top_k=40,
-            repetition_penalty=1,
-            max_new_tokens=512,
-            eos_token_id=tokenizer.eos_token_id,
+        Args:
+            model (Any): The model.
+            tokenizer (Any): Its tokenizer.
+
+        Returns:
+            tuple[Any, Any]: The model and its tokenizer.
+        """
+        tokenizer.padding_side = "left"
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        return model, tokenizer
+
+    def torch_dtype(self) -> torch.dtype:
+        """Returns half precision on GPUs and full precision on CPUs."""
+        return torch.float16 if self.DEVICE.startswith("cuda") else torch.float32
+
+    def generation_inputs(
+        self, loaded: LoadedModel, conversations: list[list], sample: bool
+    ) -> Dict[str, Any]:
+        """Tokenises conversations into the keyword arguments of one model.generate() call.
+        Conversations are padded on the left, so that every output continues its own conversation.
+
+        Args:
+            loaded (LoadedModel): The loaded model.
+            conversations (list[list]): Lists of messages tied to ChatLog instances.
+            sample (bool): Whether to sample or decode greedily.
+
+        Returns:
+            Dict[str, Any]: Keyword arguments for model.generate().
+        """
+        tokenizer = loaded.tokenizer
+        texts = [
+            tokenizer.apply_chat_template(messages, tokenize=False)
+            for messages in conversations
+        ]
+        tokenised = tokenizer(texts, return_tensors="pt", padding=True)
+        return {
+            "inputs": tokenised.input_ids.to(loaded.model.device),
+            "attention_mask": tokenised.attention_mask.to(loaded.model.device),
+            "do_sample": sample,
+            "eos_token_id": tokenizer.eos_token_id,
+            "pad_token_id": tokenizer.pad_token_id,
+            **self.GENERATION_KWARGS,
+        }
+
+    def generate_batch(self, conversations: list[list], sample: bool) -> list[str]:
+        """Generates one reply per conversation in a single generate call.
+        A single conversation reuses the cached key/value states of its earlier turns.
+
+        Args:
+            conversations (list[list]): Lists of messages tied to ChatLog instances.
+            sample (bool): Whether to sample or decode greedily.
+
+        Returns:
+            list[str]: text outputs from the Large Language Model, in the order of the conversations.
+        """
+        if len(conversations) == 1 and self.PREFIX_CACHING:
+            return [self.generate_with_prefix_cache(conversations[0], sample)]
+
+        loaded = self.loaded()
+        start = time.perf_counter()
+        inputs = self.generation_inputs(loaded, conversations, sample)
+        output = loaded.model.generate(**inputs)
+        generated = loaded.tokenizer.batch_decode(
+            output[:, inputs["inputs"].shape[1] :], skip_special_tokens=True
         )
+        loaded.record_call(time.perf_counter() - start)
+        return generated
 
-        generated = tokenizer.batch_decode(
-            output[:, input_ids.shape[1] :], skip_special_tokens=True
-        )[0]
+    def generate_with_prefix_cache(self, messages: list, sample: bool) -> str:
+        """Generates a reply to a conversation, only encoding the prompt tokens that follow
+        the longest prefix shared with the cached key/value states of the conversation.
+        The states are extended with the new prompt and reply, and cached for the next turn.
 
-        # CONTENT MODERATION NOT IMPLEMENTED
+        Args:
+            messages (list): A list of messages tied to a ChatLog instance.
+            sample (bool): Whether to sample or decode greedily.
+
+        Returns:
+            str: text output from the Large Language Model.
+        """
+        loaded = self.loaded()
+        start = time.perf_counter()
+        inputs = self.generation_inputs(loaded, [messages], sample)
+        token_ids = inputs["inputs"][0].tolist()
+
+        prefix_cache = get_prefix_cache()
+        key = conversation_key(self.name, messages)
+        states, reused = prefix_cache.take(key, token_ids)
+        if states is None:
+            states = DynamicCache()
+        else:
+            states.crop(reused)
+
+        output = loaded.model.generate(**inputs, past_key_values=states)
+        generated = loaded.tokenizer.decode(
+            output[0, len(token_ids) :], skip_special_tokens=True
+        )
+        prefix_cache.put(key, output[0, : states.get_seq_length()].tolist(), states)
+        loaded.record_call(time.perf_counter() - start)
         return generated
 
+    def answer_token_ids(self, tokenizer: Any, answer: str) -> list[int]:
+        """Returns the IDs of the first tokens of the spellings of an exit answer, with and
+        without a leading space.
 
-class LocalMistralPEFTGPTQ(LLM):
-    def __init__(self):
-        self.model_path = "./models/dolphin-2.2.1-mistral-7B-GPTQ"
-        self.adapter_path = "./models"
+        Args:
+            tokenizer (Any): The tokenizer of the model.
+            answer (str): "yes" or "no".
+
+        Returns:
+            list[int]: Distinct token IDs.
+        """
+        token_ids = []
+        for word in self.EXIT_ANSWERS[answer]:
+            for text in (word, " " + word):
+                encoded = tokenizer.encode(text, add_special_tokens=False)
+                if encoded and encoded[0] not in token_ids:
+                    token_ids.append(encoded[0])
+        return token_ids
+
+    def score_exit(self, messages: list) -> float:
+        """Scores an exit query with one forward pass over the conversation, instead of
+        generating a reasoning and an answer. The logits of the next token after the answer
+        delimiter are compared between the "Yes" and "No" spellings.
+        The conversation reuses the cached key/value states of its earlier turns.
+
+        Args:
+            messages (list): A list of messages ending with the exit query.
+
+        Returns:
+            float: Probability of "Yes" relative to "No", between 0 and 1.
+        """
+        loaded = self.loaded()
+        start = time.perf_counter()
+        tokenizer = loaded.tokenizer
+        text = (
+            tokenizer.apply_chat_template(
+                messages, tokenize=False, add_generation_prompt=True
+            )
+            + self.EXIT_ANSWER_PREFIX
+        )
+        tokenised = tokenizer(text, return_tensors="pt")
+        input_ids = tokenised.input_ids.to(loaded.model.device)
+        token_ids = input_ids[0].tolist()
+
+        prefix_cache = get_prefix_cache()
+        key = conversation_key(self.name, messages)
+        states, reused = (
+            prefix_cache.take(key, token_ids) if self.PREFIX_CACHING else (None, 0)
+        )
+        if states is None:
+            states = DynamicCache()
+        else:
+            states.crop(reused)
+
+        with torch.no_grad():
+            logits = loaded.model(
+                input_ids=input_ids[:, reused:],
+                attention_mask=tokenised.attention_mask.to(loaded.model.device),
+                past_key_values=states,
+                use_cache=True,
+            ).logits[0, -1]
+        if self.PREFIX_CACHING:
+            prefix_cache.put(key, token_ids, states)
+
+        logits = logits.float()
+        yes = torch.logsumexp(logits[self.answer_token_ids(tokenizer, "yes")], dim=0)
+        no = torch.logsumexp(logits[self.answer_token_ids(tokenizer, "no")], dim=0)
+        loaded.record_call(time.perf_counter() - start)
+        return torch.sigmoid(yes - no).item()
+
+    def exit_probability(self, messages: list) -> Optional[float]:
+        """Scores an exit query with score_exit() if LOCAL_EXIT_SCORING is "logits".
+
+        Args:
+            messages (list): A list of messages ending with the exit query.
+
+        Returns:
+            Optional[float]: Probability of "Yes" between 0 and 1, or None.
+        """
+        if self.EXIT_SCORING != "logits":
+            return None
+        return self.score_exit(messages)
 
     def run(
         self,
@@ -157,6 +437,8 @@ class LocalMistralPEFTGPTQ(LLM):
         """Runs the llm given a current conversation and seed and outputs a string.
         The transformers library does NOT support setseed in the conventional sense, and instead expects a boolean in do_sample.
         For deterministic results, set a seed that is GREATER than 9999.
+        Unless LOCAL_MODEL_BATCHING is false, the conversation is generated in a batch with
+        the other conversations waiting for the same model.
 
         Args:
             messages (list): A list of messages tied to a ChatLog instance.
@@ -166,36 +448,98 @@ class LocalMistralPEFTGPTQ(LLM):
         Returns:
             str: text output from the Large Language Model.
         """
-        model = AutoPeftModelForCausalLM.from_pretrained(
-            self.adapter_path,
+        sample = True if 1 <= seed <= 9999 else False
+        if self.BATCHING:
+            generated = get_worker(self.name, self).run(messages, sample)
+        else:
+            generated = self.generate_batch([messages], sample)[0]
+
+        # CONTENT MODERATION NOT IMPLEMENTED
+        return generated
+
+    def stream(
+        self, messages: list, seed: int = random.randint(1, 9999)
+    ) -> Iterator[str]:
+        """Runs the llm given a current conversation and seed, and yields the output text in chunks as it is generated.
+        Generation runs on a background thread. For deterministic results, set a seed that is GREATER than 9999.
+
+        Args:
+            messages (list): A list of messages tied to a ChatLog instance.
+            seed (int, optional): A random integer. Defaults to a random integer from 1 to 9998.
+
+        Yields:
+            str: chunks of text output from the Large Language Model.
+        """
+        loaded = self.loaded()
+        start = time.perf_counter()
+        streamer = TextIteratorStreamer(
+            loaded.tokenizer, skip_prompt=True, skip_special_tokens=True
+        )
+        generation = Thread(
+            target=loaded.model.generate,
+            kwargs={
+                **self.generation_inputs(
+                    loaded, [messages], True if 1 <= seed <= 9999 else False
+                ),
+                "streamer": streamer,
+            },
+        )
+        generation.start()
+        for chunk in streamer:
+            if chunk:
+                yield chunk
+        generation.join()
+        loaded.record_call(time.perf_counter() - start)
+
+
+class LocalMistralGPTQ(LocalLLM):
+    """A class for GPTQ-quantised LLM"""
+
+    def __init__(self, path: str = "./models/dolphin-2.2.1-mistral-7B-GPTQ"):
+        self.path = path
+        self.name = path
+
+    def load(self) -> tuple[Any, Any]:
+        """Loads the model and its tokenizer. Called by the model registry.
+
+        Returns:
+            tuple[Any, Any]: The model and its tokenizer.
+        """
+        model = AutoModelForCausalLM.from_pretrained(
+            self.path,
             low_cpu_mem_usage=True,
             return_dict=True,
-            torch_dtype=torch.float16,
-            device_map="cuda",
+            torch_dtype=self.torch_dtype(),
+            device_map=self.DEVICE,
         )
+        tokenizer = AutoTokenizer.from_pretrained(self.path)
+        return model, tokenizer
 
-        tokenizer = AutoTokenizer.from_pretrained(self.model_path)
 
-        sample = True if 1 <= seed <= 9999 else False
-        text = tokenizer.apply_chat_template(messages, tokenize=False)
-        tokenised = tokenizer(text, return_tensors="pt")
-        input_ids = tokenised.input_ids.cuda()
-        attention_mask = tokenised.attention_mask.cuda()
-        output = model.generate(
-            inputs=input_ids,
-            attention_mask=attention_mask,
-            temperature=0.7,
-            do_sample=sample,
-            top_p=0.95,
-            top_k=40,
-            repetition_penalty=1,
-            max_new_tokens=512,
-            eos_token_id=tokenizer.eos_token_id,
-        )
+class LocalMistralPEFTGPTQ(LocalLLM):
+    """A class for a GPTQ-quantised LLM with a PEFT adapter"""
 
-        generated = tokenizer.batch_decode(
-            output[:, input_ids.shape[1] :], skip_special_tokens=True
-        )[0]
+    def __init__(
+        self,
+        model_path: str = "./models/dolphin-2.2.1-mistral-7B-GPTQ",
+        adapter_path: str = "./models",
+    ):
+        self.model_path = model_path
+        self.adapter_path = adapter_path
+        self.name = f"{adapter_path} ({model_path})"
 
-        # CONTENT MODERATION NOT IMPLEMENTED
-        return generated
+    def load(self) -> tuple[Any, Any]:
+        """Loads the model with its adapter, and its tokenizer. Called by the model registry.
+
+        Returns:
+            tuple[Any, Any]: The model and its tokenizer.
+        """
+        model = AutoPeftModelForCausalLM.from_pretrained(
+            self.adapter_path,
+            low_cpu_mem_usage=True,
+            return_dict=True,
+            torch_dtype=self.torch_dtype(),
+            device_map=self.DEVICE,
+        )
+        tokenizer = AutoTokenizer.from_pretrained(self.model_path)
+        return model, tokenizer
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+"""
+    src.llm_classes.model_registry
+    ~~~~~~~
+
+    This module implements a process-wide registry of loaded local models, so
+    that model weights and tokenizers are loaded once per process and shared by
+    all request threads, instead of being loaded on every run.
+"""
+
+
+import gc
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class LoadedModel:
+    """A model and its tokenizer, together with load and usage statistics."""
+
+    def __init__(self, name: str, model: Any, tokenizer: Any, load_seconds: float):
+        self.name = name
+        self.model = model
+        self.tokenizer = tokenizer
+        self.load_seconds = load_seconds
+        self.calls = 0
+        self.call_seconds = 0.0
+        self._lock = threading.Lock()
+
+    def record_call(self, seconds: float) -> None:
+        """Records the duration of one call to the model.
+
+        Args:
+            seconds (float): Duration of the call in seconds.
+        """
+        with self._lock:
+            self.calls += 1
+            self.call_seconds += seconds
+
+    def metrics(self) -> Dict[str, float]:
+        """Returns the load time and per-call time of the model.
+
+        Returns:
+            Dict[str, float]: Load time, number of calls and average call time in seconds.
+        """
+        with self._lock:
+            return {
+                "load_seconds": self.load_seconds,
+                "calls": self.calls,
+                "avg_call_seconds": (
+                    self.call_seconds / self.calls if self.calls else 0.0
+                ),
+            }
+
+
+class ModelRegistry:
+    """A thread-safe registry that loads each model once and keeps the most recently used
+    `max_models` models in memory.
+
+    Concurrent requests for a model that is not loaded yet wait for a single load.
+    Evicted models stay usable by the callers that already hold them, and their memory is
+    released once those callers are done.
+    """
+
+    def __init__(self, max_models: int = 1, on_evict: Optional[Callable] = None):
+        self.max_models = max_models
+        self.on_evict = on_evict
+        self._models: OrderedDict[str, LoadedModel] = OrderedDict()
+        self._loading: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "loads": 0, "load_failures": 0, "evictions": 0}
+
+    def get(self, name: str, loader: Callable[[], tuple[Any, Any]]) -> LoadedModel:
+        """Returns a loaded model, loading it with `loader` if it is not loaded yet.
+
+        Args:
+            name (str): A name identifying the model, e.g. its path.
+            loader (Callable[[], tuple[Any, Any]]): Loads and returns the model and its tokenizer.
+
+        Returns:
+            LoadedModel: The loaded model.
+        """
+        while True:
+            with self._lock:
+                if name in self._models:
+                    self._models.move_to_end(name)
+                    self._stats["hits"] += 1
+                    return self._models[name]
+                loading = self._loading.get(name)
+                if loading is None:
+                    loading = self._loading[name] = threading.Event()
+                    break
+            # Another thread is loading the model
+            loading.wait()
+
+        try:
+            start = time.perf_counter()
+            model, tokenizer = loader()
+            loaded = LoadedModel(name, model, tokenizer, time.perf_counter() - start)
+            logger.info(f"Loaded model {name} in {loaded.load_seconds:.1f}s")
+        except Exception:
+            with self._lock:
+                self._stats["load_failures"] += 1
+                del self._loading[name]
+            loading.set()
+            raise
+
+        with self._lock:
+            self._models[name] = loaded
+            self._stats["loads"] += 1
+            evicted = []
+            while len(self._models) > self.max_models:
+                evicted.append(self._models.popitem(last=False)[0])
+                self._stats["evictions"] += 1
+            del self._loading[name]
+        loading.set()
+
+        if evicted:
+            self._release(evicted)
+        return loaded
+
+    def metrics(self) -> Dict[str, Any]:
+        """Returns the registry counters and the load and call times of the loaded models.
+
+        Returns:
+            Dict[str, Any]: Hits, loads, load failures and evictions, and metrics per loaded model.
+        """
+        with self._lock:
+            models = list(self._models.values())
+            stats = dict(self._stats)
+        stats["models"] = {model.name: model.metrics() for model in models}
+        return stats
+
+    def clear(self) -> None:
+        """Unloads all models."""
+        with self._lock:
+            names = list(self._models)
+            self._models.clear()
+        if names:
+            self._release(names)
+
+    def _release(self, names: list[str]) -> None:
+        logger.info(f"Evicted models {', '.join(names)}")
+        gc.collect()
+        if self.on_evict:
+            self.on_evict()
+
+
+_registry: Optional[ModelRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry(on_evict: Optional[Callable] = None) -> ModelRegistry:
+    """Returns the process-wide model registry, creating it on first use.
+
+    The number of models kept in memory is configured through the LOCAL_MODEL_CACHE_SIZE
+    environment variable.
+
+    Args:
+        on_evict (Callable, optional): Called after a model is evicted, e.g. to free GPU memory.
+            Only used when the registry is created.
+
+    Returns:
+        ModelRegistry: The shared model registry.
+    """
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ModelRegistry(
+                    max_models=int(os.environ.get("LOCAL_MODEL_CACHE_SIZE", "1")),
+                    on_evict=on_evict,
+                )
+    return _registry
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+    src.llm_classes.prefix_cache
+    ~~~~~~~
+
+    This module implements a bounded cache of the attention key/value states of
+    conversations with local models. Every turn of a conversation starts with the
+    same system prompts, interview questions and earlier messages, so a turn only
+    needs to encode the tokens that follow the longest prefix it shares with the
+    cached states of its conversation.
+"""
+
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence
+
+
+def common_prefix_length(cached: Sequence[int], token_ids: Sequence[int]) -> int:
+    """Returns the number of leading tokens that two token sequences share.
+
+    Args:
+        cached (Sequence[int]): Token IDs of the cached states.
+        token_ids (Sequence[int]): Token IDs of the new prompt.
+
+    Returns:
+        int: Length of the common prefix.
+    """
+    length = 0
+    for cached_id, token_id in zip(cached, token_ids):
+        if cached_id != token_id:
+            break
+        length += 1
+    return length
+
+
+def conversation_key(model: str, messages: list) -> str:
+    """Returns the cache key of a conversation: a hash of the model and the first message,
+    which contains the survey responses the interview is based on.
+
+    Args:
+        model (str): Name of the model.
+        messages (list): A list of messages tied to a ChatLog instance.
+
+    Returns:
+        str: The cache key.
+    """
+    first = messages[0]["content"] if messages else ""
+    return hashlib.sha256(f"{model}\0{first}".encode("utf-8")).hexdigest()
+
+
+class CachedPrefix:
+    """The key/value states of a conversation, and the token IDs they cover."""
+
+    def __init__(self, token_ids: list[int], states: Any):
+        self.token_ids = token_ids
+        self.states = states
+
+
+class PrefixCache:
+    """A thread-safe LRU cache of conversation key/value states, capped by the number of
+    conversations and the number of cached tokens.
+
+    A turn takes the states of its conversation out of the cache, extends them while
+    generating, and puts them back. Two turns of the same conversation never share states.
+    """
+
+    def __init__(self, max_entries: int = 64, max_tokens: int = 65536):
+        self.max_entries = max_entries
+        self.max_tokens = max_tokens
+        self._entries: OrderedDict[str, CachedPrefix] = OrderedDict()
+        self._tokens = 0
+        self._lock = threading.Lock()
+        self._stats = {
+            "hits": 0,
+            "misses": 0,
+            "evictions": 0,
+            "reused_tokens": 0,
+            "encoded_tokens": 0,
+        }
+
+    def take(self, key: str, token_ids: Sequence[int]) -> tuple[Optional[Any], int]:
+        """Removes the states of a conversation from the cache, and returns them with the
+        number of leading prompt tokens they cover.
+
+        At least one prompt token is always left to encode. The caller must truncate the
+        states to the returned length before using them.
+
+        Args:
+            key (str): The conversation key.
+            token_ids (Sequence[int]): Token IDs of the new prompt.
+
+        Returns:
+            tuple[Optional[Any], int]: The cached states, or None on a miss, and the number
+                of prompt tokens they can be reused for.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self._tokens -= len(entry.token_ids)
+            reused = (
+                min(
+                    common_prefix_length(entry.token_ids, token_ids),
+                    len(token_ids) - 1,
+                )
+                if entry is not None
+                else 0
+            )
+            if reused > 0:
+                self._stats["hits"] += 1
+            else:
+                self._stats["misses"] += 1
+            self._stats["reused_tokens"] += reused
+            self._stats["encoded_tokens"] += len(token_ids) - reused
+        if reused == 0:
+            return None, 0
+        return entry.states, reused
+
+    def put(self, key: str, token_ids: list[int], states: Any) -> None:
+        """Stores the states of a conversation, evicting the least recently used
+        conversations while the cache is over its limits.
+
+        Args:
+            key (str): The conversation key.
+            token_ids (list[int]): Token IDs covered by the states.
+            states (Any): The key/value states.
+        """
+        if len(token_ids) > self.max_tokens:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._tokens -= len(previous.token_ids)
+            self._entries[key] = CachedPrefix(token_ids, states)
+            self._tokens += len(token_ids)
+            while (
+                len(self._entries) > self.max_entries or self._tokens > self.max_tokens
+            ):
+                _, evicted = self._entries.popitem(last=False)
+                self._tokens -= len(evicted.token_ids)
+                self._stats["evictions"] += 1
+
+    def metrics(self) -> Dict[str, int]:
+        """Returns the cache size and hit, miss, eviction and token counters.
+
+        Returns:
+            Dict[str, int]: Cached conversations and tokens, and lifetime counters.
+        """
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "cached_tokens": self._tokens,
+                "max_tokens": self.max_tokens,
+                **self._stats,
+            }
+
+    def clear(self) -> None:
+        """Removes all cached states."""
+        with self._lock:
+            self._entries.clear()
+            self._tokens = 0
+
+
+_prefix_cache: Optional[PrefixCache] = None
+_prefix_cache_lock = threading.Lock()
+
+
+def get_prefix_cache() -> PrefixCache:
+    """Returns the process-wide prefix cache, creating it on first use.
+
+    Its limits are configured through the LOCAL_PREFIX_CACHE_SIZE (conversations) and
+    LOCAL_PREFIX_CACHE_TOKENS environment variables.
+
+    Returns:
+        PrefixCache: The shared prefix cache.
+    """
+    global _prefix_cache
+    if _prefix_cache is None:
+        with _prefix_cache_lock:
+            if _prefix_cache is None:
+                _prefix_cache = PrefixCache(
+                    max_entries=int(os.environ.get("LOCAL_PREFIX_CACHE_SIZE", "64")),
+                    max_tokens=int(
+                        os.environ.get("LOCAL_PREFIX_CACHE_TOKENS", "65536")
+                    ),
+                )
+    return _prefix_cache
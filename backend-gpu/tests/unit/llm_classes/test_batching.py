@@ -0,0 +1,87 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from src.llm_classes.batching import BatchingWorker
+
+
+class EchoModel:
+    """Replies to each conversation with its last message, and records the batches."""
+
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.batches = []
+        self.lock = threading.Lock()
+
+    def generate_batch(self, conversations, sample):
+        time.sleep(self.delay)
+        with self.lock:
+            self.batches.append((len(conversations), sample))
+        return [messages[-1]["content"] for messages in conversations]
+
+
+class TestBatchingWorker(TestCase):
+    def conversation(self, index):
+        return [{"role": "user", "content": f"message {index}"}]
+
+    def test_single_request(self):
+        model = EchoModel()
+        worker = BatchingWorker(model)
+        self.addCleanup(worker.close)
+
+        self.assertEqual(worker.run(self.conversation(1), False), "message 1")
+        self.assertEqual(model.batches, [(1, False)])
+
+    def test_concurrent_requests_are_batched_and_routed_back(self):
+        model = EchoModel()
+        worker = BatchingWorker(model, max_batch_size=8, max_wait_ms=50)
+        self.addCleanup(worker.close)
+
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            outputs = list(
+                executor.map(
+                    lambda index: worker.run(self.conversation(index), False),
+                    range(16),
+                )
+            )
+
+        self.assertEqual(outputs, [f"message {index}" for index in range(16)])
+        self.assertLess(len(model.batches), 16)
+        self.assertTrue(all(size <= 8 for size, _ in model.batches))
+        metrics = worker.metrics()
+        self.assertEqual(metrics["requests"], 16)
+        self.assertGreater(metrics["avg_batch_size"], 1)
+
+    def test_sampling_modes_are_generated_separately(self):
+        model = EchoModel()
+        worker = BatchingWorker(model, max_wait_ms=50)
+        self.addCleanup(worker.close)
+
+        futures = [
+            worker.submit(self.conversation(index), index % 2 == 0)
+            for index in range(4)
+        ]
+
+        self.assertEqual(
+            [future.result() for future in futures],
+            [f"message {index}" for index in range(4)],
+        )
+        self.assertEqual(sorted(model.batches), [(2, False), (2, True)])
+
+    def test_failed_batch_raises_in_every_caller(self):
+        class FailingModel:
+            def generate_batch(self, conversations, sample):
+                raise RuntimeError("CUDA out of memory")
+
+        worker = BatchingWorker(FailingModel(), max_wait_ms=50)
+        self.addCleanup(worker.close)
+
+        futures = [worker.submit(self.conversation(index), False) for index in range(3)]
+
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result()
+        # The worker keeps serving after a failure
+        worker.llm = EchoModel()
+        self.assertEqual(worker.run(self.conversation(4), False), "message 4")
@@ -0,0 +1,35 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from src.llm_classes.chatlog import ChatLog  # noqa: E402
+from src.llm_classes.functions import check_exit, parse_exit  # noqa: E402
+
+
+class TestCheckExit(TestCase):
+    MESSAGES = [{"role": "user", "content": f"message {index}"} for index in range(6)]
+
+    def test_parse_exit(self):
+        self.assertTrue(parse_exit("I thanked the user -- Yes."))
+        self.assertFalse(parse_exit("Yes, I am waiting for a reply -- No."))
+
+    def test_scored_exit_uses_threshold(self):
+        llm = MagicMock()
+        llm.exit_probability.return_value = 0.7
+
+        self.assertTrue(check_exit(self.MESSAGES, llm, threshold=0.5))
+        self.assertFalse(check_exit(self.MESSAGES, llm, threshold=0.8))
+        llm.run.assert_not_called()
+        self.assertEqual(llm.exit_probability.call_args.args[0][-1], ChatLog.END_QUERY)
+
+    def test_generates_when_scoring_is_unsupported(self):
+        llm = MagicMock()
+        llm.exit_probability.return_value = None
+        llm.run.return_value = "I thanked the user -- Yes."
+
+        self.assertTrue(check_exit(self.MESSAGES, llm))
+        llm.run.assert_called_once()
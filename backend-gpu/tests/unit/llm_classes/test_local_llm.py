@@ -0,0 +1,102 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from src.llm_classes import llm_level  # noqa: E402
+from src.llm_classes.model_registry import ModelRegistry  # noqa: E402
+from src.llm_classes.prefix_cache import PrefixCache  # noqa: E402
+
+# A randomly initialised model small enough to run on a CPU
+TINY_MODEL = "hf-internal-testing/tiny-random-LlamaForCausalLM"
+CHAT_TEMPLATE = "{% for message in messages %}{{ message['role'] }}: {{ message['content'] }}\n{% endfor %}"
+
+
+class TinyLLM(llm_level.LocalMistralGPTQ):
+    DEVICE = "cpu"
+    GENERATION_KWARGS = {**llm_level.LocalLLM.GENERATION_KWARGS, "max_new_tokens": 4}
+
+    def load(self):
+        model, tokenizer = super().load()
+        tokenizer.chat_template = tokenizer.chat_template or CHAT_TEMPLATE
+        return model, tokenizer
+
+
+class TestLocalLLM(TestCase):
+    MESSAGES = [{"role": "user", "content": "How was the product?"}]
+
+    def setUp(self):
+        self.registry = ModelRegistry()
+        patcher = patch(
+            "src.llm_classes.llm_level.get_registry", return_value=self.registry
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.prefix_cache = PrefixCache()
+        patcher = patch(
+            "src.llm_classes.llm_level.get_prefix_cache",
+            return_value=self.prefix_cache,
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_model_is_loaded_once_across_instances(self):
+        with patch.object(TinyLLM, "load", wraps=TinyLLM(TINY_MODEL).load) as load:
+            TinyLLM(TINY_MODEL).run(self.MESSAGES, seed=10000)
+            TinyLLM(TINY_MODEL).run(self.MESSAGES, seed=10000)
+
+        load.assert_called_once()
+        metrics = self.registry.metrics()["models"][TINY_MODEL]
+        self.assertEqual(metrics["calls"], 2)
+        self.assertGreater(metrics["load_seconds"], 0)
+
+    def test_stream_matches_run(self):
+        llm = TinyLLM(TINY_MODEL)
+
+        output = llm.run(self.MESSAGES, seed=10000)
+        streamed = "".join(llm.stream(self.MESSAGES, seed=10000))
+
+        self.assertEqual(streamed, output)
+
+    def test_prefix_cache_matches_uncached_generation(self):
+        llm = TinyLLM(TINY_MODEL)
+        reply = llm.generate_with_prefix_cache(self.MESSAGES, False)
+        messages = self.MESSAGES + [
+            {"role": "assistant", "content": reply},
+            {"role": "user", "content": "It was fine."},
+        ]
+
+        cached = llm.generate_with_prefix_cache(messages, False)
+        with patch.object(TinyLLM, "PREFIX_CACHING", False):
+            uncached = llm.generate_batch([messages], False)[0]
+
+        self.assertEqual(cached, uncached)
+        metrics = self.prefix_cache.metrics()
+        self.assertEqual(metrics["hits"], 1)
+        self.assertGreater(metrics["reused_tokens"], 0)
+
+    def test_score_exit_is_a_probability(self):
+        probability = TinyLLM(TINY_MODEL).score_exit(self.MESSAGES)
+
+        self.assertGreaterEqual(probability, 0)
+        self.assertLessEqual(probability, 1)
+
+    def test_score_exit_reuses_conversation_prefix(self):
+        llm = TinyLLM(TINY_MODEL)
+        reply = llm.generate_with_prefix_cache(self.MESSAGES, False)
+        messages = self.MESSAGES + [{"role": "assistant", "content": reply}]
+
+        llm.score_exit(messages + [{"role": "system", "content": "End?"}])
+
+        self.assertEqual(self.prefix_cache.metrics()["hits"], 1)
+
+    def test_exit_probability_follows_scoring_mode(self):
+        llm = TinyLLM(TINY_MODEL)
+
+        with patch.object(TinyLLM, "EXIT_SCORING", "generate"):
+            self.assertIsNone(llm.exit_probability(self.MESSAGES))
+        with patch.object(TinyLLM, "EXIT_SCORING", "logits"):
+            self.assertIsNotNone(llm.exit_probability(self.MESSAGES))
@@ -0,0 +1,92 @@
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from src.llm_classes.model_registry import ModelRegistry
+
+
+class TestModelRegistry(TestCase):
+    def loader(self, name):
+        return MagicMock(side_effect=lambda: (f"{name} model", f"{name} tokenizer"))
+
+    def test_loads_model_once(self):
+        registry = ModelRegistry()
+        loader = self.loader("tiny")
+
+        first = registry.get("tiny", loader)
+        second = registry.get("tiny", loader)
+
+        self.assertIs(first, second)
+        self.assertEqual(first.model, "tiny model")
+        self.assertEqual(first.tokenizer, "tiny tokenizer")
+        loader.assert_called_once()
+        self.assertEqual(registry.metrics()["hits"], 1)
+
+    def test_concurrent_requests_share_one_load(self):
+        registry = ModelRegistry()
+
+        def slow_loader():
+            time.sleep(0.05)
+            return "model", "tokenizer"
+
+        loader = MagicMock(side_effect=slow_loader)
+        loaded = []
+        threads = [
+            threading.Thread(target=lambda: loaded.append(registry.get("tiny", loader)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        loader.assert_called_once()
+        self.assertEqual(len(loaded), 8)
+        self.assertTrue(all(model is loaded[0] for model in loaded))
+
+    def test_evicts_least_recently_used_model(self):
+        on_evict = MagicMock()
+        registry = ModelRegistry(max_models=2, on_evict=on_evict)
+
+        registry.get("first", self.loader("first"))
+        registry.get("second", self.loader("second"))
+        registry.get("first", self.loader("first"))
+        registry.get("third", self.loader("third"))
+
+        metrics = registry.metrics()
+        self.assertEqual(set(metrics["models"]), {"first", "third"})
+        self.assertEqual(metrics["evictions"], 1)
+        on_evict.assert_called_once()
+
+    def test_failed_load_can_be_retried(self):
+        registry = ModelRegistry()
+
+        with self.assertRaises(OSError):
+            registry.get("tiny", MagicMock(side_effect=OSError("not found")))
+        loaded = registry.get("tiny", self.loader("tiny"))
+
+        self.assertEqual(loaded.model, "tiny model")
+        self.assertEqual(registry.metrics()["load_failures"], 1)
+
+    def test_reports_load_and_call_time(self):
+        registry = ModelRegistry()
+
+        loaded = registry.get("tiny", self.loader("tiny"))
+        loaded.record_call(0.2)
+        loaded.record_call(0.4)
+
+        metrics = registry.metrics()["models"]["tiny"]
+        self.assertGreaterEqual(metrics["load_seconds"], 0)
+        self.assertEqual(metrics["calls"], 2)
+        self.assertAlmostEqual(metrics["avg_call_seconds"], 0.3)
+
+    def test_clear(self):
+        registry = ModelRegistry()
+        loader = self.loader("tiny")
+
+        registry.get("tiny", loader)
+        registry.clear()
+        registry.get("tiny", loader)
+
+        self.assertEqual(loader.call_count, 2)
@@ -0,0 +1,93 @@
+from unittest import TestCase
+
+from src.llm_classes.prefix_cache import (
+    PrefixCache,
+    common_prefix_length,
+    conversation_key,
+)
+
+
+class TestPrefixCache(TestCase):
+    def test_common_prefix_length(self):
+        self.assertEqual(common_prefix_length([1, 2, 3], [1, 2, 4, 5]), 2)
+        self.assertEqual(common_prefix_length([1, 2], [1, 2, 3]), 2)
+        self.assertEqual(common_prefix_length([], [1]), 0)
+
+    def test_conversation_key_depends_on_model_and_first_message(self):
+        first = [{"role": "user", "content": "survey responses"}]
+        later = first + [{"role": "assistant", "content": "question"}]
+
+        self.assertEqual(conversation_key("a", first), conversation_key("a", later))
+        self.assertNotEqual(conversation_key("a", first), conversation_key("b", first))
+
+    def test_miss_then_hit(self):
+        cache = PrefixCache()
+
+        self.assertEqual(cache.take("key", [1, 2, 3]), (None, 0))
+        cache.put("key", [1, 2, 3, 7], "states")
+        states, reused = cache.take("key", [1, 2, 3, 7, 8, 9])
+
+        self.assertEqual((states, reused), ("states", 4))
+        metrics = cache.metrics()
+        self.assertEqual((metrics["hits"], metrics["misses"]), (1, 1))
+        self.assertEqual(metrics["reused_tokens"], 4)
+        self.assertEqual(metrics["encoded_tokens"], 5)
+
+    def test_take_removes_entry(self):
+        cache = PrefixCache()
+        cache.put("key", [1, 2, 3], "states")
+
+        cache.take("key", [1, 2, 3, 4])
+
+        self.assertEqual(cache.take("key", [1, 2, 3, 4]), (None, 0))
+        self.assertEqual(cache.metrics()["cached_tokens"], 0)
+
+    def test_diverging_prompt_reuses_common_prefix(self):
+        cache = PrefixCache()
+        # An exit check appends a query instead of continuing the reply
+        cache.put("key", [1, 2, 3, 4, 5], "states")
+
+        _, reused = cache.take("key", [1, 2, 3, 9, 9])
+
+        self.assertEqual(reused, 3)
+
+    def test_leaves_one_token_to_encode(self):
+        cache = PrefixCache()
+        cache.put("key", [1, 2, 3, 4], "states")
+
+        _, reused = cache.take("key", [1, 2, 3])
+
+        self.assertEqual(reused, 2)
+
+    def test_evicts_least_recently_used_by_entries(self):
+        cache = PrefixCache(max_entries=2)
+        cache.put("a", [1], "a")
+        cache.put("b", [2], "b")
+        cache.put("c", [3], "c")
+
+        self.assertEqual(cache.take("a", [1, 0]), (None, 0))
+        self.assertEqual(cache.take("c", [3, 0]), ("c", 1))
+        self.assertEqual(cache.metrics()["evictions"], 1)
+
+    def test_evicts_by_tokens(self):
+        cache = PrefixCache(max_tokens=5)
+        cache.put("a", [1, 2, 3], "a")
+        cache.put("b", [4, 5, 6], "b")
+
+        metrics = cache.metrics()
+        self.assertEqual(metrics["entries"], 1)
+        self.assertEqual(metrics["cached_tokens"], 3)
+
+    def test_skips_sequences_over_token_limit(self):
+        cache = PrefixCache(max_tokens=2)
+        cache.put("a", [1, 2, 3], "a")
+
+        self.assertEqual(cache.metrics()["entries"], 0)
+
+    def test_clear(self):
+        cache = PrefixCache()
+        cache.put("a", [1, 2], "a")
+        cache.clear()
+
+        self.assertEqual(cache.metrics()["entries"], 0)
+        self.assertEqual(cache.metrics()["cached_tokens"], 0)
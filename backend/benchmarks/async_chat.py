@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.async_chat
+    ~~~~~~~
+
+    This module load-tests the asyncio serving mode in process. Hundreds of
+    interviews send their chat turns at once through the ASGI app, against a
+    mock LLM with a fixed latency and an in-memory chat store, so no OpenAI key
+    or database is needed. The same turns are then run by run_chat_turn() on a
+    thread pool the size of a threaded WSGI worker, for comparison.
+
+    Usage:
+        python -m benchmarks.async_chat [conversations] [turns] [latency_ms] [threads]
+"""
+
+
+import asyncio
+import json
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, Iterator
+from unittest import mock
+
+from src import asgi, chat, database_operations
+from src.llm_classes.chatlog import ChatLog
+from src.llm_classes.llm_level import LLM
+
+# Simulated duration of each of the two short queries of a chat turn
+DB_LATENCY = 0.002
+
+
+class MockLLM(LLM):
+    """An LLM that answers after a fixed latency, sleeping a thread in run() and the event
+    loop in arun()."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    @staticmethod
+    def reply(messages: list) -> str:
+        if messages[-1] == ChatLog.END_QUERY:
+            return "I am waiting for a response -- No."
+        return "Thank you. What else would you like to tell us?"
+
+    def run(self, messages, seed=0, with_moderation=True) -> str:
+        time.sleep(self.latency)
+        return self.reply(messages)
+
+    async def arun(self, messages, seed=0, with_moderation=True) -> str:
+        await asyncio.sleep(self.latency)
+        return self.reply(messages)
+
+    async def amoderate(self, text: str) -> str:
+        return text
+
+
+class ChatStore:
+    """The chats of the load test, replacing the chat queries of database_operations."""
+
+    def __init__(self, conversations: int):
+        opening = [
+            {"role": "system", "content": "Survey answers and planned questions."},
+            {"role": "assistant", "content": "1. What did you like?"},
+            {"role": "system", "content": ChatLog.SYSPROMPT2},
+            {"role": "assistant", "content": "What did you like about the product?"},
+        ]
+        self.messages = {
+            response_id: list(opening) for response_id in range(1, conversations + 1)
+        }
+
+    def fetch_chat_turn(self, connection, survey_id, response_id) -> Dict[str, Any]:
+        time.sleep(DB_LATENCY)
+        return {
+            "chat_context": "A survey about a product.",
+            "response_object": {"answers": [{"question": "Q", "answer": "A"}]},
+            "messages": list(self.messages[int(response_id)]),
+            "summary": None,
+        }
+
+    def append_chat_messages(
+        self, connection, survey_id, response_id, messages, start
+    ) -> None:
+        time.sleep(DB_LATENCY)
+        self.messages[int(response_id)][start:] = messages[start:]
+
+    @contextmanager
+    def patched(self, llm: LLM) -> Iterator[None]:
+        """Replaces the database and the shared LLM of the chat pipeline within a `with` block."""
+
+        @contextmanager
+        def get_connection():
+            yield object()
+
+        with ExitStack() as stack:
+            for target, name, value in (
+                (database_operations, "get_connection", get_connection),
+                (database_operations, "fetch_chat_turn", self.fetch_chat_turn),
+                (
+                    database_operations,
+                    "append_chat_messages",
+                    self.append_chat_messages,
+                ),
+                (chat, "get_llm", lambda model=None: llm),
+            ):
+                stack.enter_context(mock.patch.object(target, name, value))
+            yield
+
+
+async def asgi_turn(response_id: int, content: str) -> float:
+    """Sends a chat message through the ASGI app.
+
+    Args:
+        response_id (int): Response ID
+        content (str): The user message.
+
+    Returns:
+        float: Time to the complete reply, in seconds.
+    """
+    body = json.dumps({"content": content}).encode("utf-8")
+    sent = []
+
+    async def receive() -> Dict[str, Any]:
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message: Dict[str, Any]) -> None:
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": f"/api/v1/surveys/1/responses/{response_id}/chat",
+        "query_string": b"",
+        "headers": [(b"content-type", b"application/json")],
+    }
+    start = time.perf_counter()
+    await asgi.app(scope, receive, send)
+    if sent[0]["status"] != 201:
+        raise RuntimeError(sent[-1]["body"].decode("utf-8"))
+    return time.perf_counter() - start
+
+
+def sync_turn(response_id: int, content: str) -> float:
+    """Runs a chat turn with run_chat_turn(), as a Flask worker thread would.
+
+    Args:
+        response_id (int): Response ID
+        content (str): The user message.
+
+    Returns:
+        float: Time to the complete reply, in seconds.
+    """
+    start = time.perf_counter()
+    chat.run_chat_turn(1, response_id, content)
+    return time.perf_counter() - start
+
+
+def summarise(latencies: list[float], wall: float, peak_threads: int) -> dict:
+    """Returns the throughput and latency percentiles of a run."""
+    latencies = sorted(latencies)
+    return {
+        "wall_s": round(wall, 2),
+        "turns_per_s": round(len(latencies) / wall, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+        "peak_threads": peak_threads,
+    }
+
+
+class ThreadCounter:
+    """Samples the number of live threads of the process in the background."""
+
+    def __init__(self):
+        self.peak = threading.active_count()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def _loop(self) -> None:
+        while not self._stop.wait(0.01):
+            self.peak = max(self.peak, threading.active_count())
+
+    def __enter__(self) -> "ThreadCounter":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+async def run_async(conversations: int, turns: int) -> dict:
+    async def conversation(response_id: int) -> list[float]:
+        return [await asgi_turn(response_id, f"Answer {turn}") for turn in range(turns)]
+
+    # Worker threads of the event loop, as set up by the lifespan of the ASGI app
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(asgi.ASGI_THREADS, thread_name_prefix="asgi")
+    )
+    with ThreadCounter() as threads:
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(conversation(response_id) for response_id in range(1, conversations + 1))
+        )
+        wall = time.perf_counter() - start
+    return summarise(sum(results, []), wall, threads.peak)
+
+
+def run_threads(conversations: int, turns: int, threads: int) -> dict:
+    def conversation(response_id: int) -> list[float]:
+        return [sync_turn(response_id, f"Answer {turn}") for turn in range(turns)]
+
+    with ThreadCounter() as counter, ThreadPoolExecutor(threads) as executor:
+        start = time.perf_counter()
+        results = list(executor.map(conversation, range(1, conversations + 1)))
+        wall = time.perf_counter() - start
+    return summarise(sum(results, []), wall, counter.peak)
+
+
+def run(
+    conversations: int = 500,
+    turns: int = 3,
+    latency_ms: int = 500,
+    threads: int = 64,
+) -> dict[str, dict]:
+    """Holds the same interviews through the ASGI app and on a thread pool.
+
+    Args:
+        conversations (int, optional): Concurrent interviews. Defaults to 500.
+        turns (int, optional): Chat turns per interview. Defaults to 3.
+        latency_ms (int, optional): Latency of every mock LLM call. Defaults to 500.
+        threads (int, optional): Threads of the thread pool run. Defaults to 64.
+
+    Returns:
+        dict[str, dict]: Wall time, throughput, latency percentiles and peak threads per run.
+    """
+    llm = MockLLM(latency_ms / 1000)
+    results = {}
+    with ChatStore(conversations).patched(llm):
+        results["asgi"] = asyncio.run(run_async(conversations, turns))
+    with ChatStore(conversations).patched(llm):
+        results[f"threads_{threads}"] = run_threads(conversations, turns, threads)
+    return results
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:5]]
+    for mode, result in run(*args).items():
+        print(
+            f"{mode}: " + ", ".join(f"{key}={value}" for key, value in result.items())
+        )
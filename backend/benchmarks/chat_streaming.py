@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.chat_streaming
+    ~~~~~~~
+
+    This module benchmarks the latency of chat replies against a running backend
+    server, comparing the time to first token of streamed replies with the time
+    to a complete buffered reply. The time the server spends generating the reply
+    and checking whether the interview is over is read from the Server-Timing
+    header, so that runs with different EXIT_CHECK_MODE settings can be compared.
+
+    Usage:
+        python -m benchmarks.chat_streaming [turns]
+"""
+
+
+import json
+import os
+import statistics
+import sys
+import time
+
+import requests
+from benchmarks.concurrent_submissions import create_survey, submit
+
+BACKEND_URL = os.getenv(
+    "BENCHMARK_BACKEND_URL",
+    "http://backend:" + os.getenv("BACKEND_CONTAINER_PORT", "5000"),
+)
+
+USER_MESSAGES = [
+    "I found you through an online advert.",
+    "The checkout page was confusing.",
+    "It took three attempts to enter my address.",
+    "No, that is all.",
+]
+
+
+def chat_url(base_url: str, survey_id: int, response_id: int) -> str:
+    """Returns the URL of the chat endpoint of a response."""
+    return f"{base_url}/api/v1/surveys/{survey_id}/responses/{response_id}/chat"
+
+
+def streamed_turn(url: str, content: str) -> tuple[float, float]:
+    """Sends a chat message and reads the streamed reply.
+
+    Args:
+        url (str): URL of the chat endpoint.
+        content (str): The user message.
+
+    Returns:
+        tuple[float, float]: Time to first token and time to the final event, in seconds.
+    """
+    start = time.perf_counter()
+    first_token = None
+    with requests.post(
+        url, params={"stream": "true"}, json={"content": content}, stream=True
+    ) as response:
+        response.raise_for_status()
+        event = None
+        for line in response.iter_lines(decode_unicode=True):
+            if line.startswith("event: "):
+                event = line[len("event: ") :]
+            elif line.startswith("data: "):
+                if event == "token" and first_token is None:
+                    first_token = time.perf_counter() - start
+                elif event == "error":
+                    raise RuntimeError(json.loads(line[len("data: ") :])["message"])
+    total = time.perf_counter() - start
+    return (first_token if first_token is not None else total), total
+
+
+def parse_server_timing(header: str) -> dict[str, float]:
+    """Parses a Server-Timing header into milliseconds per stage.
+
+    Args:
+        header (str): The header value, e.g. "load;dur=2.1, reply;dur=4180.3".
+
+    Returns:
+        dict[str, float]: Milliseconds per stage.
+    """
+    timings = {}
+    for metric in filter(None, (part.strip() for part in header.split(","))):
+        name, _, duration = metric.partition(";dur=")
+        timings[name] = float(duration or 0)
+    return timings
+
+
+def buffered_turn(url: str, content: str) -> tuple[float, dict[str, float]]:
+    """Sends a chat message and waits for the complete reply.
+
+    Args:
+        url (str): URL of the chat endpoint.
+        content (str): The user message.
+
+    Returns:
+        tuple[float, dict[str, float]]: Time to the complete reply in seconds, and the
+            server-side milliseconds per stage.
+    """
+    start = time.perf_counter()
+    response = requests.post(url, json={"content": content})
+    response.raise_for_status()
+    latency = time.perf_counter() - start
+    return latency, parse_server_timing(response.headers.get("Server-Timing", ""))
+
+
+def run(base_url: str = BACKEND_URL, turns: int = 3) -> dict[str, object]:
+    """Holds one streamed and one buffered interview of the same length.
+
+    Args:
+        base_url (str, optional): URL of the backend server. Defaults to BACKEND_URL.
+        turns (int, optional): Chat turns per interview, including the first question. Defaults to 3.
+
+    Returns:
+        dict[str, object]: Time to first token and time to the complete reply percentiles.
+    """
+    survey_id = create_survey(base_url)
+    messages = [""] + USER_MESSAGES[: turns - 1]
+
+    first_tokens, streamed = [], []
+    _, response_id, _ = submit(base_url, survey_id)
+    for content in messages:
+        first_token, total = streamed_turn(
+            chat_url(base_url, survey_id, response_id), content
+        )
+        first_tokens.append(first_token)
+        streamed.append(total)
+
+    _, response_id, _ = submit(base_url, survey_id)
+    buffered, server_timings = zip(
+        *(
+            buffered_turn(chat_url(base_url, survey_id, response_id), content)
+            for content in messages
+        )
+    )
+
+    return {
+        "survey_id": survey_id,
+        "turns": len(messages),
+        "stream_ttft_p50_ms": statistics.median(first_tokens) * 1000,
+        "stream_ttft_max_ms": max(first_tokens) * 1000,
+        "stream_total_p50_ms": statistics.median(streamed) * 1000,
+        "buffered_total_p50_ms": statistics.median(buffered) * 1000,
+        "server_reply_p50_ms": statistics.median(
+            timings.get("reply", 0) for timings in server_timings
+        ),
+        "server_exit_check_p50_ms": statistics.median(
+            timings.get("exit_check", 0) for timings in server_timings
+        ),
+    }
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:2]]
+    result = run(BACKEND_URL, *args)
+    for key, value in result.items():
+        print(f"{key}: {value}")
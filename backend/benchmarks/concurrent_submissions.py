@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.concurrent_submissions
+    ~~~~~~~
+
+    This module benchmarks concurrent survey response submissions against a running
+    backend server, and checks that no two submissions receive the same response ID.
+
+    Usage:
+        python -m benchmarks.concurrent_submissions [submitters] [submissions_per_submitter]
+"""
+
+
+import os
+import statistics
+import sys
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+BACKEND_URL = os.getenv(
+    "BENCHMARK_BACKEND_URL",
+    "http://backend:" + os.getenv("BACKEND_CONTAINER_PORT", "5000"),
+)
+
+QUESTIONS = [
+    {
+        "question_id": 1,
+        "type": "multiple_choice",
+        "question": "How did you hear about us?",
+        "options": ["Friends", "Online", "Other"],
+    },
+    {
+        "question_id": 2,
+        "type": "free_response",
+        "question": "What could we improve?",
+        "options": [],
+    },
+]
+
+
+def create_survey(base_url: str) -> int:
+    """Creates a throwaway admin and survey to submit responses to.
+
+    Args:
+        base_url (str): URL of the backend server.
+
+    Returns:
+        int: The ID of the created survey.
+    """
+    username = f"bench-{uuid.uuid4().hex[:12]}"
+    credentials = {"username": username, "password": "benchmark"}
+    requests.post(base_url + "/api/v1/admins", json=credentials).raise_for_status()
+    token = requests.post(base_url + "/api/v1/admins/login", json=credentials).json()[
+        "jwt"
+    ]
+
+    survey = {
+        "metadata": {"created_by": username, "created_at": "2024-01-01 00:00:00"},
+        "title": "Benchmark survey",
+        "subtitle": "Concurrent submissions",
+        "questions": QUESTIONS,
+        "chat_context": "A survey used to benchmark concurrent submissions.",
+    }
+    response = requests.post(
+        base_url + "/api/v1/surveys",
+        json=survey,
+        headers={"Authorization": "Bearer " + token},
+    )
+    response.raise_for_status()
+    return response.json()["survey_id"]
+
+
+def submit(base_url: str, survey_id: int) -> tuple[int, int, float]:
+    """Submits one response.
+
+    Args:
+        base_url (str): URL of the backend server.
+        survey_id (int): The ID of the survey.
+
+    Returns:
+        tuple[int, int, float]: Status code, response ID (or -1) and latency in seconds.
+    """
+    answers = [
+        {**QUESTIONS[0], "answer": ["Online"]},
+        {**QUESTIONS[1], "answer": ["Nothing"]},
+    ]
+    body = {"metadata": {"survey_id": survey_id}, "answers": answers}
+    start = time.perf_counter()
+    response = requests.post(
+        f"{base_url}/api/v1/surveys/{survey_id}/responses", json=body
+    )
+    latency = time.perf_counter() - start
+    response_id = response.json().get("response_id", -1) if response.ok else -1
+    return response.status_code, response_id, latency
+
+
+def run(
+    base_url: str = BACKEND_URL,
+    submitters: int = 32,
+    submissions_per_submitter: int = 10,
+) -> dict[str, object]:
+    """Submits responses from many parallel submitters to one survey.
+
+    Args:
+        base_url (str, optional): URL of the backend server. Defaults to BACKEND_URL.
+        submitters (int, optional): Number of parallel submitters. Defaults to 32.
+        submissions_per_submitter (int, optional): Submissions per submitter. Defaults to 10.
+
+    Returns:
+        dict[str, object]: Submission counts, collisions, errors, throughput and latency percentiles.
+    """
+    survey_id = create_survey(base_url)
+    total = submitters * submissions_per_submitter
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=submitters) as executor:
+        results = list(
+            executor.map(lambda _: submit(base_url, survey_id), range(total))
+        )
+    elapsed = time.perf_counter() - start
+
+    response_ids = [response_id for status, response_id, _ in results if status == 201]
+    latencies = sorted(latency for _, _, latency in results)
+    return {
+        "survey_id": survey_id,
+        "submissions": total,
+        "succeeded": len(response_ids),
+        "errors": total - len(response_ids),
+        "collisions": len(response_ids) - len(set(response_ids)),
+        "contiguous": sorted(response_ids) == list(range(1, len(response_ids) + 1)),
+        "throughput_per_s": total / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(0.99 * (len(latencies) - 1))] * 1000,
+    }
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:3]]
+    result = run(BACKEND_URL, *args)
+    for key, value in result.items():
+        print(f"{key}: {value}")
+    sys.exit(1 if result["collisions"] or result["errors"] else 0)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.context_window
+    ~~~~~~~
+
+    This module estimates the prompt tokens of every turn of an interview of
+    ChatLog.MAX_LEN messages, with and without the rolling context window. It
+    replays a synthetic interview offline, with summaries of SUMMARY_MAX_CHARS
+    characters, so no LLM or database is needed.
+
+    Usage:
+        python -m benchmarks.context_window [message_chars]
+"""
+
+
+import sys
+
+from src.llm_classes.chatlog import ChatLog
+from src.llm_classes.context_window import (
+    SUMMARY_MAX_CHARS,
+    estimate_tokens,
+    fold_point,
+    window_messages,
+)
+
+
+def interview(message_chars: int) -> list[dict[str, str]]:
+    """Returns an interview of ChatLog.MAX_LEN messages.
+
+    Args:
+        message_chars (int): Characters per message after the header.
+
+    Returns:
+        list[dict[str, str]]: The messages.
+    """
+    messages = [
+        {"role": "system", "content": ChatLog.SYSPROMPT + "x" * 1500},
+        {"role": "assistant", "content": "x" * 800},
+        {"role": "system", "content": ChatLog.SYSPROMPT2},
+    ]
+    while len(messages) < ChatLog.MAX_LEN:
+        role = "assistant" if len(messages) % 2 else "user"
+        messages.append({"role": role, "content": "x" * message_chars})
+    return messages
+
+
+def run(message_chars: int = 400) -> dict[str, int]:
+    """Replays the interview turn by turn, folding old turns as the chat turns would.
+
+    Args:
+        message_chars (int, optional): Characters per message after the header. Defaults to 400.
+
+    Returns:
+        dict[str, int]: Estimated prompt tokens of the last turn and of the whole interview,
+            with and without the context window, and the number of summary updates.
+    """
+    messages = interview(message_chars)
+    summary = None
+    full, windowed, folds = [], [], 0
+    # Every user message starts a turn
+    for end in range(5, len(messages) + 1, 2):
+        prompt = messages[:end]
+        full.append(estimate_tokens(prompt))
+        windowed.append(estimate_tokens(window_messages(prompt, summary)))
+        covered = fold_point(prompt, summary)
+        if covered:
+            summary = {"content": "x" * SUMMARY_MAX_CHARS, "covered": covered}
+            folds += 1
+    return {
+        "turns": len(full),
+        "last_turn_full_tokens": full[-1],
+        "last_turn_window_tokens": windowed[-1],
+        "interview_full_tokens": sum(full),
+        "interview_window_tokens": sum(windowed),
+        "summary_updates": folds,
+    }
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:2]]
+    for key, value in run(*args).items():
+        print(f"{key}: {value}")
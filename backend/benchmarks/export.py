@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.export
+    ~~~~~~~
+
+    This module measures the peak memory of exporting every response to a
+    survey, for surveys of growing size. The streamed NDJSON export is compared
+    with building every response object and one JSON body, as GET .../responses
+    did before it was paginated. Rows are generated by mock connections, with an
+    unbuffered cursor yielding them one at a time and a buffered cursor
+    returning them all at once, so no database is needed.
+
+    Usage:
+        python -m benchmarks.export [questions] [sizes...]
+"""
+
+
+import json
+import sys
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterator
+from unittest.mock import MagicMock
+
+from src import database_operations, export
+
+
+def answer_rows(responses: int, questions: int) -> Iterator[Dict[str, Any]]:
+    """Generates the answer rows of a survey, ordered by response ID."""
+    for response_id in range(1, responses + 1):
+        for question_id in range(1, questions + 1):
+            yield {
+                "response_id": response_id,
+                "submitted_at": datetime(2024, 1, 1),
+                "question_id": question_id,
+                "question_type": "free_response",
+                "question": f"What did you think of part {question_id}?",
+                "options": None,
+                "answer": json.dumps([f"Answer {response_id}.{question_id} " * 4]),
+            }
+
+
+def message_rows(responses: int) -> Iterator[Dict[str, Any]]:
+    """Generates the chat messages of a survey, ordered by response ID."""
+    for response_id in range(1, responses + 1):
+        for seq in range(6):
+            yield {
+                "response_id": response_id,
+                "role": "assistant" if seq % 2 else "user",
+                "content": f"Message {seq} of chat {response_id} " * 8,
+            }
+
+
+def connection(rows: Callable[[], Iterator[Dict[str, Any]]]) -> MagicMock:
+    """Returns a mock connection whose cursors yield the given rows."""
+    mock = MagicMock()
+    cursor = mock.cursor.return_value.__enter__.return_value
+    cursor.__iter__.side_effect = rows
+    cursor.fetchall.side_effect = lambda: list(rows())
+    return mock
+
+
+def streamed(responses: int, questions: int) -> int:
+    """Exports the survey as NDJSON, discarding each line once sent."""
+    sent = 0
+    lines = export.ndjson_lines(
+        database_operations.stream_responses(
+            connection(lambda: answer_rows(responses, questions)),
+            connection(lambda: message_rows(responses)),
+            1,
+        )
+    )
+    for line in lines:
+        sent += len(line.encode("utf-8"))
+    return sent
+
+
+def buffered(responses: int, questions: int) -> int:
+    """Builds every response object, then one JSON body."""
+    rows = connection(lambda: answer_rows(responses, questions))
+    response_objects = {}
+    for row in database_operations.fetch(rows, "SELECT ..."):
+        if row["response_id"] not in response_objects:
+            response_objects[row["response_id"]] = (
+                database_operations.create_response_object(1, row["response_id"], row)
+            )
+        database_operations.append_answer_to_response(
+            response_objects, row["response_id"], row
+        )
+    chat_logs = {}
+    for row in database_operations.fetch(
+        connection(lambda: message_rows(responses)), "SELECT ..."
+    ):
+        chat_logs.setdefault(row["response_id"], []).append(
+            {"role": row["role"], "content": row["content"]}
+        )
+    database_operations.attach_chat_logs(response_objects, chat_logs)
+    return len(json.dumps(list(response_objects.values())).encode("utf-8"))
+
+
+def peak_mb(function: Callable[[int, int], int], *args) -> float:
+    """Returns the peak memory allocated while running a function, in MB."""
+    tracemalloc.start()
+    try:
+        function(*args)
+        return round(tracemalloc.get_traced_memory()[1] / 2**20, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def run(questions: int = 10, sizes: tuple = (1000, 5000, 20000)) -> dict:
+    """Measures the peak memory of both exports for surveys of each size.
+
+    Args:
+        questions (int, optional): Questions per survey. Defaults to 10.
+        sizes (tuple, optional): Responses per survey. Defaults to (1000, 5000, 20000).
+
+    Returns:
+        dict: Peak memory in MB of each export, per survey size.
+    """
+    return {
+        size: {
+            "streamed_mb": peak_mb(streamed, size, questions),
+            "buffered_mb": peak_mb(buffered, size, questions),
+        }
+        for size in sizes
+    }
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    results = run(*args[:1], *([tuple(args[1:])] if len(args) > 1 else []))
+    for size, result in results.items():
+        print(
+            f"{size} responses: "
+            + ", ".join(f"{key}={value}" for key, value in result.items())
+        )
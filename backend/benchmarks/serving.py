@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.serving
+    ~~~~~~~
+
+    This module compares the chat throughput of the Flask development server
+    with the production server (gunicorn with gunicorn.conf.py). Each server is
+    started on a local port with a mock LLM of fixed latency and an in-memory
+    chat store, so no OpenAI key or database is needed, and chat turns are sent
+    by many concurrent clients.
+
+    Usage:
+        python -m benchmarks.serving [clients] [turns_per_client] [latency_ms]
+"""
+
+
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, Iterator
+
+import requests
+from benchmarks.async_chat import DB_LATENCY, ChatStore, MockLLM
+from flask import Flask
+from src.app import app
+
+# Latency of every mock LLM call in the server processes
+LATENCY_MS = int(os.environ.get("BENCHMARK_LLM_LATENCY_MS", "500"))
+PORT = 5099
+
+_patches = ExitStack()
+
+
+class OpeningStore(ChatStore):
+    """A chat store whose interviews stay at the opening question, so that the workers of
+    a server need not share it."""
+
+    def fetch_chat_turn(self, connection, survey_id, response_id) -> Dict[str, Any]:
+        return super().fetch_chat_turn(connection, survey_id, 1)
+
+    def append_chat_messages(
+        self, connection, survey_id, response_id, messages, start
+    ) -> None:
+        time.sleep(DB_LATENCY)
+
+
+def mock_app() -> Flask:
+    """Returns the Flask app with a mock LLM and an in-memory chat store.
+
+    Returns:
+        Flask: The app, e.g. for `gunicorn "benchmarks.serving:mock_app()"`.
+    """
+    _patches.enter_context(OpeningStore(1).patched(MockLLM(LATENCY_MS / 1000)))
+    return app
+
+
+SERVERS = {
+    "dev_server": [
+        sys.executable,
+        "-c",
+        f"from benchmarks.serving import mock_app; mock_app().run(port={PORT})",
+    ],
+    "gunicorn": [
+        sys.executable,
+        "-m",
+        "gunicorn",
+        "--bind",
+        f"127.0.0.1:{PORT}",
+        "benchmarks.serving:mock_app()",
+    ],
+}
+
+
+@contextmanager
+def server(command: list[str]) -> Iterator[str]:
+    """Runs a server until the end of a `with` block.
+
+    Args:
+        command (list[str]): The command that starts the server.
+
+    Yields:
+        str: URL of the server, once it is healthy.
+    """
+    url = f"http://127.0.0.1:{PORT}"
+    process = subprocess.Popen(
+        command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        for _ in range(100):
+            try:
+                requests.get(url + "/api/v1/health", timeout=1)
+                break
+            except requests.ConnectionError:
+                time.sleep(0.2)
+        yield url
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def load(url: str, clients: int, turns: int) -> dict[str, float]:
+    """Sends chat turns from concurrent clients.
+
+    Args:
+        url (str): URL of the server.
+        clients (int): Concurrent clients, each holding one interview.
+        turns (int): Chat turns per client.
+
+    Returns:
+        dict[str, float]: Throughput, latency percentiles and failed turns.
+    """
+
+    def client(response_id: int) -> list[float]:
+        session = requests.Session()
+        chat_url = f"{url}/api/v1/surveys/1/responses/{response_id}/chat"
+        latencies = []
+        for turn in range(turns):
+            start = time.perf_counter()
+            response = session.post(chat_url, json={"content": f"Answer {turn}"})
+            if response.status_code == 201:
+                latencies.append(time.perf_counter() - start)
+        return latencies
+
+    with ThreadPoolExecutor(clients) as executor:
+        start = time.perf_counter()
+        results = list(executor.map(client, range(1, clients + 1)))
+        wall = time.perf_counter() - start
+    latencies = sorted(sum(results, []))
+    return {
+        "turns_per_s": round(len(latencies) / wall, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+        "failed": clients * turns - len(latencies),
+    }
+
+
+def run(clients: int = 100, turns: int = 5) -> dict[str, dict]:
+    """Sends the same load to the development server and to the production server.
+
+    Args:
+        clients (int, optional): Concurrent clients. Defaults to 100.
+        turns (int, optional): Chat turns per client. Defaults to 5.
+
+    Returns:
+        dict[str, dict]: Throughput and latency per server.
+    """
+    results = {}
+    for name, command in SERVERS.items():
+        with server(command) as url:
+            results[name] = load(url, clients, turns)
+    return results
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 3:
+        os.environ["BENCHMARK_LLM_LATENCY_MS"] = sys.argv[3]
+    args = [int(arg) for arg in sys.argv[1:3]]
+    for name, result in run(*args).items():
+        print(
+            f"{name}: " + ", ".join(f"{key}={value}" for key, value in result.items())
+        )
@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+    benchmarks.validation
+    ~~~~~~~
+
+    This module measures the time to validate one response to a survey against
+    its questions, as submit_response does. The ResponseValidator cached with
+    the survey is compared with compiling it for every response, and with the
+    search of every question for every answer that validate_response did
+    before. No database is needed.
+
+    Usage:
+        python -m benchmarks.validation [questions] [options] [repeats]
+"""
+
+
+import sys
+import timeit
+from typing import Any, Dict, Optional, Tuple
+
+from src import database_operations
+
+
+def survey_and_response(
+    questions: int, options: int
+) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """Returns a survey alternating multiple choice and free response questions, and a
+    valid response to it with the answers in reverse order."""
+    survey_questions = [
+        {
+            "question_id": question_id,
+            "type": "multiple_choice" if question_id % 2 else "free_response",
+            "question": f"What did you think of part {question_id}?",
+            "options": (
+                [f"Option {n} of part {question_id}" for n in range(options)]
+                if question_id % 2
+                else []
+            ),
+        }
+        for question_id in range(1, questions + 1)
+    ]
+    answers = [
+        {
+            **question,
+            "options": list(reversed(question["options"])),
+            "answer": question["options"][:1] or ["Fine"],
+        }
+        for question in reversed(survey_questions)
+    ]
+    return (
+        {"metadata": {"survey_id": 1}, "questions": survey_questions},
+        {"metadata": {"survey_id": 1}, "answers": answers},
+    )
+
+
+def linear_search(
+    response_data: Dict[str, Any], survey_object: Dict[str, Any]
+) -> Optional[str]:
+    """validate_response as it was, searching the survey for every answer."""
+    response_questions = response_data.get("answers", [])
+    survey_questions = survey_object.get("questions", [])
+    if len(response_questions) != len(survey_questions):
+        return "Number of questions in response does not match survey"
+    for response_question in response_questions:
+        matching_survey_question = next(
+            (
+                question
+                for question in survey_questions
+                if question["question_id"] == response_question["question_id"]
+            ),
+            None,
+        )
+        if not matching_survey_question:
+            return "not found"
+        if response_question["type"] != matching_survey_question["type"]:
+            return "type mismatch"
+        if response_question["question"] != matching_survey_question["question"]:
+            return "text mismatch"
+        if response_question["type"] == "multiple_choice":
+            if len(response_question.get("options", [])) != len(
+                matching_survey_question.get("options", [])
+            ):
+                return "options mismatch"
+            for option in response_question.get("options", []):
+                if option not in matching_survey_question.get("options", []):
+                    return "option not found"
+    return None
+
+
+def run(questions: int = 200, options: int = 5, repeats: int = 200) -> dict:
+    """Measures the time to validate a response with each approach.
+
+    Args:
+        questions (int, optional): Questions per survey. Defaults to 200.
+        options (int, optional): Options per multiple choice question. Defaults to 5.
+        repeats (int, optional): Validations timed per approach. Defaults to 200.
+
+    Returns:
+        dict: Microseconds per validation of each approach.
+    """
+    survey_object, response_data = survey_and_response(questions, options)
+    validator = database_operations.ResponseValidator(survey_object)
+    approaches = {
+        "linear_search": lambda: linear_search(response_data, survey_object),
+        "compiled_per_response": lambda: database_operations.validate_response(
+            response_data, survey_object
+        ),
+        "cached_validator": lambda: validator.validate(response_data),
+    }
+    results = {}
+    for name, validate in approaches.items():
+        assert validate() is None
+        seconds = min(timeit.repeat(validate, number=repeats, repeat=5))
+        results[name] = round(seconds / repeats * 1e6, 1)
+    return results
+
+
+if __name__ == "__main__":
+    args = [int(arg) for arg in sys.argv[1:]]
+    for name, microseconds in run(*args).items():
+        print(f"{name}: {microseconds} us per response")
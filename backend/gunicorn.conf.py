@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+    gunicorn.conf
+    ~~~~~~~
+
+    Settings of the production server, see src.serving.
+
+    Usage:
+        pipenv run gunicorn src.app:app
+"""
+
+
+import os
+
+from prometheus_client import multiprocess
+from src import chat, migrations, serving
+
+bind = "0.0.0.0:" + os.getenv("BACKEND_CONTAINER_PORT", "5000")
+
+# Threads suit chat turns, which mostly wait for the LLM and the database
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = serving.worker_count()
+threads = serving.thread_count(workers)
+
+# Import the app once, and share its memory between the workers
+preload_app = True
+
+# LLM calls take seconds, but a stuck worker is restarted
+timeout = serving.request_timeout()
+# Workers being replaced finish the chat turns in flight
+graceful_timeout = timeout
+max_requests = serving.GUNICORN_MAX_REQUESTS
+max_requests_jitter = max(serving.GUNICORN_MAX_REQUESTS // 10, 1)
+keepalive = 5
+
+# The heartbeat files of the workers, in memory rather than on the container disk
+if os.path.isdir("/dev/shm"):
+    worker_tmp_dir = "/dev/shm"
+
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    # Once, in the master process, before the workers serve requests
+    migrations.migrate_on_startup()
+
+
+def post_fork(server, worker):
+    serving.reset_process_state()
+    # Every request thread may run an exit check in parallel with its reply
+    chat.set_default_workers(threads)
+
+
+def child_exit(server, worker):
+    # The gauges of a worker that has exited no longer count, see src.metrics
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
@@ -7,10 +7,9 @@ import sys
 import time
 
 import requests
-from openai import OpenAI
 from src.llm_classes.chatlog import ChatLog
 from src.llm_classes.functions import construct_chatlog
-from src.llm_classes.llm_level import GPT
+from src.llm_classes.llm_level import get_llm, get_openai_client
 
 
 class Evaluation:
@@ -25,13 +24,13 @@ class Evaluation:
 
         with open("./model_evaluation/response_data/fake_conversation.json", "rb") as f:
             conv = json.load(f)
-        self.llm = GPT()
+        self.llm = get_llm()
         self.survey = conv["survey"]
         self.ini_msg_ls = construct_chatlog(self.survey, llm=self.llm).message_list
 
         ### Evaluation cases####
         ####### Content Moderation #######
-        self.client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.client = get_openai_client()
         # literally the only one available. huggingface one gets rate limited easily
         self.bias = conv["bias_strong"]
         self.jailbreak = conv["jailbreak_strong"]
@@ -8,21 +8,21 @@
 
 
 import datetime
-import json
+import hmac
 import logging
 import os
+import time
+from contextlib import ExitStack
 from functools import wraps
+from typing import Optional
+from urllib.parse import urlencode
 
 import jwt
-from flask import Flask, Response, jsonify, request
-from src import database_operations
-from src.llm_classes.chatlog import ChatLog
-from src.llm_classes.functions import (
-    check_exit,
-    construct_chatlog,
-    format_responses_for_gpt,
-)
-from src.llm_classes.llm_level import GPT
+from flask import Flask, Response, g, jsonify, request, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+from prometheus_client import CONTENT_TYPE_LATEST, Histogram
+from src import chat, database_operations, export, metrics, survey_cache
+from src.llm_classes import usage
 from werkzeug.security import check_password_hash, generate_password_hash
 
 BACKEND_CONTAINER_PORT = os.getenv("BACKEND_CONTAINER_PORT", "5000")
@@ -33,11 +33,113 @@ logging.basicConfig(
     format="%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]",
 )
 
+# Number of items per page of the list routes, by default and at most
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+
+# Bearer token required to read the metrics. The metrics cannot be read without one.
+METRICS_TOKEN = os.environ.get("METRICS_TOKEN", "")
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_seconds",
+    "Duration of HTTP requests, until the response body is sent.",
+    ["method", "route", "status"],
+    buckets=metrics.DEFAULT_BUCKETS,
+)
+HTTP_REQUEST_STAGE_SECONDS = Histogram(
+    "http_request_stage_seconds",
+    "Time spent per request in the database and in LLM calls.",
+    ["route", "stage"],
+    buckets=metrics.DEFAULT_BUCKETS,
+)
+JSON_SERIALISE_SECONDS = Histogram(
+    "json_serialise_seconds",
+    "Duration of JSON serialisation of responses.",
+    buckets=metrics.DEFAULT_BUCKETS,
+)
+
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """The default JSON provider of Flask, timing the serialisation of responses."""
+
+    def dumps(self, obj, **kwargs) -> str:
+        with metrics.timed(JSON_SERIALISE_SECONDS):
+            return super().dumps(obj, **kwargs)
+
+
 app = Flask(__name__)
+app.json = TimedJSONProvider(app)
 app.config["SECRET_KEY"] = os.environ.get(
     "FLASK_SECRET_KEY", "default_key_for_development"
 )
 
+# Write the token and cost ledger of LLM calls to the database, or only to the log
+if os.environ.get("LLM_USAGE_SINK", "database").lower() == "database":
+    usage.configure(database_operations.save_llm_usage)
+
+# Metrics
+
+
+@app.before_request
+def start_request_metrics() -> None:
+    """Starts timing the request and adding up its database and LLM time."""
+    g.request_start = time.perf_counter()
+    g.request_stages = metrics.start_request()
+
+
+@app.after_request
+def record_request_metrics(response: Response) -> Response:
+    """Records the request metrics once the response body has been sent, so that
+    streamed responses are timed until their last event.
+
+    Args:
+        response (Response): The response.
+
+    Returns:
+        Response: The same response.
+    """
+    start, stages = g.get("request_start"), g.get("request_stages")
+    if start is None:
+        return response
+    method, status = request.method, str(response.status_code)
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+
+    def observe() -> None:
+        HTTP_REQUEST_SECONDS.labels(method=method, route=route, status=status).observe(
+            time.perf_counter() - start
+        )
+        for stage in ("db", "llm"):
+            HTTP_REQUEST_STAGE_SECONDS.labels(route=route, stage=stage).observe(
+                stages.get(stage, 0.0)
+            )
+
+    response.call_on_close(observe)
+    return response
+
+
+@app.route("/api/v1/metrics", methods=["GET"])
+def get_metrics() -> tuple[Response, int]:
+    """Metrics of the backend in the Prometheus text format, added up over the worker
+    processes of the server. METRICS_TOKEN must be sent as a bearer token.
+
+    Returns:
+        tuple[Response, int]: Tuple containing the response and status code
+    """
+    if not METRICS_TOKEN:
+        return (
+            jsonify({"message": "Metrics are disabled, METRICS_TOKEN is not set"}),
+            403,
+        )
+    if not hmac.compare_digest(
+        request.headers.get("Authorization", ""), "Bearer " + METRICS_TOKEN
+    ):
+        return jsonify({"message": "Token is invalid!"}), 401
+    return (
+        Response(metrics.render(), content_type=CONTENT_TYPE_LATEST),
+        200,
+    )
+
+
 # JWT
 
 
@@ -81,6 +183,46 @@ def admin_token_required(f: callable) -> callable:
     return decorated
 
 
+# Pagination of list routes
+
+
+def page_args() -> tuple[int, Optional[int]]:
+    """Parses the limit and after query parameters of a paginated route.
+    The limit is clamped to 1..MAX_PAGE_SIZE.
+
+    Raises:
+        ValueError: Raised when a parameter is not a non-negative integer.
+
+    Returns:
+        tuple[int, Optional[int]]: The page size, and the cursor after which the page starts, if any.
+    """
+    limit = int(request.args.get("limit", DEFAULT_PAGE_SIZE))
+    after = request.args.get("after")
+    after = int(after) if after is not None else None
+    if limit < 0 or (after is not None and after < 0):
+        raise ValueError("Pagination parameters must not be negative")
+    return max(1, min(limit, MAX_PAGE_SIZE)), after
+
+
+def page_response(items: list, next_cursor: Optional[int]) -> Response:
+    """Returns a page of a list route as a JSON array. If there is a next page, its cursor is
+    sent in the X-Next-Cursor header, and its URL in the Link header.
+
+    Args:
+        items (list): The items of the page.
+        next_cursor (int, optional): The cursor of the next page, or None on the last page.
+
+    Returns:
+        Response: The response.
+    """
+    response = jsonify(items)
+    if next_cursor is not None:
+        args = {**request.args.to_dict(), "after": next_cursor}
+        response.headers["X-Next-Cursor"] = str(next_cursor)
+        response.headers["Link"] = f'<{request.path}?{urlencode(args)}>; rel="next"'
+    return response
+
+
 # Health check route
 
 
@@ -112,14 +254,16 @@ def create_admin() -> tuple[Response, int]:
         return jsonify({"message": "Missing data"}), 400
 
     username = data["username"]
-    connection = database_operations.connect_to_mysql()
-    if connection:
+    with database_operations.get_connection() as connection:
+        if not connection:
+            app.logger.error("Failed to connect to the database")
+            return jsonify({"message": "Failed to connect to the database"}), 500
+
         query = "SELECT * FROM Admins WHERE admin_username = %s"
         existing_admins = database_operations.fetch(connection, query, (username,))
 
         # If admin exists
         if existing_admins:
-            database_operations.close_connection(connection)
             return jsonify({"message": "Admin already exists"}), 400
 
         # Hash password for storage
@@ -132,12 +276,8 @@ def create_admin() -> tuple[Response, int]:
         params = (username, hashed_password)
         database_operations.execute(connection, query, params)
 
-        database_operations.close_connection(connection)
         app.logger.info(f"Admin {username} created successfully")
         return jsonify({"message": f"Admin {username} created successfully"}), 201
-    else:
-        app.logger.error("Failed to connect to the database")
-        return jsonify({"message": "Failed to connect to the database"}), 500
 
 
 @app.route("/api/v1/admins/login", methods=["POST"])
@@ -155,48 +295,43 @@ def login_admin() -> tuple[Response, int]:
         return jsonify({"message": "Missing data"}), 400
 
     # Retrieve hashed password from database
-    # Connect to database
-    connection = database_operations.connect_to_mysql()
-    if connection:
+    # Borrow a database connection
+    with database_operations.get_connection() as connection:
+        if not connection:
+            app.logger.error("Failed to connect to the database")
+            return jsonify({"message": "Failed to connect to the database"}), 500
+
         # Retrieve admin_usernames
         query = "SELECT password FROM Admins WHERE admin_username = %s"
         result = database_operations.fetch(connection, query, (data["username"],))
-        if result:
-            hashed_password = result[0]["password"]
-            # Check if the provided password matches the hashed password
-            if check_password_hash(hashed_password, data["password"]):
-                # Generate the jwt_token
-                token_payload = {
-                    "exp": datetime.datetime.now(datetime.UTC)
-                    + datetime.timedelta(hours=24),
-                    "iat": datetime.datetime.now(datetime.UTC),
-                    "sub": data["username"],  # Admin's username
-                }
-                token = jwt.encode(
-                    token_payload, app.config["SECRET_KEY"], algorithm="HS256"
-                )  # Encoded with HMAC SHA-256 algorithm
-
-                # Close the connection
-                database_operations.close_connection(connection)
-                app.logger.info(f"Admin {data['username']} logged in successfully")
-                return (
-                    jsonify(
-                        {
-                            "jwt": token,
-                            "jwt_exp": token_payload["exp"].strftime(
-                                "%Y-%m-%d %H:%M:%S"
-                            ),
-                        }
-                    ),
-                    200,
-                )
-        # Close the connection
-        database_operations.close_connection(connection)
-        app.logger.info("Invalid credentials")
-        return jsonify({"message": "Invalid credentials"}), 401
-    else:
-        app.logger.error("Failed to connect to the database")
-        return jsonify({"message": "Failed to connect to the database"}), 500
+
+    if result:
+        hashed_password = result[0]["password"]
+        # Check if the provided password matches the hashed password
+        if check_password_hash(hashed_password, data["password"]):
+            # Generate the jwt_token
+            token_payload = {
+                "exp": datetime.datetime.now(datetime.UTC)
+                + datetime.timedelta(hours=24),
+                "iat": datetime.datetime.now(datetime.UTC),
+                "sub": data["username"],  # Admin's username
+            }
+            token = jwt.encode(
+                token_payload, app.config["SECRET_KEY"], algorithm="HS256"
+            )  # Encoded with HMAC SHA-256 algorithm
+
+            app.logger.info(f"Admin {data['username']} logged in successfully")
+            return (
+                jsonify(
+                    {
+                        "jwt": token,
+                        "jwt_exp": token_payload["exp"].strftime("%Y-%m-%d %H:%M:%S"),
+                    }
+                ),
+                200,
+            )
+    app.logger.info("Invalid credentials")
+    return jsonify({"message": "Invalid credentials"}), 401
 
 
 # Survey routes
@@ -225,99 +360,62 @@ def create_survey(**kwargs) -> tuple[Response, int]:
         app.logger.info(f"Invalid survey object format: {message}")
         return jsonify({"message": message}), 400
 
-    # Connect to the database
-    connection = database_operations.connect_to_mysql()
-    if not connection:
-        app.logger.error("Failed to connect to the database")
-        return jsonify({"message": "Error connecting to database"}), 500
+    # Borrow a connection from the pool
+    with database_operations.get_connection() as connection:
+        if not connection:
+            app.logger.error("Failed to connect to the database")
+            return jsonify({"message": "Error connecting to database"}), 500
 
-    try:
-        # Create the survey
-        survey_id = database_operations.create_survey(connection, data)
-
-        if survey_id:
-            app.logger.info(f"Survey {survey_id} created successfully")
-            return jsonify({"survey_id": survey_id}), 201
-        else:
-            app.logger.error("Error creating survey")
+        try:
+            # Create the survey
+            survey_id = database_operations.create_survey(connection, data)
+
+            if survey_id:
+                app.logger.info(f"Survey {survey_id} created successfully")
+                return jsonify({"survey_id": survey_id}), 201
+            else:
+                app.logger.error("Error creating survey")
+                return jsonify({"message": "Error creating survey"}), 400
+        except Exception as e:
+            app.logger.error(f"Error creating survey: {str(e)}")
             return jsonify({"message": "Error creating survey"}), 400
-    except Exception as e:
-        app.logger.error(f"Error creating survey: {str(e)}")
-        return jsonify({"message": "Error creating survey"}), 400
-    finally:
-        database_operations.close_connection(connection)
 
 
 @app.route("/api/v1/surveys", methods=["GET"])
 def get_surveys() -> tuple[Response, int]:
-    """Get all surveys
+    """Get a page of surveys, newest first
 
     Query Parameters:
         admin (str, optional): Admin username to filter surveys by
+        limit (int, optional): Number of surveys per page (default 100, at most 500)
+        after (int, optional): Cursor of the page, from the X-Next-Cursor header of the previous page
 
     Returns:
         tuple[Response, int]: Tuple containing the response and status code
     """
-    # Connect to the database
-    connection = database_operations.connect_to_mysql()
-    if not connection:
-        app.logger.error("Failed to connect to the database")
-        return jsonify({"message": "Failed to connect to database"}), 500
-
     try:
-        # Check for optional username argument
-        username = request.args.get("admin", None)
+        limit, after = page_args()
+    except ValueError:
+        return jsonify({"message": "Invalid pagination parameters"}), 400
 
-        if username:
-            query = """
-                    SELECT Surveys.*, Questions.* 
-                    FROM Surveys 
-                    LEFT JOIN Questions ON Surveys.survey_id = Questions.survey_id 
-                    WHERE Surveys.admin_username = %s 
-                    ORDER BY Surveys.survey_id DESC, Questions.question_id  
-            """
-            params = (username,)
-        else:
-            query = """
-            SELECT Surveys.*, Questions.* 
-            FROM Surveys 
-            LEFT JOIN Questions ON Surveys.survey_id = Questions.survey_id 
-            ORDER BY Surveys.survey_id DESC, Questions.question_id
-            """
-            params = None
+    # Borrow a connection from the pool
+    with database_operations.get_connection() as connection:
+        if not connection:
+            app.logger.error("Failed to connect to the database")
+            return jsonify({"message": "Failed to connect to database"}), 500
 
-        survey_data = database_operations.fetch(connection, query, params)
-
-        if survey_data is None:
-            app.logger.error("Error fetching surveys: Database error")
+        try:
+            # Check for optional username argument
+            username = request.args.get("admin", None)
+            survey_objects_list, next_cursor = database_operations.fetch_survey_page(
+                connection, limit, after, username
+            )
+        except database_operations.DataBaseError as e:
+            app.logger.error(f"Error fetching surveys: {str(e)}")
             return jsonify({"message": "Error fetching surveys"}), 500
-        elif not survey_data:
-            app.logger.info("No surveys found")
-            return jsonify([]), 200
 
-        # Group survey data by survey ID and collect questions
-        survey_objects = {}
-        for row in survey_data:
-            survey_id = row["survey_id"]
-            if survey_id not in survey_objects:
-                survey_objects[survey_id] = database_operations.create_survey_object(
-                    row
-                )
-            if row["question_id"] is not None:  # Check if there's a question associated
-                database_operations.append_question_to_survey(
-                    survey_objects, survey_id, row
-                )
-
-        # Convert dictionary to list of survey objects
-        survey_objects_list = list(survey_objects.values())
-
-        app.logger.info("Surveys fetched successfully")
-        return jsonify(survey_objects_list), 200
-    except Exception as e:
-        app.logger.error("Error fetching surveys: Database error")
-        return jsonify({"message": "Error fetching surveys"}), 500
-    finally:
-        database_operations.close_connection(connection)
+    app.logger.info("Surveys fetched successfully")
+    return page_response(survey_objects_list, next_cursor), 200
 
 
 @app.route("/api/v1/surveys/<survey_id>", methods=["GET"])
@@ -334,49 +432,20 @@ def get_survey(survey_id: str) -> tuple[Response, int]:
         app.logger.info("Missing survey ID")
         return jsonify({"message": "Missing survey ID"}), 400
 
-    # Get survey from database
-    # Connect to the database
-    connection = database_operations.connect_to_mysql()
-    if not connection:
-        app.logger.error("Failed to connect to the database")
-        return jsonify({"message": "Failed to connect to database"}), 500
-
     try:
-        query = """
-            SELECT Surveys.*, Questions.* 
-            FROM Surveys 
-            LEFT JOIN Questions ON Surveys.survey_id = Questions.survey_id 
-            WHERE Surveys.survey_id = %s
-            ORDER BY Surveys.survey_id DESC, Questions.question_id
-        """
-        params = (survey_id,)
+        survey_object = survey_cache.get_survey(int(survey_id))
+    except ValueError:
+        survey_object = None
+    except database_operations.DataBaseError as e:
+        app.logger.error(f"Error fetching survey: {str(e)}")
+        return jsonify({"message": "Error fetching survey"}), 500
 
-        survey_data = database_operations.fetch(connection, query, params)
-        if survey_data is None:
-            app.logger.error("Error fetching survey: Database error")
-            return jsonify({"message": "Error fetching survey"}), 500
-        elif not survey_data:
-            app.logger.info("Survey not found")
-            return jsonify({"message": "Survey not found"}), 404
+    if survey_object is None:
+        app.logger.info("Survey not found")
+        return jsonify({"message": "Survey not found"}), 404
 
-        # Group survey data by survey ID and collect questions
-        survey_object = {}
-        for row in survey_data:
-            survey_id = row["survey_id"]
-            if survey_id not in survey_object:
-                survey_object[survey_id] = database_operations.create_survey_object(row)
-            if row["question_id"] is not None:  # Check if there's a question associated
-                database_operations.append_question_to_survey(
-                    survey_object, survey_id, row
-                )
-        survey_object = survey_object[int(survey_id)]
-        app.logger.info("Survey fetched successfully")
-        return jsonify(survey_object), 200
-    except Exception as e:
-        app.logger.error(f"Error fetching survey: {str(e)}")
-        return jsonify({"message": "Error fetching surveys"}), 500
-    finally:
-        database_operations.close_connection(connection)
+    app.logger.info("Survey fetched successfully")
+    return jsonify(survey_object), 200
 
 
 @app.route("/api/v1/surveys/<survey_id>", methods=["DELETE"])
@@ -392,41 +461,41 @@ def delete_survey(survey_id: str, **kwargs) -> tuple[Response, int]:
         tuple[Response, int]: Tuple containing the response and status code
     """
     # Check if survey exists, return 404 if not
-    # Connect to the database
-    connection = database_operations.connect_to_mysql()
-    if not connection:
-        app.logger.error("Failed to connect to the database")
-        return jsonify({"message": "Failed to connect to the database"}), 500
-
-    try:
-        # Check if the survey exists
-        survey_query = "SELECT * FROM Surveys WHERE survey_id = %s"
-        survey = database_operations.fetch(connection, survey_query, (survey_id,))
-        if not survey:
-            app.logger.info("Survey not found")
-            return jsonify({"message": "Survey not found"}), 404
-
-        # Check if the user has permission to delete the survey
-        if survey[0]["admin_username"] != kwargs["jwt_sub"]:
-            return (
-                jsonify({"message": "Accessing other admin's surveys is forbidden"}),
-                403,
-            )
+    # Borrow a connection from the pool
+    with database_operations.get_connection() as connection:
+        if not connection:
+            app.logger.error("Failed to connect to the database")
+            return jsonify({"message": "Failed to connect to the database"}), 500
 
-        # Delete the survey
-        delete_survey_query = "DELETE FROM Surveys WHERE survey_id = %s"
-        database_operations.execute(connection, delete_survey_query, (survey_id,))
-        database_operations.commit(connection)
+        try:
+            # Check if the survey exists
+            survey_query = "SELECT * FROM Surveys WHERE survey_id = %s"
+            survey = database_operations.fetch(connection, survey_query, (survey_id,))
+            if not survey:
+                app.logger.info("Survey not found")
+                return jsonify({"message": "Survey not found"}), 404
+
+            # Check if the user has permission to delete the survey
+            if survey[0]["admin_username"] != kwargs["jwt_sub"]:
+                return (
+                    jsonify(
+                        {"message": "Accessing other admin's surveys is forbidden"}
+                    ),
+                    403,
+                )
 
-        app.logger.info("Survey deleted successfully")
-        return jsonify({"message": "Survey deleted successfully"}), 200
+            # Delete the survey
+            delete_survey_query = "DELETE FROM Surveys WHERE survey_id = %s"
+            database_operations.execute(connection, delete_survey_query, (survey_id,))
+            database_operations.commit(connection)
+            survey_cache.invalidate(survey[0]["survey_id"])
 
-    except Exception as e:
-        app.logger.error(f"Failed to delete survey: {str(e)}")
-        return jsonify({"message": "Failed to delete survey"}), 500
+            app.logger.info("Survey deleted successfully")
+            return jsonify({"message": "Survey deleted successfully"}), 200
 
-    finally:
-        database_operations.close_connection(connection)
+        except Exception as e:
+            app.logger.error(f"Failed to delete survey: {str(e)}")
+            return jsonify({"message": "Failed to delete survey"}), 500
 
 
 # Response routes
@@ -453,68 +522,82 @@ def submit_response(survey_id: str) -> tuple[Response, int]:
         app.logger.info(f"Invalid response object format: {message}")
         return jsonify({"message": message}), 400
 
-    # Retrieve survey object from the database
-    survey_object_response = get_survey(survey_id)
+    # Retrieve the validator compiled for the survey, from the cache if possible
+    try:
+        validator = survey_cache.get_validator(int(survey_id))
+    except (ValueError, database_operations.DataBaseError) as e:
+        app.logger.error(f"Error fetching survey: {str(e)}")
+        validator = None
 
-    # If GET request is not successful, return 500
-    if survey_object_response[1] != 200:
+    if validator is None:
         app.logger.error("Failed to retrieve survey object")
         return jsonify({"message": "Failed to retrieve survey object"}), 500
 
-    # GET request is successful
-    survey_object = survey_object_response[0].json
-
     # Validate response object against survey object
-    validation_error = database_operations.validate_response(data, survey_object)
+    validation_error = validator.validate(data)
     if validation_error:
         app.logger.info(f"Validation error: {validation_error}")
         return jsonify({"message": validation_error}), 400
 
-    # Connect to the database
-    connection = database_operations.connect_to_mysql()
-    if connection is None:
-        app.logger.error("Failed to connect to the database")
-        return jsonify({"message": "Failed to connect to the database"}), 500
+    # Borrow a connection from the pool
+    with database_operations.get_connection() as connection:
+        if connection is None:
+            app.logger.error("Failed to connect to the database")
+            return jsonify({"message": "Failed to connect to the database"}), 500
 
-    # Insert data into database
-    try:
+        # Insert data into database
         # Save response to database and get the response ID
-        response_id = database_operations.save_response_to_database(
-            connection, data, str(survey_id)
-        )
+        try:
+            response_id = database_operations.save_response_to_database(
+                connection, data, str(survey_id)
+            )
+        except database_operations.DataBaseError as e:
+            app.logger.error(f"Error saving response: {str(e)}")
+            return jsonify({"message": "Failed to save response to the database"}), 500
 
+        # The survey was deleted through another process after this one cached it
         if response_id is None:
-            app.logger.error("Failed to save response to the database")
-            return jsonify({"message": "Failed to save response to the database"}), 500
+            survey_cache.invalidate(int(survey_id))
+            app.logger.info("Survey not found")
+            return jsonify({"message": "Survey not found"}), 404
 
         response_body = {"response_id": response_id}
 
-        app.logger.info("Response submitted successfully")
-        return jsonify(response_body), 201
-    finally:
-        # Close database connection
-        database_operations.close_connection(connection)
+    # Plan the interview while the respondent moves on to the chat, unless planning is busy
+    if chat.PLAN_AT_SUBMISSION:
+        chat.planning.submit(chat.plan_interview, int(survey_id), response_id)
+
+    app.logger.info("Response submitted successfully")
+    return jsonify(response_body), 201
 
 
 @app.route("/api/v1/surveys/<survey_id>/responses", methods=["GET"])
 @admin_token_required
 def get_responses(survey_id: str, **kwargs) -> tuple[Response, int]:
-    """Get all responses to a survey
+    """Get a page of responses to a survey, in the order they were submitted
 
     Args:
         survey_id (str): Survey ID
         kwargs (dict): Dictionary containing the JWT token subject claim (jwt_sub: admin username)
 
+    Query Parameters:
+        limit (int, optional): Number of responses per page (default 100, at most 500)
+        after (int, optional): Cursor of the page, from the X-Next-Cursor header of the previous page
+
     Returns:
         tuple[Response, int]: Tuple containing the response and status code
     """
-
-    # Connect to MySQL database
-    connection = database_operations.connect_to_mysql()
-    if not connection:
-        app.logger.error("Failed to connect to the database")
-        return jsonify({"message": "Failed to connect to the database"}), 500
     try:
+        limit, after = page_args()
+    except ValueError:
+        return jsonify({"message": "Invalid pagination parameters"}), 400
+
+    # Borrow a connection from the pool
+    with database_operations.get_connection() as connection:
+        if not connection:
+            app.logger.error("Failed to connect to the database")
+            return jsonify({"message": "Failed to connect to the database"}), 500
+
         # Fetch survey from the database
         query = """
             SELECT * FROM Surveys WHERE survey_id = %s
@@ -533,53 +616,108 @@ def get_responses(survey_id: str, **kwargs) -> tuple[Response, int]:
                 403,
             )
 
-        # Fetch responses from the database
+        try:
+            response_objects_list, next_cursor = (
+                database_operations.fetch_response_page(
+                    connection, survey_id, limit, after
+                )
+            )
+        except database_operations.DataBaseError as e:
+            app.logger.error(f"Error fetching responses: {str(e)}")
+            return jsonify({"message": "Error fetching responses"}), 500
+
+    app.logger.info("Responses fetched successfully")
+    return page_response(response_objects_list, next_cursor), 200
+
+
+@app.route("/api/v1/surveys/<survey_id>/responses/export", methods=["GET"])
+@admin_token_required
+def export_responses(survey_id: str, **kwargs) -> tuple[Response, int]:
+    """Export every response to a survey, streamed as it is read from the database
+
+    Args:
+        survey_id (str): Survey ID
+        kwargs (dict): Dictionary containing the JWT token subject claim (jwt_sub: admin username)
+
+    Query Parameters:
+        format (str, optional): ndjson (default), with a response object per line, or csv
+
+    Returns:
+        tuple[Response, int]: Tuple containing the response and status code
+    """
+    export_format = request.args.get("format", "ndjson").lower()
+    if export_format not in export.FORMATS:
+        return jsonify({"message": "Invalid export format"}), 400
+
+    # The connections are held until the export has been sent
+    with ExitStack() as stack:
+        connection = stack.enter_context(database_operations.get_connection())
+        if not connection:
+            app.logger.error("Failed to connect to the database")
+            return jsonify({"message": "Failed to connect to the database"}), 500
+
+        # Fetch survey from the database
         query = """
-            SELECT sr.response_id, sr.submitted_at, sr.question_id, q.question_type, q.question, q.options, sr.answer
-            FROM Survey_Responses sr
-            INNER JOIN Questions q ON sr.question_id = q.question_id AND sr.survey_id = q.survey_id
-            INNER JOIN Surveys s ON sr.survey_id = s.survey_id
-            WHERE sr.survey_id = %s
+            SELECT * FROM Surveys WHERE survey_id = %s
         """
-        responses_data = database_operations.fetch(connection, query, (survey_id,))
+        survey = database_operations.fetch(connection, query, (survey_id,))
 
-        # Check if responses exist
-        if not responses_data:
-            app.logger.info("No responses found for the survey")
-            return jsonify([]), 200
+        # Check if survey exists
+        if not survey:
+            app.logger.info("Survey not found")
+            return jsonify({"message": "Survey not found"}), 404
 
-        # Create response objects dictionary
-        response_objects = {}
-        for response_data in responses_data:
-            response_id = response_data["response_id"]
-            if response_id not in response_objects:
-                response_objects[response_id] = (
-                    database_operations.create_response_object(
-                        survey_id, response_id, response_data
-                    )
-                )
-            # Retrieve chatlog if it exists
-            chat_log_query = """
-            SELECT chat_log FROM ChatLog WHERE survey_id = %s AND response_id = %s
-            """
-            chat_log_data = database_operations.fetch(
-                connection, chat_log_query, (survey_id, response_id)
-            )
-            database_operations.append_answer_to_response(
-                response_objects,
-                response_id,
-                response_data,
-                chat_log_data,
+        # Check if admin has access to survey, return 403 if not
+        if survey[0]["admin_username"] != kwargs["jwt_sub"]:
+            return (
+                jsonify({"message": "Accessing other admin's surveys is forbidden"}),
+                403,
             )
 
-        # Convert dictionary to list of response objects
-        response_objects_list = list(response_objects.values())
+        messages_connection = stack.enter_context(database_operations.get_connection())
+        if not messages_connection:
+            app.logger.error("Failed to connect to the database")
+            return jsonify({"message": "Failed to connect to the database"}), 500
+
+        responses = database_operations.stream_responses(
+            connection, messages_connection, survey[0]["survey_id"]
+        )
+        if export_format == "csv":
+            query = """
+                SELECT question_id, question FROM Questions
+                WHERE survey_id = %s ORDER BY question_id
+            """
+            questions = database_operations.fetch(connection, query, (survey_id,))
+            lines = export.csv_lines(questions, responses)
+        else:
+            lines = export.ndjson_lines(responses)
+        connections = stack.pop_all()
 
-        app.logger.info("Responses fetched successfully")
-        return jsonify(response_objects_list), 200
-    finally:
-        # Close database connection
-        database_operations.close_connection(connection)
+    def generate():
+        try:
+            yield from lines
+        except database_operations.DataBaseError as e:
+            # The status code has been sent, so the export is cut short
+            app.logger.error(f"Error exporting responses: {str(e)}")
+            return
+        app.logger.info("Responses exported successfully")
+
+    def close():
+        # Close the cursors before the connections are returned, even if the client left
+        responses.close()
+        connections.close()
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype=export.FORMATS[export_format],
+        headers={
+            "Content-Disposition": "attachment; "
+            f'filename="survey-{survey_id}-responses.{export_format}"',
+            "X-Accel-Buffering": "no",
+        },
+    )
+    response.call_on_close(close)
+    return response, 200
 
 
 @app.route("/api/v1/surveys/<survey_id>/responses/<response_id>", methods=["GET"])
@@ -595,13 +733,12 @@ def get_response(survey_id: str, response_id: str, **kwargs) -> tuple[Response,
         tuple[Response, int]: Tuple containing the response and status code
     """
 
-    # Connect to MySQL database
-    connection = database_operations.connect_to_mysql()
-    if not connection:
-        app.logger.error("Failed to connect to the database")
-        return jsonify({"message": "Failed to connect to the database"}), 500
+    # Borrow a connection from the pool
+    with database_operations.get_connection() as connection:
+        if not connection:
+            app.logger.error("Failed to connect to the database")
+            return jsonify({"message": "Failed to connect to the database"}), 500
 
-    try:
         # Fetch survey from the database
         query = """
             SELECT * FROM Surveys WHERE survey_id = %s
@@ -648,224 +785,96 @@ def get_response(survey_id: str, response_id: str, **kwargs) -> tuple[Response,
                         survey_id, response_id, response_data
                     )
                 )
-            # Retrieve chatlog if it exists
-            chat_log_query = """
-            SELECT chat_log FROM ChatLog WHERE survey_id = %s AND response_id = %s
-            """
-            chat_log_data = database_operations.fetch(
-                connection, chat_log_query, (survey_id, response_id)
-            )
             database_operations.append_answer_to_response(
-                response_objects,
-                response_id,
-                response_data,
-                chat_log_data,
+                response_objects, response_id, response_data
             )
+        # Retrieve the chat log if it exists
+        chat_logs = database_operations.fetch_chat_logs(
+            connection, survey_id, [int(response_id)]
+        )
+        database_operations.attach_chat_logs(response_objects, chat_logs)
+
         response_objects = response_objects[int(response_id)]
         app.logger.info("Response fetched successfully")
         return jsonify(response_objects), 200
-    finally:
-        # Close database connection
-        database_operations.close_connection(connection)
 
 
-def helper_send_message(
-    llm_input: dict[str, object], user_input: str, connection, survey_id, response_id
-) -> tuple[Response, int]:
-    """Generates a response from a large language model.
+@app.route("/api/v1/surveys/<survey_id>/usage", methods=["GET"])
+@admin_token_required
+def get_survey_usage(survey_id: str, **kwargs) -> tuple[Response, int]:
+    """Get the LLM tokens and cost of a survey, per call site and for its most expensive responses.
+    The query parameter limit sets the number of responses returned (default 20).
 
     Args:
-        llm_input (dict): A dictionary dict[str, object]  which contains a chat context string,
-        response object, and message list
-        user_input (str): User input
-        connection: MySQL connection object
         survey_id (str): Survey ID
-        response_id (str): Response ID
+        kwargs (dict): Dictionary containing the JWT token subject claim (jwt_sub: admin username)
 
     Returns:
         tuple[Response, int]: Tuple containing the response and status code
     """
-
-    def has_no_chat_log(content: str, message_list: list[dict[str, object]]) -> bool:
-        return not content.strip() and not message_list
-
     try:
-        # initialise LLM
-        llm = GPT()
-        chat_log_dict = json.loads(llm_input["chat_log"])
-        message_list = chat_log_dict["messages"]
-
-        has_no_chat_log = has_no_chat_log(user_input, message_list)
-        if has_no_chat_log:
-            pipe = construct_chatlog(
-                f"""{llm_input["chat_context"]}\n{
-                    format_responses_for_gpt(
-                        llm_input["response_object"]
-                    )
-                }""",
-                llm=llm,
-            )
-            first_question = llm.run(pipe.message_list, with_moderation=False)
-            updated_message_list = pipe.insert_and_update(
-                first_question, pipe.current_index, is_llm=True
-            )
+        limit = int(request.args.get("limit", "20"))
+    except ValueError:
+        return jsonify({"message": "Invalid limit"}), 400
 
-        else:
-            pipe = ChatLog(message_list, llm=llm)
-            next_question = llm.run(pipe.message_list)
-            updated_message_list = pipe.insert_and_update(
-                next_question, pipe.current_index, is_llm=True
-            )
+    # Borrow a connection from the pool
+    with database_operations.get_connection() as connection:
+        if not connection:
+            app.logger.error("Failed to connect to the database")
+            return jsonify({"message": "Failed to connect to the database"}), 500
 
-        updated_chat_log = chat_log_dict.copy()
-        updated_chat_log["messages"] = updated_message_list
-        updated_chat_log_json = json.dumps(updated_chat_log)
+        # Fetch survey from the database
+        query = """
+            SELECT * FROM Surveys WHERE survey_id = %s
+        """
+        survey = database_operations.fetch(connection, query, (survey_id,))
 
-        # Update the ChatLog table
-        try:
-            # Update the database
-            database_operations.update_chat_log(
-                connection, survey_id, response_id, updated_chat_log_json
-            )
-        except Exception as e:
-            app.logger.error(
-                "An error occurred while updating chat log with user message: " + str(e)
-            )
+        # Check if survey exists
+        if not survey:
+            app.logger.info("Survey not found")
+            return jsonify({"message": "Survey not found"}), 404
+
+        # Check if admin has access to survey, return 403 if not
+        if survey[0]["admin_username"] != kwargs["jwt_sub"]:
             return (
-                jsonify({"message": "An error occurred while updating the chat log"}),
-                500,
+                jsonify({"message": "Accessing other admin's surveys is forbidden"}),
+                403,
             )
 
-        content = updated_message_list[-1]["content"]
+        try:
+            usage_data = database_operations.fetch_survey_usage(
+                connection, survey_id, max(1, min(limit, 100))
+            )
+        except database_operations.DataBaseError as e:
+            app.logger.error(str(e))
+            return jsonify({"message": "Failed to fetch usage"}), 500
 
-        is_last = check_exit(updated_message_list, llm)
-        database_operations.close_connection(connection)
-        app.logger.info("Reply generated successfully")
-        return (
-            jsonify(
-                {
-                    "content": content,
-                    "is_last": is_last,
-                    "updated_message_list": updated_message_list,
-                }
-            ),
-            201,
-        )
-    except Exception as e:
-        app.logger.error("An error was encountered while generating a reply: " + str(e))
-        return (
-            jsonify(
-                {
-                    "message": "An error was encountered while generating a reply: "
-                    + str(e)
-                }
-            ),
-            500,
-        )
+    app.logger.info("Survey usage fetched successfully")
+    return jsonify(usage_data), 200
 
 
-@app.route("/api/v1/surveys/<survey_id>/responses/<response_id>/chat", methods=["POST"])
-def send_chat_message(survey_id: str, response_id: str) -> tuple[Response, int]:
-    """Send a chat message for a response
+@app.route("/api/v1/surveys/<survey_id>/responses/<response_id>/usage", methods=["GET"])
+@admin_token_required
+def get_response_usage(
+    survey_id: str, response_id: str, **kwargs
+) -> tuple[Response, int]:
+    """Get the LLM tokens and cost of a response, per call site and per chat turn
 
     Args:
-        survey (str): Survey ID
+        survey_id (str): Survey ID
         response_id (str): Response ID
+        kwargs (dict): Dictionary containing the JWT token subject claim (jwt_sub: admin username)
 
     Returns:
         tuple[Response, int]: Tuple containing the response and status code
     """
-    # Check that there is "content" in request body
-    data = request.get_json()
-    if "content" not in data:
-        app.logger.info("Missing content")
-        return jsonify({"message": "Missing content"}), 400
-
-    # Step 1: Retrieve Response Object
-    response_object = get_response_no_auth(survey_id, response_id)
-
-    # If GET request is not successful
-    if response_object[1] != 200:
-        app.logger.error(response_object[0].json.get("message"))
-        return response_object
-
-    # GET request is successful
-    response_object = response_object[0].json
-
-    # Connect to MySQL database
-    connection = database_operations.connect_to_mysql()
-    if not connection:
-        app.logger.error("Failed to connect to the database")
-        return jsonify({"message": "Failed to connect to the database"}), 500
-
-    # Step 2: Insert message to DB
-    try:
-        chat_log = database_operations.get_chat_log(connection, survey_id, response_id)
-        chat_log_dict = json.loads(chat_log)
-
-        if data["content"]:
-            # Append new message to the messages list
-            chat_log_dict["messages"].append(
-                {"role": "user", "content": data["content"]}
-            )
-
-            # Convert the updated chat log dictionary back to a JSON string
-            updated_chat_log = json.dumps(chat_log_dict)
-            database_operations.update_chat_log(
-                connection, survey_id, response_id, updated_chat_log
-            )
-    except Exception as e:
-        app.logger.error(
-            "An error occurred while updating chat log with user message: " + str(e)
-        )
-        return (
-            jsonify(
-                {
-                    "message": "An error occurred while updating chat log with user message"
-                }
-            ),
-            500,
-        )
-
-    # Step 3: Retrieve chat_context
-    try:
-        chat_context = database_operations.fetch_chat_context(connection, survey_id)
-    except Exception as e:
-        app.logger.error("An error occurred while fetching chat context: " + str(e))
-        return (
-            jsonify({"message": "An error occurred while fetching chat context"}),
-            500,
-        )
-
-    # Step 4: Retrieve chatLog object
-    try:
-        chat_log = database_operations.get_chat_log(connection, survey_id, response_id)
-    except Exception as e:
-        app.logger.error("An error occurred while fetching chat log: " + str(e))
-        return jsonify({"message": "An error occurred while fetching chat log"}), 500
-
-    # Create the object to parse into ChatGPT
-    llm_input = {
-        "chat_context": chat_context,
-        "response_object": response_object,
-        "chat_log": chat_log,
-    }
-
-    return helper_send_message(
-        llm_input, data["content"], connection, survey_id, response_id
-    )
-
 
-# TODO: Think of a better way than having the same function without authentication
-# Function to get response object without admin token required
-# Exactly the same as get_response except it is not an endpoint, and there is no admin verification token.
-def get_response_no_auth(survey_id, response_id):
-    # Connect to MySQL database
-    connection = database_operations.connect_to_mysql()
-    if not connection:
-        return jsonify({"message": "Failed to connect to the database"}), 500
+    # Borrow a connection from the pool
+    with database_operations.get_connection() as connection:
+        if not connection:
+            app.logger.error("Failed to connect to the database")
+            return jsonify({"message": "Failed to connect to the database"}), 500
 
-    try:
         # Fetch survey from the database
         query = """
             SELECT * FROM Surveys WHERE survey_id = %s
@@ -874,46 +883,51 @@ def get_response_no_auth(survey_id, response_id):
 
         # Check if survey exists
         if not survey:
+            app.logger.info("Survey not found")
             return jsonify({"message": "Survey not found"}), 404
 
-        # Fetch responses from the database
-        query = """
-            SELECT sr.response_id, sr.submitted_at, sr.question_id, q.question_type, q.question, q.options, sr.answer
-            FROM Survey_Responses sr
-            INNER JOIN Questions q ON sr.question_id = q.question_id AND sr.survey_id = q.survey_id
-            INNER JOIN Surveys s ON sr.survey_id = s.survey_id
-            WHERE sr.survey_id = %s AND sr.response_id = %s
-        """
-        responses_data = database_operations.fetch(
-            connection, query, (survey_id, response_id)
-        )
-
-        # Check if responses exist
-        if not responses_data:
-            app.logger.info("No responses found for the survey")
-            return jsonify([]), 200
+        # Check if admin has access to survey, return 403 if not
+        if survey[0]["admin_username"] != kwargs["jwt_sub"]:
+            return (
+                jsonify({"message": "Accessing other admin's surveys is forbidden"}),
+                403,
+            )
 
-        # Create response objects dictionary
-        response_objects = {}
-        for response_data in responses_data:
-            response_id = response_data["response_id"]
-            if response_id not in response_objects:
-                response_objects[response_id] = (
-                    database_operations.create_response_object(
-                        survey_id, response_id, response_data
-                    )
-                )
-            database_operations.append_answer_to_response(
-                response_objects,
-                response_id,
-                response_data,
-                [],
+        try:
+            usage_data = database_operations.fetch_response_usage(
+                connection, survey_id, response_id
             )
-        response_objects = response_objects[int(response_id)]
-        return jsonify(response_objects), 200
-    finally:
-        # Close database connection
-        database_operations.close_connection(connection)
+        except database_operations.DataBaseError as e:
+            app.logger.error(str(e))
+            return jsonify({"message": "Failed to fetch usage"}), 500
+
+    app.logger.info("Response usage fetched successfully")
+    return jsonify(usage_data), 200
+
+
+@app.route("/api/v1/surveys/<survey_id>/responses/<response_id>/chat", methods=["POST"])
+def send_chat_message(survey_id: str, response_id: str) -> tuple[Response, int]:
+    """Send a chat message for a response.
+    With the query parameter stream=true, the reply is streamed as Server-Sent Events.
+
+    Args:
+        survey (str): Survey ID
+        response_id (str): Response ID
+
+    Returns:
+        tuple[Response, int]: Tuple containing the response and status code
+    """
+    # Shared with the asyncio serving mode, see src.asgi
+    reply = chat.chat_response(
+        survey_id, response_id, request.get_data(), request.args.get("stream", "")
+    )
+    if reply.events is not None:
+        return Response(
+            stream_with_context(reply.events),
+            status=reply.status,
+            headers=reply.headers,
+        )
+    return jsonify(reply.data), reply.status, reply.headers
 
 
 if __name__ == "__main__":
@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+    src.asgi
+    ~~~~~~~
+
+    This module implements the asyncio (ASGI) serving mode of the backend server.
+    Chat turns are served on the event loop with the asynchronous OpenAI client,
+    so an interview waiting for the LLM does not hold a thread, and one worker
+    process can hold hundreds of concurrent interviews. Every other route is
+    passed to the Flask app on a worker thread, so it keeps working unchanged.
+
+    Usage:
+        uvicorn src.asgi:app --host 0.0.0.0 --port 5000
+"""
+
+
+import asyncio
+import logging
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+from a2wsgi import WSGIMiddleware
+from src import chat, metrics, migrations
+from src.app import (
+    BACKEND_CONTAINER_PORT,
+    HTTP_REQUEST_SECONDS,
+    HTTP_REQUEST_STAGE_SECONDS,
+)
+from src.app import app as flask_app
+
+logger = logging.getLogger(__name__)
+
+Receive = Callable[[], Awaitable[Dict[str, Any]]]
+Send = Callable[[Dict[str, Any]], Awaitable[None]]
+
+# Worker threads for database calls, and as many for the routes served by the Flask app
+ASGI_THREADS = int(os.environ.get("ASGI_THREADS", "32"))
+
+# The Flask app, run on its own worker threads by a2wsgi
+flask_asgi = WSGIMiddleware(flask_app, workers=ASGI_THREADS)
+
+CHAT_ROUTE = "/api/v1/surveys/<survey_id>/responses/<response_id>/chat"
+CHAT_PATH = re.compile(
+    r"^/api/v1/surveys/(?P<survey_id>[^/]+)/responses/(?P<response_id>[^/]+)/chat$"
+)
+
+
+async def app(scope: Dict[str, Any], receive: Receive, send: Send) -> None:
+    """The ASGI application. Serves chat turns natively and every other route through
+    the Flask app.
+
+    Args:
+        scope (Dict[str, Any]): The connection scope.
+        receive (Receive): Receives events from the client.
+        send (Send): Sends events to the client.
+    """
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    match = CHAT_PATH.match(scope["path"])
+    if match and scope["method"] == "POST":
+        await send_chat_message(scope, receive, send, **match.groupdict())
+    else:
+        await call_flask(scope, receive, send)
+
+
+async def lifespan(receive: Receive, send: Send) -> None:
+    """Handles the startup and shutdown events of the server.
+    On startup, the worker threads of the event loop are sized to ASGI_THREADS, and
+    pending schema migrations are applied.
+
+    Args:
+        receive (Receive): Receives events from the server.
+        send (Send): Sends events to the server.
+    """
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            asyncio.get_running_loop().set_default_executor(
+                ThreadPoolExecutor(max_workers=ASGI_THREADS, thread_name_prefix="asgi")
+            )
+            await asyncio.to_thread(migrations.migrate_on_startup)
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def read_body(receive: Receive) -> bytes:
+    """Reads the whole body of a request.
+
+    Args:
+        receive (Receive): Receives events from the client.
+
+    Returns:
+        bytes: The request body.
+    """
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return body
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+def encode_headers(headers: Dict[str, str]) -> List[Tuple[bytes, bytes]]:
+    """Encodes the headers of a response as ASGI headers.
+
+    Args:
+        headers (Dict[str, str]): Header names and values.
+
+    Returns:
+        List[Tuple[bytes, bytes]]: The headers, with lowercase names.
+    """
+    return [
+        (name.lower().encode("latin-1"), value.encode("latin-1"))
+        for name, value in headers.items()
+    ]
+
+
+async def send_json(
+    send: Send,
+    status: int,
+    data: Any,
+    headers: Optional[Dict[str, str]] = None,
+) -> None:
+    """Sends a JSON response.
+
+    Args:
+        send (Send): Sends events to the client.
+        status (int): The HTTP status code.
+        data (Any): The response data.
+        headers (Dict[str, str], optional): Additional headers. Defaults to None.
+    """
+    body = flask_app.json.dumps(data).encode("utf-8")
+    await send(
+        {
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode("latin-1")),
+                *encode_headers(headers or {}),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
+
+
+async def send_events(send: Send, reply: chat.ChatResponse) -> None:
+    """Sends a reply streamed as Server-Sent Events, and closes its events.
+
+    Args:
+        send (Send): Sends events to the client.
+        reply (chat.ChatResponse): The reply, see chat.achat_response().
+    """
+    await send(
+        {
+            "type": "http.response.start",
+            "status": reply.status,
+            "headers": encode_headers(reply.headers),
+        }
+    )
+    try:
+        async for message in reply.events:
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": message.encode("utf-8"),
+                    "more_body": True,
+                }
+            )
+        await send({"type": "http.response.body", "body": b""})
+    except OSError:
+        logger.info("Client disconnected from the stream")
+    finally:
+        await reply.events.aclose()
+
+
+async def send_chat_message(
+    scope: Dict[str, Any],
+    receive: Receive,
+    send: Send,
+    survey_id: str,
+    response_id: str,
+) -> None:
+    """Send a chat message for a response, see the send chat message route of the Flask app.
+    With the query parameter stream=true, the reply is streamed as Server-Sent Events.
+
+    Args:
+        scope (Dict[str, Any]): The connection scope.
+        receive (Receive): Receives events from the client.
+        send (Send): Sends events to the client.
+        survey_id (str): Survey ID
+        response_id (str): Response ID
+    """
+    start = time.perf_counter()
+    stages = metrics.start_request()
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    reply = await chat.achat_response(
+        survey_id, response_id, await read_body(receive), query.get("stream", [""])[0]
+    )
+    if reply.events is None:
+        await send_json(send, reply.status, reply.data, reply.headers)
+    else:
+        await send_events(send, reply)
+
+    HTTP_REQUEST_SECONDS.labels(
+        method="POST", route=CHAT_ROUTE, status=reply.status
+    ).observe(time.perf_counter() - start)
+    for stage in ("db", "llm"):
+        HTTP_REQUEST_STAGE_SECONDS.labels(route=CHAT_ROUTE, stage=stage).observe(
+            stages.get(stage, 0.0)
+        )
+
+
+def join_cookies(scope: Dict[str, Any]) -> Dict[str, Any]:
+    """Joins the Cookie headers of a request into one, separated by "; " as a single
+    Cookie header is. The WSGI adapter joins repeated headers with ",".
+
+    Args:
+        scope (Dict[str, Any]): The connection scope.
+
+    Returns:
+        Dict[str, Any]: The scope, with at most one Cookie header.
+    """
+    headers = scope.get("headers", [])
+    cookies = [value for name, value in headers if name == b"cookie"]
+    if len(cookies) < 2:
+        return scope
+    headers = [(name, value) for name, value in headers if name != b"cookie"]
+    return {**scope, "headers": headers + [(b"cookie", b"; ".join(cookies))]}
+
+
+async def call_flask(scope: Dict[str, Any], receive: Receive, send: Send) -> None:
+    """Serves a request with the Flask app on a worker thread.
+
+    Args:
+        scope (Dict[str, Any]): The connection scope.
+        receive (Receive): Receives events from the client.
+        send (Send): Sends events to the client.
+    """
+    await flask_asgi(join_cookies(scope), receive, send)
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    uvicorn.run(app, host="0.0.0.0", port=int(BACKEND_CONTAINER_PORT))
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""
+    src.background
+    ~~~~~~~
+
+    This module implements a process-wide pool of worker threads for jobs that
+    should not hold up a request, such as LLM calls whose results are written
+    back to the database once they are ready, and bounded pools for optional
+    jobs that are skipped rather than queued when their pool is busy.
+"""
+
+
+import contextvars
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+from prometheus_client import Counter
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+BACKGROUND_JOBS_SKIPPED = Counter(
+    "background_jobs_skipped",
+    "Optional background jobs skipped because their pool was full.",
+    ["pool"],
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_bounded_executors: List["BoundedExecutor"] = []
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """
+    Returns the process-wide background executor, creating it on first use.
+
+    The number of worker threads is configured through the BACKGROUND_WORKERS
+    environment variable.
+
+    Returns:
+        ThreadPoolExecutor: The shared background executor.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=int(os.environ.get("BACKGROUND_WORKERS", "4")),
+                    thread_name_prefix="background",
+                )
+    return _executor
+
+
+def submit(job: Callable[..., Any], *args, **kwargs) -> Future:
+    """
+    Run a job on the background executor. Exceptions raised by the job are logged.
+    The job runs in a copy of the caller's context, e.g. its LLM usage scope.
+
+    Args:
+        job (Callable[..., Any]): The function to run.
+        *args: Positional arguments for the job.
+        **kwargs: Keyword arguments for the job.
+
+    Returns:
+        Future: A future holding the result of the job.
+    """
+
+    return get_executor().submit(
+        contextvars.copy_context().run, _run, job, args, kwargs
+    )
+
+
+def _run(job: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+    try:
+        # The job outlives the request, so its time is not added to the request
+        with metrics.outside_request():
+            return job(*args, **kwargs)
+    except Exception as e:
+        logger.error(f"Background job {job.__name__} failed: {e}")
+        raise
+
+
+class BoundedExecutor:
+    """
+    A pool of worker threads of its own for optional jobs, which the caller can do without,
+    such as work done ahead of time. At most max_pending jobs are queued or running; further
+    jobs are skipped. A burst of optional jobs thus neither delays the jobs of the shared
+    executor nor builds up a backlog that is stale by the time it runs.
+    """
+
+    def __init__(self, name: str, workers: int, max_pending: int):
+        """
+        Args:
+            name (str): Name of the pool, used for its threads and metrics.
+            workers (int): Number of worker threads.
+            max_pending (int): Maximum number of jobs queued or running.
+        """
+        self.name = name
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max(max_pending, 1))
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        _bounded_executors.append(self)
+
+    def submit(self, job: Callable[..., Any], *args, **kwargs) -> Optional[Future]:
+        """
+        Run a job on the pool, unless it is full. Exceptions raised by the job are logged.
+        The job runs in a copy of the caller's context, as with submit().
+
+        Args:
+            job (Callable[..., Any]): The function to run.
+            *args: Positional arguments for the job.
+            **kwargs: Keyword arguments for the job.
+
+        Returns:
+            Optional[Future]: A future holding the result of the job, or None if it was skipped.
+        """
+        if self.max_pending <= 0 or not self._slots.acquire(blocking=False):
+            BACKGROUND_JOBS_SKIPPED.labels(pool=self.name).inc()
+            logger.info(f"Background job {job.__name__} skipped, {self.name} is full")
+            return None
+        try:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix=self.name
+                    )
+                return self._executor.submit(
+                    contextvars.copy_context().run, self._run, job, args, kwargs
+                )
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _run(self, job: Callable[..., Any], args: tuple, kwargs: dict) -> Any:
+        # The slot is freed before the future is resolved, so that waiters can submit again
+        try:
+            return _run(job, args, kwargs)
+        finally:
+            self._slots.release()
+
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the worker threads, optionally waiting for queued jobs to finish.
+
+        Args:
+            wait (bool, optional): Whether to wait for queued jobs. Defaults to True.
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+def shutdown(wait: bool = True) -> None:
+    """
+    Stop the background executor and the bounded pools, optionally waiting for queued
+    jobs to finish.
+
+    Args:
+        wait (bool, optional): Whether to wait for queued jobs. Defaults to True.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=wait)
+            _executor = None
+    for executor in _bounded_executors:
+        executor.shutdown(wait=wait)
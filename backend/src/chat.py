@@ -0,0 +1,1258 @@
+# -*- coding: utf-8 -*-
+"""
+    src.chat
+    ~~~~~~~
+
+    This module implements the chat turn pipeline behind the send chat message
+    endpoint: load the state of a response, generate the next reply with the LLM,
+    decide whether the interview is over and persist the new messages.
+"""
+
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import (
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    NamedTuple,
+    Optional,
+)
+
+from prometheus_client import Gauge, Histogram
+from src import background, database_operations, metrics
+from src.llm_classes.chatlog import ChatLog
+from src.llm_classes.context_window import (
+    fold,
+    fold_point,
+    record_prompt,
+    window_messages,
+)
+from src.llm_classes.functions import (
+    acheck_exit,
+    check_exit,
+    construct_chatlog,
+    format_responses_for_gpt,
+)
+from src.llm_classes.llm_level import LLM, get_llm
+from src.llm_classes.usage import usage_scope
+
+logger = logging.getLogger(__name__)
+
+# How the exit check runs: "parallel", "serial" or "off". See resolve_reply().
+EXIT_CHECK_MODE = os.environ.get("EXIT_CHECK_MODE", "parallel")
+# Model for the exit check, e.g. a cheaper model than the one generating replies
+EXIT_CHECK_MODEL = os.environ.get("EXIT_CHECK_MODEL", "")
+
+# Whether the interview plan and opening question are generated when a response is submitted
+PLAN_AT_SUBMISSION = os.environ.get("PLAN_AT_SUBMISSION", "true").lower() == "true"
+# Threads that plan interviews, apart from the shared background jobs such as summaries
+PLANNING_WORKERS = int(os.environ.get("PLANNING_WORKERS", "2"))
+# Interviews queued or being planned, beyond which submissions are not planned ahead
+PLANNING_QUEUE_SIZE = int(os.environ.get("PLANNING_QUEUE_SIZE", "8"))
+
+# Minimum number of new characters before a streamed reply is moderated again
+MODERATION_CHUNK_CHARS = int(os.environ.get("MODERATION_CHUNK_CHARS", "200"))
+
+# Worker threads for the LLM calls that overlap with a chat turn, such as the exit check,
+# or 0 for the default set by the server, see set_default_workers()
+CHAT_WORKERS = int(os.environ.get("CHAT_WORKERS") or "0")
+_default_workers = 32
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+CHAT_TURNS_IN_FLIGHT = Gauge(
+    "chat_turns_in_flight",
+    "Chat turns being generated.",
+    ["mode"],
+    multiprocess_mode="livesum",
+)
+CHAT_STAGE_SECONDS = Histogram(
+    "chat_stage_seconds",
+    "Duration of the stages of chat turns.",
+    ["stage"],
+    buckets=metrics.DEFAULT_BUCKETS,
+)
+
+
+def set_default_workers(workers: int) -> None:
+    """Sets the number of worker threads used when CHAT_WORKERS is not set. The production
+    server sets it to its request threads, so that every request thread may run an exit
+    check in parallel with its reply. Takes effect when the executor is created on first use.
+
+    Args:
+        workers (int): Worker threads.
+    """
+    global _default_workers
+    _default_workers = workers
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Returns the executor of the chat turns of this process, creating it on first use.
+
+    Returns:
+        ThreadPoolExecutor: The executor.
+    """
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=CHAT_WORKERS or _default_workers,
+                    thread_name_prefix="chat",
+                )
+    return _executor
+
+
+def _submit(fn: Callable[..., Any], *args, **kwargs) -> Future:
+    # Runs fn on a worker thread, in the LLM usage scope of the chat turn
+    return get_executor().submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+# Chats whose summary is being updated, see summarise_chat()
+_folding: set[tuple[int, int]] = set()
+_folding_lock = threading.Lock()
+
+
+class ChatTurnError(Exception):
+    """Raised when a chat turn cannot be completed. Carries the HTTP status code to respond with."""
+
+    def __init__(self, message: str, status_code: int = 500):
+        self.message = message
+        self.status_code = status_code
+        super().__init__(self.message)
+
+
+class StageTimer:
+    """Records how long each stage of a chat turn takes, in milliseconds."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.timings: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Times the body of a `with` block as the stage `name`.
+
+        Args:
+            name (str): Name of the stage.
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = (time.perf_counter() - start) * 1000
+
+    def mark(self, name: str) -> None:
+        """Records the time elapsed since the start of the chat turn as `name`.
+
+        Args:
+            name (str): Name of the mark, e.g. "first_token".
+        """
+        self.timings[name] = (time.perf_counter() - self.start) * 1000
+
+    def total(self) -> Dict[str, float]:
+        """Returns the stage timings together with the total time so far.
+
+        Returns:
+            Dict[str, float]: Milliseconds spent per stage, and in total.
+        """
+        return {**self.timings, "total": (time.perf_counter() - self.start) * 1000}
+
+    def summary(self) -> str:
+        """Formats the timings for logging.
+
+        Returns:
+            str: The timings, e.g. "load=2.1ms, reply=4180.3ms".
+        """
+        return ", ".join(f"{name}={ms:.1f}ms" for name, ms in self.total().items())
+
+    def server_timing(self) -> str:
+        """Formats the timings as the value of a Server-Timing HTTP header.
+
+        Returns:
+            str: The header value, e.g. "load;dur=2.1, reply;dur=4180.3".
+        """
+        return ", ".join(
+            f"{name};dur={duration:.1f}" for name, duration in self.total().items()
+        )
+
+    def observe(self) -> None:
+        """Records the timings of a completed chat turn in the chat stage metrics."""
+        for name, duration in self.total().items():
+            CHAT_STAGE_SECONDS.labels(stage=name).observe(duration / 1000)
+
+
+class StreamModerator:
+    """Moderates a streamed reply at sentence boundaries while it is still being generated.
+
+    Each check covers the whole reply so far, so by the time the stream ends, the complete
+    reply has usually been checked already, or is being checked.
+    """
+
+    SENTENCE_ENDS = (".", "?", "!", "\n")
+
+    def __init__(self, llm: LLM, min_chars: int = MODERATION_CHUNK_CHARS):
+        self.llm = llm
+        self.min_chars = min_chars
+        self.checks: Dict[str, Future] = {}
+        self.pending: Optional[Future] = None
+        self.checked_len = 0
+
+    def feed(self, text: str) -> None:
+        """Starts moderating the reply so far if it ends a sentence, enough new text has
+        arrived and no other check is in flight.
+
+        Args:
+            text (str): The reply so far.
+        """
+        if self.pending and not self.pending.done():
+            return
+        if len(text) - self.checked_len < self.min_chars:
+            return
+        if not text.rstrip(" ").endswith(self.SENTENCE_ENDS):
+            return
+        self.pending = self.check(text)
+        self.checks[text] = self.pending
+        self.checked_len = len(text)
+
+    def check(self, text: str) -> Future:
+        """Starts moderating text on a worker thread.
+
+        Args:
+            text (str): Text to check.
+
+        Returns:
+            Future: A future holding the text, or a replacement.
+        """
+        return _submit(self.llm.moderate, text)
+
+    def moderate(self, text: str) -> str:
+        """Returns the complete reply, or a replacement if it or any part of it checked while
+        streaming is inappropriate.
+
+        Args:
+            text (str): The complete reply.
+
+        Returns:
+            str: The reply, or a replacement.
+        """
+        final = self.checks.get(text) or self.check(text)
+        for checked, check in self.checks.items():
+            moderated = check.result()
+            if moderated != checked:
+                return moderated
+        return final.result()
+
+
+class AsyncStreamModerator(StreamModerator):
+    """StreamModerator for the asyncio serving mode, whose checks run as tasks on the event loop."""
+
+    def check(self, text: str) -> asyncio.Task:
+        """Starts moderating text in a task.
+
+        Args:
+            text (str): Text to check.
+
+        Returns:
+            asyncio.Task: A task returning the text, or a replacement.
+        """
+        return asyncio.ensure_future(self.llm.amoderate(text))
+
+    async def amoderate(self, text: str) -> str:
+        """Coroutine version of moderate().
+
+        Args:
+            text (str): The complete reply.
+
+        Returns:
+            str: The reply, or a replacement.
+        """
+        final = self.checks.get(text) or self.check(text)
+        for checked, check in self.checks.items():
+            moderated = await check
+            if moderated != checked:
+                return moderated
+        return await final
+
+
+def load_chat_turn(survey_id: int, response_id: int) -> Dict[str, Any]:
+    """Loads the chat context, response object and messages of a response.
+
+    Args:
+        survey_id (int): Survey ID
+        response_id (int): Response ID
+
+    Raises:
+        ChatTurnError: Raised when the database is unavailable or the survey or response does not exist.
+
+    Returns:
+        Dict[str, Any]: See database_operations.fetch_chat_turn().
+    """
+    with database_operations.get_connection() as connection:
+        if not connection:
+            raise ChatTurnError("Failed to connect to the database")
+        try:
+            turn = database_operations.fetch_chat_turn(
+                connection, survey_id, response_id
+            )
+        except database_operations.DataBaseError as e:
+            raise ChatTurnError("An error occurred while fetching the chat") from e
+
+    if turn is None:
+        raise ChatTurnError("Survey not found", 404)
+    if not turn["response_object"]["answers"]:
+        raise ChatTurnError("Response not found", 404)
+    return turn
+
+
+def prepare_reply(
+    chat_context: str,
+    response_object: Dict[str, Any],
+    message_list: list[dict[str, str]],
+    user_input: str,
+    llm: LLM,
+    timer: StageTimer,
+) -> tuple[ChatLog, bool]:
+    """Prepares the chat log that the next assistant message is generated from.
+
+    If the chat has not started yet, the interview is first planned from the survey responses.
+
+    Args:
+        chat_context (str): Chat context of the survey.
+        response_object (Dict[str, Any]): The response being discussed.
+        message_list (list[dict[str, str]]): Messages so far, including the new user message.
+        user_input (str): The new user message.
+        llm (LLM): A large language model.
+        timer (StageTimer): Records the time spent planning.
+
+    Returns:
+        tuple[ChatLog, bool]: The chat log, and whether the reply should be moderated.
+    """
+    if not user_input.strip() and not message_list:
+        with timer.stage("plan"):
+            pipe = construct_chatlog(
+                f"{chat_context}\n{format_responses_for_gpt(response_object)}",
+                llm=llm,
+            )
+        return pipe, False
+    return ChatLog(message_list, llm=llm), True
+
+
+def stored_opening(turn: Dict[str, Any], user_input: str) -> Optional[Dict[str, Any]]:
+    """Returns the reply of the first chat turn if the interview was already planned, e.g.
+    by plan_interview() when the response was submitted.
+
+    Args:
+        turn (Dict[str, Any]): The chat turn loaded by load_chat_turn().
+        user_input (str): The user message. Empty to start the interview.
+
+    Returns:
+        Optional[Dict[str, Any]]: The reply (content, is_last, updated_message_list) with the
+            stored opening question, or None if the reply must be generated.
+    """
+    messages = turn["messages"]
+    if (
+        user_input.strip()
+        or len(messages) != ChatLog.MIN_LEN
+        or messages[-1]["role"] != "assistant"
+    ):
+        return None
+    return {
+        "content": messages[-1]["content"],
+        "is_last": False,
+        "updated_message_list": list(messages),
+    }
+
+
+# Planning is optional: a first chat turn that finds no plan plans the interview itself
+planning = background.BoundedExecutor("planning", PLANNING_WORKERS, PLANNING_QUEUE_SIZE)
+
+
+def plan_interview(
+    survey_id: int, response_id: int, llm: Optional[LLM] = None
+) -> Optional[list[dict[str, str]]]:
+    """Background job that plans the interview of a submitted response and generates its
+    opening question, so that the first chat turn can be served from storage.
+
+    If the chat has started in the meantime, nothing is stored. The primary key of
+    ChatMessages rejects the plan if a first chat turn stores its own plan first.
+
+    Args:
+        survey_id (int): Survey ID
+        response_id (int): Response ID
+        llm (LLM, optional): A large language model. Defaults to the shared GPT instance.
+
+    Raises:
+        ChatTurnError: Raised when the response cannot be loaded or the plan cannot be stored.
+
+    Returns:
+        Optional[list[dict[str, str]]]: The stored messages, or None if the chat had already started.
+    """
+    timer = StageTimer()
+    llm = llm or get_llm()
+    turn = load_chat_turn(survey_id, response_id)
+    if turn["messages"]:
+        return None
+
+    with usage_scope(**turn_scope(survey_id, response_id, turn)):
+        pipe, _ = prepare_reply(
+            turn["chat_context"], turn["response_object"], [], "", llm, timer
+        )
+        with timer.stage("reply"), usage_scope(call_site="reply"):
+            opening = llm.run(pipe.message_list, with_moderation=False)
+    messages = pipe.insert_and_update(opening, pipe.current_index, is_llm=True)
+
+    with database_operations.get_connection() as connection:
+        if not connection:
+            raise ChatTurnError("Failed to connect to the database")
+        try:
+            database_operations.append_chat_messages(
+                connection, survey_id, response_id, messages, 0
+            )
+        except database_operations.DataBaseError as e:
+            raise ChatTurnError("An error occurred while storing the plan") from e
+
+    logger.info(
+        f"Planned interview of response {response_id} of survey {survey_id} in "
+        + timer.summary()
+    )
+    return messages
+
+
+def turn_scope(
+    survey_id: int, response_id: int, turn: Dict[str, Any]
+) -> Dict[str, int]:
+    """Returns the fields that attribute the LLM calls of a chat turn in the usage ledger.
+
+    Args:
+        survey_id (int): Survey ID
+        response_id (int): Response ID
+        turn (Dict[str, Any]): The chat turn loaded by load_chat_turn().
+
+    Returns:
+        Dict[str, int]: The survey and response IDs, and the number of messages before the turn.
+    """
+    return {
+        "survey_id": int(survey_id),
+        "response_id": int(response_id),
+        "turn": len(turn["messages"]),
+    }
+
+
+def start_turn(
+    turn: Dict[str, Any], user_input: str, llm: LLM, timer: StageTimer
+) -> tuple[ChatLog, bool]:
+    """Appends the user message to the loaded messages and prepares the reply.
+
+    Args:
+        turn (Dict[str, Any]): The chat turn loaded by load_chat_turn().
+        user_input (str): The user message.
+        llm (LLM): A large language model.
+        timer (StageTimer): Records the time spent per stage.
+
+    Raises:
+        ChatTurnError: Raised when the interview cannot be planned.
+
+    Returns:
+        tuple[ChatLog, bool]: The chat log, and whether the reply should be moderated.
+    """
+    message_list = list(turn["messages"])
+    if user_input:
+        message_list.append({"role": "user", "content": user_input})
+    try:
+        return prepare_reply(
+            turn["chat_context"],
+            turn["response_object"],
+            message_list,
+            user_input,
+            llm,
+            timer,
+        )
+    except Exception as e:
+        raise ChatTurnError(
+            "An error was encountered while generating a reply: " + str(e)
+        ) from e
+
+
+def turn_context(pipe: ChatLog, turn: Dict[str, Any]) -> list[dict[str, str]]:
+    """Returns the messages the reply is generated from: the context window of the chat,
+    with older turns replaced by the stored summary. Logs the estimated prompt tokens
+    with and without the window.
+
+    Args:
+        pipe (ChatLog): The chat log the reply is generated from.
+        turn (Dict[str, Any]): The chat turn loaded by load_chat_turn().
+
+    Returns:
+        list[dict[str, str]]: The messages to send to the LLM.
+    """
+    context = window_messages(pipe.message_list, turn.get("summary"))
+    full, windowed = record_prompt(pipe.message_list, context)
+    logger.info(f"Prompt tokens (estimated): {full} full, {windowed} windowed")
+    return context
+
+
+def summarise_chat(
+    survey_id: int,
+    response_id: int,
+    message_list: list[dict[str, str]],
+    summary: Optional[Dict[str, Any]],
+    covered: int,
+    llm: LLM,
+) -> Optional[Dict[str, Any]]:
+    """Background job that folds the messages that fell out of the context window into the
+    summary of the chat, and stores it. Skipped while another update of the chat is running.
+
+    Args:
+        survey_id (int): Survey ID
+        response_id (int): Response ID
+        message_list (list[dict[str, str]]): All messages of the chat.
+        summary (Dict[str, Any], optional): The summary the turn was generated with, or None.
+        covered (int): The number of messages the new summary covers.
+        llm (LLM): A large language model.
+
+    Raises:
+        ChatTurnError: Raised when the database is unavailable.
+
+    Returns:
+        Optional[Dict[str, Any]]: The new summary, or None if the update was skipped.
+    """
+    key = (survey_id, response_id)
+    with _folding_lock:
+        if key in _folding:
+            return None
+        _folding.add(key)
+    try:
+        updated = fold(message_list, summary, covered, llm)
+        with database_operations.get_connection() as connection:
+            if not connection:
+                raise ChatTurnError("Failed to connect to the database")
+            database_operations.save_chat_summary(
+                connection,
+                survey_id,
+                response_id,
+                updated["content"],
+                updated["covered"],
+            )
+        return updated
+    finally:
+        with _folding_lock:
+            _folding.discard(key)
+
+
+def get_exit_check_llm(llm: LLM) -> LLM:
+    """Returns the LLM that decides whether the interview is over.
+
+    Args:
+        llm (LLM): The LLM that generates the replies.
+
+    Returns:
+        LLM: The shared GPT instance of EXIT_CHECK_MODEL if it is set, otherwise llm.
+    """
+    return get_llm(EXIT_CHECK_MODEL) if EXIT_CHECK_MODEL else llm
+
+
+def resolve_reply(
+    pipe: ChatLog,
+    reply: str,
+    moderate: Optional[Callable[[str], str]],
+    llm: LLM,
+    timer: StageTimer,
+    summary: Optional[Dict[str, Any]] = None,
+) -> tuple[list[dict[str, str]], bool]:
+    """Moderates the reply, adds it to the chat and decides whether the interview is over.
+    The exit check sees the same context window as the reply.
+
+    How the exit check runs is configured by EXIT_CHECK_MODE:
+        "parallel": the exit check runs on a worker thread while the reply is moderated.
+        "serial": the exit check runs after the reply is moderated.
+        "off": no exit check, the interview only ends after ChatLog.MAX_LEN messages.
+
+    Args:
+        pipe (ChatLog): The chat log the reply was generated from.
+        reply (str): The unmoderated assistant message.
+        moderate (Callable[[str], str], optional): Returns the reply, or a replacement if it is inappropriate.
+            None if the reply should not be moderated.
+        llm (LLM): A large language model.
+        timer (StageTimer): Records the time spent per stage.
+        summary (Dict[str, Any], optional): The stored summary of the chat. Defaults to None.
+
+    Returns:
+        tuple[list[dict[str, str]], bool]: The updated list of messages, and whether the interview is over.
+    """
+    updated_message_list = pipe.insert_and_update(
+        reply, pipe.current_index, is_llm=True
+    )
+    context = window_messages(updated_message_list, summary)
+    if EXIT_CHECK_MODE == "off":
+        if moderate:
+            with timer.stage("moderation"):
+                updated_message_list[-1]["content"] = moderate(reply)
+        return updated_message_list, len(updated_message_list) > ChatLog.MAX_LEN
+
+    exit_llm = get_exit_check_llm(llm)
+    if EXIT_CHECK_MODE == "serial":
+        if moderate:
+            with timer.stage("moderation"):
+                updated_message_list[-1]["content"] = moderate(reply)
+        with timer.stage("exit_check"):
+            return updated_message_list, check_exit(
+                updated_message_list, exit_llm, context=context
+            )
+
+    with timer.stage("exit_check"):
+        is_last = _submit(
+            check_exit, list(updated_message_list), exit_llm, context=list(context)
+        )
+        if moderate:
+            with timer.stage("moderation"):
+                moderated = moderate(reply)
+            if moderated != reply:
+                # A refusal never ends the interview
+                is_last.cancel()
+                updated_message_list[-1]["content"] = moderated
+                return updated_message_list, False
+        return updated_message_list, is_last.result()
+
+
+async def aresolve_reply(
+    pipe: ChatLog,
+    reply: str,
+    moderate: Optional[Callable[[str], Awaitable[str]]],
+    llm: LLM,
+    timer: StageTimer,
+    summary: Optional[Dict[str, Any]] = None,
+) -> tuple[list[dict[str, str]], bool]:
+    """Coroutine version of resolve_reply(). In "parallel" mode, the exit check runs in a
+    task on the event loop while the reply is moderated.
+
+    Args:
+        pipe (ChatLog): The chat log the reply was generated from.
+        reply (str): The unmoderated assistant message.
+        moderate (Callable[[str], Awaitable[str]], optional): Returns the reply, or a replacement
+            if it is inappropriate. None if the reply should not be moderated.
+        llm (LLM): A large language model.
+        timer (StageTimer): Records the time spent per stage.
+        summary (Dict[str, Any], optional): The stored summary of the chat. Defaults to None.
+
+    Returns:
+        tuple[list[dict[str, str]], bool]: The updated list of messages, and whether the interview is over.
+    """
+    updated_message_list = pipe.insert_and_update(
+        reply, pipe.current_index, is_llm=True
+    )
+    context = window_messages(updated_message_list, summary)
+    if EXIT_CHECK_MODE == "off":
+        if moderate:
+            with timer.stage("moderation"):
+                updated_message_list[-1]["content"] = await moderate(reply)
+        return updated_message_list, len(updated_message_list) > ChatLog.MAX_LEN
+
+    exit_llm = get_exit_check_llm(llm)
+    if EXIT_CHECK_MODE == "serial":
+        if moderate:
+            with timer.stage("moderation"):
+                updated_message_list[-1]["content"] = await moderate(reply)
+        with timer.stage("exit_check"):
+            return updated_message_list, await acheck_exit(
+                updated_message_list, exit_llm, context=context
+            )
+
+    with timer.stage("exit_check"):
+        is_last = asyncio.ensure_future(
+            acheck_exit(list(updated_message_list), exit_llm, context=list(context))
+        )
+        if moderate:
+            with timer.stage("moderation"):
+                moderated = await moderate(reply)
+            if moderated != reply:
+                # A refusal never ends the interview
+                is_last.cancel()
+                updated_message_list[-1]["content"] = moderated
+                return updated_message_list, False
+        return updated_message_list, await is_last
+
+
+def finish_turn(
+    survey_id: int,
+    response_id: int,
+    turn: Dict[str, Any],
+    pipe: ChatLog,
+    reply: str,
+    moderate: Optional[Callable[[str], str]],
+    llm: LLM,
+    timer: StageTimer,
+) -> Dict[str, Any]:
+    """Adds the reply to the chat, checks whether the interview is over and persists the new messages.
+    Once enough turns have fallen out of the context window, they are folded into the summary
+    of the chat in the background. If the first turn loses the race to store the interview
+    plan against plan_interview(), the stored plan is returned instead.
+
+    Args:
+        survey_id (int): Survey ID
+        response_id (int): Response ID
+        turn (Dict[str, Any]): The chat turn loaded by load_chat_turn().
+        pipe (ChatLog): The chat log the reply was generated from.
+        reply (str): The unmoderated assistant message.
+        moderate (Callable[[str], str], optional): Moderates the reply. None if the reply should not be moderated.
+        llm (LLM): A large language model.
+        timer (StageTimer): Records the time spent per stage.
+
+    Raises:
+        ChatTurnError: Raised when the moderation, the exit check or the database write fails.
+
+    Returns:
+        Dict[str, Any]: The reply (content, is_last, updated_message_list).
+    """
+    try:
+        updated_message_list, is_last = resolve_reply(
+            pipe, reply, moderate, llm, timer, turn.get("summary")
+        )
+    except Exception as e:
+        raise ChatTurnError(
+            "An error was encountered while generating a reply: " + str(e)
+        ) from e
+    return persist_turn(
+        survey_id, response_id, turn, updated_message_list, is_last, llm, timer
+    )
+
+
+async def afinish_turn(
+    survey_id: int,
+    response_id: int,
+    turn: Dict[str, Any],
+    pipe: ChatLog,
+    reply: str,
+    moderate: Optional[Callable[[str], Awaitable[str]]],
+    llm: LLM,
+    timer: StageTimer,
+) -> Dict[str, Any]:
+    """Coroutine version of finish_turn(). The messages are persisted on a worker thread.
+
+    Args:
+        survey_id (int): Survey ID
+        response_id (int): Response ID
+        turn (Dict[str, Any]): The chat turn loaded by load_chat_turn().
+        pipe (ChatLog): The chat log the reply was generated from.
+        reply (str): The unmoderated assistant message.
+        moderate (Callable[[str], Awaitable[str]], optional): Moderates the reply. None if the reply should not be moderated.
+        llm (LLM): A large language model.
+        timer (StageTimer): Records the time spent per stage.
+
+    Raises:
+        ChatTurnError: Raised when the moderation, the exit check or the database write fails.
+
+    Returns:
+        Dict[str, Any]: The reply (content, is_last, updated_message_list).
+    """
+    try:
+        updated_message_list, is_last = await aresolve_reply(
+            pipe, reply, moderate, llm, timer, turn.get("summary")
+        )
+    except Exception as e:
+        raise ChatTurnError(
+            "An error was encountered while generating a reply: " + str(e)
+        ) from e
+    return await asyncio.to_thread(
+        persist_turn,
+        survey_id,
+        response_id,
+        turn,
+        updated_message_list,
+        is_last,
+        llm,
+        timer,
+    )
+
+
+def persist_turn(
+    survey_id: int,
+    response_id: int,
+    turn: Dict[str, Any],
+    updated_message_list: list[dict[str, str]],
+    is_last: bool,
+    llm: LLM,
+    timer: StageTimer,
+) -> Dict[str, Any]:
+    """Persists the new messages of a chat turn, and folds the turns that fell out of the
+    context window into the summary of the chat in the background.
+
+    Args:
+        survey_id (int): Survey ID
+        response_id (int): Response ID
+        turn (Dict[str, Any]): The chat turn loaded by load_chat_turn().
+        updated_message_list (list[dict[str, str]]): All messages, ending with the moderated reply.
+        is_last (bool): Whether the interview is over.
+        llm (LLM): A large language model.
+        timer (StageTimer): Records the time spent per stage.
+
+    Raises:
+        ChatTurnError: Raised when the database write fails.
+
+    Returns:
+        Dict[str, Any]: The reply (content, is_last, updated_message_list).
+    """
+    summary = turn.get("summary")
+    stored = len(turn["messages"])
+    persist_error = None
+    with timer.stage("persist"):
+        with database_operations.get_connection() as connection:
+            if not connection:
+                raise ChatTurnError("Failed to connect to the database")
+            try:
+                database_operations.append_chat_messages(
+                    connection,
+                    survey_id,
+                    response_id,
+                    updated_message_list[stored:],
+                    stored,
+                )
+            except Exception as e:
+                persist_error = e
+    if persist_error:
+        # The plan of the response may have been stored while this turn planned its own
+        opening = (
+            stored_opening(load_chat_turn(survey_id, response_id), "")
+            if not stored
+            else None
+        )
+        if opening:
+            return opening
+        raise ChatTurnError(
+            "An error occurred while updating the chat log"
+        ) from persist_error
+
+    covered = fold_point(updated_message_list, summary)
+    if covered:
+        background.submit(
+            summarise_chat,
+            survey_id,
+            response_id,
+            list(updated_message_list),
+            summary,
+            covered,
+            llm,
+        )
+
+    return {
+        "content": updated_message_list[-1]["content"],
+        "is_last": is_last,
+        "updated_message_list": updated_message_list,
+    }
+
+
+def run_chat_turn(
+    survey_id: int,
+    response_id: int,
+    user_input: str,
+    llm: Optional[LLM] = None,
+) -> tuple[Dict[str, Any], StageTimer]:
+    """Runs one turn of the interview.
+
+    The state of the response is loaded with one query, and the user message and the
+    assistant reply are persisted together with one insert. No database connection
+    is held while the LLM is generating.
+
+    Args:
+        survey_id (int): Survey ID
+        response_id (int): Response ID
+        user_input (str): The user message. Empty to start the interview.
+        llm (LLM, optional): A large language model. Defaults to the shared GPT instance.
+
+    Raises:
+        ChatTurnError: Raised when the chat turn cannot be completed.
+
+    Returns:
+        tuple[Dict[str, Any], StageTimer]: The reply (content, is_last, updated_message_list)
+            and the per-stage timings.
+    """
+    timer = StageTimer()
+    llm = llm or get_llm()
+
+    with timer.stage("load"):
+        turn = load_chat_turn(survey_id, response_id)
+    opening = stored_opening(turn, user_input)
+    if opening:
+        return opening, timer
+
+    with usage_scope(**turn_scope(survey_id, response_id, turn)):
+        with CHAT_TURNS_IN_FLIGHT.labels(mode="json").track_inprogress():
+            pipe, with_moderation = start_turn(turn, user_input, llm, timer)
+            try:
+                with timer.stage("reply"), usage_scope(call_site="reply"):
+                    reply = llm.run(turn_context(pipe, turn), with_moderation=False)
+            except Exception as e:
+                raise ChatTurnError(
+                    "An error was encountered while generating a reply: " + str(e)
+                ) from e
+
+            moderate = llm.moderate if with_moderation else None
+            result = finish_turn(
+                survey_id, response_id, turn, pipe, reply, moderate, llm, timer
+            )
+    timer.observe()
+    return result, timer
+
+
+def stream_chat_turn(
+    survey_id: int,
+    response_id: int,
+    user_input: str,
+    llm: Optional[LLM] = None,
+) -> Iterator[tuple[str, Dict[str, Any]]]:
+    """Runs one turn of the interview, streaming the reply as it is generated.
+
+    The chat is loaded before this function returns, so that a missing survey or
+    response raises ChatTurnError instead of starting a stream. The returned iterator
+    yields ("token", {"content": ...}) events while the LLM generates, then a single
+    ("done", reply) event once the reply has been moderated and persisted, where reply
+    has the same fields as the reply of run_chat_turn(). If the moderated reply differs
+    from the streamed tokens, the content of the "done" event replaces them. Errors
+    after the stream has started are yielded as ("error", {"message": ...}) events.
+
+    Args:
+        survey_id (int): Survey ID
+        response_id (int): Response ID
+        user_input (str): The user message. Empty to start the interview.
+        llm (LLM, optional): A large language model. Defaults to the shared GPT instance.
+
+    Raises:
+        ChatTurnError: Raised when the chat cannot be loaded.
+
+    Returns:
+        Iterator[tuple[str, Dict[str, Any]]]: Event names and data.
+    """
+    timer = StageTimer()
+    llm = llm or get_llm()
+
+    with timer.stage("load"):
+        turn = load_chat_turn(survey_id, response_id)
+
+    def events() -> Iterator[tuple[str, Dict[str, Any]]]:
+        opening = stored_opening(turn, user_input)
+        if opening:
+            yield "token", {"content": opening["content"]}
+            yield "done", opening
+            return
+
+        try:
+            with usage_scope(
+                **turn_scope(survey_id, response_id, turn)
+            ), CHAT_TURNS_IN_FLIGHT.labels(mode="stream").track_inprogress():
+                pipe, with_moderation = start_turn(turn, user_input, llm, timer)
+                moderator = StreamModerator(llm) if with_moderation else None
+                chunks = []
+                try:
+                    with timer.stage("reply"), usage_scope(call_site="reply"):
+                        for chunk in llm.stream(turn_context(pipe, turn)):
+                            if not chunks:
+                                timer.mark("first_token")
+                            chunks.append(chunk)
+                            if moderator:
+                                moderator.feed("".join(chunks))
+                            yield "token", {"content": chunk}
+                except Exception as e:
+                    raise ChatTurnError(
+                        "An error was encountered while generating a reply: " + str(e)
+                    ) from e
+
+                result = finish_turn(
+                    survey_id,
+                    response_id,
+                    turn,
+                    pipe,
+                    "".join(chunks),
+                    moderator.moderate if moderator else None,
+                    llm,
+                    timer,
+                )
+        except ChatTurnError as e:
+            logger.error(str(e.__cause__ or e.message))
+            yield "error", {"message": e.message}
+            return
+
+        timer.observe()
+        logger.info("Reply streamed successfully in " + timer.summary())
+        yield "done", result
+
+    return events()
+
+
+async def arun_chat_turn(
+    survey_id: int,
+    response_id: int,
+    user_input: str,
+    llm: Optional[LLM] = None,
+) -> tuple[Dict[str, Any], StageTimer]:
+    """Coroutine version of run_chat_turn(), for the asyncio serving mode.
+
+    The LLM calls are awaited on the event loop, so a waiting chat turn does not hold a
+    thread. The short database calls, and planning an interview that was not planned when
+    the response was submitted, run on worker threads.
+
+    Args:
+        survey_id (int): Survey ID
+        response_id (int): Response ID
+        user_input (str): The user message. Empty to start the interview.
+        llm (LLM, optional): A large language model. Defaults to the shared GPT instance.
+
+    Raises:
+        ChatTurnError: Raised when the chat turn cannot be completed.
+
+    Returns:
+        tuple[Dict[str, Any], StageTimer]: The reply (content, is_last, updated_message_list)
+            and the per-stage timings.
+    """
+    timer = StageTimer()
+    llm = llm or get_llm()
+
+    with timer.stage("load"):
+        turn = await asyncio.to_thread(load_chat_turn, survey_id, response_id)
+    opening = stored_opening(turn, user_input)
+    if opening:
+        return opening, timer
+
+    with usage_scope(**turn_scope(survey_id, response_id, turn)):
+        with CHAT_TURNS_IN_FLIGHT.labels(mode="async").track_inprogress():
+            pipe, with_moderation = await asyncio.to_thread(
+                start_turn, turn, user_input, llm, timer
+            )
+            try:
+                with timer.stage("reply"), usage_scope(call_site="reply"):
+                    reply = await llm.arun(
+                        turn_context(pipe, turn), with_moderation=False
+                    )
+            except Exception as e:
+                raise ChatTurnError(
+                    "An error was encountered while generating a reply: " + str(e)
+                ) from e
+
+            moderate = llm.amoderate if with_moderation else None
+            result = await afinish_turn(
+                survey_id, response_id, turn, pipe, reply, moderate, llm, timer
+            )
+    timer.observe()
+    return result, timer
+
+
+async def astream_chat_turn(
+    survey_id: int,
+    response_id: int,
+    user_input: str,
+    llm: Optional[LLM] = None,
+) -> AsyncIterator[tuple[str, Dict[str, Any]]]:
+    """Coroutine version of stream_chat_turn(), for the asyncio serving mode.
+
+    Args:
+        survey_id (int): Survey ID
+        response_id (int): Response ID
+        user_input (str): The user message. Empty to start the interview.
+        llm (LLM, optional): A large language model. Defaults to the shared GPT instance.
+
+    Raises:
+        ChatTurnError: Raised when the chat cannot be loaded.
+
+    Returns:
+        AsyncIterator[tuple[str, Dict[str, Any]]]: Event names and data, see stream_chat_turn().
+    """
+    timer = StageTimer()
+    llm = llm or get_llm()
+
+    with timer.stage("load"):
+        turn = await asyncio.to_thread(load_chat_turn, survey_id, response_id)
+
+    async def events() -> AsyncIterator[tuple[str, Dict[str, Any]]]:
+        opening = stored_opening(turn, user_input)
+        if opening:
+            yield "token", {"content": opening["content"]}
+            yield "done", opening
+            return
+
+        try:
+            with usage_scope(
+                **turn_scope(survey_id, response_id, turn)
+            ), CHAT_TURNS_IN_FLIGHT.labels(mode="async_stream").track_inprogress():
+                pipe, with_moderation = await asyncio.to_thread(
+                    start_turn, turn, user_input, llm, timer
+                )
+                moderator = AsyncStreamModerator(llm) if with_moderation else None
+                chunks = []
+                try:
+                    with timer.stage("reply"), usage_scope(call_site="reply"):
+                        async for chunk in llm.astream(turn_context(pipe, turn)):
+                            if not chunks:
+                                timer.mark("first_token")
+                            chunks.append(chunk)
+                            if moderator:
+                                moderator.feed("".join(chunks))
+                            yield "token", {"content": chunk}
+                except Exception as e:
+                    raise ChatTurnError(
+                        "An error was encountered while generating a reply: " + str(e)
+                    ) from e
+
+                result = await afinish_turn(
+                    survey_id,
+                    response_id,
+                    turn,
+                    pipe,
+                    "".join(chunks),
+                    moderator.amoderate if moderator else None,
+                    llm,
+                    timer,
+                )
+        except ChatTurnError as e:
+            logger.error(str(e.__cause__ or e.message))
+            yield "error", {"message": e.message}
+            return
+
+        timer.observe()
+        logger.info("Reply streamed successfully in " + timer.summary())
+        yield "done", result
+
+    return events()
+
+
+def format_event(event: str, data: Dict[str, Any]) -> str:
+    """Formats an event as a Server-Sent Events message.
+
+    Args:
+        event (str): Event name.
+        data (Dict[str, Any]): Event data, sent as JSON.
+
+    Returns:
+        str: The Server-Sent Events message.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Headers of a reply streamed as Server-Sent Events
+STREAM_HEADERS = {
+    "Content-Type": "text/event-stream; charset=utf-8",
+    "Cache-Control": "no-cache",
+    "X-Accel-Buffering": "no",
+}
+
+
+class ChatResponse(NamedTuple):
+    """The HTTP response to a chat message, built the same way by the Flask app and by the
+    asyncio serving mode."""
+
+    status: int
+    headers: Dict[str, str]
+    # JSON data of the response, unless the reply is streamed
+    data: Any = None
+    # Server-Sent Events messages of a streamed reply, an Iterator[str] from
+    # chat_response() or an AsyncIterator[str] from achat_response()
+    events: Any = None
+
+
+def chat_message_content(body: bytes) -> Optional[str]:
+    """Returns the content of the message in the body of a chat message request.
+
+    Args:
+        body (bytes): The request body, a JSON object with the content of the message.
+
+    Returns:
+        Optional[str]: The content, or None if the body has none.
+    """
+    try:
+        data = json.loads(body or b"null")
+    except ValueError:
+        return None
+    if not isinstance(data, dict) or "content" not in data:
+        return None
+    return data["content"]
+
+
+def chat_response(
+    survey_id: str, response_id: str, body: bytes, stream: str
+) -> ChatResponse:
+    """Runs the chat turn of a chat message request and builds its response.
+
+    Args:
+        survey_id (str): Survey ID
+        response_id (str): Response ID
+        body (bytes): The request body, see chat_message_content().
+        stream (str): The stream query parameter. With "true", the reply is streamed
+            as Server-Sent Events.
+
+    Returns:
+        ChatResponse: The response.
+    """
+    content = chat_message_content(body)
+    if content is None:
+        logger.info("Missing content")
+        return ChatResponse(400, {}, {"message": "Missing content"})
+    try:
+        if stream.lower() == "true":
+            events = stream_chat_turn(survey_id, response_id, content)
+            return ChatResponse(
+                201,
+                STREAM_HEADERS,
+                events=(format_event(event, data) for event, data in events),
+            )
+        reply, timer = run_chat_turn(survey_id, response_id, content)
+    except ChatTurnError as e:
+        return _error_response(e)
+    return _reply_response(reply, timer)
+
+
+async def achat_response(
+    survey_id: str, response_id: str, body: bytes, stream: str
+) -> ChatResponse:
+    """Coroutine version of chat_response(), for the asyncio serving mode. The events of
+    a streamed reply must be closed with aclose() once they are sent.
+
+    Args:
+        survey_id (str): Survey ID
+        response_id (str): Response ID
+        body (bytes): The request body, see chat_message_content().
+        stream (str): The stream query parameter, see chat_response().
+
+    Returns:
+        ChatResponse: The response.
+    """
+    content = chat_message_content(body)
+    if content is None:
+        logger.info("Missing content")
+        return ChatResponse(400, {}, {"message": "Missing content"})
+    try:
+        if stream.lower() == "true":
+            events = await astream_chat_turn(survey_id, response_id, content)
+            return ChatResponse(201, STREAM_HEADERS, events=_aformat_events(events))
+        reply, timer = await arun_chat_turn(survey_id, response_id, content)
+    except ChatTurnError as e:
+        return _error_response(e)
+    return _reply_response(reply, timer)
+
+
+def _error_response(e: ChatTurnError) -> ChatResponse:
+    logger.error(str(e.__cause__ or e.message))
+    return ChatResponse(e.status_code, {}, {"message": e.message})
+
+
+def _reply_response(reply: Dict[str, Any], timer: StageTimer) -> ChatResponse:
+    logger.info("Reply generated successfully in " + timer.summary())
+    return ChatResponse(201, {"Server-Timing": timer.server_timing()}, reply)
+
+
+async def _aformat_events(
+    events: AsyncIterator[tuple[str, Dict[str, Any]]],
+) -> AsyncIterator[str]:
+    try:
+        async for event, data in events:
+            yield format_event(event, data)
+    finally:
+        await events.aclose()
@@ -9,13 +9,46 @@
 
 
 import json
+import logging
 import os
-from typing import Any, Dict, List, Optional, Tuple
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import pymysql
+from prometheus_client import Counter, Gauge, Histogram
 from pymysql.connections import Connection
 from pymysql.cursors import Cursor
-from src.llm_classes.llm_level import GPT
+from src import background, metrics
+from src.llm_classes.llm_level import get_llm
+from src.llm_classes.usage import usage_scope
+
+logger = logging.getLogger(__name__)
+
+DB_QUERY_SECONDS = Histogram(
+    "db_query_seconds",
+    "Duration of SQL queries.",
+    ["operation"],
+    buckets=metrics.DEFAULT_BUCKETS,
+)
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting for a pooled database connection.",
+    buckets=metrics.DEFAULT_BUCKETS,
+)
+DB_POOL_CONNECTIONS = Gauge(
+    "db_pool_connections",
+    "Connections of the database pools by state.",
+    ["state"],
+    multiprocess_mode="livesum",
+)
+DB_POOL_EVENTS = Counter(
+    "db_pool_events", "Lifetime counters of the database pools.", ["event"]
+)
 
 
 def connect_to_mysql() -> Optional[Connection]:
@@ -44,6 +77,285 @@ def connect_to_mysql() -> Optional[Connection]:
         raise e
 
 
+class ConnectionPool:
+    """A bounded, thread-safe pool of MySQL connections.
+
+    Connections are created lazily up to `max_size`. Idle connections are pinged
+    before being handed out if they have been idle for longer than
+    `health_check_interval` seconds, and are replaced once they are older than
+    `recycle` seconds. Callers wait at most `timeout` seconds for a free connection.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[], Connection] = None,
+        max_size: int = 10,
+        timeout: float = 5.0,
+        recycle: float = 3600.0,
+        health_check_interval: float = 30.0,
+    ):
+        """Initialises an empty connection pool.
+
+        Args:
+            factory (Callable[[], Connection], optional): Creates a new connection. Defaults to connect_to_mysql.
+            max_size (int, optional): Maximum number of open connections. Defaults to 10.
+            timeout (float, optional): Seconds to wait for a free connection. Defaults to 5.0.
+            recycle (float, optional): Seconds after which a connection is replaced. Defaults to 3600.0.
+            health_check_interval (float, optional): Idle seconds after which a connection is pinged. Defaults to 30.0.
+        """
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        self.factory = factory or connect_to_mysql
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.health_check_interval = health_check_interval
+
+        self._lock = threading.Condition()
+        self._idle = deque()  # (connection, created_at, last_used)
+        self._created_at = {}  # id(connection) -> created_at
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._stats = {
+            "checkouts": 0,
+            "timeouts": 0,
+            "created": 0,
+            "recycled": 0,
+            "failed_health_checks": 0,
+        }
+
+    def acquire(self, timeout: Optional[float] = None) -> Connection:
+        """Borrow a connection from the pool, creating one if the pool is not full.
+
+        Args:
+            timeout (float, optional): Seconds to wait for a free connection. Defaults to the pool timeout.
+
+        Raises:
+            PoolTimeoutError: Raised when no connection becomes available in time.
+
+        Returns:
+            Connection: A healthy connection that must be given back with release().
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise PoolTimeoutError("Connection pool is closed")
+                if self._idle:
+                    connection, created_at, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # Reserve a slot and create the connection outside the lock
+                    self._size += 1
+                    connection = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._count("timeouts")
+                    raise PoolTimeoutError(
+                        f"Timed out after {timeout}s waiting for a database connection"
+                    )
+                self._waiting += 1
+                self._lock.wait(remaining)
+                self._waiting -= 1
+
+        if connection is not None:
+            # The slot stays reserved while a stale connection is replaced
+            now = time.monotonic()
+            if now - created_at > self.recycle:
+                self._close_quietly(connection)
+                self._count("recycled")
+                connection = None
+            elif now - last_used > self.health_check_interval and not self._ping(
+                connection
+            ):
+                self._close_quietly(connection)
+                self._count("failed_health_checks")
+                connection = None
+
+        if connection is None:
+            try:
+                connection = self.factory()
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                    self._lock.notify()
+                raise
+            with self._lock:
+                self._created_at[id(connection)] = time.monotonic()
+            self._count("created")
+
+        self._count("checkouts")
+        return connection
+
+    def release(self, connection: Connection) -> None:
+        """Give a borrowed connection back to the pool.
+
+        Any uncommitted work is rolled back so that the next borrower starts with a
+        clean transaction and does not read from a stale snapshot.
+
+        Args:
+            connection (Connection): The connection obtained from acquire().
+        """
+        try:
+            connection.rollback()
+            healthy = True
+        except Exception:
+            healthy = False
+
+        with self._lock:
+            if healthy and not self._closed:
+                created_at = self._created_at.get(id(connection), time.monotonic())
+                self._idle.append((connection, created_at, time.monotonic()))
+                self._lock.notify()
+                return
+        self._discard(connection)
+
+    def close(self) -> None:
+        """Close every idle connection and refuse further checkouts."""
+        with self._lock:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._lock.notify_all()
+        for connection, _, _ in idle:
+            self._discard(connection)
+
+    def metrics(self) -> Dict[str, int]:
+        """Returns a snapshot of the pool size and usage counters.
+
+        Returns:
+            Dict[str, int]: Pool size, in-use, idle and waiting counts and lifetime counters.
+        """
+        with self._lock:
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "in_use": self._size - len(self._idle),
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                **self._stats,
+            }
+
+    def _ping(self, connection: Connection) -> bool:
+        try:
+            connection.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _count(self, stat: str) -> None:
+        with self._lock:
+            self._stats[stat] += 1
+        DB_POOL_EVENTS.labels(event=stat).inc()
+
+    def _close_quietly(self, connection: Connection) -> None:
+        with self._lock:
+            self._created_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _discard(self, connection: Connection) -> None:
+        self._close_quietly(connection)
+        with self._lock:
+            self._size -= 1
+            self._lock.notify()
+
+
+_pool: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Returns the process-wide connection pool, creating it on first use.
+
+    The pool is configured through the API_MYSQL_POOL_SIZE, API_MYSQL_POOL_TIMEOUT,
+    API_MYSQL_POOL_RECYCLE and API_MYSQL_POOL_HEALTH_CHECK environment variables.
+
+    Returns:
+        ConnectionPool: The shared connection pool.
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    max_size=int(os.environ.get("API_MYSQL_POOL_SIZE", "10")),
+                    timeout=float(os.environ.get("API_MYSQL_POOL_TIMEOUT", "5")),
+                    recycle=float(os.environ.get("API_MYSQL_POOL_RECYCLE", "3600")),
+                    health_check_interval=float(
+                        os.environ.get("API_MYSQL_POOL_HEALTH_CHECK", "30")
+                    ),
+                )
+    return _pool
+
+
+@contextmanager
+def get_connection() -> Iterator[Optional[Connection]]:
+    """
+    Borrow a connection from the shared pool for the duration of a `with` block.
+
+    Yields None if no connection could be obtained, so that callers can keep
+    reporting "Failed to connect to the database" instead of raising.
+
+    Yields:
+        pymysql.connections.Connection or None: A pooled connection, or None on failure.
+    """
+    pool = get_pool()
+    try:
+        with metrics.timed(DB_POOL_WAIT_SECONDS, "db"):
+            connection = pool.acquire()
+    except Exception as e:
+        logger.error(f"Failed to obtain a database connection: {e}")
+        connection = None
+    record_pool_metrics(pool)
+    try:
+        yield connection
+    finally:
+        if connection:
+            pool.release(connection)
+            record_pool_metrics(pool)
+
+
+def reset_pool() -> None:
+    """
+    Forgets the shared connection pool, so that the next call to get_pool() creates a new
+    one, e.g. in a forked worker process. Its connections are not closed, since after a fork
+    they belong to the parent process.
+    """
+    global _pool
+    with _pool_lock:
+        _pool = None
+
+
+def pool_metrics() -> Dict[str, int]:
+    """
+    Returns the size and usage counters of the shared connection pool.
+
+    Returns:
+        Dict[str, int]: See ConnectionPool.metrics().
+    """
+    return get_pool().metrics()
+
+
+def record_pool_metrics(pool: ConnectionPool) -> None:
+    """
+    Copies the size of a connection pool into the metrics, as it changes when a
+    connection is borrowed or given back. Its lifetime counters are counted as they happen.
+
+    Args:
+        pool (ConnectionPool): The connection pool.
+    """
+    snapshot = pool.metrics()
+    for state in ("max_size", "size", "in_use", "idle", "waiting"):
+        DB_POOL_CONNECTIONS.labels(state=state).set(snapshot[state])
+
+
 def get_cursor(connection: Connection) -> Cursor:
     """
     Returns a cursor object associated with the provided database connection.
@@ -100,9 +412,10 @@ def execute(connection: Connection, query: str, params: Optional[tuple] = None)
         params (tuple, optional): Optional parameters to be used in the query (default is None).
     """
     try:
-        with connection.cursor() as cursor:
-            cursor.execute(query, params)
-            commit(connection)  # Commit changes after successful execution
+        with metrics.timed(DB_QUERY_SECONDS.labels(operation="execute"), "db"):
+            with connection.cursor() as cursor:
+                cursor.execute(query, params)
+                commit(connection)  # Commit changes after successful execution
     except Exception as e:
         # Roll back changes if execution fails
         rollback(connection)
@@ -124,13 +437,40 @@ def fetch(
         List[dict]: A list of dictionaries representing the fetched results.
     """
     try:
-        with connection.cursor() as cursor:
-            cursor.execute(query, params)
-            return cursor.fetchall()
+        with metrics.timed(DB_QUERY_SECONDS.labels(operation="fetch"), "db"):
+            with connection.cursor() as cursor:
+                cursor.execute(query, params)
+                return cursor.fetchall()
     except Exception as e:
         raise DataBaseError("Error while fetching from SQL!", e) from None
 
 
+def stream(
+    connection: Connection, query: str, params: Optional[tuple] = None
+) -> Iterator[dict]:
+    """
+    Execute a SQL query with an unbuffered cursor, and yield the results as they are
+    received from the server, so that they are never all held in memory.
+
+    The connection cannot run other queries until the iterator is exhausted or closed.
+
+    Args:
+        connection (pymysql.connections.Connection): The database connection to execute the query.
+        query (str): The SQL query to execute.
+        params (tuple, optional): Optional parameters to be used in the query (default is None).
+
+    Yields:
+        dict: The fetched rows.
+    """
+    try:
+        with connection.cursor(pymysql.cursors.SSDictCursor) as cursor:
+            with metrics.timed(DB_QUERY_SECONDS.labels(operation="stream"), "db"):
+                cursor.execute(query, params)
+            yield from cursor
+    except Exception as e:
+        raise DataBaseError("Error while streaming from SQL!", e) from None
+
+
 def close_cursor(cursor: Cursor) -> None:
     """
     Close the provided cursor if it's open.
@@ -146,6 +486,13 @@ def close_cursor(cursor: Cursor) -> None:
 
 
 # create_survey
+# Status of the summarised chat context of a survey
+SUMMARY_PENDING = "pending"
+SUMMARY_READY = "ready"
+SUMMARY_FAILED = "failed"
+SUMMARY_MAX_LEN = 1500
+
+
 def summarise(chat_context: str) -> str:
     """
     Summarize the provided chat context text.
@@ -169,10 +516,11 @@ def summarise(chat_context: str) -> str:
         },
     ]
 
-    MAX_LEN = 1500
+    MAX_LEN = SUMMARY_MAX_LEN
     if len(chat_context) > MAX_LEN:
-        llm = GPT()
-        output = llm.run(SUMMARISE_DEFAULT, with_moderation=False)
+        llm = get_llm()
+        with usage_scope(call_site="summarise"):
+            output = llm.run(SUMMARISE_DEFAULT, with_moderation=False)
         output = output[:MAX_LEN]
         return output
     else:
@@ -222,6 +570,10 @@ def create_survey(connection: Connection, data: dict) -> int:
     """
     Create a new survey in the database based on the provided survey data.
 
+    The survey is committed with the raw chat context. Chat contexts longer than
+    SUMMARY_MAX_LEN are summarised by a background job, which fills in the
+    summarised_context column and sets summary_status to "ready" once done.
+
     Args:
         connection (pymysql.connections.Connection): The database connection.
         data (dict): The survey data to be inserted into the database.
@@ -232,48 +584,94 @@ def create_survey(connection: Connection, data: dict) -> int:
     try:
         # Insert survey data into Surveys table
         insert_survey_query = """
-            INSERT INTO Surveys (title, subtitle, admin_username, created_at, chat_context)
-            VALUES (%s, %s, %s, %s, %s)
+            INSERT INTO Surveys (title, subtitle, admin_username, created_at, chat_context, summarised_context, summary_status)
+            VALUES (%s, %s, %s, %s, %s, %s, %s)
         """
+        chat_context = data["chat_context"]
+        needs_summary = len(chat_context) > SUMMARY_MAX_LEN
         survey_data = (
             data["title"],
             data["subtitle"],
             data["metadata"]["created_by"],
             data["metadata"]["created_at"],
-            summarise(data["chat_context"]),
+            chat_context,
+            None if needs_summary else chat_context,
+            SUMMARY_PENDING if needs_summary else SUMMARY_READY,
         )
-        cursor = connection.cursor()
-        cursor.execute(insert_survey_query, survey_data)
-
-        # Get the ID of the inserted survey
-        survey_id = cursor.lastrowid
-
-        # Insert questions into Questions table
-        for question in data["questions"]:
-            insert_question_query = """
-                INSERT INTO Questions (question_id, survey_id, question, question_type, options)
-                VALUES (%s, %s, %s, %s, %s)
-            """
-            question_data = (
-                question["question_id"],
-                survey_id,
-                question["question"],
-                question["type"],
-                (
-                    json.dumps(question.get("options", []))
-                    if "options" in question
-                    else None
-                ),
-            )
-            cursor.execute(insert_question_query, question_data)
+        with metrics.timed(DB_QUERY_SECONDS.labels(operation="transaction"), "db"):
+            cursor = connection.cursor()
+            cursor.execute(insert_survey_query, survey_data)
+
+            # Get the ID of the inserted survey
+            survey_id = cursor.lastrowid
+
+            # Insert questions into Questions table
+            for question in data["questions"]:
+                insert_question_query = """
+                    INSERT INTO Questions (question_id, survey_id, question, question_type, options)
+                    VALUES (%s, %s, %s, %s, %s)
+                """
+                question_data = (
+                    question["question_id"],
+                    survey_id,
+                    question["question"],
+                    question["type"],
+                    (
+                        json.dumps(question.get("options", []))
+                        if "options" in question
+                        else None
+                    ),
+                )
+                cursor.execute(insert_question_query, question_data)
+
+            # Commit changes and close cursor
+            connection.commit()
+            cursor.close()
+    except Exception as e:
+        raise DataBaseError("Error while creating survey", e) from None
 
-        # Commit changes and close cursor
-        connection.commit()
-        cursor.close()
+    # Summarise outside of the transaction, after the connection is free again
+    if needs_summary:
+        background.submit(summarise_survey_context, survey_id, chat_context)
 
-        return survey_id
+    return survey_id
+
+
+# create_survey()
+# Background job to summarise the chat context of a new survey
+def summarise_survey_context(survey_id: int, chat_context: str) -> str:
+    """
+    Summarise the chat context of a survey and store the summary.
+
+    Runs outside of any request, so it borrows its own connection from the pool
+    only once the summary is ready.
+
+    Args:
+        survey_id (int): The ID of the survey.
+        chat_context (str): The raw chat context of the survey.
+
+    Returns:
+        str: The summary status stored for the survey.
+    """
+    try:
+        with usage_scope(survey_id=survey_id):
+            summary, status = summarise(chat_context), SUMMARY_READY
     except Exception as e:
-        raise DataBaseError("Error while creating survey", e) from None
+        logger.error(f"Failed to summarise chat context of survey {survey_id}: {e}")
+        summary, status = None, SUMMARY_FAILED
+
+    update_query = """
+        UPDATE Surveys SET summarised_context = %s, summary_status = %s
+        WHERE survey_id = %s
+    """
+    with get_connection() as connection:
+        if not connection:
+            raise DataBaseError(
+                "Error while saving summarised context",
+                "Failed to connect to the database",
+            )
+        execute(connection, update_query, (summary, status, survey_id))
+    return status
 
 
 # get_surveys()
@@ -295,6 +693,7 @@ def create_survey_object(row: Dict[str, Any]) -> Dict[str, Any]:
             "created_at": row["created_at"].strftime(
                 "%Y-%m-%d %H:%M:%S"
             ),  # Convert to string
+            "summary_status": row["summary_status"],
         },
         "title": row["title"],
         "subtitle": row["subtitle"],
@@ -333,11 +732,111 @@ def append_question_to_survey(
     )
 
 
+# get_surveys()
+# Helper function to fetch one page of surveys
+def fetch_survey_page(
+    connection: Connection,
+    limit: int,
+    after: Optional[int] = None,
+    admin_username: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Fetch a page of surveys with their questions, newest first.
+
+    The LIMIT is applied to the surveys in a derived table before the questions are
+    joined, and the page starts after a survey ID rather than at an offset, so that the
+    cost of a page does not grow with the number of surveys.
+
+    Args:
+        connection (Connection): The database connection.
+        limit (int): The maximum number of surveys in the page.
+        after (int, optional): Only fetch surveys older than this survey ID, i.e. the
+            cursor of the previous page. Defaults to None, which fetches the first page.
+        admin_username (str, optional): Only fetch surveys created by this admin. Defaults to None.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], Optional[int]]: The survey objects, and the cursor of the
+            next page, or None if this is the last page.
+    """
+    conditions, params = [], []
+    if admin_username is not None:
+        conditions.append("admin_username = %s")
+        params.append(admin_username)
+    if after is not None:
+        conditions.append("survey_id < %s")
+        params.append(after)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    # One survey more than the page, to tell whether there is a next page
+    query = f"""
+    SELECT Surveys.*, Questions.*
+    FROM (
+        SELECT survey_id FROM Surveys {where}
+        ORDER BY survey_id DESC LIMIT %s
+    ) AS page
+    INNER JOIN Surveys ON Surveys.survey_id = page.survey_id
+    LEFT JOIN Questions ON Surveys.survey_id = Questions.survey_id
+    ORDER BY Surveys.survey_id DESC, Questions.question_id
+    """
+    try:
+        rows = fetch(connection, query, tuple(params) + (limit + 1,))
+    except Exception as e:
+        raise DataBaseError("Error while fetching surveys", e) from None
+
+    # Group survey data by survey ID and collect questions
+    survey_objects = {}
+    next_cursor = None
+    for row in rows:
+        survey_id = row["survey_id"]
+        if survey_id not in survey_objects:
+            if len(survey_objects) == limit:
+                next_cursor = list(survey_objects)[-1]
+                break
+            survey_objects[survey_id] = create_survey_object(row)
+        if row["question_id"] is not None:  # Check if there's a question associated
+            append_question_to_survey(survey_objects, survey_id, row)
+
+    return list(survey_objects.values()), next_cursor
+
+
+# get_survey()
+# Helper function to fetch a survey with its questions
+def fetch_survey(connection: Connection, survey_id: int) -> Optional[Dict[str, Any]]:
+    """
+    Fetch a survey with its questions.
+
+    Args:
+        connection (Connection): The database connection.
+        survey_id (int): The ID of the survey.
+
+    Returns:
+        Optional[Dict[str, Any]]: The survey object, or None if there is no such survey.
+    """
+    query = """
+    SELECT Surveys.*, Questions.*
+    FROM Surveys
+    LEFT JOIN Questions ON Surveys.survey_id = Questions.survey_id
+    WHERE Surveys.survey_id = %s
+    ORDER BY Questions.question_id
+    """
+    try:
+        rows = fetch(connection, query, (survey_id,))
+    except Exception as e:
+        raise DataBaseError("Error while fetching survey", e) from None
+    if not rows:
+        return None
+
+    survey_objects = {survey_id: create_survey_object(rows[0])}
+    for row in rows:
+        if row["question_id"] is not None:  # Check if there's a question associated
+            append_question_to_survey(survey_objects, survey_id, row)
+    return survey_objects[survey_id]
+
+
 # submit_response()
 # Helper function to insert response data into DB
 def save_response_to_database(
     connection: Connection, data: Dict[str, Any], survey_id: int
-) -> int:
+) -> Optional[int]:
     """
     Save the survey response data to the database.
 
@@ -346,49 +845,89 @@ def save_response_to_database(
         data (Dict[str, Any]): The survey response data to be saved.
         survey_id (int): The ID of the survey for which the response is being saved.
 
+    Raises:
+        DataBaseError: Raised when the response cannot be saved.
+
     Returns:
-        int: The ID of the newly saved response.
+        Optional[int]: The ID of the newly saved response, or None if the survey does
+            not exist.
     """
     try:
-        query = """
-        SELECT MAX(response_id) FROM Survey_Responses WHERE survey_id = %s
-        """
-
-        # Execute the query with the survey ID as a parameter
-        result = fetch(connection, query, (survey_id,))
-
-        # If there are no results or the result is None, return 1
-        if not result or result[0]["MAX(response_id)"] is None:
-            last_response_id = 0
-        else:
-            # Extract the last response ID and return it
-            last_response_id = result[0]["MAX(response_id)"]
-
-        # Increment the last response_id by 1 to generate a new response_id
-        new_response_id = last_response_id + 1
-
-        # Save each question's response to the database
-        for answer in data["answers"]:
-            survey_id = data["metadata"]["survey_id"]
-            question_id = answer["question_id"]
-            answer_text = json.dumps(answer["answer"]) if "options" in answer else None
-
-            # Insert the survey response into the database with the new_response_id
-            query = """
-                INSERT INTO Survey_Responses (response_id, survey_id, question_id, answer, submitted_at)
-                VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
-            """
-            params = (new_response_id, survey_id, question_id, answer_text)
-            execute(connection, query, params)
-
-        # Commit the transaction
-        connection.commit()
+        answers = data["answers"]
+        with metrics.timed(DB_QUERY_SECONDS.labels(operation="transaction"), "db"):
+            with connection.cursor() as cursor:
+                new_response_id = allocate_response_id(cursor, survey_id)
+                if new_response_id is None:
+                    rollback(connection)
+                    return None
+
+                # Save every question's response in one multi-row INSERT
+                if answers:
+                    rows = ", ".join(
+                        ["(%s, %s, %s, %s, CURRENT_TIMESTAMP)"] * len(answers)
+                    )
+                    query = f"""
+                        INSERT INTO Survey_Responses (response_id, survey_id, question_id, answer, submitted_at)
+                        VALUES {rows}
+                    """
+                    params = []
+                    for answer in answers:
+                        answer_text = (
+                            json.dumps(answer["answer"])
+                            if "options" in answer
+                            else None
+                        )
+                        params += [
+                            new_response_id,
+                            survey_id,
+                            answer["question_id"],
+                            answer_text,
+                        ]
+                    cursor.execute(query, params)
+
+            # Commit the allocation and the answers together
+            connection.commit()
 
         return new_response_id
     except Exception as e:
+        rollback(connection)
         raise DataBaseError("Error while saving response!", e) from None
 
 
+# submit_response()
+# Helper function to allocate a response ID
+def allocate_response_id(cursor: Cursor, survey_id: int) -> Optional[int]:
+    """
+    Atomically allocate the next response ID of a survey.
+
+    The survey's counter row is incremented in place, so concurrent submitters are
+    serialised on the row lock until their transaction commits and never receive
+    the same ID. LAST_INSERT_ID(expr) returns the new value to this connection only,
+    without another round-trip.
+
+    Args:
+        cursor (Cursor): A cursor of the connection whose transaction saves the response.
+        survey_id (int): The ID of the survey for which the response is being saved.
+
+    Returns:
+        Optional[int]: The newly allocated response ID, or None if the survey does not
+            exist.
+    """
+    query = """
+        UPDATE Surveys SET last_response_id = LAST_INSERT_ID(last_response_id + 1)
+        WHERE survey_id = %s
+    """
+    cursor.execute(query, (survey_id,))
+    if cursor.rowcount != 1:
+        return None
+    return cursor.lastrowid
+
+
+# The question types, and the keys of each answer, of a response object
+QUESTION_TYPES = ("multiple_choice", "multiple_response", "free_response")
+ANSWER_KEYS = ("question_id", "type", "question", "options", "answer")
+
+
 def validate_response_object(response_data: dict[str, Any]) -> tuple[bool, str]:
     """
     Validate a response object to ensure it follows a specific format.
@@ -400,8 +939,6 @@ def validate_response_object(response_data: dict[str, Any]) -> tuple[bool, str]:
         Tuple[bool, str]: A tuple containing a boolean indicating whether the response object is valid
                          and a message describing the result.
     """
-    question_types = ["multiple_choice", "multiple_response", "free_response"]
-
     if not isinstance(response_data, dict):
         return False, "Response data must be a dictionary"
 
@@ -421,11 +958,10 @@ def validate_response_object(response_data: dict[str, Any]) -> tuple[bool, str]:
         if not isinstance(answer, dict):
             return False, "Each answer must be a dictionary"
 
-        keys = ["question_id", "type", "question", "options", "answer"]
-        for key in keys:
+        for key in ANSWER_KEYS:
             if key not in answer:
                 return False, f"Each answer must contain '{key}' key"
-            elif key == "type" and (answer[key] not in question_types):
+            elif key == "type" and (answer[key] not in QUESTION_TYPES):
                 return False, f"Invalid question type"
 
         if not isinstance(answer["question_id"], int):
@@ -448,13 +984,108 @@ def validate_response_object(response_data: dict[str, Any]) -> tuple[bool, str]:
     return True, "Response object format is valid"
 
 
+# submit_response()
+# Helper class to validate response data against a survey
+class ResponseValidator:
+    """
+    The checks of validate_response() compiled for one survey: its questions indexed by
+    question ID, with their options as sets. A validator is built once per survey and
+    cached with it (see survey_cache), so validating a response takes one lookup per
+    answer and one per option, rather than a search of every question for every answer.
+    """
+
+    def __init__(self, survey_object: dict[str, Any]):
+        """
+        Compile the checks for a survey object.
+
+        Args:
+            survey_object (Dict[str, Any]): The survey object against which to validate responses.
+        """
+        survey_questions = survey_object.get("questions", [])
+        self.question_count = len(survey_questions)
+        # question_id -> (type, question, options, number of options, is multiple choice)
+        self.questions: Dict[Any, Tuple[str, str, Any, int, bool]] = {}
+        for question in survey_questions:
+            options = question.get("options") or []
+            try:
+                option_set = frozenset(options)
+            except TypeError:  # Options that cannot be hashed are searched in the list
+                option_set = options
+            # The first question with an ID is the one matched, as in a search of the list
+            self.questions.setdefault(
+                question["question_id"],
+                (
+                    question["type"],
+                    question["question"],
+                    option_set,
+                    len(options),
+                    question["type"] == "multiple_choice",
+                ),
+            )
+
+    def validate(self, response_data: dict[str, Any]) -> Optional[str]:
+        """
+        Validate a response object, which has passed validate_response_object().
+
+        Args:
+            response_data (Dict[str, Any]): The response object to validate.
+
+        Returns:
+            Optional[str]: A message indicating any validation errors, or None if the response is valid.
+        """
+        response_questions = response_data.get("answers", [])
+
+        # Check if the number of questions match
+        if len(response_questions) != self.question_count:
+            return "Number of questions in response does not match survey"
+
+        for response_question in response_questions:
+            question_id = response_question["question_id"]
+            # Find the corresponding question in the survey
+            matching_survey_question = self.questions.get(question_id)
+            if matching_survey_question is None:
+                return f"Question with ID {question_id} not found in survey"
+            question_type, question, options, option_count, multiple_choice = (
+                matching_survey_question
+            )
+
+            # Check if the type matches
+            if response_question["type"] != question_type:
+                return f"Question type mismatch for question with ID {question_id}"
+
+            # Check if the question matches
+            if response_question["question"] != question:
+                return f"Question text mismatch for question with ID {question_id}"
+
+            # If the question type is 'multiple_choice', check if the options match
+            if multiple_choice:
+                response_options = response_question.get("options", [])
+                # Check if the number of options match
+                if len(response_options) != option_count:
+                    return (
+                        f"Number of options mismatch for question with ID {question_id}"
+                    )
+                # Check if each option in the response exists in the survey question's options
+                for option in response_options:
+                    try:
+                        found = option in options
+                    except TypeError:  # e.g. a list, which is never an option
+                        found = False
+                    if not found:
+                        return f"Option '{option}' not found in question with ID {question_id}'s options"
+
+        # If all checks pass, the response object is valid
+        return None
+
+
 # submit_response()
 # Helper function to validate response data structure
 def validate_response(
     response_data: dict[str, Any], survey_object: dict[str, Any]
 ) -> Optional[str]:
     """
-    Validate a response object against a survey object.
+    Validate a response object against a survey object. To validate many responses to
+    a survey, build its ResponseValidator once instead.
 
     Args:
         response_data (Dict[str, Any]): The response object to validate.
@@ -463,49 +1094,7 @@ def validate_response(
     Returns:
         Optional[str]: A message indicating any validation errors, or None if the response is valid.
     """
-    response_questions = response_data.get("answers", [])
-    survey_questions = survey_object.get("questions", [])
-
-    # Check if the number of questions match
-    if len(response_questions) != len(survey_questions):
-        return "Number of questions in response does not match survey"
-
-    # Iterate through each question in the response
-    for response_question in response_questions:
-        # Find the corresponding question in the survey
-        matching_survey_question = next(
-            (
-                question
-                for question in survey_questions
-                if question["question_id"] == response_question["question_id"]
-            ),
-            None,
-        )
-        if not matching_survey_question:
-            return f"Question with ID {response_question['question_id']} not found in survey"
-
-        # Check if the type matches
-        if response_question["type"] != matching_survey_question["type"]:
-            return f"Question type mismatch for question with ID {response_question['question_id']}"
-
-        # Check if the question matches
-        if response_question["question"] != matching_survey_question["question"]:
-            return f"Question text mismatch for question with ID {response_question['question_id']}"
-
-        # If the question type is 'multiple_choice', check if the options match
-        if response_question["type"] == "multiple_choice":
-            # Check if the number of options match
-            if len(response_question.get("options", [])) != len(
-                matching_survey_question.get("options", [])
-            ):
-                return f"Number of options mismatch for question with ID {response_question['question_id']}"
-            # Check if each option in the response exists in the survey question's options
-            for option in response_question.get("options", []):
-                if option not in matching_survey_question.get("options", []):
-                    return f"Option '{option}' not found in question with ID {response_question['question_id']}'s options"
-
-    # If all checks pass, the response object is valid
-    return None
+    return ResponseValidator(survey_object).validate(response_data)
 
 
 # get_responses()
@@ -542,7 +1131,6 @@ def append_answer_to_response(
     response_objects: dict[int, dict[str, Any]],
     response_id: int,
     response_data: dict[str, Any],
-    chat_log_data: dict[str, Any],
 ) -> None:
     """
     Append an answer to the response object identified by the provided response ID.
@@ -551,7 +1139,6 @@ def append_answer_to_response(
         response_objects (Dict[int, Dict[str, Any]]): A dictionary containing response objects indexed by response ID.
         response_id (int): The ID of the response to which the answer will be appended.
         response_data (Dict[str, Any]): The data of the answer to be appended to the response.
-        chat_log_data (Dict[str, Any]): The chat log history to be append to the response
 
     Returns:
         None
@@ -568,48 +1155,230 @@ def append_answer_to_response(
         ),
     }
     response_objects[response_id]["answers"].append(answer)
-    if chat_log_data:
-        chat_log = json.loads(chat_log_data[0]["chat_log"])
-        # Extract the list of messages
-        messages = chat_log["messages"]
-        response_objects[response_id]["messages"] = messages[3:]
 
 
-# send_chat_message()
-# Helper function to fetch the chat_context from Surveys
-def fetch_chat_context(connection: Connection, survey_id: int) -> str:
+# Number of leading chat messages (system prompts and generated interview questions)
+# that are not shown to admins
+HIDDEN_CHAT_MESSAGES = 3
+
+
+# get_responses()
+# Helper function to fetch the chat logs of many responses in one query
+def fetch_chat_logs(
+    connection: Connection,
+    survey_id: int,
+    response_ids: Optional[List[int]] = None,
+) -> Dict[int, List[dict[str, str]]]:
     """
-    Fetch the chat context associated with a survey from the database.
+    Fetch the chat messages of a survey's responses in a single query.
 
     Args:
         connection (Connection): The database connection.
-        survey_id (int): The ID of the survey for which to fetch the chat context.
+        survey_id (int): The ID of the survey.
+        response_ids (List[int], optional): Only fetch the chat logs of these responses.
+            Defaults to None, which fetches the chat logs of every response to the survey.
 
     Returns:
-        str: The chat context associated with the survey.
+        Dict[int, List[Dict[str, str]]]: The chat messages of each response, indexed by response ID.
     """
     try:
-        # Fetch chat context from the database
-        chat_context_query = """
-        SELECT chat_context FROM Surveys WHERE survey_id = %s
+        query = """
+        SELECT response_id, role, content FROM ChatMessages
+        WHERE survey_id = %s AND seq >= %s
         """
-        result = fetch(connection, chat_context_query, (survey_id,))
-        # Check if chat context exists
-        if not result:
-            raise
+        params = (survey_id, HIDDEN_CHAT_MESSAGES)
+        if response_ids is not None:
+            if not response_ids:
+                return {}
+            placeholders = ", ".join(["%s"] * len(response_ids))
+            query += f" AND response_id IN ({placeholders})"
+            params += tuple(response_ids)
+        query += " ORDER BY response_id, seq"
+
+        chat_logs = {}
+        for row in fetch(connection, query, params):
+            chat_logs.setdefault(row["response_id"], []).append(
+                {"role": row["role"], "content": row["content"]}
+            )
+        return chat_logs
+    except Exception as e:
+        raise DataBaseError("Error while fetching chat logs", e) from None
+
 
-        # If chat context exists, return it
-        result = result[0]["chat_context"]
-        return result
+# get_responses()
+# Helper function to attach the fetched chat logs to response objects
+def attach_chat_logs(
+    response_objects: dict[int, dict[str, Any]],
+    chat_logs: Dict[int, List[dict[str, str]]],
+) -> None:
+    """
+    Attach each response's chat messages to its response object.
+
+    Args:
+        response_objects (Dict[int, Dict[str, Any]]): A dictionary containing response objects indexed by response ID.
+        chat_logs (Dict[int, List[Dict[str, str]]]): Chat messages indexed by response ID, from fetch_chat_logs().
+
+    Returns:
+        None
+    """
+    for response_id, response_object in response_objects.items():
+        if response_id in chat_logs:
+            response_object["messages"] = chat_logs[response_id]
+
+
+# get_responses()
+# Helper function to fetch one page of responses
+def fetch_response_page(
+    connection: Connection,
+    survey_id: int,
+    limit: int,
+    after: Optional[int] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+    """
+    Fetch a page of responses to a survey with their answers and chat messages, in the
+    order they were submitted.
+
+    The LIMIT is applied to the response IDs in a derived table, which reads the
+    (survey_id, response_id) index, before the answers are joined. The page starts after
+    a response ID rather than at an offset, so that the cost of a page does not grow
+    with the number of responses.
+
+    Args:
+        connection (Connection): The database connection.
+        survey_id (int): The ID of the survey.
+        limit (int): The maximum number of responses in the page.
+        after (int, optional): Only fetch responses after this response ID, i.e. the cursor
+            of the previous page. Defaults to None, which fetches the first page.
+
+    Returns:
+        Tuple[List[Dict[str, Any]], Optional[int]]: The response objects, and the cursor of
+            the next page, or None if this is the last page.
+    """
+    # One response more than the page, to tell whether there is a next page
+    query = """
+    SELECT sr.response_id, sr.submitted_at, sr.question_id, q.question_type, q.question, q.options, sr.answer
+    FROM (
+        SELECT DISTINCT response_id FROM Survey_Responses
+        WHERE survey_id = %s AND response_id > %s
+        ORDER BY response_id LIMIT %s
+    ) AS page
+    INNER JOIN Survey_Responses sr ON sr.survey_id = %s AND sr.response_id = page.response_id
+    INNER JOIN Questions q ON sr.question_id = q.question_id AND sr.survey_id = q.survey_id
+    ORDER BY sr.response_id, sr.question_id
+    """
+    try:
+        rows = fetch(connection, query, (survey_id, after or 0, limit + 1, survey_id))
+
+        # Create response objects dictionary
+        response_objects = {}
+        next_cursor = None
+        for row in rows:
+            response_id = row["response_id"]
+            if response_id not in response_objects:
+                if len(response_objects) == limit:
+                    next_cursor = list(response_objects)[-1]
+                    break
+                response_objects[response_id] = create_response_object(
+                    survey_id, response_id, row
+                )
+            append_answer_to_response(response_objects, response_id, row)
+
+        # Retrieve the chat logs of the page in one query
+        chat_logs = fetch_chat_logs(connection, survey_id, list(response_objects))
     except Exception as e:
-        raise DataBaseError("Error while fetching chat context!", e) from None
+        raise DataBaseError("Error while fetching responses", e) from None
+
+    attach_chat_logs(response_objects, chat_logs)
+    return list(response_objects.values()), next_cursor
+
+
+# export_responses()
+# Helper function to stream every response to a survey
+def stream_responses(
+    answers_connection: Connection,
+    messages_connection: Connection,
+    survey_id: int,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Stream the responses to a survey with their answers and chat messages, in the order
+    they were submitted.
+
+    The answers and the chat messages are read with unbuffered cursors on two connections,
+    both ordered by response ID, and merged as they arrive. Each response object is yielded
+    as soon as its last row has been read, so memory use does not grow with the number of
+    responses.
+
+    Args:
+        answers_connection (Connection): The database connection to read the answers with.
+        messages_connection (Connection): The database connection to read the chat messages with.
+        survey_id (int): The ID of the survey.
+
+    Raises:
+        DataBaseError: Raised when a query fails, possibly after responses have been yielded.
+
+    Yields:
+        Dict[str, Any]: The response objects.
+    """
+    answers = stream(
+        answers_connection,
+        """
+        SELECT sr.response_id, sr.submitted_at, sr.question_id, q.question_type, q.question, q.options, sr.answer
+        FROM Survey_Responses sr
+        INNER JOIN Questions q ON sr.question_id = q.question_id AND sr.survey_id = q.survey_id
+        WHERE sr.survey_id = %s
+        ORDER BY sr.response_id, sr.question_id
+        """,
+        (survey_id,),
+    )
+    messages = stream(
+        messages_connection,
+        """
+        SELECT response_id, role, content FROM ChatMessages
+        WHERE survey_id = %s AND seq >= %s
+        ORDER BY response_id, seq
+        """,
+        (survey_id, HIDDEN_CHAT_MESSAGES),
+    )
+    # Close both cursors before the connections are returned, even if the export stops early
+    try:
+        chat_logs = groupby(messages, key=itemgetter("response_id"))
+        chat_log = next(chat_logs, None)
+
+        for response_id, rows in groupby(answers, key=itemgetter("response_id")):
+            response_objects = {}
+            for row in rows:
+                if not response_objects:
+                    response_objects[response_id] = create_response_object(
+                        survey_id, response_id, row
+                    )
+                append_answer_to_response(response_objects, response_id, row)
+
+            # Skip the chat messages of responses without answers
+            while chat_log is not None and chat_log[0] < response_id:
+                chat_log = next(chat_logs, None)
+            if chat_log is not None and chat_log[0] == response_id:
+                response_objects[response_id]["messages"] = [
+                    {"role": row["role"], "content": row["content"]}
+                    for row in chat_log[1]
+                ]
+                chat_log = next(chat_logs, None)
+
+            yield response_objects[response_id]
+    finally:
+        answers.close()
+        messages.close()
 
 
 # send_chat_message()
-# Helper function to get the chatLog or create a new chatLog
-def get_chat_log(connection: Connection, survey_id: int, response_id: int) -> str:
+# Helper function to get the messages of a chat
+def get_chat_messages(
+    connection: Connection, survey_id: int, response_id: int
+) -> List[dict[str, str]]:
     """
-    Get the chat log associated with a survey and response from the database.
+    Get the chat messages associated with a survey and response from the database.
+
+    Chats that were stored as a single document in the legacy ChatLog table are
+    copied into ChatMessages the first time they are read.
 
     Args:
         connection (Connection): The database connection.
@@ -617,69 +1386,386 @@ def get_chat_log(connection: Connection, survey_id: int, response_id: int) -> st
         response_id (int): The ID of the response.
 
     Returns:
-        str: The chat log associated with the survey and response.
+        List[Dict[str, str]]: The messages of the chat, in order.
     """
     try:
-        # Check if chat log exists for the survey
+        chat_messages_query = """
+        SELECT role, content FROM ChatMessages
+        WHERE survey_id = %s AND response_id = %s
+        ORDER BY seq
+        """
+        result = fetch(connection, chat_messages_query, (survey_id, response_id))
+        if result:
+            return [{"role": row["role"], "content": row["content"]} for row in result]
+
+        # Fall back to a chat log that has not been migrated yet
         chat_log_query = """
         SELECT chat_log FROM ChatLog WHERE survey_id = %s AND response_id = %s
         """
         result = fetch(connection, chat_log_query, (survey_id, response_id))
-
-        # If chat log doesn't exist, create a new chat_log
         if not result:
-            insert_chat_log_query = """
-            INSERT INTO ChatLog (survey_id, response_id, chat_log, created_at) VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
-            """
-            # Define the initial chat log structure
-            initial_chat_log = {"messages": []}
-            initial_chat_log = json.dumps(initial_chat_log)
-            execute(
-                connection,
-                insert_chat_log_query,
-                (survey_id, response_id, initial_chat_log),
-            )
-            chat_log = initial_chat_log
-        else:
-            chat_log = result[0]["chat_log"]
+            return []
+        messages = json.loads(result[0]["chat_log"])["messages"]
+        append_chat_messages(connection, survey_id, response_id, messages, 0)
+        return messages
+
+    except Exception as e:
+        raise DataBaseError("Error while getting chat messages", e) from None
+
 
-        return chat_log  # Return chat log
+# send_chat_message()
+# Helper function to append messages to a chat
+def append_chat_messages(
+    connection: Connection,
+    survey_id: int,
+    response_id: int,
+    messages: List[dict[str, str]],
+    start_seq: int,
+) -> None:
+    """
+    Append messages to the chat associated with a survey and response.
+
+    The messages are inserted in one statement, so every turn costs a constant
+    amount of writes regardless of the length of the conversation. The primary key
+    on (survey_id, response_id, seq) rejects a concurrent write of the same turn.
 
+    Args:
+        connection (Connection): The database connection.
+        survey_id (int): The ID of the survey.
+        response_id (int): The ID of the response.
+        messages (List[Dict[str, str]]): The messages to append.
+        start_seq (int): The position of the first message in the chat, i.e. the current number of messages.
+    """
+    if not messages:
+        return
+    try:
+        rows = ", ".join(["(%s, %s, %s, %s, %s, CURRENT_TIMESTAMP)"] * len(messages))
+        insert_query = f"""
+        INSERT INTO ChatMessages (survey_id, response_id, seq, role, content, created_at)
+        VALUES {rows}
+        """
+        params = []
+        for seq, message in enumerate(messages, start=start_seq):
+            params += [survey_id, response_id, seq, message["role"], message["content"]]
+        execute(connection, insert_query, tuple(params))
     except Exception as e:
-        raise DataBaseError("Error while getting chat log", e) from None
+        raise DataBaseError("Error while appending chat messages", e) from None
 
 
 # send_chat_message()
-# Helper function update chat log
-def update_chat_log(
-    connection: Connection, survey_id: int, response_id: int, updated_chat_log: str
-) -> bool:
+# Helper function to load everything a chat turn needs in one query
+def fetch_chat_turn(
+    connection: Connection, survey_id: int, response_id: int
+) -> Optional[Dict[str, Any]]:
     """
-    Update the chat log associated with a survey and response in the database.
+    Fetch the chat context, response object and chat messages of a response in one query.
+
+    The answers and messages are aggregated into JSON arrays by MySQL, so a chat
+    turn needs a single round-trip to load its state. Chats that only exist as a
+    legacy ChatLog document are copied into ChatMessages.
 
     Args:
         connection (Connection): The database connection.
         survey_id (int): The ID of the survey.
         response_id (int): The ID of the response.
-        updated_chat_log (str): The updated chat log to be stored in the database.
 
     Returns:
-        bool: True if the chat log was successfully updated, False otherwise.
+        Optional[Dict[str, Any]]: A dictionary with the chat_context, response_object and messages
+            of the response, or None if the survey does not exist.
     """
     try:
-        # Update chat_log in the database
-        update_chat_log_query = """
-        UPDATE ChatLog SET chat_log = %s WHERE survey_id = %s AND response_id = %s
+        chat_turn_query = f"""
+        SELECT
+            COALESCE(s.summarised_context, LEFT(s.chat_context, {SUMMARY_MAX_LEN})) AS chat_context,
+            (
+                SELECT JSON_ARRAYAGG(JSON_OBJECT(
+                    'question_id', sr.question_id,
+                    'type', q.question_type,
+                    'question', q.question,
+                    'options', q.options,
+                    'answer', sr.answer,
+                    'submitted_at', DATE_FORMAT(sr.submitted_at, '%%Y-%%m-%%d %%H:%%i:%%s')
+                ))
+                FROM Survey_Responses sr
+                INNER JOIN Questions q ON sr.question_id = q.question_id AND sr.survey_id = q.survey_id
+                WHERE sr.survey_id = %s AND sr.response_id = %s
+            ) AS answers,
+            (
+                SELECT JSON_ARRAYAGG(JSON_OBJECT('seq', m.seq, 'role', m.role, 'content', m.content))
+                FROM ChatMessages m
+                WHERE m.survey_id = %s AND m.response_id = %s
+            ) AS messages,
+            (
+                SELECT c.chat_log FROM ChatLog c
+                WHERE c.survey_id = %s AND c.response_id = %s
+                LIMIT 1
+            ) AS legacy_chat_log,
+            (
+                SELECT JSON_OBJECT('content', cs.content, 'covered', cs.covered)
+                FROM ChatSummaries cs
+                WHERE cs.survey_id = %s AND cs.response_id = %s
+            ) AS summary
+        FROM Surveys s
+        WHERE s.survey_id = %s
         """
-        execute(
-            connection,
-            update_chat_log_query,
-            (updated_chat_log, survey_id, response_id),
+        params = (survey_id, response_id) * 4 + (survey_id,)
+        result = fetch(connection, chat_turn_query, params)
+        if not result:
+            return None
+        row = result[0]
+
+        answers = sorted(
+            json.loads(row["answers"] or "[]"), key=lambda a: a["question_id"]
         )
+        response_object = {
+            "metadata": {
+                "survey_id": int(survey_id),
+                "response_id": int(response_id),
+                "submitted_at": answers[0]["submitted_at"] if answers else None,
+            },
+            "answers": [
+                {
+                    "question_id": answer["question_id"],
+                    "type": answer["type"],
+                    "question": answer["question"],
+                    "options": answer["options"] or [],
+                    "answer": answer["answer"] or [],
+                }
+                for answer in answers
+            ],
+            "messages": [],
+        }
 
-        return True
+        if row["messages"]:
+            stored = sorted(json.loads(row["messages"]), key=lambda m: m["seq"])
+            messages = [{"role": m["role"], "content": m["content"]} for m in stored]
+        elif row["legacy_chat_log"]:
+            messages = json.loads(row["legacy_chat_log"])["messages"]
+            append_chat_messages(connection, survey_id, response_id, messages, 0)
+        else:
+            messages = []
+
+        return {
+            "chat_context": row["chat_context"],
+            "response_object": response_object,
+            "messages": messages,
+            "summary": json.loads(row["summary"]) if row.get("summary") else None,
+        }
     except Exception as e:
-        raise DataBaseError("Error while updating chat log", e) from None
+        raise DataBaseError("Error while fetching chat turn", e) from None
+
+
+# send_chat_message()
+# Helper function to store the summary of the older messages of a chat
+def save_chat_summary(
+    connection: Connection,
+    survey_id: int,
+    response_id: int,
+    content: str,
+    covered: int,
+) -> None:
+    """
+    Store the summary of the first messages of a chat.
+
+    A summary is only replaced by one that covers more messages, so that a slow
+    summary update cannot overwrite a newer one.
+
+    Args:
+        connection (Connection): The database connection.
+        survey_id (int): The ID of the survey.
+        response_id (int): The ID of the response.
+        content (str): The summary.
+        covered (int): The number of messages of the chat that the summary covers.
+    """
+    try:
+        upsert_query = """
+        INSERT INTO ChatSummaries (survey_id, response_id, covered, content, updated_at)
+        VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+        ON DUPLICATE KEY UPDATE
+            content = IF(VALUES(covered) > covered, VALUES(content), content),
+            updated_at = IF(VALUES(covered) > covered, VALUES(updated_at), updated_at),
+            covered = GREATEST(covered, VALUES(covered))
+        """
+        execute(connection, upsert_query, (survey_id, response_id, covered, content))
+    except Exception as e:
+        raise DataBaseError("Error while saving chat summary", e) from None
+
+
+# Usage ledger
+# Writes the batches of LLM usage records flushed by the ledger
+def save_llm_usage(records: List[Dict[str, Any]]) -> None:
+    """
+    Save a batch of LLM usage records with one insert.
+
+    Runs on the flushing thread of the usage ledger, so it borrows its own
+    connection from the pool.
+
+    Args:
+        records (List[Dict[str, Any]]): Usage records, see usage.UsageLedger.record().
+    """
+    if not records:
+        return
+    rows = ", ".join(["(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"] * len(records))
+    insert_query = f"""
+    INSERT INTO LLMUsage (survey_id, response_id, turn, call_site, model,
+        prompt_tokens, completion_tokens, cost_usd, latency_ms, created_at)
+    VALUES {rows}
+    """
+    params = []
+    for record in records:
+        params += [
+            record["survey_id"],
+            record["response_id"],
+            record["turn"],
+            record["call_site"],
+            record["model"],
+            record["prompt_tokens"],
+            record["completion_tokens"],
+            record["cost_usd"],
+            record["latency_ms"],
+            record["created_at"],
+        ]
+    with get_connection() as connection:
+        if not connection:
+            raise DataBaseError(
+                "Error while saving LLM usage", "Failed to connect to the database"
+            )
+        execute(connection, insert_query, tuple(params))
+
+
+# get_survey_usage()
+# Helper function to aggregate the LLM usage of a survey
+def fetch_survey_usage(
+    connection: Connection, survey_id: int, limit: int = 20
+) -> Dict[str, Any]:
+    """
+    Aggregate the LLM usage of a survey per call site and per response.
+
+    Args:
+        connection (Connection): The database connection.
+        survey_id (int): The ID of the survey.
+        limit (int, optional): Number of most expensive responses to return. Defaults to 20.
+
+    Returns:
+        Dict[str, Any]: Totals, totals per call site, and the most expensive responses.
+    """
+    try:
+        call_sites_query = f"""
+        SELECT call_site, {USAGE_TOTALS}
+        FROM LLMUsage WHERE survey_id = %s
+        GROUP BY call_site
+        """
+        responses_query = f"""
+        SELECT response_id, {USAGE_TOTALS}, MAX(turn) AS turns
+        FROM LLMUsage WHERE survey_id = %s AND response_id IS NOT NULL
+        GROUP BY response_id
+        ORDER BY cost_usd DESC, prompt_tokens DESC
+        LIMIT %s
+        """
+        call_sites = fetch(connection, call_sites_query, (survey_id,))
+        responses = fetch(connection, responses_query, (survey_id, limit))
+    except Exception as e:
+        raise DataBaseError("Error while fetching survey usage", e) from None
+
+    return {
+        "survey_id": int(survey_id),
+        "totals": sum_usage(call_sites),
+        "call_sites": {row.pop("call_site"): usage_row(row) for row in call_sites},
+        "responses": [usage_row(row) for row in responses],
+    }
+
+
+# get_response_usage()
+# Helper function to aggregate the LLM usage of a response
+def fetch_response_usage(
+    connection: Connection, survey_id: int, response_id: int
+) -> Dict[str, Any]:
+    """
+    Aggregate the LLM usage of a response per call site and per chat turn.
+
+    Args:
+        connection (Connection): The database connection.
+        survey_id (int): The ID of the survey.
+        response_id (int): The ID of the response.
+
+    Returns:
+        Dict[str, Any]: Totals, totals per call site, and totals per turn in chat order.
+    """
+    try:
+        call_sites_query = f"""
+        SELECT call_site, {USAGE_TOTALS}
+        FROM LLMUsage WHERE survey_id = %s AND response_id = %s
+        GROUP BY call_site
+        """
+        turns_query = f"""
+        SELECT turn, {USAGE_TOTALS}
+        FROM LLMUsage WHERE survey_id = %s AND response_id = %s
+        GROUP BY turn
+        ORDER BY turn
+        """
+        params = (survey_id, response_id)
+        call_sites = fetch(connection, call_sites_query, params)
+        turns = fetch(connection, turns_query, params)
+    except Exception as e:
+        raise DataBaseError("Error while fetching response usage", e) from None
+
+    return {
+        "survey_id": int(survey_id),
+        "response_id": int(response_id),
+        "totals": sum_usage(call_sites),
+        "call_sites": {row.pop("call_site"): usage_row(row) for row in call_sites},
+        "turns": [usage_row(row) for row in turns],
+    }
+
+
+USAGE_TOTALS = """COUNT(*) AS calls,
+        SUM(prompt_tokens) AS prompt_tokens,
+        SUM(completion_tokens) AS completion_tokens,
+        SUM(cost_usd) AS cost_usd,
+        AVG(latency_ms) AS latency_ms_avg"""
+
+
+def usage_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert the aggregates of a usage query from SQL decimals to JSON numbers.
+
+    Args:
+        row (Dict[str, Any]): A row of a usage query.
+
+    Returns:
+        Dict[str, Any]: The row, with integer counts and float cost and latency.
+    """
+    converted = dict(row)
+    for key in ("calls", "prompt_tokens", "completion_tokens", "turn", "turns"):
+        if converted.get(key) is not None:
+            converted[key] = int(converted[key])
+    for key in ("cost_usd", "latency_ms_avg"):
+        if key in converted:
+            converted[key] = float(converted[key] or 0)
+    return converted
+
+
+def sum_usage(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Add up the calls, tokens and cost of usage rows.
+
+    Args:
+        rows (List[Dict[str, Any]]): Rows of a usage query.
+
+    Returns:
+        Dict[str, Any]: Total calls, prompt and completion tokens, and cost.
+    """
+    rows = [usage_row(row) for row in rows]
+    return {
+        "calls": sum(row["calls"] for row in rows),
+        "prompt_tokens": sum(row["prompt_tokens"] for row in rows),
+        "completion_tokens": sum(row["completion_tokens"] for row in rows),
+        "cost_usd": sum(row["cost_usd"] for row in rows),
+    }
+
+
+class PoolTimeoutError(Exception):
+    """Raised when no pooled database connection becomes available in time."""
 
 
 class DataBaseError(Exception):
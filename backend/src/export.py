@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""
+    src.export
+    ~~~~~~~
+
+    This module implements the export formats of the responses to a survey.
+    Responses are encoded one at a time as they are read from the database, so
+    an export is streamed to the admin without holding the whole survey in
+    memory.
+"""
+
+
+import csv
+import io
+import json
+from typing import Any, Dict, Iterable, Iterator, List
+
+# Export formats, and the media type of each
+FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def ndjson_lines(responses: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    """Encodes response objects as newline-delimited JSON, one response per line.
+
+    Args:
+        responses (Iterable[Dict[str, Any]]): The response objects.
+
+    Yields:
+        str: A line for each response.
+    """
+    for response in responses:
+        yield json.dumps(response, ensure_ascii=False) + "\n"
+
+
+def csv_lines(
+    questions: List[Dict[str, Any]], responses: Iterable[Dict[str, Any]]
+) -> Iterator[str]:
+    """Encodes response objects as CSV, one response per row. After the response ID and
+    submission time, there is a column for each question of the survey, with the options
+    chosen separated by semicolons, and a last column with the chat transcript.
+
+    Args:
+        questions (List[Dict[str, Any]]): The questions of the survey, with "question_id"
+            and "question".
+        responses (Iterable[Dict[str, Any]]): The response objects.
+
+    Yields:
+        str: The header row, then a row for each response.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    def row(values: List[Any]) -> str:
+        writer.writerow(values)
+        line = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return line
+
+    question_ids = [question["question_id"] for question in questions]
+    yield row(
+        ["response_id", "submitted_at"]
+        + [question["question"] for question in questions]
+        + ["chat"]
+    )
+    for response in responses:
+        answers = {
+            answer["question_id"]: "; ".join(map(str, answer["answer"]))
+            for answer in response["answers"]
+        }
+        transcript = "\n".join(
+            f"{message['role']}: {message['content']}"
+            for message in response["messages"]
+        )
+        yield row(
+            [
+                response["metadata"]["response_id"],
+                response["metadata"]["submitted_at"],
+            ]
+            + [answers.get(question_id, "") for question_id in question_ids]
+            + [transcript]
+        )
@@ -1,7 +1,8 @@
 import random
+from typing import Optional
 
 from .exceptions import EmptyException, RoleException
-from .llm_level import GPT, LLM
+from .llm_level import LLM, get_llm
 
 
 class ChatLog:
@@ -51,7 +52,7 @@ class ChatLog:
     def __init__(
         self,
         message_list: list[dict[str, str]],
-        llm: LLM = GPT(),
+        llm: Optional[LLM] = None,
         from_start: bool = False,
         seed: int = random.randint(1, 9999),
     ):
@@ -61,7 +62,7 @@ class ChatLog:
 
         Args:
             message_list (list[dict[str, str]]): A list of messages, or a conversation.
-            llm (LLM, optional): A large language model. Defaults to gpt-4-turbo-preview.
+            llm (LLM, optional): A large language model. Defaults to the shared gpt-4-turbo-preview instance.
             from_start (bool, optional): Is initalising the chatlog with multi-stage system prompting. Defaults to False.
             seed (int, optional): random seed. Defaults to a random integer from 1 to 9998.
 
@@ -71,7 +72,7 @@ class ChatLog:
 
         self.message_list = message_list.copy()
         self.current_index = len(message_list)
-        self.llm = llm
+        self.llm = llm or get_llm()
         if not self.message_list:
             raise EmptyException
         if self.current_index == 1 and from_start:
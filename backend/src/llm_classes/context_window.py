@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+    src.llm_classes.context_window
+    ~~~~~~~
+
+    This module implements a rolling context window for long interviews. The
+    system prompts, the survey answers and the planned questions are always sent
+    to the LLM, together with the last turns of the interview. Older turns are
+    folded into a summary, which is updated incrementally and stored with the
+    chat, so that the prompt of a turn stops growing with the interview.
+"""
+
+
+import logging
+import os
+import threading
+from typing import Any, Dict, Optional
+
+from .llm_level import LLM
+from .usage import usage_scope
+
+logger = logging.getLogger(__name__)
+
+# Whether older turns are replaced by a summary
+CONTEXT_WINDOW = os.environ.get("CONTEXT_WINDOW", "true").lower() == "true"
+# Turns (an assistant and a user message) that are always sent verbatim
+CONTEXT_KEEP_TURNS = int(os.environ.get("CONTEXT_KEEP_TURNS", "6"))
+# Turns that must fall out of the window before they are folded into the summary
+CONTEXT_FOLD_TURNS = int(os.environ.get("CONTEXT_FOLD_TURNS", "4"))
+SUMMARY_MAX_CHARS = 2000
+
+# The system prompt with the survey answers, the planned questions and the interview instructions
+HEADER_LEN = 3
+
+SUMMARY_MESSAGE = """Summary of the earlier part of the interview, whose messages are not shown:
+{summary}"""
+
+SUMMARY_PROMPT = """Update the summary of an interview about a product with the new messages below.
+Keep every fact and opinion the user shared, and the questions that were already asked.
+Reply with the summary only, in less than 10 sentences.
+
+Summary so far:
+{summary}
+
+New messages:
+{transcript}"""
+
+_stats_lock = threading.Lock()
+_stats = {"turns": 0, "full_tokens": 0, "window_tokens": 0, "folds": 0}
+
+
+def estimate_tokens(messages: list[dict[str, str]]) -> int:
+    """Estimates the number of prompt tokens of a list of messages, at about 4 characters
+    per token and 4 tokens of formatting per message.
+
+    Args:
+        messages (list[dict[str, str]]): A list of messages.
+
+    Returns:
+        int: Estimated number of tokens.
+    """
+    return sum(len(message["content"]) // 4 + 4 for message in messages)
+
+
+def window_messages(
+    message_list: list[dict[str, str]], summary: Optional[Dict[str, Any]]
+) -> list[dict[str, str]]:
+    """Returns the messages sent to the LLM: the header of the chat, the summary of the
+    messages it covers, and the messages that follow.
+
+    Args:
+        message_list (list[dict[str, str]]): All messages of the chat.
+        summary (Dict[str, Any], optional): The stored summary of the chat, with its content
+            and the number of messages it covers. None if the chat has no summary yet.
+
+    Returns:
+        list[dict[str, str]]: The messages to send to the LLM.
+    """
+    if (
+        not CONTEXT_WINDOW
+        or not summary
+        or not HEADER_LEN < summary["covered"] <= len(message_list)
+    ):
+        return message_list
+    return (
+        message_list[:HEADER_LEN]
+        + [
+            {
+                "role": "system",
+                "content": SUMMARY_MESSAGE.format(summary=summary["content"]),
+            }
+        ]
+        + message_list[summary["covered"] :]
+    )
+
+
+def record_prompt(
+    message_list: list[dict[str, str]], window: list[dict[str, str]]
+) -> tuple[int, int]:
+    """Records the estimated prompt tokens of a turn with and without the context window.
+
+    Args:
+        message_list (list[dict[str, str]]): All messages of the chat.
+        window (list[dict[str, str]]): The messages sent to the LLM.
+
+    Returns:
+        tuple[int, int]: Estimated tokens of all messages and of the window.
+    """
+    full, windowed = estimate_tokens(message_list), estimate_tokens(window)
+    with _stats_lock:
+        _stats["turns"] += 1
+        _stats["full_tokens"] += full
+        _stats["window_tokens"] += windowed
+    return full, windowed
+
+
+def fold_point(
+    message_list: list[dict[str, str]],
+    summary: Optional[Dict[str, Any]],
+    keep_turns: int = CONTEXT_KEEP_TURNS,
+    fold_turns: int = CONTEXT_FOLD_TURNS,
+) -> Optional[int]:
+    """Returns the number of messages the summary should cover once enough turns have
+    fallen out of the window. Folding several turns at once keeps summary updates rare.
+
+    Args:
+        message_list (list[dict[str, str]]): All messages of the chat.
+        summary (Dict[str, Any], optional): The stored summary of the chat, or None.
+        keep_turns (int, optional): Turns always sent verbatim. Defaults to CONTEXT_KEEP_TURNS.
+        fold_turns (int, optional): Turns folded at once. Defaults to CONTEXT_FOLD_TURNS.
+
+    Returns:
+        Optional[int]: The number of messages to cover, or None if the summary is up to date.
+    """
+    if not CONTEXT_WINDOW:
+        return None
+    covered = summary["covered"] if summary else HEADER_LEN
+    keep_from = len(message_list) - 2 * keep_turns
+    if keep_from - covered < 2 * fold_turns:
+        return None
+    return keep_from
+
+
+def fold(
+    message_list: list[dict[str, str]],
+    summary: Optional[Dict[str, Any]],
+    covered: int,
+    llm: LLM,
+) -> Dict[str, Any]:
+    """Folds the messages that fell out of the window into the summary.
+
+    Args:
+        message_list (list[dict[str, str]]): All messages of the chat.
+        summary (Dict[str, Any], optional): The stored summary of the chat, or None.
+        covered (int): The number of messages the new summary covers, see fold_point().
+        llm (LLM): A large language model.
+
+    Returns:
+        Dict[str, Any]: The new summary, with its content and the number of messages it covers.
+    """
+    start = summary["covered"] if summary else HEADER_LEN
+    transcript = "\n".join(
+        f"{message['role']}: {message['content']}"
+        for message in message_list[start:covered]
+    )
+    prompt = [
+        {"role": "system", "content": "You are an assistant who summarises text."},
+        {
+            "role": "user",
+            "content": SUMMARY_PROMPT.format(
+                summary=summary["content"] if summary else "(none)",
+                transcript=transcript,
+            ),
+        },
+    ]
+    with usage_scope(call_site="summarise"):
+        content = llm.run(prompt, with_moderation=False)[:SUMMARY_MAX_CHARS]
+    with _stats_lock:
+        _stats["folds"] += 1
+    return {"content": content, "covered": covered}
+
+
+def context_metrics() -> Dict[str, float]:
+    """Returns the estimated prompt tokens per turn with and without the context window.
+
+    Returns:
+        Dict[str, float]: Turns and summary updates so far, and average estimated prompt
+            tokens per turn of all messages and of the window.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    turns = stats["turns"] or 1
+    stats["avg_full_tokens"] = stats.pop("full_tokens") / turns
+    stats["avg_window_tokens"] = stats.pop("window_tokens") / turns
+    return stats
@@ -1,9 +1,11 @@
 import logging
 import random
 import re
+from typing import Optional
 
 from src.llm_classes.chatlog import ChatLog
-from src.llm_classes.llm_level import GPT, LLM
+from src.llm_classes.llm_level import LLM
+from src.llm_classes.usage import usage_scope
 
 # Custom logger
 logger = logging.getLogger("exit_logger")
@@ -18,13 +20,15 @@ logger.addHandler(file_handler)
 
 
 def construct_chatlog(
-    survey_initial_responses: str, llm: LLM = GPT(), seed: int = random.randint(1, 9999)
+    survey_initial_responses: str,
+    llm: Optional[LLM] = None,
+    seed: int = random.randint(1, 9999),
 ) -> ChatLog:
     """Given a formatted survey response, constructs a ChatLog object.
 
     Args:
         survey_initial_responses (str): Initial responses to the static survey.
-        llm (LLM, optional): A Large Language Model object. Defaults to gpt-4-turbo-preview.
+        llm (LLM, optional): A Large Language Model object. Defaults to the shared gpt-4-turbo-preview instance.
         seed (int, optional): A random integer. Defaults to an integer from the range 1 to 9998.
 
     Returns:
@@ -36,7 +40,8 @@ def construct_chatlog(
             survey_initial_responses=survey_initial_responses
         ),
     }
-    return ChatLog([start_dict], llm=llm, from_start=True, seed=seed)
+    with usage_scope(call_site="plan"):
+        return ChatLog([start_dict], llm=llm, from_start=True, seed=seed)
 
 
 def format_multiple_choices(
@@ -87,6 +92,7 @@ def check_exit(
     llm: LLM,
     seed: int = random.randint(1, 9999),
     delim: str = ChatLog.EXIT_DELIM,
+    context: Optional[list[dict[str, str]]] = None,
 ) -> bool:
     """Checks if the interactive survey has come to a conclusion. Returns a boolean.
 
@@ -95,6 +101,8 @@ def check_exit(
         llm (LLM): A LLM object.
         seed (int, optional): An random integer controlling pseudo-randomness. Defaults to a random integer from 1 to 9998
         delim (str, optional): A delimiter to parse a formatted LLM output. Defaults to ChatLog.EXIT_DELIM, which defaults to "--".
+        context (list[dict[str, str]], optional): The messages sent to the LLM, e.g. a context window
+            of updated_message_list. Defaults to updated_message_list.
 
     Returns:
         bool: _description_
@@ -103,10 +111,70 @@ def check_exit(
     """
     if len(updated_message_list) <= ChatLog.MIN_LEN:
         return False
-    exit = updated_message_list.copy()
-    exit.append(ChatLog.END_QUERY)
-    result = llm.run(exit, seed=seed, with_moderation=False)
+    with usage_scope(call_site="exit_check"):
+        result = llm.run(
+            exit_query(updated_message_list, context), seed=seed, with_moderation=False
+        )
+    return parse_exit(result, updated_message_list, delim)
+
+
+async def acheck_exit(
+    updated_message_list: list[dict[str, str]],
+    llm: LLM,
+    seed: int = random.randint(1, 9999),
+    delim: str = ChatLog.EXIT_DELIM,
+    context: Optional[list[dict[str, str]]] = None,
+) -> bool:
+    """Coroutine version of check_exit(), for the asyncio serving mode.
 
+    Args:
+        updated_message_list (list[dict[str, str]]): A message list tied to the ChatLog instance.
+        llm (LLM): A LLM object.
+        seed (int, optional): An random integer controlling pseudo-randomness. Defaults to a random integer from 1 to 9998
+        delim (str, optional): A delimiter to parse a formatted LLM output. Defaults to ChatLog.EXIT_DELIM.
+        context (list[dict[str, str]], optional): The messages sent to the LLM. Defaults to updated_message_list.
+
+    Returns:
+        bool: Whether the interview is over.
+    """
+    if len(updated_message_list) <= ChatLog.MIN_LEN:
+        return False
+    with usage_scope(call_site="exit_check"):
+        result = await llm.arun(
+            exit_query(updated_message_list, context), seed=seed, with_moderation=False
+        )
+    return parse_exit(result, updated_message_list, delim)
+
+
+def exit_query(
+    updated_message_list: list[dict[str, str]],
+    context: Optional[list[dict[str, str]]] = None,
+) -> list[dict[str, str]]:
+    """Returns the messages that ask the LLM whether the interview is over.
+
+    Args:
+        updated_message_list (list[dict[str, str]]): A message list tied to the ChatLog instance.
+        context (list[dict[str, str]], optional): The messages sent to the LLM. Defaults to updated_message_list.
+
+    Returns:
+        list[dict[str, str]]: The messages, followed by ChatLog.END_QUERY.
+    """
+    return list(context or updated_message_list) + [ChatLog.END_QUERY]
+
+
+def parse_exit(
+    result: str, updated_message_list: list[dict[str, str]], delim: str
+) -> bool:
+    """Parses the answer of the LLM to the exit query.
+
+    Args:
+        result (str): The answer, with the reasoning before the delimiter and Yes or No after it.
+        updated_message_list (list[dict[str, str]]): A message list tied to the ChatLog instance.
+        delim (str): The delimiter.
+
+    Returns:
+        bool: Whether the interview is over. Always True after ChatLog.MAX_LEN messages.
+    """
     is_last = bool(re.search(r"[yY]es", result.split(delim)[-1]))
     logger.info(f"exit: {is_last}, Reasoning: {result}")
     return is_last or (len(updated_message_list) > ChatLog.MAX_LEN)
@@ -1,9 +1,35 @@
+import asyncio
+import hashlib
+import importlib.util
 import os
 import random
+import threading
+import time
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Iterator, Optional, Union
 
+import openai
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+from prometheus_client import Histogram
+from src import metrics
+
+from .usage import record_usage
+
+DEFAULT_MODEL = "gpt-4-turbo-preview"
+
+MODERATION_SECONDS = Histogram(
+    "moderation_seconds",
+    "Duration of content moderation checks, answered by the API or the verdict cache.",
+    ["cached"],
+    buckets=metrics.DEFAULT_BUCKETS,
+)
+
+_client: Optional[OpenAI] = None
+_async_client: Optional[AsyncOpenAI] = None
+_llms: Dict[str, "GPT"] = {}
+_registry_lock = threading.Lock()
 
 
 class LLM(ABC):
@@ -17,16 +43,160 @@ class LLM(ABC):
     ) -> str:
         return
 
+    def stream(
+        self, messages: list, seed: int = random.randint(1, 9999)
+    ) -> Iterator[str]:
+        """Runs the llm given a current conversation and seed, and yields the output text in chunks as it is generated.
+        LLMs that cannot stream yield their whole output as one chunk.
+        Content moderation is not applied, call moderate() on the accumulated text instead.
+
+        Args:
+            messages (list): A list of messages tied to a ChatLog instance.
+            seed (int, optional): A random integer. Defaults to a random integer from 1 to 9998.
+
+        Yields:
+            str: chunks of text output from the Large Language Model.
+        """
+        yield self.run(messages, seed=seed, with_moderation=False)
+
+    def moderate(self, text: str) -> str:
+        """Returns the text, or a default reply if the text is inappropriate.
+        LLMs without content moderation return the text unchanged.
+
+        Args:
+            text (str): Text to check.
+
+        Returns:
+            str: The text, or a default reply.
+        """
+        return text
+
+    async def arun(
+        self, messages: list, seed: int = random.randint(1, 9999), with_moderation=True
+    ) -> str:
+        """Coroutine version of run(), for the asyncio serving mode.
+        LLMs without an asynchronous client run run() on a worker thread.
+
+        Args:
+            messages (list): A list of messages tied to a ChatLog instance.
+            seed (int, optional): A random integer. Defaults to a random integer from 1 to 9998.
+            with_moderation (bool, optional): Whether to activate moderation module to filter content. Defaults to True.
+
+        Returns:
+            str: text output from the Large Language Model.
+        """
+        return await asyncio.to_thread(
+            self.run, messages, seed=seed, with_moderation=with_moderation
+        )
+
+    async def astream(
+        self, messages: list, seed: int = random.randint(1, 9999)
+    ) -> AsyncIterator[str]:
+        """Asynchronous iterator version of stream(). LLMs without an asynchronous client
+        yield their whole output as one chunk.
+
+        Args:
+            messages (list): A list of messages tied to a ChatLog instance.
+            seed (int, optional): A random integer. Defaults to a random integer from 1 to 9998.
+
+        Yields:
+            str: chunks of text output from the Large Language Model.
+        """
+        yield await self.arun(messages, seed=seed, with_moderation=False)
+
+    async def amoderate(self, text: str) -> str:
+        """Coroutine version of moderate().
+
+        Args:
+            text (str): Text to check.
+
+        Returns:
+            str: The text, or a default reply.
+        """
+        return await asyncio.to_thread(self.moderate, text)
+
+
+class VerdictCache:
+    """A thread-safe LRU cache of content moderation verdicts, keyed by a hash of the text."""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._verdicts: OrderedDict[str, bool] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(text: str) -> str:
+        """Returns the cache key of a text."""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[bool]:
+        """Returns the cached verdict for a text, or None if there is none.
+
+        Args:
+            text (str): The text that was checked.
+
+        Returns:
+            Optional[bool]: Whether the text was flagged.
+        """
+        key = self.key(text)
+        with self._lock:
+            if key not in self._verdicts:
+                return None
+            self._verdicts.move_to_end(key)
+            return self._verdicts[key]
+
+    def put(self, text: str, verdict: bool) -> None:
+        """Caches the verdict for a text, evicting the least recently used verdict if the cache is full.
+
+        Args:
+            text (str): The text that was checked.
+            verdict (bool): Whether the text was flagged.
+        """
+        key = self.key(text)
+        with self._lock:
+            self._verdicts[key] = verdict
+            self._verdicts.move_to_end(key)
+            while len(self._verdicts) > self.max_size:
+                self._verdicts.popitem(last=False)
+
+    def clear(self) -> None:
+        """Removes all cached verdicts."""
+        with self._lock:
+            self._verdicts.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._verdicts)
+
 
 class ContentModeration:
     """A wrapper class around a content filter, for added security measures.
     Currently uses a model from Openai API.
     Redefine this class if the application is scaled for a larger user-base.
+    Verdicts are cached process-wide, so repeated texts are only checked once.
     """
 
-    def __init__(self, client: OpenAI):
+    verdicts = VerdictCache(int(os.environ.get("MODERATION_CACHE_SIZE", "1024")))
+    _stats_lock = threading.Lock()
+    _stats = {
+        "checks": 0,
+        "cache_hits": 0,
+        "flagged": 0,
+        "latency_ms_total": 0.0,
+        "latency_ms_max": 0.0,
+        "latency_ms_last": 0.0,
+    }
+
+    def __init__(self, client: OpenAI, async_client: Optional[AsyncOpenAI] = None):
         self.default = "Sorry, I cannot assist you with that. Please note that your replies are being logged."
         self.client = client
+        self._async_client = async_client
+        self.verdicts.put(self.default, False)
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """The asynchronous OpenAI client, the shared one unless another was given."""
+        return self._async_client or get_async_openai_client()
 
     def is_harmful(self, text: str) -> bool:
         """
@@ -38,21 +208,227 @@ class ContentModeration:
         Returns:
             bool: A boolean value that determines if the text is inappropriate.
         """
+        start = time.perf_counter()
+        verdict = self.verdicts.get(text)
+        if verdict is not None:
+            self._count(cache_hit=True)
+            MODERATION_SECONDS.labels(cached="true").observe(
+                time.perf_counter() - start
+            )
+            return verdict
+
         response = self.client.moderations.create(input=text)
-        return response.results[0].flagged
+        latency = (time.perf_counter() - start) * 1000
+        # The moderation API does not report tokens
+        record_usage(str(response.model), 0, 0, latency, call_site="moderation")
+        verdict = response.results[0].flagged
+        self.verdicts.put(text, verdict)
+        self._count(latency=latency, flagged=verdict)
+        MODERATION_SECONDS.labels(cached="false").observe(latency / 1000)
+        return verdict
+
+    async def ais_harmful(self, text: str) -> bool:
+        """
+        Coroutine version of is_harmful(), using the asynchronous OpenAI client.
+
+        Args:
+            text (str): Text to check.
+
+        Returns:
+            bool: A boolean value that determines if the text is inappropriate.
+        """
+        start = time.perf_counter()
+        verdict = self.verdicts.get(text)
+        if verdict is not None:
+            self._count(cache_hit=True)
+            MODERATION_SECONDS.labels(cached="true").observe(
+                time.perf_counter() - start
+            )
+            return verdict
+
+        response = await self.async_client.moderations.create(input=text)
+        latency = (time.perf_counter() - start) * 1000
+        # The moderation API does not report tokens
+        record_usage(str(response.model), 0, 0, latency, call_site="moderation")
+        verdict = response.results[0].flagged
+        self.verdicts.put(text, verdict)
+        self._count(latency=latency, flagged=verdict)
+        MODERATION_SECONDS.labels(cached="false").observe(latency / 1000)
+        return verdict
+
+    @classmethod
+    def metrics(cls) -> Dict[str, float]:
+        """Returns the process-wide moderation counters and latencies.
+
+        Returns:
+            Dict[str, float]: Moderation API calls, cache hits, flagged texts, cache size
+                and per-call latencies in milliseconds.
+        """
+        with cls._stats_lock:
+            stats = dict(cls._stats)
+        stats["cache_size"] = len(cls.verdicts)
+        stats["latency_ms_avg"] = (
+            stats["latency_ms_total"] / stats["checks"] if stats["checks"] else 0.0
+        )
+        return stats
+
+    @classmethod
+    def _count(
+        cls, latency: float = 0.0, flagged: bool = False, cache_hit: bool = False
+    ) -> None:
+        with cls._stats_lock:
+            if cache_hit:
+                cls._stats["cache_hits"] += 1
+                return
+            cls._stats["checks"] += 1
+            cls._stats["flagged"] += int(flagged)
+            cls._stats["latency_ms_total"] += latency
+            cls._stats["latency_ms_last"] = latency
+            cls._stats["latency_ms_max"] = max(cls._stats["latency_ms_max"], latency)
+
+
+def moderation_metrics() -> Dict[str, float]:
+    """Returns the process-wide content moderation counters and latencies.
+
+    Returns:
+        Dict[str, float]: See ContentModeration.metrics().
+    """
+    return ContentModeration.metrics()
+
+
+def _http_client(
+    asynchronous: bool = False,
+) -> Optional[Union[openai.DefaultHttpxClient, openai.DefaultAsyncHttpxClient]]:
+    """Returns an HTTP client for the OpenAI API with keep-alive connection pooling,
+    and HTTP/2 if the h2 package is installed.
+
+    Args:
+        asynchronous (bool, optional): Whether the client is for AsyncOpenAI. Defaults to False.
+
+    Returns:
+        Optional[Union[openai.DefaultHttpxClient, openai.DefaultAsyncHttpxClient]]: The HTTP
+            client, or None if the installed OpenAI library does not use httpx, in which case
+            its default HTTP client is used.
+    """
+    try:
+        import httpx
+    except ImportError:
+        return None
+
+    max_connections = int(os.environ.get("OPENAI_MAX_CONNECTIONS", "100"))
+    client_class = (
+        openai.DefaultAsyncHttpxClient if asynchronous else openai.DefaultHttpxClient
+    )
+    return client_class(
+        limits=httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_connections,
+            keepalive_expiry=float(os.environ.get("OPENAI_KEEPALIVE_EXPIRY", "60")),
+        ),
+        http2=importlib.util.find_spec("h2") is not None,
+    )
+
+
+def get_openai_client() -> OpenAI:
+    """Returns the process-wide OpenAI client, creating it on first use.
+
+    The client keeps its HTTP connections to the API alive between requests, so
+    that chat turns do not pay for new TLS handshakes. Timeouts and retries are
+    configured through the OPENAI_TIMEOUT and OPENAI_MAX_RETRIES environment variables.
+
+    Returns:
+        OpenAI: The shared OpenAI client.
+    """
+    global _client
+    if _client is None:
+        with _registry_lock:
+            if _client is None:
+                load_dotenv()
+                _client = OpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    timeout=float(os.environ.get("OPENAI_TIMEOUT", "60")),
+                    max_retries=int(os.environ.get("OPENAI_MAX_RETRIES", "2")),
+                    http_client=_http_client(),
+                )
+    return _client
+
+
+def get_async_openai_client() -> AsyncOpenAI:
+    """Returns the process-wide asynchronous OpenAI client of the asyncio serving mode,
+    creating it on first use. It is configured like get_openai_client(), and must only be
+    used from the event loop of the process.
+
+    Returns:
+        AsyncOpenAI: The shared asynchronous OpenAI client.
+    """
+    global _async_client
+    if _async_client is None:
+        with _registry_lock:
+            if _async_client is None:
+                load_dotenv()
+                _async_client = AsyncOpenAI(
+                    api_key=os.getenv("OPENAI_API_KEY"),
+                    timeout=float(os.environ.get("OPENAI_TIMEOUT", "60")),
+                    max_retries=int(os.environ.get("OPENAI_MAX_RETRIES", "2")),
+                    http_client=_http_client(asynchronous=True),
+                )
+    return _async_client
+
+
+def get_llm(model: Optional[str] = None) -> "GPT":
+    """Returns the process-wide GPT instance of a model, creating it on first use.
+
+    Args:
+        model (str, optional): Name of the OpenAI model. Defaults to DEFAULT_MODEL.
+
+    Returns:
+        GPT: The shared GPT instance, which uses the shared OpenAI client.
+    """
+    model = model or DEFAULT_MODEL
+    llm = _llms.get(model)
+    if llm is None:
+        client = get_openai_client()
+        with _registry_lock:
+            llm = _llms.setdefault(model, GPT(model=model, client=client))
+    return llm
+
+
+def reset_clients() -> None:
+    """Closes the shared OpenAI client and forgets the shared GPT instances.
+    The next call to get_openai_client() or get_llm() creates new ones, e.g. in a forked worker process.
+    The asynchronous client is forgotten without being closed, since it belongs to an event loop.
+    """
+    global _client, _async_client
+    with _registry_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+        _async_client = None
+        _llms.clear()
 
 
 class GPT(LLM):
-    """Wrapper class around the GPT models from OpenAI."""
+    """Wrapper class around the GPT models from OpenAI.
+    Use get_llm() to share one instance, and its HTTP connections, across requests.
+    """
 
-    def __init__(self, model="gpt-4-turbo-preview"):
-        load_dotenv()
-        client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-        self.client = client
+    def __init__(
+        self,
+        model: str = DEFAULT_MODEL,
+        client: Optional[OpenAI] = None,
+        async_client: Optional[AsyncOpenAI] = None,
+    ):
+        self.client = client or get_openai_client()
+        self._async_client = async_client
         self.model = model
-        self.content_moderation = ContentModeration(self.client)
+        self.content_moderation = ContentModeration(self.client, async_client)
         super().__init__()
 
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """The asynchronous OpenAI client, created on first use by the asyncio serving mode."""
+        return self._async_client or get_async_openai_client()
+
     def run(
         self, messages: list, seed: int = random.randint(1, 9999), with_moderation=True
     ) -> str:
@@ -66,6 +442,7 @@ class GPT(LLM):
         Returns:
             str: text output from the Large Language Model.
         """
+        start = time.perf_counter()
         output = self.client.chat.completions.create(
             model=self.model,
             messages=messages,
@@ -74,12 +451,136 @@ class GPT(LLM):
             top_p=0.4,
             seed=seed,
         )
+        self._record(output.usage, start)
         output_text = output.choices[0].message.content
-        if with_moderation and self.content_moderation.is_harmful(output_text):
-            return self.content_moderation.default
+        if with_moderation:
+            return self.moderate(output_text)
         else:
             return output_text
 
+    def stream(
+        self, messages: list, seed: int = random.randint(1, 9999)
+    ) -> Iterator[str]:
+        """Runs the llm given a current conversation and seed, and yields the output text in chunks as it is generated.
+        Content moderation is not applied, call moderate() on the accumulated text instead.
+        The token usage is sent in the last chunk of the stream.
+
+        Args:
+            messages (list): A list of messages tied to a ChatLog instance.
+            seed (int, optional): A random integer. Defaults to a random integer from 1 to 9998.
+
+        Yields:
+            str: chunks of text output from the Large Language Model.
+        """
+        start = time.perf_counter()
+        output = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            temperature=0.4,
+            top_p=0.4,
+            seed=seed,
+        )
+        for chunk in output:
+            if chunk.usage:
+                self._record(chunk.usage, start)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def arun(
+        self, messages: list, seed: int = random.randint(1, 9999), with_moderation=True
+    ) -> str:
+        """Coroutine version of run(), using the asynchronous OpenAI client.
+
+        Args:
+            messages (list): A list of messages tied to a ChatLog instance.
+            seed (int, optional): A random integer. Defaults to a random integer from 1 to 9998.
+            with_moderation (bool, optional): Whether to activate moderation module to filter content. Defaults to True.
+
+        Returns:
+            str: text output from the Large Language Model.
+        """
+        start = time.perf_counter()
+        output = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=False,
+            temperature=0.4,
+            top_p=0.4,
+            seed=seed,
+        )
+        self._record(output.usage, start)
+        output_text = output.choices[0].message.content
+        if with_moderation:
+            return await self.amoderate(output_text)
+        return output_text
+
+    async def astream(
+        self, messages: list, seed: int = random.randint(1, 9999)
+    ) -> AsyncIterator[str]:
+        """Asynchronous iterator version of stream(), using the asynchronous OpenAI client.
+        Content moderation is not applied, call amoderate() on the accumulated text instead.
+
+        Args:
+            messages (list): A list of messages tied to a ChatLog instance.
+            seed (int, optional): A random integer. Defaults to a random integer from 1 to 9998.
+
+        Yields:
+            str: chunks of text output from the Large Language Model.
+        """
+        start = time.perf_counter()
+        output = await self.async_client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            stream=True,
+            stream_options={"include_usage": True},
+            temperature=0.4,
+            top_p=0.4,
+            seed=seed,
+        )
+        async for chunk in output:
+            if chunk.usage:
+                self._record(chunk.usage, start)
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def amoderate(self, text: str) -> str:
+        """Coroutine version of moderate().
+
+        Args:
+            text (str): Text to check.
+
+        Returns:
+            str: The text, or a default reply.
+        """
+        if await self.content_moderation.ais_harmful(text):
+            return self.content_moderation.default
+        return text
+
+    def _record(
+        self, usage: Optional[openai.types.CompletionUsage], start: float
+    ) -> None:
+        record_usage(
+            self.model,
+            int(getattr(usage, "prompt_tokens", 0) or 0),
+            int(getattr(usage, "completion_tokens", 0) or 0),
+            (time.perf_counter() - start) * 1000,
+        )
+
+    def moderate(self, text: str) -> str:
+        """Returns the text, or a default reply if the content moderation module flags it.
+
+        Args:
+            text (str): Text to check.
+
+        Returns:
+            str: The text, or a default reply.
+        """
+        if self.content_moderation.is_harmful(text):
+            return self.content_moderation.default
+        return text
+
 
 class LocalLLMGPTQ(LLM):
     # LOCAL-LLMS CAN BE DEFINED IN THIS CLASS SUCH THAT THE APP CAN SUPPORT LOCALLLMS
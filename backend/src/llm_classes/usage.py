@@ -0,0 +1,303 @@
+# -*- coding: utf-8 -*-
+"""
+    src.llm_classes.usage
+    ~~~~~~~
+
+    This module implements the token and cost ledger of LLM calls. Every call
+    made by the LLM classes is recorded with its call site, model, prompt and
+    completion tokens, latency and the survey and response it was made for.
+    Records are buffered in memory and written in batches by a background
+    thread, so that accounting never adds a database write to a chat turn.
+"""
+
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from prometheus_client import Counter, Histogram
+from src import metrics
+
+logger = logging.getLogger(__name__)
+
+LLM_CALL_SECONDS = Histogram(
+    "llm_call_seconds",
+    "Duration of LLM calls.",
+    ["call_site", "model"],
+    buckets=metrics.DEFAULT_BUCKETS,
+)
+LLM_TOKENS = Counter("llm_tokens", "Tokens of LLM calls.", ["call_site", "kind"])
+LLM_COST = Counter("llm_cost_usd", "Cost of LLM calls.", ["call_site"])
+
+# US dollars per 1000 prompt and completion tokens
+PRICES = {
+    "gpt-4-turbo-preview": (0.01, 0.03),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4": (0.03, 0.06),
+    "gpt-4o": (0.005, 0.015),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+PRICES.update(json.loads(os.environ.get("LLM_PRICES", "{}")))
+
+# Survey, response, turn and call site of the LLM calls made in the current context
+_scope: ContextVar[Dict[str, Any]] = ContextVar("llm_usage_scope", default={})
+
+
+@contextmanager
+def usage_scope(**fields) -> Iterator[None]:
+    """Attributes the LLM calls made in a `with` block, e.g. to a survey and response or to a
+    call site. Nested scopes add to or override the fields of the enclosing scope.
+    Jobs submitted to other threads keep the scope if they run in a copy of the context.
+
+    Args:
+        **fields: survey_id, response_id, turn and/or call_site.
+    """
+    token = _scope.set({**_scope.get(), **fields})
+    try:
+        yield
+    finally:
+        _scope.reset(token)
+
+
+def cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Returns the cost of a call in US dollars, or 0 for models without a known price.
+
+    Args:
+        model (str): Name of the model.
+        prompt_tokens (int): Tokens sent to the model.
+        completion_tokens (int): Tokens generated by the model.
+
+    Returns:
+        float: Cost in US dollars.
+    """
+    prompt_price, completion_price = PRICES.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+
+def log_records(records: List[Dict[str, Any]]) -> None:
+    """Writes usage records to the log as JSON lines.
+
+    Args:
+        records (List[Dict[str, Any]]): The usage records.
+    """
+    for record in records:
+        logger.info(json.dumps(record, default=str))
+
+
+class UsageLedger:
+    """A buffer of usage records, flushed to a sink by a background thread every
+    `flush_seconds` seconds, or sooner once `batch_size` records are waiting.
+    """
+
+    def __init__(
+        self,
+        sink: Callable[[List[Dict[str, Any]]], None] = log_records,
+        batch_size: int = 100,
+        flush_seconds: float = 5,
+    ):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self._records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._stats = {"recorded": 0, "flushed": 0, "dropped": 0, "flushes": 0}
+        self._totals: Dict[str, Dict[str, float]] = {}
+        self._thread = threading.Thread(
+            target=self._loop, name="llm-usage", daemon=True
+        )
+        self._thread.start()
+
+    def record(
+        self,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency_ms: float,
+        call_site: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """Records one LLM call, attributed to the current usage_scope().
+
+        Args:
+            model (str): Name of the model.
+            prompt_tokens (int): Tokens sent to the model.
+            completion_tokens (int): Tokens generated by the model.
+            latency_ms (float): Duration of the call in milliseconds.
+            call_site (str, optional): Overrides the call site of the scope, e.g. "moderation".
+
+        Returns:
+            Dict[str, Any]: The usage record.
+        """
+        scope = _scope.get()
+        record = {
+            "survey_id": scope.get("survey_id"),
+            "response_id": scope.get("response_id"),
+            "turn": scope.get("turn"),
+            "call_site": call_site or scope.get("call_site", "other"),
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "cost_usd": cost(model, prompt_tokens, completion_tokens),
+            "latency_ms": latency_ms,
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime()),
+        }
+        with self._lock:
+            self._records.append(record)
+            self._stats["recorded"] += 1
+            totals = self._totals.setdefault(
+                record["call_site"],
+                {
+                    "calls": 0,
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "cost_usd": 0.0,
+                },
+            )
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["cost_usd"] += record["cost_usd"]
+            full = len(self._records) >= self.batch_size
+        if full:
+            self._wake.set()
+        return record
+
+    def flush(self) -> int:
+        """Writes the buffered records to the sink. Records that cannot be written are
+        dropped and logged, so that a database outage cannot exhaust memory.
+
+        Returns:
+            int: The number of records written.
+        """
+        with self._flush_lock:
+            with self._lock:
+                records, self._records = self._records, []
+            if not records:
+                return 0
+            try:
+                self.sink(records)
+            except Exception as e:
+                logger.error(f"Failed to write {len(records)} LLM usage records: {e}")
+                with self._lock:
+                    self._stats["dropped"] += len(records)
+                return 0
+            with self._lock:
+                self._stats["flushed"] += len(records)
+                self._stats["flushes"] += 1
+            return len(records)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Returns the ledger counters and the tokens and cost per call site in this process.
+
+        Returns:
+            Dict[str, Any]: Records recorded, flushed, dropped and waiting, and totals per call site.
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._records)
+            stats["call_sites"] = {
+                call_site: dict(totals) for call_site, totals in self._totals.items()
+            }
+        return stats
+
+    def close(self) -> None:
+        """Stops the background thread and writes the remaining records."""
+        self._closed = True
+        self._wake.set()
+        self._thread.join()
+        self.flush()
+
+    def _loop(self) -> None:
+        while not self._closed:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+
+_ledger: Optional[UsageLedger] = None
+_ledger_lock = threading.Lock()
+# Where the records of the process-wide ledger are written, see configure()
+_sink: Callable[[List[Dict[str, Any]]], None] = log_records
+
+
+def get_ledger() -> UsageLedger:
+    """Returns the process-wide usage ledger, creating it on first use.
+
+    Batching is configured through the LLM_USAGE_BATCH_SIZE and LLM_USAGE_FLUSH_SECONDS
+    environment variables. Records are logged until configure() sets another sink.
+
+    Returns:
+        UsageLedger: The shared usage ledger.
+    """
+    global _ledger
+    if _ledger is None:
+        with _ledger_lock:
+            if _ledger is None:
+                _ledger = UsageLedger(
+                    sink=_sink,
+                    batch_size=int(os.environ.get("LLM_USAGE_BATCH_SIZE", "100")),
+                    flush_seconds=float(os.environ.get("LLM_USAGE_FLUSH_SECONDS", "5")),
+                )
+                atexit.register(_ledger.close)
+    return _ledger
+
+
+def configure(sink: Callable[[List[Dict[str, Any]]], None]) -> None:
+    """Sets where the usage records of this process are written, e.g. to the database.
+
+    Args:
+        sink (Callable[[List[Dict[str, Any]]], None]): Writes a batch of usage records.
+    """
+    global _sink
+    _sink = sink
+    get_ledger().sink = sink
+
+
+def reset_ledger() -> None:
+    """Forgets the process-wide usage ledger, so that the next call to get_ledger() creates
+    a new one with the configured sink, e.g. in a forked worker process, where the flushing
+    thread of the parent does not run. Records buffered before the fork are left to the parent.
+    """
+    global _ledger
+    with _ledger_lock:
+        if _ledger is not None:
+            atexit.unregister(_ledger.close)
+        _ledger = None
+
+
+def record_usage(
+    model: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    latency_ms: float,
+    call_site: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Records one LLM call in the process-wide usage ledger and in the metrics.
+    See UsageLedger.record()."""
+    record = get_ledger().record(
+        model, prompt_tokens, completion_tokens, latency_ms, call_site
+    )
+    call_site = record["call_site"]
+    LLM_CALL_SECONDS.labels(call_site=call_site, model=model).observe(latency_ms / 1000)
+    LLM_TOKENS.labels(call_site=call_site, kind="prompt").inc(prompt_tokens)
+    LLM_TOKENS.labels(call_site=call_site, kind="completion").inc(completion_tokens)
+    LLM_COST.labels(call_site=call_site).inc(record["cost_usd"])
+    metrics.add_request_time("llm", latency_ms / 1000)
+    return record
+
+
+def usage_metrics() -> Dict[str, Any]:
+    """Returns the metrics of the process-wide usage ledger.
+
+    Returns:
+        Dict[str, Any]: See UsageLedger.metrics().
+    """
+    return get_ledger().metrics()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+    src.metrics
+    ~~~~~~~
+
+    This module renders the metrics of the backend server in the Prometheus
+    text format, and adds up the time spent per stage by the request handled
+    in the current context. The metrics are prometheus_client metrics, defined
+    by the modules that record them: request latency is measured by hooks
+    around the Flask app, while the database helpers, the LLM classes and the
+    chat pipeline time their own stages. Time spent in the database and in the
+    LLM is also added up per request, so that a slow request can be traced to
+    the stage it spent its time in.
+
+    The gunicorn workers write their metrics to files in the directory set by
+    PROMETHEUS_MULTIPROC_DIR, and the metrics of all of them are added up
+    whichever worker serves the scrape.
+"""
+
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from prometheus_client import (
+    REGISTRY,
+    CollectorRegistry,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Upper bounds in seconds, from fast queries to slow LLM calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Seconds spent per stage ("db", "llm") by the request handled in the current context
+_request_stages: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "request_stages", default=None
+)
+# The threads that serve a request in parallel, e.g. the exit check, add to its stages
+_request_stages_lock = threading.Lock()
+
+
+def render() -> bytes:
+    """Renders the metrics in the Prometheus text format. If PROMETHEUS_MULTIPROC_DIR is
+    set, the metrics of every worker process are added up.
+
+    Returns:
+        bytes: The metrics.
+    """
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not directory:
+        return generate_latest(REGISTRY)
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry, directory)
+    return generate_latest(registry)
+
+
+@contextmanager
+def timed(histogram: Histogram, stage: Optional[str] = None) -> Iterator[None]:
+    """Observes the duration of a `with` block.
+
+    Args:
+        histogram (Histogram): The histogram, with its label values if it has labels.
+        stage (str, optional): Also adds the duration to this stage of the current
+            request, see start_request(). Defaults to None.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        histogram.observe(elapsed)
+        if stage:
+            add_request_time(stage, elapsed)
+
+
+def start_request() -> Dict[str, float]:
+    """Starts adding up the seconds spent per stage by the request handled in the
+    current context. Threads that run in a copy of the context add to the same stages.
+
+    Returns:
+        Dict[str, float]: Seconds per stage, updated as the request runs.
+    """
+    stages: Dict[str, float] = {}
+    _request_stages.set(stages)
+    return stages
+
+
+@contextmanager
+def outside_request() -> Iterator[None]:
+    """Stops adding time to the stages of the current request within a `with` block."""
+    token = _request_stages.set(None)
+    try:
+        yield
+    finally:
+        _request_stages.reset(token)
+
+
+def add_request_time(stage: str, seconds: float) -> None:
+    """Adds time to a stage of the request handled in the current context, if any.
+
+    Args:
+        stage (str): Name of the stage, e.g. "db" or "llm".
+        seconds (float): The time spent.
+    """
+    stages = _request_stages.get()
+    if stages is not None:
+        with _request_stages_lock:
+            stages[stage] = stages.get(stage, 0.0) + seconds
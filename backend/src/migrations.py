@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+    src.migrations
+    ~~~~~~~
+
+    This module implements the schema migrations of the database. Every file
+    in database/migrations named <version>_<name>.sql is a migration, applied
+    once in the order of its version. The versions that have been applied are
+    recorded in the SchemaMigrations table, which init.sql fills in for the
+    migrations that it already contains. Migrations are applied when the
+    production server starts (see gunicorn.conf.py), or from the command line.
+
+    Usage:
+        python -m src.migrations [status]
+"""
+
+
+import logging
+import os
+import re
+import sys
+from typing import List, Optional, Set, Tuple
+
+import pymysql
+from pymysql.connections import Connection
+from src import database_operations
+
+logger = logging.getLogger(__name__)
+
+# Directory of the migration files
+MIGRATIONS_DIR = os.environ.get("MIGRATIONS_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    "database",
+    "migrations",
+)
+# Whether the production server applies pending migrations when it starts
+MIGRATE_ON_STARTUP = os.environ.get("MIGRATE_ON_STARTUP", "true").lower() == "true"
+# Seconds to wait for another process that is applying migrations
+MIGRATION_LOCK_TIMEOUT = int(os.environ.get("MIGRATION_LOCK_TIMEOUT", "300"))
+
+MIGRATION_FILE = re.compile(r"^(?P<version>\d+)_(?P<name>\w+)\.sql$")
+
+# MySQL errors raised by statements whose change is already in the schema, e.g. an index
+# added by hand or by a newer init.sql. The statement is skipped, so migrations can be
+# applied again safely.
+ALREADY_APPLIED_ERRORS = {
+    1050,  # Table already exists
+    1060,  # Duplicate column name
+    1061,  # Duplicate key name
+    1091,  # Can't DROP, check that column/key exists
+    1826,  # Duplicate foreign key constraint name
+}
+
+Migration = Tuple[int, str, str]
+
+
+def discover(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """Lists the migration files of a directory, in the order they are applied.
+
+    Args:
+        directory (str, optional): The directory. Defaults to MIGRATIONS_DIR.
+
+    Raises:
+        ValueError: Raised when two migrations have the same version.
+
+    Returns:
+        List[Migration]: The version, name and path of each migration.
+    """
+    migrations = {}
+    for filename in sorted(os.listdir(directory)):
+        match = MIGRATION_FILE.match(filename)
+        if not match:
+            continue
+        version = int(match["version"])
+        if version in migrations:
+            raise ValueError(f"Duplicate migration version {version}: {filename}")
+        migrations[version] = (
+            version,
+            match["name"],
+            os.path.join(directory, filename),
+        )
+    return [migrations[version] for version in sorted(migrations)]
+
+
+def split_statements(sql: str) -> List[str]:
+    """Splits a migration file into statements, each ending with a semicolon at the end
+    of a line. Comment lines are dropped, and so are USE statements, since migrations are
+    applied to the database of the connection (API_MYSQL_DB).
+
+    Args:
+        sql (str): The content of the migration file.
+
+    Returns:
+        List[str]: The statements, without their semicolons.
+    """
+    statements, lines = [], []
+    for line in sql.splitlines():
+        if line.strip().startswith("--"):
+            continue
+        lines.append(line)
+        if line.rstrip().endswith(";"):
+            statements.append("\n".join(lines).strip().rstrip(";").strip())
+            lines = []
+    statements.append("\n".join(lines).strip())
+    return [
+        statement
+        for statement in statements
+        if statement and not re.match(r"^USE\s", statement, re.IGNORECASE)
+    ]
+
+
+def ensure_table(connection: Connection) -> None:
+    """Creates the SchemaMigrations table of a database created before it existed.
+
+    Args:
+        connection (Connection): The database connection.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS SchemaMigrations (
+                version INT PRIMARY KEY,
+                name VARCHAR(255),
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            """)
+
+
+def applied_versions(connection: Connection) -> Set[int]:
+    """Returns the versions of the migrations applied to the database.
+
+    Args:
+        connection (Connection): The database connection.
+
+    Returns:
+        Set[int]: The applied versions.
+    """
+    rows = database_operations.fetch(connection, "SELECT version FROM SchemaMigrations")
+    return {row["version"] for row in rows}
+
+
+def pending(
+    connection: Connection, migrations: Optional[List[Migration]] = None
+) -> List[Migration]:
+    """Returns the migrations that have not been applied to the database.
+
+    Args:
+        connection (Connection): The database connection.
+        migrations (List[Migration], optional): The known migrations. Defaults to discover().
+
+    Returns:
+        List[Migration]: The pending migrations, in the order they are applied.
+    """
+    ensure_table(connection)
+    applied = applied_versions(connection)
+    return [
+        migration
+        for migration in (migrations if migrations is not None else discover())
+        if migration[0] not in applied
+    ]
+
+
+def apply(connection: Connection, migration: Migration) -> None:
+    """Applies a migration, and records its version.
+
+    Each statement runs on its own, as MySQL commits schema changes one statement at a
+    time. Statements whose change is already in the schema are skipped.
+
+    Args:
+        connection (Connection): The database connection.
+        migration (Migration): The migration.
+
+    Raises:
+        DataBaseError: Raised when a statement fails.
+    """
+    version, name, path = migration
+    with open(path, encoding="utf-8") as file:
+        statements = split_statements(file.read())
+
+    for statement in statements:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(statement)
+        except pymysql.MySQLError as e:
+            if e.args and e.args[0] in ALREADY_APPLIED_ERRORS:
+                logger.info(f"Migration {version} {name}: skipped, {e.args[1]}")
+                continue
+            connection.rollback()
+            raise database_operations.DataBaseError(
+                f"Migration {version} {name} failed", e
+            ) from None
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "INSERT INTO SchemaMigrations (version, name) VALUES (%s, %s)",
+            (version, name),
+        )
+    connection.commit()
+    logger.info(f"Migration {version} {name}: applied")
+
+
+def migrate(
+    connection: Connection, migrations: Optional[List[Migration]] = None
+) -> List[Migration]:
+    """Applies the pending migrations in order. A named lock of the database makes other
+    processes, e.g. the backends of other containers, wait until they are applied.
+
+    Args:
+        connection (Connection): The database connection.
+        migrations (List[Migration], optional): The known migrations. Defaults to discover().
+
+    Raises:
+        DataBaseError: Raised when the lock cannot be obtained or a migration fails.
+
+    Returns:
+        List[Migration]: The migrations applied.
+    """
+    lock = database_operations.fetch(
+        connection,
+        "SELECT GET_LOCK('schema_migrations', %s) AS locked",
+        (MIGRATION_LOCK_TIMEOUT,),
+    )
+    if not lock[0]["locked"]:
+        raise database_operations.DataBaseError(
+            "Failed to obtain the migration lock",
+            f"waited {MIGRATION_LOCK_TIMEOUT} seconds",
+        )
+    try:
+        # Read the applied versions once the lock is held, as another process may have applied some
+        to_apply = pending(connection, migrations)
+        for migration in to_apply:
+            apply(connection, migration)
+        return to_apply
+    finally:
+        database_operations.fetch(
+            connection, "SELECT RELEASE_LOCK('schema_migrations') AS released"
+        )
+
+
+def migrate_on_startup() -> None:
+    """Applies the pending migrations with a dedicated connection, if MIGRATE_ON_STARTUP
+    is set. Errors are logged rather than raised, so that the server still starts and
+    reports them.
+    """
+    if not MIGRATE_ON_STARTUP:
+        return
+    try:
+        connection = database_operations.connect_to_mysql()
+    except Exception as e:
+        logger.error(f"Migrations not applied, failed to connect to the database: {e}")
+        return
+    try:
+        applied = migrate(connection)
+        logger.info(f"Schema up to date, {len(applied)} migrations applied")
+    except Exception as e:
+        logger.error(f"Migrations not applied: {e}")
+    finally:
+        connection.close()
+
+
+def main(args: List[str]) -> int:
+    connection = database_operations.connect_to_mysql()
+    try:
+        if args[:1] == ["status"]:
+            to_apply = {migration[0] for migration in pending(connection)}
+            for version, name, _ in discover():
+                state = "pending" if version in to_apply else "applied"
+                print(f"{version:04d} {name}: {state}")
+            return 0
+        for version, name, _ in migrate(connection):
+            print(f"{version:04d} {name}: applied")
+        return 0
+    finally:
+        connection.close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s: %(message)s")
+    sys.exit(main(sys.argv[1:]))
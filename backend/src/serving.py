@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+    src.serving
+    ~~~~~~~
+
+    This module implements the settings of the production server, which runs
+    the Flask app with gunicorn (see gunicorn.conf.py). Worker processes are
+    sized from the CPU cores and threads from the expected number of chat turns
+    waiting for the LLM at once. The app is imported once before the workers are
+    forked, and every worker then creates its own OpenAI clients, connection
+    pool, usage ledger and background threads.
+"""
+
+
+import math
+import os
+
+from src import background, database_operations
+from src.llm_classes import llm_level, usage
+
+# Worker processes, or 0 to size them from the CPU cores
+GUNICORN_WORKERS = int(os.environ.get("GUNICORN_WORKERS", "0"))
+# Threads per worker, or 0 to size them from LLM_CONCURRENCY
+GUNICORN_THREADS = int(os.environ.get("GUNICORN_THREADS", "0"))
+# Chat turns expected to wait for the LLM at once, across all workers
+LLM_CONCURRENCY = int(os.environ.get("LLM_CONCURRENCY", "64"))
+# Seconds a request may take, or 0 to derive it from the OpenAI timeout and retries
+GUNICORN_TIMEOUT = int(os.environ.get("GUNICORN_TIMEOUT", "0"))
+# Requests after which a worker is replaced, to bound memory growth
+GUNICORN_MAX_REQUESTS = int(os.environ.get("GUNICORN_MAX_REQUESTS", "1000"))
+
+# Each worker holds its own connection pool, so workers are capped to protect MySQL
+MAX_WORKERS = 8
+
+
+def worker_count(cpu_count: int = os.cpu_count() or 1) -> int:
+    """Returns the number of worker processes: GUNICORN_WORKERS, or 2 per CPU core plus 1,
+    up to MAX_WORKERS. Chat turns mostly wait for the LLM, so more processes than this only
+    add memory and database connections.
+
+    Args:
+        cpu_count (int, optional): CPU cores available. Defaults to os.cpu_count().
+
+    Returns:
+        int: Worker processes.
+    """
+    return GUNICORN_WORKERS or min(2 * cpu_count + 1, MAX_WORKERS)
+
+
+def thread_count(workers: int) -> int:
+    """Returns the number of threads per worker: GUNICORN_THREADS, or enough threads for
+    LLM_CONCURRENCY chat turns across the workers, and at least 4.
+
+    Args:
+        workers (int): Worker processes, see worker_count().
+
+    Returns:
+        int: Threads per worker.
+    """
+    return GUNICORN_THREADS or max(math.ceil(LLM_CONCURRENCY / workers), 4)
+
+
+def request_timeout() -> int:
+    """Returns the seconds a request may take before its worker is restarted:
+    GUNICORN_TIMEOUT, or enough for the two sequential LLM calls of a chat turn, each
+    retried up to OPENAI_MAX_RETRIES times with OPENAI_TIMEOUT, plus 30 seconds.
+
+    Returns:
+        int: Seconds.
+    """
+    if GUNICORN_TIMEOUT:
+        return GUNICORN_TIMEOUT
+    attempts = int(os.environ.get("OPENAI_MAX_RETRIES", "2")) + 1
+    llm_call = float(os.environ.get("OPENAI_TIMEOUT", "60")) * attempts
+    return math.ceil(2 * llm_call) + 30
+
+
+def reset_process_state() -> None:
+    """Drops the clients, pools and threads inherited from the parent process, so
+    that a forked worker creates its own on first use. Sockets shared with the parent would
+    interleave requests, and threads do not survive a fork.
+    """
+    llm_level.reset_clients()
+    database_operations.reset_pool()
+    usage.reset_ledger()
+    background.shutdown(wait=False)
@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+    src.survey_cache
+    ~~~~~~~
+
+    This module implements a process-wide cache of survey objects. A survey is
+    read by every visit to its link and again to validate every submitted
+    response, but only changes when it is deleted or when the summary of its
+    chat context is stored. Surveys are kept for SURVEY_CACHE_TTL seconds, and
+    the least recently used ones are evicted beyond SURVEY_CACHE_SIZE. Requests
+    for a survey that is being loaded wait for that load instead of querying
+    the database again. Each survey is cached with its ResponseValidator, so
+    the checks of a submitted response are compiled once per survey.
+"""
+
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+from prometheus_client import Counter, Gauge
+from src import database_operations
+
+# Number of surveys cached per process, or 0 to disable the cache
+SURVEY_CACHE_SIZE = int(os.environ.get("SURVEY_CACHE_SIZE", "1024"))
+# Seconds a survey is cached. A survey deleted by another process is served until then,
+# so this is kept short: long enough to share one query between a burst of visits.
+SURVEY_CACHE_TTL = float(os.environ.get("SURVEY_CACHE_TTL", "5"))
+
+SURVEY_CACHE_REQUESTS = Counter(
+    "survey_cache_requests",
+    "Survey lookups by result: hit, miss, or wait for a load in progress.",
+    ["result"],
+)
+SURVEY_CACHE_SURVEYS = Gauge(
+    "survey_cache_surveys",
+    "Surveys held by the survey cache.",
+    multiprocess_mode="livesum",
+)
+
+
+class CachedSurvey(NamedTuple):
+    """A survey object with the validator of its responses."""
+
+    survey: Dict[str, Any]
+    validator: database_operations.ResponseValidator
+
+
+class SurveyCache:
+    """A thread-safe cache of survey objects with a time to live, evicting the least
+    recently used survey when full. Concurrent misses for the same survey share one load.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: float = 5,
+        cacheable: Callable[[CachedSurvey], bool] = lambda cached: True,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.cacheable = cacheable
+        self._surveys: OrderedDict[int, Tuple[float, CachedSurvey]] = OrderedDict()
+        self._loading: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self, survey_id: int, load: Callable[[int], Optional[CachedSurvey]]
+    ) -> Optional[CachedSurvey]:
+        """Returns a survey from the cache, or loads it. If the survey is already being
+        loaded by another thread, waits for that load. The survey object is shared, so
+        it must not be modified.
+
+        Args:
+            survey_id (int): Survey ID
+            load (Callable[[int], Optional[CachedSurvey]]): Loads the survey from the
+                database, or returns None if there is no such survey.
+
+        Raises:
+            Exception: Raised by load(), also in the threads waiting for it.
+
+        Returns:
+            Optional[CachedSurvey]: The survey, or None if there is no such survey.
+        """
+        with self._lock:
+            cached = self._surveys.get(survey_id)
+            if cached is not None:
+                if cached[0] > time.monotonic():
+                    self._surveys.move_to_end(survey_id)
+                    SURVEY_CACHE_REQUESTS.labels(result="hit").inc()
+                    return cached[1]
+                del self._surveys[survey_id]
+                SURVEY_CACHE_SURVEYS.dec()
+            future = self._loading.get(survey_id)
+            loading = future is None
+            if loading:
+                future = self._loading[survey_id] = Future()
+
+        if not loading:
+            SURVEY_CACHE_REQUESTS.labels(result="wait").inc()
+            return future.result()
+
+        SURVEY_CACHE_REQUESTS.labels(result="miss").inc()
+        try:
+            survey = load(survey_id)
+        except BaseException as e:
+            with self._lock:
+                if self._loading.get(survey_id) is future:
+                    del self._loading[survey_id]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            # Not cached if the survey was invalidated while it was being loaded
+            if self._loading.get(survey_id) is future:
+                del self._loading[survey_id]
+                if survey is not None and self.cacheable(survey):
+                    self._put(survey_id, survey)
+        future.set_result(survey)
+        return survey
+
+    def _put(self, survey_id: int, survey: CachedSurvey) -> None:
+        if self.max_size <= 0 or self.ttl <= 0:
+            return
+        if survey_id not in self._surveys:
+            SURVEY_CACHE_SURVEYS.inc()
+        self._surveys[survey_id] = (time.monotonic() + self.ttl, survey)
+        self._surveys.move_to_end(survey_id)
+        while len(self._surveys) > self.max_size:
+            self._surveys.popitem(last=False)
+            SURVEY_CACHE_SURVEYS.dec()
+
+    def invalidate(self, survey_id: int) -> None:
+        """Removes a survey from the cache, and keeps a load in progress from caching it.
+
+        Args:
+            survey_id (int): Survey ID
+        """
+        with self._lock:
+            if self._surveys.pop(survey_id, None) is not None:
+                SURVEY_CACHE_SURVEYS.dec()
+            self._loading.pop(survey_id, None)
+
+    def clear(self) -> None:
+        """Removes all cached surveys."""
+        with self._lock:
+            SURVEY_CACHE_SURVEYS.dec(len(self._surveys))
+            self._surveys.clear()
+            self._loading.clear()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._surveys)
+
+
+# Surveys whose chat context is still being summarised change once the summary is stored
+surveys = SurveyCache(
+    SURVEY_CACHE_SIZE,
+    SURVEY_CACHE_TTL,
+    cacheable=lambda cached: cached.survey["metadata"]["summary_status"]
+    != database_operations.SUMMARY_PENDING,
+)
+
+
+def load_survey(survey_id: int) -> Optional[CachedSurvey]:
+    """Reads a survey from the database with a pooled connection, and compiles the
+    validator of its responses.
+
+    Args:
+        survey_id (int): Survey ID
+
+    Raises:
+        DataBaseError: Raised when the survey cannot be read.
+
+    Returns:
+        Optional[CachedSurvey]: The survey, or None if there is no such survey.
+    """
+    with database_operations.get_connection() as connection:
+        if not connection:
+            raise database_operations.DataBaseError(
+                "Error while fetching survey", "Failed to connect to the database"
+            )
+        survey = database_operations.fetch_survey(connection, survey_id)
+    if survey is None:
+        return None
+    return CachedSurvey(survey, database_operations.ResponseValidator(survey))
+
+
+def get_survey(survey_id: int) -> Optional[Dict[str, Any]]:
+    """Returns a survey object, from the cache if possible.
+
+    Args:
+        survey_id (int): Survey ID
+
+    Raises:
+        DataBaseError: Raised when the survey cannot be read.
+
+    Returns:
+        Optional[Dict[str, Any]]: The survey object, or None if there is no such survey.
+    """
+    cached = surveys.get(survey_id, load_survey)
+    return cached.survey if cached else None
+
+
+def get_validator(survey_id: int) -> Optional[database_operations.ResponseValidator]:
+    """Returns the validator of the responses to a survey, from the cache if possible.
+
+    Args:
+        survey_id (int): Survey ID
+
+    Raises:
+        DataBaseError: Raised when the survey cannot be read.
+
+    Returns:
+        Optional[ResponseValidator]: The validator, or None if there is no such survey.
+    """
+    cached = surveys.get(survey_id, load_survey)
+    return cached.validator if cached else None
+
+
+def invalidate(survey_id: int) -> None:
+    """Removes a survey from the cache of this process, e.g. once it has been deleted.
+
+    Args:
+        survey_id (int): Survey ID
+    """
+    surveys.invalidate(survey_id)
@@ -1,6 +1,8 @@
 import os
+import re
 
 import requests
+from benchmarks import concurrent_submissions
 
 BACKEND_URL = "http://backend:" + os.getenv("BACKEND_CONTAINER_PORT")
 
@@ -258,7 +260,9 @@ def test_get_surveys_success():
     response = requests.get(SURVEYS_ENDPOINT)
 
     SURVEY_DATA["metadata"]["survey_id"] = 1
+    SURVEY_DATA["metadata"]["summary_status"] = "ready"
     survey_data["metadata"]["survey_id"] = 2
+    survey_data["metadata"]["summary_status"] = "ready"
 
     assert response.status_code == 200
     assert response.json() == [survey_data, SURVEY_DATA]
@@ -686,8 +690,63 @@ def test_send_chat_message_missing_content():
     assert response.json() == {"message": "Missing content"}
 
 
-# def test_send_chat_message_survey_not_found():
-#     response = requests.post(SURVEYS_ENDPOINT + "/0" + "/responses" + "/1" + "/chat", json={"content": "Hi"})
+def test_send_chat_message_survey_not_found():
+    response = requests.post(
+        SURVEYS_ENDPOINT + "/0" + "/responses" + "/1" + "/chat", json={"content": "Hi"}
+    )
+
+    assert response.status_code == 404
+    assert response.json() == {"message": "Survey not found"}
+
+
+# Test cases for concurrent submissions
+
+
+def test_submit_response_concurrent_no_collisions():
+    result = concurrent_submissions.run(
+        BACKEND_URL, submitters=16, submissions_per_submitter=5
+    )
+
+    assert result["errors"] == 0
+    assert result["collisions"] == 0
+    assert result["contiguous"]
+
+
+# Test cases for metrics
+
+METRICS_ENDPOINT = BACKEND_URL + "/api/v1/metrics"
+HEALTH_REQUESTS = re.compile(
+    r'^http_request_seconds_count\{method="GET",route="/api/v1/health",status="200"\} (\S+)$',
+    re.MULTILINE,
+)
+
+
+def health_requests() -> float:
+    # Health checks counted by the metrics, whichever worker serves the scrape
+    response = requests.get(
+        METRICS_ENDPOINT,
+        headers={"Authorization": "Bearer " + os.environ["METRICS_TOKEN"]},
+    )
+    assert response.status_code == 200
+    match = HEALTH_REQUESTS.search(response.text)
+    return float(match.group(1)) if match else 0.0
+
+
+def test_metrics_requires_token():
+    response = requests.get(METRICS_ENDPOINT)
+    assert response.status_code == 401
+
+    response = requests.get(
+        METRICS_ENDPOINT, headers={"Authorization": "Bearer wrong-token"}
+    )
+    assert response.status_code == 401
+
+
+def test_metrics_add_up_the_workers():
+    before = health_requests()
+    for _ in range(20):
+        requests.get(BACKEND_URL + "/api/v1/health")
 
-#     assert response.status_code == 404
-#     assert response.json() == {"message": "Survey not found"}
+    # Every scrape counts the requests served by all the workers
+    for _ in range(5):
+        assert health_requests() >= before + 20
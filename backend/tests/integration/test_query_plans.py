@@ -0,0 +1,167 @@
+import datetime
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import jwt
+import pymysql
+import pytest
+from src import migrations, survey_cache
+from src.app import app, database_operations
+
+# Tables small enough to be read whole, where an index would not help
+FULL_SCAN_ALLOWED = {"Admins"}
+
+
+class ExplainingCursor:
+    """A cursor that explains every SELECT before running it."""
+
+    def __init__(self, cursor, plans, connection):
+        self.cursor = cursor
+        self.plans = plans
+        self.connection = connection
+
+    def execute(self, query, params=None):
+        if query.lstrip().upper().startswith("SELECT"):
+            with self.connection.cursor(pymysql.cursors.DictCursor) as cursor:
+                cursor.execute("EXPLAIN " + query, params)
+                self.plans.append((" ".join(query.split()), cursor.fetchall()))
+        return self.cursor.execute(query, params)
+
+    def __iter__(self):
+        return iter(self.cursor)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cursor.close()
+
+
+class ExplainingConnection:
+    """A connection that records the plan of every SELECT run through it."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.plans = []
+
+    def cursor(self, *args):
+        return ExplainingCursor(
+            self.connection.cursor(*args), self.plans, self.connection
+        )
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+@pytest.fixture(scope="module")
+def connection():
+    connection = database_operations.connect_to_mysql()
+    yield connection
+    connection.close()
+
+
+@pytest.fixture(scope="module")
+def plans(connection):
+    """Runs the read paths of the API and records the plans of their queries."""
+    explaining = ExplainingConnection(connection)
+
+    @contextmanager
+    def get_connection():
+        yield explaining
+
+    token = jwt.encode(
+        {
+            "exp": datetime.datetime.now(datetime.UTC) + datetime.timedelta(hours=1),
+            "iat": datetime.datetime.now(datetime.UTC),
+            "sub": "admin1",
+        },
+        app.config["SECRET_KEY"],
+        algorithm="HS256",
+    )
+    headers = {"Authorization": "Bearer " + token}
+    client = app.test_client()
+    # Read the survey from the database rather than from the cache
+    survey_cache.surveys.clear()
+    with patch.object(database_operations, "get_connection", get_connection):
+        client.post(
+            "/api/v1/admins/login", json={"username": "admin1", "password": "password1"}
+        )
+        client.get("/api/v1/surveys")
+        client.get("/api/v1/surveys?admin=admin1&limit=1&after=2")
+        client.get("/api/v1/surveys/1")
+        client.get("/api/v1/surveys/1/responses?limit=1&after=1", headers=headers)
+        client.get("/api/v1/surveys/1/responses/1", headers=headers)
+        client.get("/api/v1/surveys/1/usage", headers=headers)
+        client.get("/api/v1/surveys/1/responses/1/usage", headers=headers)
+
+    # The queries of a chat turn, and of the exports, which hold two connections
+    database_operations.fetch_chat_turn(explaining, 1, 1)
+    database_operations.get_chat_messages(explaining, 1, 1)
+    other = ExplainingConnection(database_operations.connect_to_mysql())
+    try:
+        list(database_operations.stream_responses(explaining, other, 1))
+    finally:
+        other.close()
+    return explaining.plans + other.plans
+
+
+def plan_of(plans, fragment):
+    for query, plan in plans:
+        if fragment in query:
+            return plan
+    raise AssertionError(f"No query containing {fragment!r} was run")
+
+
+def test_schema_is_up_to_date(connection):
+    assert migrations.migrate(connection) == []
+    assert migrations.pending(connection) == []
+
+
+def test_every_table_access_can_use_an_index(plans):
+    assert len(plans) >= 10
+    for query, plan in plans:
+        for row in plan:
+            table = row["table"]
+            if not table or table.startswith("<") or table in FULL_SCAN_ALLOWED:
+                continue
+            assert (
+                row["type"] != "ALL" or row["possible_keys"]
+            ), f"{table} is read whole, without an applicable index, by: {query}"
+
+
+def test_surveys_of_an_admin_use_admin_index(plans):
+    plan = plan_of(plans, "FROM Surveys WHERE admin_username = %s")
+    rows = [row for row in plan if row["table"] == "Surveys"]
+    assert any("idx_surveys_admin" in (row["possible_keys"] or "") for row in rows)
+
+
+def test_response_pages_use_survey_index(plans):
+    plan = plan_of(plans, "SELECT DISTINCT response_id FROM Survey_Responses")
+    rows = [row for row in plan if row["table"] == "Survey_Responses"]
+    assert any(
+        "idx_survey_responses_survey" in (row["possible_keys"] or "") for row in rows
+    )
+
+
+def test_legacy_chat_lookup_uses_unique_index(plans):
+    plan = plan_of(plans, "AS legacy_chat_log")
+    rows = [row for row in plan if row["table"] == "c"]
+    if rows:
+        assert "idx_chat_log_response" in (rows[0]["possible_keys"] or "")
+        assert rows[0]["type"] in ("const", "eq_ref", "ref")
+    else:
+        # A lookup of the unique index that found no chat is resolved while planning
+        assert any(
+            "no matching row in const table" in (row["Extra"] or "")
+            for row in plan
+            if row["select_type"] == "SUBQUERY"
+        )
+
+
+def test_chat_messages_use_primary_key(plans):
+    plan = plan_of(plans, "SELECT role, content FROM ChatMessages")
+    (row,) = plan
+    assert row["key"] == "PRIMARY"
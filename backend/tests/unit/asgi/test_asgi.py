@@ -0,0 +1,135 @@
+import asyncio
+import json
+from unittest import TestCase
+from unittest.mock import AsyncMock, patch
+
+from src import asgi, chat
+from src.app import app as flask_app
+
+
+def request(method, path, body=b"", query_string=b""):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "method": method,
+        "path": path,
+        "query_string": query_string,
+        "http_version": "1.1",
+        "headers": [(b"content-type", b"application/json")],
+    }
+    asyncio.run(asgi.app(scope, receive, send))
+    headers = dict(sent[0]["headers"])
+    return sent[0]["status"], headers, b"".join(m.get("body", b"") for m in sent[1:])
+
+
+class TestASGI(TestCase):
+    CHAT = "/api/v1/surveys/1/responses/2/chat"
+
+    def test_other_routes_are_served_by_flask(self):
+        status, headers, body = request("GET", "/api/v1/health")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(headers[b"content-type"], b"application/json")
+        self.assertEqual(json.loads(body), {"message": "Server is running!"})
+
+    def test_cookie_headers_are_joined(self):
+        scope = {
+            "headers": [
+                (b"cookie", b"a=1"),
+                (b"content-type", b"application/json"),
+                (b"cookie", b"b=2"),
+            ]
+        }
+
+        headers = asgi.join_cookies(scope)["headers"]
+
+        self.assertEqual(
+            headers,
+            [(b"content-type", b"application/json"), (b"cookie", b"a=1; b=2")],
+        )
+        self.assertIs(asgi.join_cookies({"headers": headers})["headers"], headers)
+
+    def test_flask_failure_is_raised_to_the_server(self):
+        # uvicorn answers with a 500 when the app fails before starting the response
+        with patch(
+            "src.asgi.flask_app.wsgi_app", side_effect=ZeroDivisionError
+        ), self.assertRaises(ZeroDivisionError):
+            request("GET", "/api/v1/health")
+
+    def test_chat_missing_content(self):
+        status, _, body = request("POST", self.CHAT, b"{}")
+
+        self.assertEqual(status, 400)
+        self.assertEqual(json.loads(body), {"message": "Missing content"})
+
+    @patch("src.asgi.chat.arun_chat_turn", new_callable=AsyncMock)
+    def test_chat_turn(self, arun_chat_turn):
+        timer = chat.StageTimer()
+        reply = {"content": "Why?", "is_last": False, "updated_message_list": []}
+        arun_chat_turn.return_value = (reply, timer)
+
+        status, headers, body = request("POST", self.CHAT, b'{"content": "Hi"}')
+
+        self.assertEqual(status, 201)
+        self.assertEqual(json.loads(body), reply)
+        self.assertIn(b"server-timing", headers)
+        arun_chat_turn.assert_awaited_once_with("1", "2", "Hi")
+
+    @patch("src.asgi.chat.arun_chat_turn", new_callable=AsyncMock)
+    def test_chat_turn_error(self, arun_chat_turn):
+        arun_chat_turn.side_effect = chat.ChatTurnError("Survey not found", 404)
+
+        status, _, body = request("POST", self.CHAT, b'{"content": "Hi"}')
+
+        self.assertEqual(status, 404)
+        self.assertEqual(json.loads(body), {"message": "Survey not found"})
+
+    @patch("src.chat.run_chat_turn")
+    @patch("src.chat.arun_chat_turn", new_callable=AsyncMock)
+    def test_serving_modes_answer_alike(self, arun_chat_turn, run_chat_turn):
+        reply = {"content": "Why?", "is_last": False, "updated_message_list": []}
+        arun_chat_turn.return_value = run_chat_turn.return_value = (
+            reply,
+            chat.StageTimer(),
+        )
+        client = flask_app.test_client()
+
+        for body in (b"{}", b"not json", b'{"content": "Hi"}'):
+            with self.subTest(body=body):
+                status, headers, asgi_body = request("POST", self.CHAT, body)
+                response = client.post(
+                    self.CHAT, data=body, content_type="application/json"
+                )
+
+                self.assertEqual(response.status_code, status)
+                self.assertEqual(response.get_json(), json.loads(asgi_body))
+                self.assertEqual(
+                    "Server-Timing" in response.headers, b"server-timing" in headers
+                )
+
+    @patch("src.asgi.chat.astream_chat_turn", new_callable=AsyncMock)
+    def test_chat_stream(self, astream_chat_turn):
+        async def events():
+            yield "token", {"content": "Why?"}
+            yield "done", {"content": "Why?", "is_last": False}
+
+        astream_chat_turn.return_value = events()
+
+        status, headers, body = request(
+            "POST", self.CHAT, b'{"content": "Hi"}', b"stream=true"
+        )
+
+        self.assertEqual(status, 201)
+        self.assertTrue(headers[b"content-type"].startswith(b"text/event-stream"))
+        self.assertEqual(
+            body.decode("utf-8"),
+            chat.format_event("token", {"content": "Why?"})
+            + chat.format_event("done", {"content": "Why?", "is_last": False}),
+        )
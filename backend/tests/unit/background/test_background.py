@@ -0,0 +1,37 @@
+import threading
+from unittest import TestCase
+
+from src import background
+
+
+class TestBoundedExecutor(TestCase):
+    def setUp(self):
+        self.executor = background.BoundedExecutor("test", workers=1, max_pending=2)
+        self.addCleanup(self.executor.shutdown)
+
+    def test_skips_jobs_when_full(self):
+        release = threading.Event()
+        futures = [self.executor.submit(release.wait, 5) for _ in range(3)]
+
+        self.assertIsNotNone(futures[0])
+        self.assertIsNotNone(futures[1])
+        self.assertIsNone(futures[2])
+
+        release.set()
+        futures[0].result(5)
+        futures[1].result(5)
+        self.assertEqual(self.executor.submit(lambda: 1).result(5), 1)
+
+    def test_failed_jobs_free_their_slot(self):
+        def fail():
+            raise ValueError("Lost connection")
+
+        with self.assertLogs(background.logger, level="ERROR"):
+            for _ in range(3):
+                with self.assertRaises(ValueError):
+                    self.executor.submit(fail).result(5)
+
+    def test_disabled(self):
+        executor = background.BoundedExecutor("disabled", workers=1, max_pending=0)
+
+        self.assertIsNone(executor.submit(lambda: 1))
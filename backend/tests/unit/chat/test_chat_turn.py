@@ -0,0 +1,514 @@
+import asyncio
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from src import chat
+from src.database_operations import DataBaseError
+from src.llm_classes.chatlog import ChatLog
+from src.llm_classes.llm_level import LLM
+
+
+class FakeLLM(LLM):
+    def __init__(self, replies, flagged=()):
+        self.replies = list(replies)
+        self.flagged = flagged
+        self.calls = []
+        self.moderated = []
+
+    def run(self, messages, seed=0, with_moderation=True):
+        self.calls.append(list(messages))
+        return self.replies.pop(0)
+
+    def stream(self, messages, seed=0):
+        self.calls.append(list(messages))
+        reply = self.replies.pop(0)
+        for start in range(0, len(reply), 5):
+            yield reply[start : start + 5]
+
+    def moderate(self, text):
+        self.moderated.append(text)
+        return "Sorry" if text in self.flagged else text
+
+
+class TestChatTurn(TestCase):
+    RESPONSE_OBJECT = {
+        "metadata": {
+            "survey_id": 1,
+            "response_id": 2,
+            "submitted_at": "2024-03-01 10:00:00",
+        },
+        "answers": [
+            {
+                "question_id": 1,
+                "type": "short",
+                "question": "How was the product?",
+                "options": [],
+                "answer": ["Great"],
+            }
+        ],
+        "messages": [],
+    }
+    MESSAGES = [
+        {"role": "system", "content": "sysprompt"},
+        {"role": "assistant", "content": "questions"},
+        {"role": "system", "content": "sysprompt2"},
+        {"role": "assistant", "content": "What did you like about it?"},
+    ]
+
+    def setUp(self):
+        self.connection = MagicMock()
+        get_connection = patch("src.chat.database_operations.get_connection")
+        self.get_connection = get_connection.start()
+        self.get_connection.return_value.__enter__.return_value = self.connection
+        self.addCleanup(get_connection.stop)
+
+        fetch_chat_turn = patch("src.chat.database_operations.fetch_chat_turn")
+        self.fetch_chat_turn = fetch_chat_turn.start()
+        self.addCleanup(fetch_chat_turn.stop)
+
+        append_chat_messages = patch(
+            "src.chat.database_operations.append_chat_messages"
+        )
+        self.append_chat_messages = append_chat_messages.start()
+        self.addCleanup(append_chat_messages.stop)
+
+    def load(self, messages):
+        self.fetch_chat_turn.return_value = {
+            "chat_context": "Survey about fries",
+            "response_object": self.RESPONSE_OBJECT,
+            "messages": list(messages),
+        }
+
+    def test_first_turn_plans_interview(self):
+        self.load([])
+        llm = FakeLLM(["questions", "What did you like about it?"])
+
+        reply, _ = chat.run_chat_turn(1, 2, "", llm=llm)
+
+        self.assertEqual(reply["content"], "What did you like about it?")
+        self.assertFalse(reply["is_last"])
+        self.assertEqual(len(reply["updated_message_list"]), 4)
+        self.assertIn("Survey about fries", llm.calls[0][0]["content"])
+        self.append_chat_messages.assert_called_once_with(
+            self.connection, 1, 2, reply["updated_message_list"], 0
+        )
+
+    def test_turn_persists_user_and_assistant_messages_together(self):
+        self.load(self.MESSAGES)
+        llm = FakeLLM(["Why?", "I am waiting for a reply -- No."])
+
+        reply, timer = chat.run_chat_turn(1, 2, "The fries", llm=llm)
+
+        self.assertEqual(reply["content"], "Why?")
+        self.assertFalse(reply["is_last"])
+        self.append_chat_messages.assert_called_once_with(
+            self.connection,
+            1,
+            2,
+            [
+                {"role": "user", "content": "The fries"},
+                {"role": "assistant", "content": "Why?"},
+            ],
+            4,
+        )
+        # One connection to load the turn and one to persist it
+        self.assertEqual(self.get_connection.call_count, 2)
+        self.assertEqual(
+            set(timer.total()),
+            {"load", "reply", "moderation", "exit_check", "persist", "total"},
+        )
+
+    def test_exit_check_ends_interview(self):
+        self.load(self.MESSAGES)
+        llm = FakeLLM(["Thank you for your time!", "I thanked the user -- Yes."])
+
+        reply, _ = chat.run_chat_turn(1, 2, "That is all", llm=llm)
+
+        self.assertTrue(reply["is_last"])
+
+    def test_refusal_does_not_end_interview(self):
+        self.load(self.MESSAGES)
+        llm = FakeLLM(
+            ["Bad words", "I thanked the user -- Yes."], flagged=("Bad words",)
+        )
+
+        reply, _ = chat.run_chat_turn(1, 2, "The fries", llm=llm)
+
+        self.assertEqual(reply["content"], "Sorry")
+        self.assertFalse(reply["is_last"])
+
+    @patch("src.chat.EXIT_CHECK_MODE", "serial")
+    def test_serial_exit_check_sees_moderated_reply(self):
+        self.load(self.MESSAGES)
+        llm = FakeLLM(
+            ["Bad words", "I asked a question -- No."], flagged=("Bad words",)
+        )
+
+        reply, _ = chat.run_chat_turn(1, 2, "The fries", llm=llm)
+
+        self.assertEqual(reply["content"], "Sorry")
+        self.assertEqual(llm.calls[-1][-2], {"role": "assistant", "content": "Sorry"})
+
+    @patch("src.chat.EXIT_CHECK_MODE", "off")
+    def test_exit_check_off(self):
+        self.load(self.MESSAGES)
+        llm = FakeLLM(["Thank you for your time!"])
+
+        reply, timer = chat.run_chat_turn(1, 2, "That is all", llm=llm)
+
+        self.assertFalse(reply["is_last"])
+        self.assertEqual(len(llm.calls), 1)
+        self.assertNotIn("exit_check", timer.total())
+
+    @patch("src.chat.EXIT_CHECK_MODEL", "gpt-3.5-turbo")
+    @patch("src.chat.get_llm")
+    def test_exit_check_model(self, mock_get_llm):
+        self.load(self.MESSAGES)
+        mock_get_llm.return_value = FakeLLM(["I thanked the user -- Yes."])
+        llm = FakeLLM(["Thank you for your time!"])
+
+        reply, _ = chat.run_chat_turn(1, 2, "That is all", llm=llm)
+
+        mock_get_llm.assert_called_once_with("gpt-3.5-turbo")
+        self.assertTrue(reply["is_last"])
+        self.assertEqual(len(llm.calls), 1)
+
+    def long_chat(self, turns):
+        messages = list(self.MESSAGES)
+        for turn in range(turns):
+            messages.append({"role": "user", "content": f"answer {turn}"})
+            messages.append({"role": "assistant", "content": f"question {turn}"})
+        return messages
+
+    @patch("src.chat.background.submit")
+    def test_reply_and_exit_check_use_context_window(self, submit):
+        messages = self.long_chat(12)
+        self.fetch_chat_turn.return_value = {
+            "chat_context": "Survey about fries",
+            "response_object": self.RESPONSE_OBJECT,
+            "messages": messages,
+            "summary": {"content": "The user likes fries.", "covered": 15},
+        }
+        llm = FakeLLM(["Why?", "I am waiting for a reply -- No."])
+
+        reply, _ = chat.run_chat_turn(1, 2, "The fries", llm=llm)
+
+        reply_context, exit_context = llm.calls
+        self.assertEqual(reply_context[:3], messages[:3])
+        self.assertIn("The user likes fries.", reply_context[3]["content"])
+        self.assertEqual(reply_context[4:-1], messages[15:])
+        self.assertEqual(
+            exit_context[:-1],
+            reply_context + [{"role": "assistant", "content": "Why?"}],
+        )
+        self.assertEqual(len(reply["updated_message_list"]), len(messages) + 2)
+        submit.assert_not_called()
+
+    @patch("src.chat.background.submit")
+    def test_old_turns_are_folded_in_background(self, submit):
+        self.load(self.long_chat(12))
+        llm = FakeLLM(["Why?", "I am waiting for a reply -- No."])
+
+        reply, _ = chat.run_chat_turn(1, 2, "The fries", llm=llm)
+
+        submit.assert_called_once()
+        job, survey_id, response_id, message_list, summary, covered, _ = (
+            submit.call_args.args
+        )
+        self.assertIs(job, chat.summarise_chat)
+        self.assertEqual((survey_id, response_id), (1, 2))
+        self.assertEqual(message_list, reply["updated_message_list"])
+        self.assertIsNone(summary)
+        self.assertEqual(covered, len(message_list) - 12)
+
+    @patch("src.chat.database_operations.save_chat_summary")
+    def test_summarise_chat_saves_summary(self, save_chat_summary):
+        llm = FakeLLM(["The user likes fries."])
+
+        summary = chat.summarise_chat(1, 2, self.long_chat(12), None, 19, llm)
+
+        self.assertEqual(summary, {"content": "The user likes fries.", "covered": 19})
+        save_chat_summary.assert_called_once_with(
+            self.connection, 1, 2, "The user likes fries.", 19
+        )
+
+    def test_first_turn_served_from_stored_plan(self):
+        self.load(self.MESSAGES)
+        llm = FakeLLM([])
+
+        reply, _ = chat.run_chat_turn(1, 2, "", llm=llm)
+
+        self.assertEqual(reply["content"], "What did you like about it?")
+        self.assertFalse(reply["is_last"])
+        self.assertEqual(reply["updated_message_list"], self.MESSAGES)
+        self.assertEqual(llm.calls, [])
+        self.append_chat_messages.assert_not_called()
+
+    def test_stream_first_turn_served_from_stored_plan(self):
+        self.load(self.MESSAGES)
+
+        events = list(chat.stream_chat_turn(1, 2, "", llm=FakeLLM([])))
+
+        self.assertEqual(
+            events[0], ("token", {"content": "What did you like about it?"})
+        )
+        self.assertEqual(events[1][0], "done")
+        self.append_chat_messages.assert_not_called()
+
+    def test_plan_interview_stores_plan_and_opening_question(self):
+        self.load([])
+        llm = FakeLLM(["questions", "What did you like about it?"])
+
+        messages = chat.plan_interview(1, 2, llm=llm)
+
+        self.assertEqual(len(messages), ChatLog.MIN_LEN)
+        self.assertEqual(messages[-1]["content"], "What did you like about it?")
+        self.append_chat_messages.assert_called_once_with(
+            self.connection, 1, 2, messages, 0
+        )
+
+    def test_plan_interview_skips_started_chat(self):
+        self.load(self.MESSAGES)
+        llm = FakeLLM([])
+
+        self.assertIsNone(chat.plan_interview(1, 2, llm=llm))
+        self.append_chat_messages.assert_not_called()
+
+    def test_first_turn_falls_back_to_plan_stored_meanwhile(self):
+        self.fetch_chat_turn.side_effect = [
+            {
+                "chat_context": "Survey about fries",
+                "response_object": self.RESPONSE_OBJECT,
+                "messages": [],
+            },
+            {
+                "chat_context": "Survey about fries",
+                "response_object": self.RESPONSE_OBJECT,
+                "messages": self.MESSAGES,
+            },
+        ]
+        self.append_chat_messages.side_effect = DataBaseError("Duplicate", "seq")
+        llm = FakeLLM(["other questions", "Another question?"])
+
+        reply, _ = chat.run_chat_turn(1, 2, "", llm=llm)
+
+        self.assertEqual(reply["updated_message_list"], self.MESSAGES)
+
+    def test_survey_not_found(self):
+        self.fetch_chat_turn.return_value = None
+
+        with self.assertRaises(chat.ChatTurnError) as context:
+            chat.run_chat_turn(0, 2, "Hi", llm=FakeLLM([]))
+        self.assertEqual(context.exception.status_code, 404)
+        self.assertEqual(context.exception.message, "Survey not found")
+
+    def test_response_not_found(self):
+        self.fetch_chat_turn.return_value = {
+            "chat_context": "Survey about fries",
+            "response_object": {**self.RESPONSE_OBJECT, "answers": []},
+            "messages": [],
+        }
+
+        with self.assertRaises(chat.ChatTurnError) as context:
+            chat.run_chat_turn(1, 99, "Hi", llm=FakeLLM([]))
+        self.assertEqual(context.exception.status_code, 404)
+
+    def test_database_error_while_loading(self):
+        self.fetch_chat_turn.side_effect = DataBaseError("Error", Exception("gone"))
+
+        with self.assertRaises(chat.ChatTurnError) as context:
+            chat.run_chat_turn(1, 2, "Hi", llm=FakeLLM([]))
+        self.assertEqual(context.exception.status_code, 500)
+
+    def test_nothing_is_persisted_when_generation_fails(self):
+        self.load(self.MESSAGES)
+        llm = MagicMock(spec=LLM)
+        llm.run.side_effect = Exception("rate limited")
+
+        with self.assertRaises(chat.ChatTurnError) as context:
+            chat.run_chat_turn(1, 2, "The fries", llm=llm)
+        self.assertEqual(context.exception.status_code, 500)
+        self.append_chat_messages.assert_not_called()
+
+    def test_stream_yields_tokens_then_persists_reply(self):
+        self.load(self.MESSAGES)
+        llm = FakeLLM(["Why is that?", "I am waiting for a reply -- No."])
+
+        events = list(chat.stream_chat_turn(1, 2, "The fries", llm=llm))
+
+        self.assertEqual(
+            events[:-1],
+            [
+                ("token", {"content": "Why i"}),
+                ("token", {"content": "s tha"}),
+                ("token", {"content": "t?"}),
+            ],
+        )
+        event, reply = events[-1]
+        self.assertEqual(event, "done")
+        self.assertEqual(reply["content"], "Why is that?")
+        self.assertFalse(reply["is_last"])
+        self.append_chat_messages.assert_called_once()
+        self.assertEqual(
+            self.append_chat_messages.call_args[0][3][-1],
+            {"role": "assistant", "content": "Why is that?"},
+        )
+
+    def test_stream_moderates_accumulated_reply(self):
+        self.load(self.MESSAGES)
+        llm = FakeLLM(
+            ["Bad words", "I am waiting for a reply -- No."], flagged=("Bad words",)
+        )
+
+        events = list(chat.stream_chat_turn(1, 2, "The fries", llm=llm))
+
+        self.assertEqual(events[-1][0], "done")
+        self.assertEqual(events[-1][1]["content"], "Sorry")
+        self.assertEqual(
+            self.append_chat_messages.call_args[0][3][-1]["content"], "Sorry"
+        )
+
+    def test_stream_survey_not_found_raises_before_streaming(self):
+        self.fetch_chat_turn.return_value = None
+
+        with self.assertRaises(chat.ChatTurnError) as context:
+            chat.stream_chat_turn(0, 2, "Hi", llm=FakeLLM([]))
+        self.assertEqual(context.exception.status_code, 404)
+
+    def test_stream_error_event(self):
+        self.load(self.MESSAGES)
+        llm = FakeLLM(["Why?", "I am waiting for a reply -- No."])
+        self.append_chat_messages.side_effect = Exception("Lost connection")
+
+        events = list(chat.stream_chat_turn(1, 2, "The fries", llm=llm))
+
+        self.assertEqual(
+            events[-1],
+            ("error", {"message": "An error occurred while updating the chat log"}),
+        )
+
+    def test_stream_moderator_checks_complete_sentences(self):
+        llm = FakeLLM([])
+        moderator = chat.StreamModerator(llm, min_chars=10)
+
+        moderator.feed("Thanks")
+        moderator.feed("Thanks for that. What")
+        moderator.feed("Thanks for that. What did you like?")
+        moderator.pending.result()
+
+        self.assertEqual(
+            moderator.moderate("Thanks for that. What did you like?"),
+            "Thanks for that. What did you like?",
+        )
+        self.assertEqual(llm.moderated, ["Thanks for that. What did you like?"])
+
+    def test_stream_moderator_flagged_prefix_replaces_reply(self):
+        llm = FakeLLM([], flagged=("Bad words.",))
+        moderator = chat.StreamModerator(llm, min_chars=5)
+
+        moderator.feed("Bad words.")
+        moderator.pending.result()
+        moderator.feed("Bad words. Anyway, how was it?")
+
+        self.assertEqual(moderator.moderate("Bad words. Anyway, how was it?"), "Sorry")
+
+    def test_async_turn_persists_user_and_assistant_messages_together(self):
+        self.load(self.MESSAGES)
+        llm = FakeLLM(["Why?", "I am waiting for a reply -- No."])
+
+        reply, timer = asyncio.run(chat.arun_chat_turn(1, 2, "The fries", llm=llm))
+
+        self.assertEqual(reply["content"], "Why?")
+        self.assertFalse(reply["is_last"])
+        self.append_chat_messages.assert_called_once_with(
+            self.connection,
+            1,
+            2,
+            [
+                {"role": "user", "content": "The fries"},
+                {"role": "assistant", "content": "Why?"},
+            ],
+            4,
+        )
+        self.assertEqual(
+            set(timer.total()),
+            {"load", "reply", "moderation", "exit_check", "persist", "total"},
+        )
+
+    def test_async_refusal_does_not_end_interview(self):
+        self.load(self.MESSAGES)
+        llm = FakeLLM(
+            ["Bad words", "I thanked the user -- Yes."], flagged=("Bad words",)
+        )
+
+        reply, _ = asyncio.run(chat.arun_chat_turn(1, 2, "The fries", llm=llm))
+
+        self.assertEqual(reply["content"], "Sorry")
+        self.assertFalse(reply["is_last"])
+
+    def test_async_survey_not_found(self):
+        self.fetch_chat_turn.return_value = None
+
+        with self.assertRaises(chat.ChatTurnError) as context:
+            asyncio.run(chat.arun_chat_turn(0, 2, "Hi", llm=FakeLLM([])))
+        self.assertEqual(context.exception.status_code, 404)
+
+    def test_async_stream_yields_tokens_then_persists_reply(self):
+        self.load(self.MESSAGES)
+        llm = FakeLLM(["Why is that?", "I am waiting for a reply -- No."])
+
+        async def collect():
+            events = await chat.astream_chat_turn(1, 2, "The fries", llm=llm)
+            return [event async for event in events]
+
+        events = asyncio.run(collect())
+
+        # LLMs without an asynchronous client stream their reply as one chunk
+        self.assertEqual(events[0], ("token", {"content": "Why is that?"}))
+        self.assertEqual(events[-1][0], "done")
+        self.assertEqual(events[-1][1]["content"], "Why is that?")
+        self.append_chat_messages.assert_called_once()
+
+    def test_async_stream_moderator_flagged_prefix_replaces_reply(self):
+        llm = FakeLLM([], flagged=("Bad words.",))
+
+        async def moderate():
+            moderator = chat.AsyncStreamModerator(llm, min_chars=5)
+            moderator.feed("Bad words.")
+            moderator.feed("Bad words. Anyway, how was it?")
+            return await moderator.amoderate("Bad words. Anyway, how was it?")
+
+        self.assertEqual(asyncio.run(moderate()), "Sorry")
+
+    def test_format_event(self):
+        self.assertEqual(
+            chat.format_event("token", {"content": "Hi"}),
+            'event: token\ndata: {"content": "Hi"}\n\n',
+        )
+
+    def test_server_timing_header(self):
+        timer = chat.StageTimer()
+        with timer.stage("load"):
+            pass
+
+        header = timer.server_timing()
+        self.assertRegex(header, r"^load;dur=\d+\.\d, total;dur=\d+\.\d$")
+
+    @patch("src.chat._executor", None)
+    @patch("src.chat._default_workers", 32)
+    @patch("src.chat.CHAT_WORKERS", 0)
+    def test_executor_sized_by_server(self):
+        chat.set_default_workers(8)
+        executor = chat.get_executor()
+        self.addCleanup(executor.shutdown)
+        self.assertEqual(executor._max_workers, 8)
+        self.assertIs(chat.get_executor(), executor)
+
+    @patch("src.chat._executor", None)
+    @patch("src.chat._default_workers", 32)
+    @patch("src.chat.CHAT_WORKERS", 4)
+    def test_configured_executor_workers(self):
+        chat.set_default_workers(8)
+        executor = chat.get_executor()
+        self.addCleanup(executor.shutdown)
+        self.assertEqual(executor._max_workers, 4)
@@ -0,0 +1,177 @@
+import json
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from src.app import database_operations
+
+
+class TestChatMessages(TestCase):
+    MESSAGES = [
+        {"role": "system", "content": "sysprompt"},
+        {"role": "assistant", "content": "questions"},
+        {"role": "system", "content": "sysprompt2"},
+        {"role": "assistant", "content": "How was the product?"},
+    ]
+
+    def setUp(self):
+        self.mock_cursor = MagicMock()
+        self.mock_connection = MagicMock()
+        self.mock_connection.cursor.return_value.__enter__.return_value = (
+            self.mock_cursor
+        )
+
+    def test_append_chat_messages_single_insert(self):
+        database_operations.append_chat_messages(
+            self.mock_connection, 1, 2, self.MESSAGES[2:], 2
+        )
+
+        self.mock_cursor.execute.assert_called_once()
+        query, params = self.mock_cursor.execute.call_args[0]
+        self.assertIn("INSERT INTO ChatMessages", query)
+        self.assertEqual(
+            params,
+            (
+                1,
+                2,
+                2,
+                "system",
+                "sysprompt2",
+                1,
+                2,
+                3,
+                "assistant",
+                "How was the product?",
+            ),
+        )
+        self.mock_connection.commit.assert_called_once()
+
+    def test_append_no_chat_messages(self):
+        database_operations.append_chat_messages(self.mock_connection, 1, 2, [], 0)
+
+        self.mock_cursor.execute.assert_not_called()
+
+    def test_get_chat_messages(self):
+        self.mock_cursor.fetchall.return_value = self.MESSAGES
+
+        messages = database_operations.get_chat_messages(self.mock_connection, 1, 2)
+
+        self.assertEqual(messages, self.MESSAGES)
+        self.mock_cursor.execute.assert_called_once()
+        self.assertIn("ORDER BY seq", self.mock_cursor.execute.call_args[0][0])
+
+    def test_get_chat_messages_migrates_legacy_chat_log(self):
+        self.mock_cursor.fetchall.side_effect = [
+            [],
+            [{"chat_log": json.dumps({"messages": self.MESSAGES})}],
+        ]
+
+        messages = database_operations.get_chat_messages(self.mock_connection, 1, 2)
+
+        self.assertEqual(messages, self.MESSAGES)
+        query, params = self.mock_cursor.execute.call_args[0]
+        self.assertIn("INSERT INTO ChatMessages", query)
+        self.assertEqual(params[:5], (1, 2, 0, "system", "sysprompt"))
+
+    def test_get_chat_messages_new_chat(self):
+        self.mock_cursor.fetchall.return_value = []
+
+        messages = database_operations.get_chat_messages(self.mock_connection, 1, 2)
+
+        self.assertEqual(messages, [])
+        self.assertEqual(self.mock_cursor.execute.call_count, 2)
+
+    def test_fetch_chat_turn_single_query(self):
+        answers = [
+            {
+                "question_id": 2,
+                "type": "multiple",
+                "question": "Which flavours?",
+                "options": ["Seaweed", "Cheese"],
+                "answer": ["Seaweed"],
+                "submitted_at": "2024-03-01 10:00:00",
+            },
+            {
+                "question_id": 1,
+                "type": "short",
+                "question": "How was the product?",
+                "options": None,
+                "answer": ["Great"],
+                "submitted_at": "2024-03-01 10:00:00",
+            },
+        ]
+        messages = [
+            {"seq": index, **message} for index, message in enumerate(self.MESSAGES)
+        ]
+        self.mock_cursor.fetchall.return_value = [
+            {
+                "chat_context": "Survey about fries",
+                "answers": json.dumps(answers),
+                "messages": json.dumps(messages[::-1]),
+                "legacy_chat_log": None,
+            }
+        ]
+
+        turn = database_operations.fetch_chat_turn(self.mock_connection, 1, 2)
+
+        self.mock_cursor.execute.assert_called_once()
+        self.assertEqual(turn["chat_context"], "Survey about fries")
+        self.assertEqual(turn["messages"], self.MESSAGES)
+        response_object = turn["response_object"]
+        self.assertEqual(
+            response_object["metadata"],
+            {"survey_id": 1, "response_id": 2, "submitted_at": "2024-03-01 10:00:00"},
+        )
+        self.assertEqual(
+            [answer["question_id"] for answer in response_object["answers"]], [1, 2]
+        )
+        self.assertEqual(response_object["answers"][0]["options"], [])
+
+    def test_fetch_chat_turn_summary(self):
+        self.mock_cursor.fetchall.return_value = [
+            {
+                "chat_context": "Survey about fries",
+                "answers": None,
+                "messages": None,
+                "legacy_chat_log": None,
+                "summary": json.dumps({"content": "Likes fries", "covered": 11}),
+            }
+        ]
+
+        turn = database_operations.fetch_chat_turn(self.mock_connection, 1, 2)
+
+        self.assertEqual(turn["summary"], {"content": "Likes fries", "covered": 11})
+
+    def test_save_chat_summary_keeps_newer_summary(self):
+        database_operations.save_chat_summary(
+            self.mock_connection, 1, 2, "Likes fries", 11
+        )
+
+        query, params = self.mock_cursor.execute.call_args[0]
+        self.assertIn("INSERT INTO ChatSummaries", query)
+        self.assertIn("VALUES(covered) > covered", query)
+        self.assertEqual(params, (1, 2, 11, "Likes fries"))
+        self.mock_connection.commit.assert_called_once()
+
+    def test_fetch_chat_turn_survey_not_found(self):
+        self.mock_cursor.fetchall.return_value = []
+
+        self.assertIsNone(
+            database_operations.fetch_chat_turn(self.mock_connection, 0, 2)
+        )
+
+    def test_fetch_chat_turn_migrates_legacy_chat_log(self):
+        self.mock_cursor.fetchall.return_value = [
+            {
+                "chat_context": "Survey about fries",
+                "answers": None,
+                "messages": None,
+                "legacy_chat_log": json.dumps({"messages": self.MESSAGES}),
+            }
+        ]
+
+        turn = database_operations.fetch_chat_turn(self.mock_connection, 1, 2)
+
+        self.assertEqual(turn["messages"], self.MESSAGES)
+        self.assertEqual(turn["response_object"]["answers"], [])
+        query, _ = self.mock_cursor.execute.call_args[0]
+        self.assertIn("INSERT INTO ChatMessages", query)
@@ -0,0 +1,138 @@
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from src.app import database_operations
+from src.database_operations import ConnectionPool, PoolTimeoutError
+
+
+class TestConnectionPool(TestCase):
+    def make_pool(self, **kwargs):
+        factory = MagicMock(side_effect=lambda: MagicMock())
+        return ConnectionPool(factory=factory, **kwargs), factory
+
+    def test_reuses_released_connection(self):
+        pool, factory = self.make_pool(max_size=2)
+
+        connection = pool.acquire()
+        pool.release(connection)
+        self.assertIs(pool.acquire(), connection)
+        self.assertEqual(factory.call_count, 1)
+
+    def test_release_rolls_back(self):
+        pool, _ = self.make_pool()
+
+        connection = pool.acquire()
+        pool.release(connection)
+        connection.rollback.assert_called_once()
+
+    def test_checkout_timeout(self):
+        pool, _ = self.make_pool(max_size=1, timeout=0.05)
+
+        pool.acquire()
+        with self.assertRaises(PoolTimeoutError):
+            pool.acquire()
+        self.assertEqual(pool.metrics()["timeouts"], 1)
+
+    def test_waiter_is_woken_on_release(self):
+        pool, _ = self.make_pool(max_size=1, timeout=2)
+        connection = pool.acquire()
+        acquired = []
+
+        waiter = threading.Thread(target=lambda: acquired.append(pool.acquire()))
+        waiter.start()
+        time.sleep(0.05)
+        pool.release(connection)
+        waiter.join(1)
+
+        self.assertEqual(acquired, [connection])
+
+    def test_recycles_old_connection(self):
+        pool, factory = self.make_pool(recycle=0)
+
+        connection = pool.acquire()
+        pool.release(connection)
+        new_connection = pool.acquire()
+
+        self.assertIsNot(new_connection, connection)
+        connection.close.assert_called_once()
+        self.assertEqual(pool.metrics()["recycled"], 1)
+        self.assertEqual(pool.metrics()["size"], 1)
+
+    def test_replaces_connection_failing_health_check(self):
+        pool, factory = self.make_pool(health_check_interval=0)
+
+        connection = pool.acquire()
+        connection.ping.side_effect = Exception("MySQL server has gone away")
+        pool.release(connection)
+
+        self.assertIsNot(pool.acquire(), connection)
+        self.assertEqual(pool.metrics()["failed_health_checks"], 1)
+
+    def test_broken_connection_is_discarded_on_release(self):
+        pool, _ = self.make_pool()
+
+        connection = pool.acquire()
+        connection.rollback.side_effect = Exception("Lost connection")
+        pool.release(connection)
+
+        metrics = pool.metrics()
+        self.assertEqual(metrics["size"], 0)
+        self.assertEqual(metrics["idle"], 0)
+
+    def test_factory_failure_frees_slot(self):
+        pool = ConnectionPool(
+            factory=MagicMock(side_effect=Exception("refused")), max_size=1
+        )
+
+        with self.assertRaises(Exception):
+            pool.acquire()
+        self.assertEqual(pool.metrics()["size"], 0)
+
+    def test_metrics(self):
+        pool, _ = self.make_pool(max_size=3)
+
+        first = pool.acquire()
+        pool.acquire()
+        pool.release(first)
+
+        metrics = pool.metrics()
+        self.assertEqual(metrics["max_size"], 3)
+        self.assertEqual(metrics["size"], 2)
+        self.assertEqual(metrics["in_use"], 1)
+        self.assertEqual(metrics["idle"], 1)
+        self.assertEqual(metrics["checkouts"], 2)
+
+    def test_never_exceeds_max_size(self):
+        pool, factory = self.make_pool(max_size=4, timeout=5)
+
+        def borrow():
+            for _ in range(50):
+                connection = pool.acquire()
+                pool.release(connection)
+
+        threads = [threading.Thread(target=borrow) for _ in range(16)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertLessEqual(factory.call_count, 4)
+        self.assertEqual(pool.metrics()["checkouts"], 800)
+
+    def test_get_connection_returns_connection_to_pool(self):
+        pool, _ = self.make_pool()
+
+        with patch("src.database_operations.get_pool", return_value=pool):
+            with database_operations.get_connection() as connection:
+                self.assertEqual(pool.metrics()["in_use"], 1)
+        self.assertEqual(pool.metrics()["in_use"], 0)
+        self.assertIs(pool.acquire(), connection)
+
+    def test_get_connection_yields_none_on_failure(self):
+        pool = ConnectionPool(factory=MagicMock(side_effect=Exception("refused")))
+
+        with patch("src.database_operations.get_pool", return_value=pool):
+            with database_operations.get_connection() as connection:
+                self.assertIsNone(connection)
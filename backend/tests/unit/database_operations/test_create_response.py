@@ -1,10 +1,19 @@
 from datetime import datetime
 from unittest import TestCase
+from unittest.mock import MagicMock
 
 from src.app import database_operations
 
 
 class TestCreateResponse(TestCase):
+    MESSAGES = [
+        {"role": "system", "content": "sysprompt"},
+        {"role": "assistant", "content": "questions"},
+        {"role": "system", "content": "sysprompt2"},
+        {"role": "assistant", "content": "How was the product?"},
+        {"role": "user", "content": "Great"},
+    ]
+
     def test_create_response_object(self):
         row = {"submitted_at": datetime(2024, 3, 31, 12, 0, 0)}
         expected_response_object = {
@@ -57,3 +66,39 @@ class TestCreateResponse(TestCase):
             response_objects[123]["answers"][0]["options"], ["Red", "Blue", "Green"]
         )
         self.assertEqual(response_objects[123]["answers"][0]["answer"], ["Blue"])
+
+    def test_fetch_chat_logs_single_query(self):
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = [
+            {"response_id": 1, **message} for message in self.MESSAGES[3:]
+        ] + [{"response_id": 2, "role": "assistant", "content": "Hi"}]
+        mock_connection = MagicMock()
+        mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
+
+        chat_logs = database_operations.fetch_chat_logs(mock_connection, 1)
+
+        mock_cursor.execute.assert_called_once()
+        self.assertEqual(
+            chat_logs,
+            {1: self.MESSAGES[3:], 2: [{"role": "assistant", "content": "Hi"}]},
+        )
+
+    def test_fetch_chat_logs_for_response_ids(self):
+        mock_cursor = MagicMock()
+        mock_cursor.fetchall.return_value = []
+        mock_connection = MagicMock()
+        mock_connection.cursor.return_value.__enter__.return_value = mock_cursor
+
+        database_operations.fetch_chat_logs(mock_connection, 1, [4, 5])
+
+        query, params = mock_cursor.execute.call_args[0]
+        self.assertIn("response_id IN (%s, %s)", query)
+        self.assertEqual(params, (1, 3, 4, 5))
+
+    def test_attach_chat_logs(self):
+        response_objects = {1: {"answers": [], "messages": []}, 2: {"messages": []}}
+
+        database_operations.attach_chat_logs(response_objects, {1: self.MESSAGES[3:]})
+
+        self.assertEqual(response_objects[1]["messages"], self.MESSAGES[3:])
+        self.assertEqual(response_objects[2]["messages"], [])
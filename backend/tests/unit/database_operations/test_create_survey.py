@@ -0,0 +1,80 @@
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from src.app import database_operations
+
+
+class TestCreateSurvey(TestCase):
+    SURVEY = {
+        "metadata": {"created_by": "admin1", "created_at": "2024-03-22 15:24:10"},
+        "title": "Test Title",
+        "subtitle": "Test Subtitle",
+        "questions": [
+            {
+                "question_id": 1,
+                "type": "free_response",
+                "question": "Do you have any feedback about the venue?",
+                "options": [],
+            }
+        ],
+        "chat_context": "Full Stack Entertainment organises concerts.",
+    }
+
+    def setUp(self):
+        self.mock_connection = MagicMock()
+        self.mock_cursor = self.mock_connection.cursor.return_value
+        self.mock_cursor.lastrowid = 3
+
+    @patch("src.database_operations.background.submit")
+    @patch("src.database_operations.summarise")
+    def test_short_context_is_ready_without_summary(self, mock_summarise, mock_submit):
+        survey_id = database_operations.create_survey(self.mock_connection, self.SURVEY)
+
+        self.assertEqual(survey_id, 3)
+        survey_params = self.mock_cursor.execute.call_args_list[0][0][1]
+        self.assertEqual(
+            survey_params[-3:], (self.SURVEY["chat_context"],) * 2 + ("ready",)
+        )
+        mock_summarise.assert_not_called()
+        mock_submit.assert_not_called()
+
+    @patch("src.database_operations.background.submit")
+    @patch("src.database_operations.summarise")
+    def test_long_context_is_summarised_after_commit(self, mock_summarise, mock_submit):
+        survey = {**self.SURVEY, "chat_context": "x" * 2000}
+        mock_submit.side_effect = (
+            lambda *args: self.mock_connection.commit.assert_called_once()
+        )
+
+        database_operations.create_survey(self.mock_connection, survey)
+
+        survey_params = self.mock_cursor.execute.call_args_list[0][0][1]
+        self.assertEqual(survey_params[-3:], ("x" * 2000, None, "pending"))
+        mock_summarise.assert_not_called()
+        mock_submit.assert_called_once_with(
+            database_operations.summarise_survey_context, 3, "x" * 2000
+        )
+
+    @patch("src.database_operations.execute")
+    @patch("src.database_operations.get_connection")
+    @patch("src.database_operations.summarise", return_value="A summary")
+    def test_summarise_survey_context(
+        self, mock_summarise, mock_get_connection, mock_execute
+    ):
+        status = database_operations.summarise_survey_context(3, "x" * 2000)
+
+        self.assertEqual(status, "ready")
+        params = mock_execute.call_args[0][2]
+        self.assertEqual(params, ("A summary", "ready", 3))
+
+    @patch("src.database_operations.execute")
+    @patch("src.database_operations.get_connection")
+    @patch("src.database_operations.summarise", side_effect=Exception("API down"))
+    def test_summarise_survey_context_failure(
+        self, mock_summarise, mock_get_connection, mock_execute
+    ):
+        status = database_operations.summarise_survey_context(3, "x" * 2000)
+
+        self.assertEqual(status, "failed")
+        params = mock_execute.call_args[0][2]
+        self.assertEqual(params, (None, "failed", 3))
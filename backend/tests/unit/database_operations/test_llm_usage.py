@@ -0,0 +1,97 @@
+from decimal import Decimal
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from src.app import database_operations
+
+
+class TestLLMUsage(TestCase):
+    RECORD = {
+        "survey_id": 1,
+        "response_id": 2,
+        "turn": 5,
+        "call_site": "reply",
+        "model": "gpt-4",
+        "prompt_tokens": 100,
+        "completion_tokens": 20,
+        "cost_usd": 0.0042,
+        "latency_ms": 830.0,
+        "created_at": "2024-03-22 15:24:10",
+    }
+
+    def setUp(self):
+        self.mock_cursor = MagicMock()
+        self.mock_connection = MagicMock()
+        self.mock_connection.cursor.return_value.__enter__.return_value = (
+            self.mock_cursor
+        )
+
+    @patch("src.database_operations.get_connection")
+    def test_save_llm_usage_single_insert(self, mock_get_connection):
+        mock_get_connection.return_value.__enter__.return_value = self.mock_connection
+
+        database_operations.save_llm_usage([self.RECORD, self.RECORD])
+
+        self.mock_cursor.execute.assert_called_once()
+        query, params = self.mock_cursor.execute.call_args[0]
+        self.assertIn("INSERT INTO LLMUsage", query)
+        self.assertEqual(len(params), 20)
+        self.assertEqual(params[:4], (1, 2, 5, "reply"))
+        self.mock_connection.commit.assert_called_once()
+
+    @patch("src.database_operations.get_connection")
+    def test_save_llm_usage_without_connection(self, mock_get_connection):
+        mock_get_connection.return_value.__enter__.return_value = None
+
+        with self.assertRaises(database_operations.DataBaseError):
+            database_operations.save_llm_usage([self.RECORD])
+
+    def test_fetch_response_usage(self):
+        self.mock_cursor.fetchall.side_effect = [
+            [
+                self.totals(call_site="reply", calls=2, prompt_tokens=300),
+                self.totals(call_site="exit_check", calls=2, prompt_tokens=200),
+            ],
+            [
+                self.totals(turn=4, calls=2, prompt_tokens=200),
+                self.totals(turn=6, calls=2, prompt_tokens=300),
+            ],
+        ]
+
+        usage = database_operations.fetch_response_usage(self.mock_connection, 1, 2)
+
+        self.assertEqual(usage["totals"]["calls"], 4)
+        self.assertEqual(usage["totals"]["prompt_tokens"], 500)
+        self.assertEqual(usage["call_sites"]["reply"]["prompt_tokens"], 300)
+        self.assertEqual([turn["turn"] for turn in usage["turns"]], [4, 6])
+        self.assertIsInstance(usage["turns"][0]["cost_usd"], float)
+        self.assertIn("ORDER BY turn", self.mock_cursor.execute.call_args[0][0])
+
+    def test_fetch_survey_usage(self):
+        self.mock_cursor.fetchall.side_effect = [
+            [self.totals(call_site="reply", calls=3, prompt_tokens=900)],
+            [self.totals(response_id=2, turns=12, calls=3, prompt_tokens=900)],
+        ]
+
+        usage = database_operations.fetch_survey_usage(self.mock_connection, 1, 5)
+
+        self.assertEqual(usage["totals"]["prompt_tokens"], 900)
+        self.assertEqual(usage["responses"][0]["response_id"], 2)
+        self.assertEqual(self.mock_cursor.execute.call_args[0][1], (1, 5))
+
+    def test_fetch_usage_error(self):
+        self.mock_cursor.execute.side_effect = Exception("error")
+
+        with self.assertRaises(database_operations.DataBaseError):
+            database_operations.fetch_survey_usage(self.mock_connection, 1)
+
+    @staticmethod
+    def totals(calls, prompt_tokens, **fields):
+        return {
+            **fields,
+            "calls": calls,
+            "prompt_tokens": Decimal(prompt_tokens),
+            "completion_tokens": Decimal(10 * calls),
+            "cost_usd": Decimal("0.001000"),
+            "latency_ms_avg": 500.0,
+        }
@@ -0,0 +1,175 @@
+from datetime import datetime
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from src.app import app, database_operations
+
+
+def survey_row(survey_id, question_id=1):
+    return {
+        "survey_id": survey_id,
+        "admin_username": "admin",
+        "created_at": datetime(2024, 1, 1),
+        "summary_status": "ready",
+        "title": f"Survey {survey_id}",
+        "subtitle": "",
+        "chat_context": "",
+        "question_id": question_id,
+        "question_type": "free_response",
+        "question": "Why?",
+        "options": None,
+    }
+
+
+def response_row(response_id, question_id=1):
+    return {
+        "response_id": response_id,
+        "submitted_at": datetime(2024, 1, 1),
+        "question_id": question_id,
+        "question_type": "free_response",
+        "question": "Why?",
+        "options": None,
+        "answer": '["Because"]',
+    }
+
+
+class TestFetchSurveyPage(TestCase):
+    def setUp(self):
+        self.mock_cursor = MagicMock()
+        self.mock_connection = MagicMock()
+        self.mock_connection.cursor.return_value.__enter__.return_value = (
+            self.mock_cursor
+        )
+
+    def test_next_cursor_when_more_surveys(self):
+        self.mock_cursor.fetchall.return_value = [
+            survey_row(5, 1),
+            survey_row(5, 2),
+            survey_row(4),
+            survey_row(3),
+        ]
+
+        surveys, next_cursor = database_operations.fetch_survey_page(
+            self.mock_connection, 2
+        )
+
+        self.assertEqual([s["metadata"]["survey_id"] for s in surveys], [5, 4])
+        self.assertEqual(len(surveys[0]["questions"]), 2)
+        self.assertEqual(next_cursor, 4)
+        query, params = self.mock_cursor.execute.call_args[0]
+        self.assertIn("LIMIT %s", query)
+        self.assertEqual(params, (3,))
+
+    def test_last_page_has_no_cursor(self):
+        self.mock_cursor.fetchall.return_value = [survey_row(2), survey_row(1)]
+
+        surveys, next_cursor = database_operations.fetch_survey_page(
+            self.mock_connection, 2, after=3, admin_username="admin"
+        )
+
+        self.assertEqual(len(surveys), 2)
+        self.assertIsNone(next_cursor)
+        query, params = self.mock_cursor.execute.call_args[0]
+        self.assertIn("admin_username = %s AND survey_id < %s", query)
+        self.assertEqual(params, ("admin", 3, 3))
+
+    def test_database_error(self):
+        self.mock_cursor.execute.side_effect = Exception("Connection lost")
+
+        with self.assertRaises(database_operations.DataBaseError):
+            database_operations.fetch_survey_page(self.mock_connection, 2)
+
+
+class TestFetchResponsePage(TestCase):
+    def setUp(self):
+        self.mock_cursor = MagicMock()
+        self.mock_connection = MagicMock()
+        self.mock_connection.cursor.return_value.__enter__.return_value = (
+            self.mock_cursor
+        )
+
+    def test_next_cursor_and_chat_logs_of_page(self):
+        self.mock_cursor.fetchall.side_effect = [
+            [response_row(7, 1), response_row(7, 2), response_row(8)],
+            [{"response_id": 7, "role": "user", "content": "Hi"}],
+        ]
+
+        responses, next_cursor = database_operations.fetch_response_page(
+            self.mock_connection, 1, 1, after=6
+        )
+
+        self.assertEqual(len(responses), 1)
+        self.assertEqual(len(responses[0]["answers"]), 2)
+        self.assertEqual(responses[0]["messages"], [{"role": "user", "content": "Hi"}])
+        self.assertEqual(next_cursor, 7)
+        page_params = self.mock_cursor.execute.call_args_list[0][0][1]
+        self.assertEqual(page_params, (1, 6, 2, 1))
+        chat_query, chat_params = self.mock_cursor.execute.call_args_list[1][0]
+        self.assertIn("response_id IN (%s)", chat_query)
+        self.assertEqual(chat_params[-1], 7)
+
+    def test_empty_page(self):
+        self.mock_cursor.fetchall.return_value = []
+
+        responses, next_cursor = database_operations.fetch_response_page(
+            self.mock_connection, 1, 100
+        )
+
+        self.assertEqual(responses, [])
+        self.assertIsNone(next_cursor)
+        self.mock_cursor.execute.assert_called_once()
+
+
+class TestPageRoutes(TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.connection = MagicMock()
+        self.connection.__enter__.return_value = MagicMock()
+        patcher = patch.object(
+            database_operations, "get_connection", return_value=self.connection
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def patch_page(self, items, next_cursor):
+        patcher = patch.object(
+            database_operations,
+            "fetch_survey_page",
+            return_value=(items, next_cursor),
+        )
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def test_next_page_headers(self):
+        fetch_survey_page = self.patch_page([{}], 4)
+
+        response = self.client.get("/api/v1/surveys?limit=1&admin=admin")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, [{}])
+        self.assertEqual(response.headers["X-Next-Cursor"], "4")
+        self.assertEqual(
+            response.headers["Link"],
+            '</api/v1/surveys?limit=1&admin=admin&after=4>; rel="next"',
+        )
+        fetch_survey_page.assert_called_once_with(
+            self.connection.__enter__.return_value, 1, None, "admin"
+        )
+
+    def test_limit_is_clamped(self):
+        fetch_survey_page = self.patch_page([], None)
+
+        response = self.client.get("/api/v1/surveys?limit=100000&after=10")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn("X-Next-Cursor", response.headers)
+        self.assertEqual(fetch_survey_page.call_args[0][1:3], (500, 10))
+
+    def test_invalid_parameters(self):
+        for query in ("limit=abc", "after=-1", "limit=-5"):
+            response = self.client.get("/api/v1/surveys?" + query)
+
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(
+                response.json, {"message": "Invalid pagination parameters"}
+            )
@@ -0,0 +1,76 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from src.app import database_operations
+
+
+class TestSaveResponse(TestCase):
+    RESPONSE = {
+        "metadata": {"survey_id": 1},
+        "answers": [
+            {
+                "question_id": 1,
+                "type": "multiple_choice",
+                "question": "Which performance did you enjoy the most?",
+                "options": ["Clowns", "Acrobats"],
+                "answer": ["Clowns"],
+            },
+            {
+                "question_id": 2,
+                "type": "free_response",
+                "question": "Do you have any feedback about the venue?",
+                "options": [],
+                "answer": ["Spacious"],
+            },
+        ],
+    }
+
+    def setUp(self):
+        self.mock_cursor = MagicMock()
+        self.mock_cursor.rowcount = 1
+        self.mock_cursor.lastrowid = 7
+        self.mock_connection = MagicMock()
+        self.mock_connection.cursor.return_value.__enter__.return_value = (
+            self.mock_cursor
+        )
+
+    def test_allocates_id_and_inserts_answers_in_one_statement(self):
+        response_id = database_operations.save_response_to_database(
+            self.mock_connection, self.RESPONSE, 1
+        )
+
+        self.assertEqual(response_id, 7)
+        self.assertEqual(self.mock_cursor.execute.call_count, 2)
+
+        allocate_query, allocate_params = self.mock_cursor.execute.call_args_list[0][0]
+        self.assertIn("LAST_INSERT_ID(last_response_id + 1)", allocate_query)
+        self.assertEqual(allocate_params, (1,))
+
+        insert_query, insert_params = self.mock_cursor.execute.call_args_list[1][0]
+        self.assertEqual(insert_query.count("CURRENT_TIMESTAMP"), 2)
+        self.assertEqual(
+            insert_params, [7, 1, 1, '["Clowns"]', 7, 1, 2, '["Spacious"]']
+        )
+        self.mock_connection.commit.assert_called_once()
+
+    def test_unknown_survey_rolls_back(self):
+        self.mock_cursor.rowcount = 0
+
+        response_id = database_operations.save_response_to_database(
+            self.mock_connection, self.RESPONSE, 1
+        )
+
+        self.assertIsNone(response_id)
+        self.assertEqual(self.mock_cursor.execute.call_count, 1)
+        self.mock_connection.commit.assert_not_called()
+        self.mock_connection.rollback.assert_called_once()
+
+    def test_failed_insert_rolls_back(self):
+        self.mock_cursor.execute.side_effect = [None, Exception("Lost connection")]
+
+        with self.assertRaises(database_operations.DataBaseError):
+            database_operations.save_response_to_database(
+                self.mock_connection, self.RESPONSE, 1
+            )
+        self.mock_connection.commit.assert_not_called()
+        self.mock_connection.rollback.assert_called_once()
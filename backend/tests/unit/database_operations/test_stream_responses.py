@@ -0,0 +1,87 @@
+from datetime import datetime
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from src.app import database_operations
+
+
+def answer_row(response_id, question_id):
+    return {
+        "response_id": response_id,
+        "submitted_at": datetime(2024, 1, 1),
+        "question_id": question_id,
+        "question_type": "free_response",
+        "question": f"Question {question_id}",
+        "options": None,
+        "answer": f'["Answer {response_id}.{question_id}"]',
+    }
+
+
+def message_row(response_id, content):
+    return {"response_id": response_id, "role": "user", "content": content}
+
+
+def streaming_connection(rows):
+    connection = MagicMock()
+    cursor = connection.cursor.return_value.__enter__.return_value
+    cursor.__iter__.side_effect = lambda: iter(rows)
+    return connection, cursor
+
+
+class TestStreamResponses(TestCase):
+    def test_merges_answers_and_messages(self):
+        answers, answers_cursor = streaming_connection(
+            [answer_row(1, 1), answer_row(1, 2), answer_row(2, 1), answer_row(4, 1)]
+        )
+        messages, _ = streaming_connection(
+            [
+                message_row(1, "Hi"),
+                message_row(1, "Bye"),
+                message_row(3, "Orphan"),
+                message_row(4, "Hello"),
+            ]
+        )
+
+        responses = list(database_operations.stream_responses(answers, messages, 7))
+
+        self.assertEqual([r["metadata"]["response_id"] for r in responses], [1, 2, 4])
+        self.assertEqual(len(responses[0]["answers"]), 2)
+        self.assertEqual(
+            [m["content"] for m in responses[0]["messages"]], ["Hi", "Bye"]
+        )
+        self.assertEqual(responses[1]["messages"], [])
+        self.assertEqual(responses[2]["messages"][0]["content"], "Hello")
+        answers.cursor.assert_called_once_with(
+            database_operations.pymysql.cursors.SSDictCursor
+        )
+        query, params = answers_cursor.execute.call_args[0]
+        self.assertIn("ORDER BY sr.response_id, sr.question_id", query)
+        self.assertEqual(params, (7,))
+
+    def test_yields_each_response_when_complete(self):
+        read = []
+
+        def rows():
+            for row in [answer_row(1, 1), answer_row(2, 1), answer_row(3, 1)]:
+                read.append(row["response_id"])
+                yield row
+
+        answers, answers_cursor = streaming_connection([])
+        answers_cursor.__iter__.side_effect = rows
+        messages, _ = streaming_connection([])
+
+        responses = database_operations.stream_responses(answers, messages, 7)
+
+        self.assertEqual(next(responses)["metadata"]["response_id"], 1)
+        self.assertEqual(read, [1, 2])
+        responses.close()
+        answers.cursor.return_value.__exit__.assert_called_once()
+        messages.cursor.return_value.__exit__.assert_called_once()
+
+    def test_database_error(self):
+        answers, answers_cursor = streaming_connection([])
+        answers_cursor.execute.side_effect = Exception("Connection lost")
+        messages, _ = streaming_connection([])
+
+        with self.assertRaises(database_operations.DataBaseError):
+            list(database_operations.stream_responses(answers, messages, 7))
@@ -181,3 +181,83 @@ class TestValidateResponse(TestCase):
         result, message = database_operations.validate_response_object(response_data)
         self.assertFalse(result)
         self.assertEqual(message, "'answer' is empty")
+
+
+class TestResponseValidator(TestCase):
+    def setUp(self):
+        self.survey_object = {
+            "metadata": {"survey_id": 3},
+            "questions": [
+                {
+                    "question_id": 1,
+                    "type": "multiple_choice",
+                    "question": "Which performance did you enjoy the most?",
+                    "options": ["Clowns", "Acrobats", "Jugglers"],
+                },
+                {
+                    "question_id": 2,
+                    "type": "free_response",
+                    "question": "Do you have any feedback about the venue?",
+                    "options": [],
+                },
+            ],
+        }
+        self.validator = database_operations.ResponseValidator(self.survey_object)
+        self.response_data = {
+            "metadata": {"survey_id": 3},
+            "answers": [
+                {
+                    "question_id": 2,
+                    "type": "free_response",
+                    "question": "Do you have any feedback about the venue?",
+                    "options": [],
+                    "answer": ["The venue was spacious."],
+                },
+                {
+                    "question_id": 1,
+                    "type": "multiple_choice",
+                    "question": "Which performance did you enjoy the most?",
+                    "options": ["Jugglers", "Clowns", "Acrobats"],
+                    "answer": ["Clowns"],
+                },
+            ],
+        }
+
+    def assertInvalid(self, message):
+        self.assertEqual(self.validator.validate(self.response_data), message)
+        self.assertEqual(
+            database_operations.validate_response(
+                self.response_data, self.survey_object
+            ),
+            message,
+        )
+
+    def test_valid_response_in_any_order(self):
+        self.assertInvalid(None)
+
+    def test_number_of_questions_mismatch(self):
+        self.response_data["answers"].pop()
+        self.assertInvalid("Number of questions in response does not match survey")
+
+    def test_question_not_found(self):
+        self.response_data["answers"][0]["question_id"] = 4
+        self.assertInvalid("Question with ID 4 not found in survey")
+
+    def test_type_and_text_mismatch(self):
+        self.response_data["answers"][1]["question"] = "Which act?"
+        self.assertInvalid("Question text mismatch for question with ID 1")
+        self.response_data["answers"][1]["type"] = "multiple_response"
+        self.assertInvalid("Question type mismatch for question with ID 1")
+
+    def test_options_mismatch(self):
+        answer = self.response_data["answers"][1]
+        answer["options"] = ["Clowns", "Acrobats"]
+        self.assertInvalid("Number of options mismatch for question with ID 1")
+        answer["options"] = ["Clowns", "Acrobats", "Magicians"]
+        self.assertInvalid(
+            "Option 'Magicians' not found in question with ID 1's options"
+        )
+        answer["options"] = ["Clowns", "Acrobats", ["Jugglers"]]
+        self.assertInvalid(
+            "Option '['Jugglers']' not found in question with ID 1's options"
+        )
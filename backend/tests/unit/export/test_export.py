@@ -0,0 +1,132 @@
+import csv
+import io
+import json
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from src import export
+from src.app import app, database_operations
+
+RESPONSES = [
+    {
+        "metadata": {
+            "survey_id": 1,
+            "response_id": 1,
+            "submitted_at": "2024-01-01 00:00:00",
+        },
+        "answers": [
+            {"question_id": 1, "answer": ["Clowns", "Jugglers"]},
+            {"question_id": 2, "answer": ['Very "good", thanks']},
+        ],
+        "messages": [
+            {"role": "assistant", "content": "What did you like?"},
+            {"role": "user", "content": "The clowns"},
+        ],
+    },
+    {
+        "metadata": {
+            "survey_id": 1,
+            "response_id": 2,
+            "submitted_at": "2024-01-02 00:00:00",
+        },
+        "answers": [{"question_id": 2, "answer": ["Fine"]}],
+        "messages": [],
+    },
+]
+
+QUESTIONS = [
+    {"question_id": 1, "question": "Which acts?"},
+    {"question_id": 2, "question": "How was it?"},
+]
+
+
+class TestExportFormats(TestCase):
+    def test_ndjson_lines(self):
+        lines = list(export.ndjson_lines(iter(RESPONSES)))
+
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(all(line.endswith("\n") for line in lines))
+        self.assertEqual([json.loads(line) for line in lines], RESPONSES)
+
+    def test_csv_lines(self):
+        lines = list(export.csv_lines(QUESTIONS, iter(RESPONSES)))
+
+        rows = list(csv.reader(io.StringIO("".join(lines))))
+        self.assertEqual(len(lines), 3)
+        self.assertEqual(
+            rows[0],
+            ["response_id", "submitted_at", "Which acts?", "How was it?", "chat"],
+        )
+        self.assertEqual(
+            rows[1],
+            [
+                "1",
+                "2024-01-01 00:00:00",
+                "Clowns; Jugglers",
+                'Very "good", thanks',
+                "assistant: What did you like?\nuser: The clowns",
+            ],
+        )
+        self.assertEqual(rows[2], ["2", "2024-01-02 00:00:00", "", "Fine", ""])
+
+
+class TestExportRoute(TestCase):
+    def setUp(self):
+        self.client = app.test_client()
+        self.connection = MagicMock()
+        self.contexts = [MagicMock(), MagicMock()]
+        for context in self.contexts:
+            context.__enter__.return_value = self.connection
+        for name, value in (
+            ("get_connection", MagicMock(side_effect=self.contexts)),
+            (
+                "fetch",
+                MagicMock(return_value=[{"survey_id": 1, "admin_username": "admin"}]),
+            ),
+            ("stream_responses", MagicMock(return_value=(r for r in RESPONSES))),
+        ):
+            patcher = patch.object(database_operations, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = patch("jwt.decode", return_value={"sub": "admin"})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.headers = {"Authorization": "Bearer token"}
+
+    def test_ndjson_export(self):
+        response = self.client.get(
+            "/api/v1/surveys/1/responses/export", headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+        self.assertIn(
+            "survey-1-responses.ndjson", response.headers["Content-Disposition"]
+        )
+        self.assertEqual(
+            [json.loads(line) for line in response.data.splitlines()], RESPONSES
+        )
+        response.close()
+        for context in self.contexts:
+            context.__exit__.assert_called_once()
+
+    def test_invalid_format(self):
+        response = self.client.get(
+            "/api/v1/surveys/1/responses/export?format=xml", headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json, {"message": "Invalid export format"})
+
+    def test_other_admin_forbidden(self):
+        database_operations.fetch.return_value = [
+            {"survey_id": 1, "admin_username": "other"}
+        ]
+
+        response = self.client.get(
+            "/api/v1/surveys/1/responses/export", headers=self.headers
+        )
+
+        self.assertEqual(response.status_code, 403)
+        self.contexts[0].__exit__.assert_called_once()
+        self.contexts[1].__enter__.assert_not_called()
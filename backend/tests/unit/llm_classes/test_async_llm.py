@@ -0,0 +1,97 @@
+import asyncio
+from unittest import TestCase
+from unittest.mock import AsyncMock, MagicMock
+
+from src.llm_classes.chatlog import ChatLog
+from src.llm_classes.functions import acheck_exit
+from src.llm_classes.llm_level import GPT, ContentModeration
+
+
+def completion(content):
+    return MagicMock(
+        choices=[MagicMock(message=MagicMock(content=content))],
+        usage=MagicMock(prompt_tokens=10, completion_tokens=5),
+    )
+
+
+class AsyncChunks:
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
+
+
+class TestAsyncGPT(TestCase):
+    def setUp(self):
+        ContentModeration.verdicts.clear()
+        self.client = MagicMock()
+        self.async_client = MagicMock()
+        self.async_client.chat.completions.create = AsyncMock(
+            return_value=completion("What did you like?")
+        )
+        self.async_client.moderations.create = AsyncMock(
+            return_value=MagicMock(results=[MagicMock(flagged=False)])
+        )
+        self.gpt = GPT(client=self.client, async_client=self.async_client)
+
+    def test_arun_uses_async_client(self):
+        output = asyncio.run(self.gpt.arun([{"role": "user", "content": "Hi"}]))
+
+        self.assertEqual(output, "What did you like?")
+        self.async_client.moderations.create.assert_awaited_once_with(
+            input="What did you like?"
+        )
+        self.client.chat.completions.create.assert_not_called()
+        self.client.moderations.create.assert_not_called()
+
+    def test_amoderate_replaces_flagged_text(self):
+        self.async_client.moderations.create.return_value = MagicMock(
+            results=[MagicMock(flagged=True)]
+        )
+
+        output = asyncio.run(self.gpt.amoderate("Harmful text"))
+
+        self.assertEqual(output, self.gpt.content_moderation.default)
+
+    def test_astream_yields_chunks(self):
+        self.async_client.chat.completions.create.return_value = AsyncChunks(
+            [
+                MagicMock(choices=[MagicMock(delta=MagicMock(content="What "))]),
+                MagicMock(choices=[MagicMock(delta=MagicMock(content="else?"))]),
+                MagicMock(choices=[], usage=MagicMock()),
+            ]
+        )
+
+        async def collect():
+            return [chunk async for chunk in self.gpt.astream([])]
+
+        self.assertEqual(asyncio.run(collect()), ["What ", "else?"])
+
+
+class TestAsyncCheckExit(TestCase):
+    MESSAGES = [{"role": "assistant", "content": "Hi"}] * (ChatLog.MIN_LEN + 1)
+
+    def test_acheck_exit_true(self):
+        llm = MagicMock()
+        llm.arun = AsyncMock(return_value="I thanked the user -- Yes.")
+
+        self.assertTrue(asyncio.run(acheck_exit(self.MESSAGES, llm)))
+        self.assertEqual(llm.arun.await_args[0][0][-1], ChatLog.END_QUERY)
+
+    def test_acheck_exit_false(self):
+        llm = MagicMock()
+        llm.arun = AsyncMock(return_value="I asked a question -- No.")
+
+        self.assertFalse(asyncio.run(acheck_exit(self.MESSAGES, llm)))
+
+    def test_acheck_exit_skips_short_chats(self):
+        llm = MagicMock()
+        llm.arun = AsyncMock()
+
+        self.assertFalse(asyncio.run(acheck_exit(self.MESSAGES[:2], llm)))
+        llm.arun.assert_not_called()
@@ -0,0 +1,96 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from src.llm_classes import context_window
+from src.llm_classes.context_window import (
+    HEADER_LEN,
+    estimate_tokens,
+    fold,
+    fold_point,
+    window_messages,
+)
+
+
+def interview(turns):
+    header = [
+        {"role": "system", "content": "sysprompt with survey answers"},
+        {"role": "assistant", "content": "planned questions"},
+        {"role": "system", "content": "sysprompt2"},
+    ]
+    messages = []
+    for turn in range(turns):
+        messages.append({"role": "assistant", "content": f"question {turn}"})
+        messages.append({"role": "user", "content": f"answer {turn}"})
+    return header + messages
+
+
+class TestContextWindow(TestCase):
+    def test_estimate_tokens(self):
+        self.assertEqual(estimate_tokens([{"role": "user", "content": "a" * 40}]), 14)
+
+    def test_window_without_summary_is_whole_chat(self):
+        messages = interview(10)
+
+        self.assertEqual(window_messages(messages, None), messages)
+
+    def test_window_replaces_covered_messages_with_summary(self):
+        messages = interview(10)
+        summary = {"content": "The user likes fries.", "covered": 13}
+
+        window = window_messages(messages, summary)
+
+        self.assertEqual(window[:HEADER_LEN], messages[:HEADER_LEN])
+        self.assertEqual(window[HEADER_LEN]["role"], "system")
+        self.assertIn("The user likes fries.", window[HEADER_LEN]["content"])
+        self.assertEqual(window[HEADER_LEN + 1 :], messages[13:])
+
+    def test_summary_beyond_chat_is_ignored(self):
+        messages = interview(2)
+
+        self.assertEqual(
+            window_messages(messages, {"content": "stale", "covered": 20}), messages
+        )
+
+    def test_fold_point(self):
+        # 6 turns are kept and 4 turns must fall out of the window before folding
+        self.assertIsNone(fold_point(interview(9), None, keep_turns=6, fold_turns=4))
+        self.assertEqual(
+            fold_point(interview(10), None, keep_turns=6, fold_turns=4),
+            HEADER_LEN + 8,
+        )
+        self.assertIsNone(
+            fold_point(
+                interview(11),
+                {"content": "", "covered": HEADER_LEN + 8},
+                keep_turns=6,
+                fold_turns=4,
+            )
+        )
+
+    def test_fold_updates_summary_with_new_messages(self):
+        llm = MagicMock()
+        llm.run.return_value = "The user likes fries and salt."
+        messages = interview(14)
+
+        summary = fold(
+            messages, {"content": "The user likes fries.", "covered": 11}, 19, llm
+        )
+
+        self.assertEqual(
+            summary, {"content": "The user likes fries and salt.", "covered": 19}
+        )
+        prompt = llm.run.call_args.args[0][-1]["content"]
+        self.assertIn("The user likes fries.", prompt)
+        self.assertIn("question 4", prompt)
+        self.assertNotIn("question 3", prompt)
+        self.assertNotIn("question 8", prompt)
+
+    def test_metrics(self):
+        before = context_window.context_metrics()["turns"]
+        messages = interview(10)
+        window = window_messages(messages, {"content": "summary", "covered": 13})
+
+        full, windowed = context_window.record_prompt(messages, window)
+
+        self.assertLess(windowed, full)
+        self.assertEqual(context_window.context_metrics()["turns"], before + 1)
@@ -4,10 +4,14 @@ from unittest.mock import MagicMock, patch
 from openai import OpenAI
 from src.llm_classes.chatlog import ChatLog
 from src.llm_classes.functions import construct_chatlog
-from src.llm_classes.llm_level import GPT, LLM
+from src.llm_classes.llm_level import GPT, LLM, get_llm, reset_clients
 
 
 class TestMockAPI(TestCase):
+    def setUp(self):
+        reset_clients()
+        self.addCleanup(reset_clients)
+
     @patch("src.llm_classes.llm_level.OpenAI")
     def test_gpt_exception_handling(self, mock_openai):
         mock_client = MagicMock()
@@ -36,3 +40,59 @@ class TestMockAPI(TestCase):
         response = gpt.run([{"role": "system", "content": "Some prompt"}])
         self.assertEqual(response, "Mocked response")
         mock_client.chat.completions.create.assert_called_once()
+
+    @patch("src.llm_classes.llm_level.OpenAI")
+    def test_gpt_stream(self, mock_openai):
+        mock_client = MagicMock()
+        mock_openai.return_value = mock_client
+        chunks = [
+            MagicMock(choices=[MagicMock(delta=MagicMock(content=content))])
+            for content in ["Mocked", " streamed", None, " response"]
+        ]
+        mock_client.chat.completions.create.return_value = iter(chunks)
+
+        gpt = GPT()
+        response = list(gpt.stream([{"role": "system", "content": "Some prompt"}]))
+        self.assertEqual(response, ["Mocked", " streamed", " response"])
+        self.assertTrue(mock_client.chat.completions.create.call_args.kwargs["stream"])
+        mock_client.moderations.create.assert_not_called()
+
+    @patch("src.llm_classes.llm_level.OpenAI")
+    def test_gpt_moderate(self, mock_openai):
+        mock_client = MagicMock()
+        mock_openai.return_value = mock_client
+        mock_client.moderations.create.return_value = MagicMock(
+            results=[MagicMock(flagged=True)]
+        )
+
+        gpt = GPT()
+        self.assertEqual(gpt.moderate("Harmful text"), gpt.content_moderation.default)
+
+        mock_client.moderations.create.return_value = MagicMock(
+            results=[MagicMock(flagged=False)]
+        )
+        self.assertEqual(gpt.moderate("Harmless text"), "Harmless text")
+
+    @patch("src.llm_classes.llm_level.OpenAI")
+    def test_gpt_shares_client(self, mock_openai):
+        first, second = GPT(), GPT(model="gpt-3.5-turbo")
+
+        mock_openai.assert_called_once()
+        self.assertIs(first.client, second.client)
+
+    @patch("src.llm_classes.llm_level.OpenAI")
+    def test_get_llm_shares_instances(self, mock_openai):
+        self.assertIs(get_llm(), get_llm())
+        self.assertIs(get_llm("gpt-3.5-turbo"), get_llm("gpt-3.5-turbo"))
+        self.assertIsNot(get_llm(), get_llm("gpt-3.5-turbo"))
+        self.assertEqual(get_llm("gpt-3.5-turbo").model, "gpt-3.5-turbo")
+        mock_openai.assert_called_once()
+
+    @patch("src.llm_classes.llm_level.OpenAI")
+    def test_reset_clients(self, mock_openai):
+        llm = get_llm()
+        reset_clients()
+
+        mock_openai.return_value.close.assert_called_once()
+        self.assertIsNot(get_llm(), llm)
+        self.assertEqual(mock_openai.call_count, 2)
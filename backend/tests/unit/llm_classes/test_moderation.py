@@ -0,0 +1,81 @@
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from src.llm_classes.llm_level import (
+    ContentModeration,
+    VerdictCache,
+    moderation_metrics,
+)
+
+
+class TestVerdictCache(TestCase):
+    def test_get_and_put(self):
+        cache = VerdictCache()
+
+        self.assertIsNone(cache.get("text"))
+        cache.put("text", True)
+        self.assertTrue(cache.get("text"))
+
+    def test_evicts_least_recently_used(self):
+        cache = VerdictCache(max_size=2)
+
+        cache.put("first", False)
+        cache.put("second", False)
+        cache.get("first")
+        cache.put("third", True)
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get("second"))
+        self.assertFalse(cache.get("first"))
+        self.assertTrue(cache.get("third"))
+
+
+class TestContentModeration(TestCase):
+    def setUp(self):
+        ContentModeration.verdicts.clear()
+        self.client = MagicMock()
+        self.client.moderations.create.return_value = MagicMock(
+            results=[MagicMock(flagged=False)]
+        )
+        self.moderation = ContentModeration(self.client)
+
+    def test_repeated_text_is_checked_once(self):
+        before = moderation_metrics()
+
+        self.assertFalse(self.moderation.is_harmful("How was the product?"))
+        self.assertFalse(self.moderation.is_harmful("How was the product?"))
+
+        self.client.moderations.create.assert_called_once()
+        after = moderation_metrics()
+        self.assertEqual(after["checks"] - before["checks"], 1)
+        self.assertEqual(after["cache_hits"] - before["cache_hits"], 1)
+
+    def test_cache_is_shared_between_instances(self):
+        self.moderation.is_harmful("How was the product?")
+
+        other_client = MagicMock()
+        ContentModeration(other_client).is_harmful("How was the product?")
+
+        other_client.moderations.create.assert_not_called()
+
+    def test_default_refusal_is_not_checked(self):
+        self.assertFalse(self.moderation.is_harmful(self.moderation.default))
+
+        self.client.moderations.create.assert_not_called()
+
+    def test_flagged_verdict_is_cached(self):
+        self.client.moderations.create.return_value = MagicMock(
+            results=[MagicMock(flagged=True)]
+        )
+
+        self.assertTrue(self.moderation.is_harmful("Harmful text"))
+        self.assertTrue(self.moderation.is_harmful("Harmful text"))
+        self.client.moderations.create.assert_called_once()
+
+    def test_latency_metrics(self):
+        self.moderation.is_harmful("How was the product?")
+
+        metrics = moderation_metrics()
+        self.assertGreaterEqual(metrics["latency_ms_last"], 0)
+        self.assertGreaterEqual(metrics["latency_ms_max"], metrics["latency_ms_last"])
+        self.assertGreater(metrics["cache_size"], 0)
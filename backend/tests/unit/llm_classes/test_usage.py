@@ -0,0 +1,95 @@
+import contextvars
+import threading
+from unittest import TestCase
+from unittest.mock import MagicMock
+
+from src.llm_classes.usage import UsageLedger, cost, usage_scope
+
+
+class TestUsageLedger(TestCase):
+    def setUp(self):
+        self.sink = MagicMock()
+        # Flush only when asked to, or when a batch is full
+        self.ledger = UsageLedger(self.sink, batch_size=100, flush_seconds=3600)
+
+    def tearDown(self):
+        self.ledger.close()
+
+    def test_cost(self):
+        self.assertAlmostEqual(cost("gpt-4-turbo-preview", 1000, 500), 0.025)
+        self.assertEqual(cost("unknown-model", 1000, 500), 0.0)
+
+    def test_record_outside_scope(self):
+        record = self.ledger.record("gpt-4", 10, 5, 12.5)
+
+        self.assertIsNone(record["survey_id"])
+        self.assertIsNone(record["response_id"])
+        self.assertEqual(record["call_site"], "other")
+        self.assertEqual(record["latency_ms"], 12.5)
+
+    def test_record_in_nested_scopes(self):
+        with usage_scope(survey_id=1, response_id=2, turn=7):
+            with usage_scope(call_site="exit_check"):
+                record = self.ledger.record("gpt-4", 10, 5, 1.0)
+            outer = self.ledger.record("gpt-4", 10, 5, 1.0, call_site="moderation")
+
+        self.assertEqual(
+            (record["survey_id"], record["response_id"], record["turn"]), (1, 2, 7)
+        )
+        self.assertEqual(record["call_site"], "exit_check")
+        self.assertEqual(outer["call_site"], "moderation")
+        self.assertIsNone(self.ledger.record("gpt-4", 1, 1, 1.0)["survey_id"])
+
+    def test_scope_follows_copied_context(self):
+        records = []
+        with usage_scope(survey_id=3, call_site="summarise"):
+            context = contextvars.copy_context()
+        thread = threading.Thread(
+            target=context.run,
+            args=(lambda: records.append(self.ledger.record("gpt-4", 1, 1, 1.0)),),
+        )
+        thread.start()
+        thread.join()
+
+        self.assertEqual(records[0]["survey_id"], 3)
+        self.assertEqual(records[0]["call_site"], "summarise")
+
+    def test_flush_writes_one_batch(self):
+        for _ in range(3):
+            self.ledger.record("gpt-4", 10, 5, 1.0)
+
+        self.assertEqual(self.ledger.flush(), 3)
+        self.sink.assert_called_once()
+        self.assertEqual(len(self.sink.call_args[0][0]), 3)
+        self.assertEqual(self.ledger.flush(), 0)
+        self.sink.assert_called_once()
+
+    def test_full_batch_wakes_flusher(self):
+        flushed = threading.Event()
+        self.ledger.sink = lambda records: flushed.set()
+        self.ledger.batch_size = 2
+
+        self.ledger.record("gpt-4", 10, 5, 1.0)
+        self.ledger.record("gpt-4", 10, 5, 1.0)
+
+        self.assertTrue(flushed.wait(5))
+
+    def test_failed_flush_drops_records(self):
+        self.sink.side_effect = Exception("database down")
+        self.ledger.record("gpt-4", 10, 5, 1.0)
+
+        self.assertEqual(self.ledger.flush(), 0)
+
+        metrics = self.ledger.metrics()
+        self.assertEqual(metrics["dropped"], 1)
+        self.assertEqual(metrics["pending"], 0)
+
+    def test_metrics_per_call_site(self):
+        with usage_scope(call_site="reply"):
+            self.ledger.record("gpt-4", 1000, 1000, 1.0)
+            self.ledger.record("gpt-4", 1000, 0, 1.0)
+
+        totals = self.ledger.metrics()["call_sites"]["reply"]
+        self.assertEqual(totals["calls"], 2)
+        self.assertEqual(totals["prompt_tokens"], 2000)
+        self.assertAlmostEqual(totals["cost_usd"], 0.12)
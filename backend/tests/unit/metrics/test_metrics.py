@@ -0,0 +1,132 @@
+import contextvars
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+from unittest import TestCase
+from unittest.mock import patch
+
+from prometheus_client import CollectorRegistry, Histogram, multiprocess
+from src import metrics
+from src.app import app
+
+# Records the metrics of a worker process, and prints its process ID
+WORKER = """
+import os
+from prometheus_client import Counter, Gauge
+Counter("jobs", "Jobs.").inc(2)
+Gauge("busy", "Busy.", multiprocess_mode="livesum").set(1)
+print(os.getpid())
+"""
+
+
+class TestMetrics(TestCase):
+    def test_request_stages(self):
+        registry = CollectorRegistry()
+        histogram = Histogram("query_seconds", "Queries.", registry=registry)
+
+        def run():
+            stages = metrics.start_request()
+            with metrics.timed(histogram, "db"):
+                pass
+            # Threads running in a copy of the context add to the same request
+            context = contextvars.copy_context()
+            thread = threading.Thread(
+                target=context.run, args=(metrics.add_request_time, "llm", 2.0)
+            )
+            thread.start()
+            thread.join()
+            with metrics.outside_request():
+                metrics.add_request_time("llm", 5.0)
+            return stages
+
+        stages = contextvars.copy_context().run(run)
+
+        self.assertGreaterEqual(stages["db"], 0.0)
+        self.assertEqual(stages["llm"], 2.0)
+        self.assertEqual(registry.get_sample_value("query_seconds_count"), 1)
+
+    def test_parallel_request_stages(self):
+        def add():
+            for _ in range(10000):
+                metrics.add_request_time("llm", 1.0)
+
+        def run():
+            stages = metrics.start_request()
+            threads = [
+                threading.Thread(target=contextvars.copy_context().run, args=(add,))
+                for _ in range(8)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return stages
+
+        stages = contextvars.copy_context().run(run)
+
+        self.assertEqual(stages["llm"], 80000.0)
+
+    def test_render_adds_up_the_workers(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": directory.name}
+        pids = [
+            int(
+                subprocess.run(
+                    [sys.executable, "-c", WORKER],
+                    env=env,
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                ).stdout
+            )
+            for _ in range(2)
+        ]
+
+        with patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": directory.name}):
+            body = metrics.render().decode("utf-8")
+            # Called by gunicorn when a worker exits
+            multiprocess.mark_process_dead(pids[0], directory.name)
+            after_exit = metrics.render().decode("utf-8")
+
+        self.assertIn("jobs_total 4.0", body)
+        self.assertIn("busy 2.0", body)
+        self.assertIn("jobs_total 4.0", after_exit)
+        self.assertIn("busy 1.0", after_exit)
+
+    @patch("src.app.METRICS_TOKEN", "secret")
+    def test_metrics_endpoint(self):
+        client = app.test_client()
+        # Request metrics are recorded when the server closes the response
+        client.get("/api/v1/health").close()
+
+        response = client.get(
+            "/api/v1/metrics", headers={"Authorization": "Bearer secret"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith("text/plain"))
+        body = response.get_data(as_text=True)
+        self.assertIn(
+            'http_request_seconds_count{method="GET",route="/api/v1/health",status="200"}',
+            body,
+        )
+        self.assertIn("# TYPE db_pool_connections gauge", body)
+        self.assertIn("# TYPE llm_call_seconds histogram", body)
+        self.assertIn("json_serialise_seconds_count", body)
+
+    @patch("src.app.METRICS_TOKEN", "secret")
+    def test_metrics_endpoint_requires_token(self):
+        client = app.test_client()
+
+        response = client.get("/api/v1/metrics", headers={"Authorization": "Bearer x"})
+
+        self.assertEqual(response.status_code, 401)
+
+    @patch("src.app.METRICS_TOKEN", "")
+    def test_metrics_endpoint_disabled_without_token(self):
+        response = app.test_client().get("/api/v1/metrics")
+
+        self.assertEqual(response.status_code, 403)
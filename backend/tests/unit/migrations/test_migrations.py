@@ -0,0 +1,165 @@
+import os
+import tempfile
+from unittest import TestCase, skipUnless
+from unittest.mock import MagicMock, patch
+
+import pymysql
+from src import database_operations, migrations
+
+
+class TestDiscover(TestCase):
+    def test_repository_migrations_are_ordered(self):
+        found = migrations.discover()
+
+        versions = [version for version, _, _ in found]
+        self.assertEqual(versions, sorted(versions))
+        self.assertEqual(versions[:2], [1, 2])
+        self.assertIn((7, "query_indexes"), [(v, name) for v, name, _ in found])
+
+    INIT_SQL = os.path.join(os.path.dirname(migrations.MIGRATIONS_DIR), "init.sql")
+
+    @skipUnless(os.path.exists(INIT_SQL), "init.sql is not next to the migrations")
+    def test_init_sql_records_every_migration(self):
+        with open(self.INIT_SQL, encoding="utf-8") as file:
+            content = file.read()
+
+        for version, name, _ in migrations.discover():
+            self.assertIn(f"({version}, '{name}')", content)
+
+    def test_ignores_other_files_and_rejects_duplicates(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for filename in ("0002_b.sql", "0010_c.sql", "0001_a.sql", "README.md"):
+                open(os.path.join(directory, filename), "w").close()
+
+            self.assertEqual(
+                [(v, name) for v, name, _ in migrations.discover(directory)],
+                [(1, "a"), (2, "b"), (10, "c")],
+            )
+
+            open(os.path.join(directory, "02_b_again.sql"), "w").close()
+            with self.assertRaises(ValueError):
+                migrations.discover(directory)
+
+
+class TestSplitStatements(TestCase):
+    def test_split_statements(self):
+        sql = """-- A comment
+USE ai_chat_survey_db;
+
+CREATE TABLE T (
+    id INT, -- The ID
+    name TEXT
+);
+ALTER TABLE T ADD INDEX idx (name(10)), ALGORITHM = INPLACE, LOCK = NONE;
+DO 0"""
+
+        self.assertEqual(
+            migrations.split_statements(sql),
+            [
+                "CREATE TABLE T (\n    id INT, -- The ID\n    name TEXT\n)",
+                "ALTER TABLE T ADD INDEX idx (name(10)), ALGORITHM = INPLACE, LOCK = NONE",
+                "DO 0",
+            ],
+        )
+
+    def test_repository_migrations_split(self):
+        for _, _, path in migrations.discover():
+            with open(path, encoding="utf-8") as file:
+                statements = migrations.split_statements(file.read())
+
+            self.assertTrue(statements)
+            self.assertFalse(any(statement.endswith(";") for statement in statements))
+
+
+class TestMigrate(TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        for filename, sql in (
+            ("0001_first.sql", "CREATE TABLE A (id INT);\nCREATE TABLE B (id INT);\n"),
+            ("0002_second.sql", "ALTER TABLE A ADD INDEX idx (id);\n"),
+        ):
+            with open(os.path.join(self.directory.name, filename), "w") as file:
+                file.write(sql)
+        self.migrations = migrations.discover(self.directory.name)
+
+        self.mock_cursor = MagicMock()
+        self.mock_connection = MagicMock()
+        self.mock_connection.cursor.return_value.__enter__.return_value = (
+            self.mock_cursor
+        )
+        self.applied = [{"version": 1}]
+        patcher = patch.object(database_operations, "fetch", side_effect=self.fetch)
+        self.mock_fetch = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def fetch(self, connection, query, params=None):
+        if "GET_LOCK" in query:
+            return [{"locked": 1}]
+        if "RELEASE_LOCK" in query:
+            return [{"released": 1}]
+        return self.applied
+
+    def executed(self):
+        return [call[0][0] for call in self.mock_cursor.execute.call_args_list]
+
+    def test_applies_pending_migrations_only(self):
+        applied = migrations.migrate(self.mock_connection, self.migrations)
+
+        self.assertEqual([name for _, name, _ in applied], ["second"])
+        executed = self.executed()
+        self.assertIn("ALTER TABLE A ADD INDEX idx (id)", executed)
+        self.assertNotIn("CREATE TABLE A (id INT)", executed)
+        self.assertEqual(self.mock_cursor.execute.call_args[0][1], (2, "second"))
+        self.mock_connection.commit.assert_called_once()
+        self.assertIn("RELEASE_LOCK", self.mock_fetch.call_args[0][1])
+
+    def test_skips_changes_already_in_schema(self):
+        self.applied = []
+
+        def execute(statement, params=None):
+            if statement.startswith("CREATE TABLE B"):
+                raise pymysql.err.OperationalError(1050, "Table 'B' already exists")
+
+        self.mock_cursor.execute.side_effect = execute
+
+        applied = migrations.migrate(self.mock_connection, self.migrations)
+
+        self.assertEqual(len(applied), 2)
+        self.assertEqual(self.mock_connection.commit.call_count, 2)
+
+    def test_failed_migration_is_not_recorded(self):
+        self.applied = []
+
+        def execute(statement, params=None):
+            if statement.startswith("ALTER TABLE"):
+                raise pymysql.err.OperationalError(1146, "Table 'A' doesn't exist")
+
+        self.mock_cursor.execute.side_effect = execute
+
+        with self.assertRaises(database_operations.DataBaseError):
+            migrations.migrate(self.mock_connection, self.migrations)
+
+        inserts = [q for q in self.executed() if q.startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+        self.mock_connection.rollback.assert_called_once()
+        self.assertIn("RELEASE_LOCK", self.mock_fetch.call_args[0][1])
+
+    def test_lock_timeout(self):
+        self.mock_fetch.side_effect = lambda *args: [{"locked": 0}]
+
+        with self.assertRaises(database_operations.DataBaseError):
+            migrations.migrate(self.mock_connection, self.migrations)
+
+        self.mock_cursor.execute.assert_not_called()
+
+    @patch.object(migrations, "MIGRATE_ON_STARTUP", True)
+    @patch.object(database_operations, "connect_to_mysql")
+    def test_migrate_on_startup_logs_errors(self, mock_connect):
+        mock_connect.return_value = self.mock_connection
+        self.mock_fetch.side_effect = Exception("Lost connection")
+
+        with self.assertLogs(migrations.logger, level="ERROR"):
+            migrations.migrate_on_startup()
+
+        self.mock_connection.close.assert_called_once()
@@ -0,0 +1,49 @@
+from unittest import TestCase
+from unittest.mock import patch
+
+from src import database_operations, serving
+from src.llm_classes import usage
+
+
+class TestServing(TestCase):
+    @patch("src.serving.GUNICORN_WORKERS", 0)
+    def test_workers_sized_from_cpu_cores(self):
+        self.assertEqual(serving.worker_count(1), 3)
+        self.assertEqual(serving.worker_count(2), 5)
+        self.assertEqual(serving.worker_count(16), serving.MAX_WORKERS)
+
+    @patch("src.serving.GUNICORN_WORKERS", 12)
+    def test_configured_workers(self):
+        self.assertEqual(serving.worker_count(1), 12)
+
+    @patch("src.serving.GUNICORN_THREADS", 0)
+    @patch("src.serving.LLM_CONCURRENCY", 64)
+    def test_threads_sized_from_llm_concurrency(self):
+        self.assertEqual(serving.thread_count(3), 22)
+        self.assertEqual(serving.thread_count(8), 8)
+        self.assertEqual(serving.thread_count(64), 4)
+
+    @patch("src.serving.GUNICORN_TIMEOUT", 0)
+    @patch.dict("os.environ", {"OPENAI_TIMEOUT": "60", "OPENAI_MAX_RETRIES": "2"})
+    def test_timeout_covers_two_llm_calls_with_retries(self):
+        self.assertEqual(serving.request_timeout(), 390)
+
+    @patch("src.serving.GUNICORN_TIMEOUT", 120)
+    def test_configured_timeout(self):
+        self.assertEqual(serving.request_timeout(), 120)
+
+    @patch("src.serving.background.shutdown")
+    @patch("src.serving.llm_level.reset_clients")
+    def test_reset_process_state(self, reset_clients, shutdown):
+        pool = database_operations.get_pool()
+        ledger = usage.get_ledger()
+        sink = ledger.sink
+
+        serving.reset_process_state()
+
+        reset_clients.assert_called_once()
+        shutdown.assert_called_once_with(wait=False)
+        self.assertIsNot(database_operations.get_pool(), pool)
+        self.assertIsNot(usage.get_ledger(), ledger)
+        # The new ledger writes to the configured sink
+        self.assertIs(usage.get_ledger().sink, sink)
@@ -0,0 +1,221 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+from unittest.mock import MagicMock, patch
+
+from src import survey_cache
+from src.app import app, database_operations
+from src.survey_cache import SurveyCache
+
+
+def survey(survey_id, summary_status="ready"):
+    return {
+        "metadata": {"survey_id": survey_id, "summary_status": summary_status},
+        "questions": [],
+    }
+
+
+class TestSurveyCache(TestCase):
+    def test_loads_once_until_expired(self):
+        cache = SurveyCache(ttl=60)
+        load = MagicMock(side_effect=survey)
+
+        with patch("src.survey_cache.time.monotonic", return_value=100):
+            self.assertEqual(cache.get(1, load), survey(1))
+            self.assertEqual(cache.get(1, load), survey(1))
+        self.assertEqual(load.call_count, 1)
+
+        with patch("src.survey_cache.time.monotonic", return_value=161):
+            cache.get(1, load)
+        self.assertEqual(load.call_count, 2)
+
+    def test_evicts_least_recently_used(self):
+        cache = SurveyCache(max_size=2)
+        load = MagicMock(side_effect=survey)
+
+        cache.get(1, load)
+        cache.get(2, load)
+        cache.get(1, load)
+        cache.get(3, load)
+
+        self.assertEqual(len(cache), 2)
+        cache.get(1, load)
+        cache.get(2, load)
+        self.assertEqual([c[0][0] for c in load.call_args_list], [1, 2, 3, 2])
+
+    def test_missing_and_uncacheable_surveys_are_not_cached(self):
+        cache = SurveyCache(
+            cacheable=lambda s: s["metadata"]["summary_status"] != "pending"
+        )
+        load = MagicMock(side_effect=[None, None, survey(2, "pending"), survey(2)])
+
+        self.assertIsNone(cache.get(1, load))
+        self.assertIsNone(cache.get(1, load))
+        cache.get(2, load)
+        cache.get(2, load)
+
+        self.assertEqual(load.call_count, 4)
+        self.assertEqual(len(cache), 1)
+
+    def test_concurrent_misses_share_one_load(self):
+        cache = SurveyCache()
+        started, release = threading.Event(), threading.Event()
+
+        def load(survey_id):
+            started.set()
+            release.wait(5)
+            return survey(survey_id)
+
+        load = MagicMock(side_effect=load)
+        with ThreadPoolExecutor(8) as executor:
+            first = executor.submit(cache.get, 1, load)
+            started.wait(5)
+            others = [executor.submit(cache.get, 1, load) for _ in range(7)]
+            release.set()
+            results = [first.result()] + [other.result() for other in others]
+
+        load.assert_called_once_with(1)
+        self.assertTrue(all(result is results[0] for result in results))
+
+    def test_failed_load_is_raised_and_retried(self):
+        cache = SurveyCache()
+        load = MagicMock(side_effect=[Exception("Lost connection"), survey(1)])
+
+        with self.assertRaises(Exception):
+            cache.get(1, load)
+
+        self.assertEqual(cache.get(1, load), survey(1))
+
+    def test_invalidate(self):
+        cache = SurveyCache()
+        load = MagicMock(side_effect=survey)
+
+        cache.get(1, load)
+        cache.invalidate(1)
+        cache.get(1, load)
+
+        self.assertEqual(load.call_count, 2)
+
+    def test_invalidated_during_load_is_not_cached(self):
+        cache = SurveyCache()
+
+        def load(survey_id):
+            cache.invalidate(survey_id)
+            return survey(survey_id)
+
+        cache.get(1, load)
+
+        self.assertEqual(len(cache), 0)
+
+    def test_disabled(self):
+        cache = SurveyCache(ttl=0)
+        load = MagicMock(side_effect=survey)
+
+        cache.get(1, load)
+        cache.get(1, load)
+
+        self.assertEqual(load.call_count, 2)
+
+
+class TestSurveyRoutes(TestCase):
+    def setUp(self):
+        survey_cache.surveys.clear()
+        self.addCleanup(survey_cache.surveys.clear)
+        self.client = app.test_client()
+        self.connection = MagicMock()
+        self.connection.__enter__.return_value = MagicMock()
+        for name, value in (
+            ("get_connection", MagicMock(return_value=self.connection)),
+            ("fetch_survey", MagicMock(return_value=survey(1))),
+        ):
+            patcher = patch.object(database_operations, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_get_survey_is_cached(self):
+        for _ in range(3):
+            response = self.client.get("/api/v1/surveys/1")
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json, survey(1))
+
+        database_operations.fetch_survey.assert_called_once()
+
+    def test_get_survey_not_found(self):
+        database_operations.fetch_survey.return_value = None
+
+        for survey_id in ("2", "abc"):
+            response = self.client.get("/api/v1/surveys/" + survey_id)
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response.json, {"message": "Survey not found"})
+
+    def test_pending_survey_is_not_cached(self):
+        database_operations.fetch_survey.return_value = survey(1, "pending")
+
+        self.client.get("/api/v1/surveys/1")
+        self.client.get("/api/v1/surveys/1")
+
+        self.assertEqual(database_operations.fetch_survey.call_count, 2)
+
+    def test_submissions_share_the_cached_validator(self):
+        with patch.object(database_operations, "ResponseValidator") as validator:
+            validator.return_value.validate.return_value = "Invalid"
+            for _ in range(3):
+                response = self.client.post(
+                    "/api/v1/surveys/1/responses",
+                    json={"metadata": {"survey_id": 1}, "answers": []},
+                )
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json, {"message": "Invalid"})
+
+        validator.assert_called_once_with(survey(1))
+        database_operations.fetch_survey.assert_called_once()
+        self.assertEqual(validator.return_value.validate.call_count, 3)
+
+    def test_delete_invalidates(self):
+        self.client.get("/api/v1/surveys/1")
+        with patch.object(
+            database_operations,
+            "fetch",
+            return_value=[{"survey_id": 1, "admin_username": "admin"}],
+        ), patch.object(database_operations, "execute"), patch.object(
+            database_operations, "commit"
+        ), patch(
+            "jwt.decode", return_value={"sub": "admin"}
+        ):
+            response = self.client.delete(
+                "/api/v1/surveys/1", headers={"Authorization": "Bearer token"}
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(survey_cache.surveys), 0)
+
+    def submit(self):
+        with patch.object(database_operations, "ResponseValidator") as validator:
+            validator.return_value.validate.return_value = None
+            return self.client.post(
+                "/api/v1/surveys/1/responses",
+                json={"metadata": {"survey_id": 1}, "answers": []},
+            )
+
+    def test_submission_to_survey_deleted_elsewhere(self):
+        with patch.object(
+            database_operations, "save_response_to_database", return_value=None
+        ):
+            response = self.submit()
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json, {"message": "Survey not found"})
+        self.assertEqual(len(survey_cache.surveys), 0)
+
+    def test_submission_fails_to_save(self):
+        with patch.object(
+            database_operations,
+            "save_response_to_database",
+            side_effect=database_operations.DataBaseError("Error", "Lost"),
+        ):
+            response = self.submit()
+
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(
+            response.json, {"message": "Failed to save response to the database"}
+        )
@@ -18,7 +18,11 @@ CREATE TABLE IF NOT EXISTS Surveys (
     subtitle TEXT,
     admin_username VARCHAR(255),
     created_at TIMESTAMP,
-    chat_context VARCHAR(1500),
+    chat_context TEXT, -- Raw chat context provided by the admin
+    summarised_context VARCHAR(1500), -- Filled in by a background job for long chat contexts
+    summary_status VARCHAR(16) NOT NULL DEFAULT 'ready', -- pending, ready or failed
+    last_response_id INT NOT NULL DEFAULT 0, -- Counter used to allocate response IDs
+    INDEX idx_surveys_admin (admin_username, survey_id), -- Surveys of an admin
     FOREIGN KEY (admin_username) REFERENCES Admins(admin_username)
 );
 
@@ -41,16 +45,76 @@ CREATE TABLE IF NOT EXISTS Survey_Responses (
     answer JSON,
     submitted_at TIMESTAMP,
     PRIMARY KEY (response_id, question_id, survey_id),
+    INDEX idx_survey_responses_survey (survey_id, response_id), -- Pages of a survey's responses
     FOREIGN KEY (survey_id, question_id) REFERENCES Questions(survey_id, question_id) ON DELETE CASCADE
 );
 
 -- Create the ChatLog table
+-- Legacy store of whole chats as JSON documents, superseded by ChatMessages
 CREATE TABLE IF NOT EXISTS ChatLog (
     chat_id INT AUTO_INCREMENT PRIMARY KEY,
     survey_id INT,
     response_id INT,
     chat_log JSON,
     created_at TIMESTAMP,
-    FOREIGN KEY (survey_id) REFERENCES Surveys(survey_id) ON DELETE CASCADE,
-    FOREIGN KEY (response_id) REFERENCES Survey_Responses(response_id) ON DELETE CASCADE
+    UNIQUE INDEX idx_chat_log_response (survey_id, response_id), -- Chat of a response
+    FOREIGN KEY (survey_id) REFERENCES Surveys(survey_id) ON DELETE CASCADE
+);
+
+-- Create the ChatMessages table
+CREATE TABLE IF NOT EXISTS ChatMessages (
+    survey_id INT,
+    response_id INT,
+    seq INT, -- Position of the message in the chat, starting from 0
+    role VARCHAR(16),
+    content LONGTEXT,
+    created_at TIMESTAMP,
+    PRIMARY KEY (survey_id, response_id, seq),
+    FOREIGN KEY (survey_id) REFERENCES Surveys(survey_id) ON DELETE CASCADE
+);
+
+-- Create the ChatSummaries table
+CREATE TABLE IF NOT EXISTS ChatSummaries (
+    survey_id INT,
+    response_id INT,
+    covered INT, -- Number of messages of the chat that the summary covers
+    content LONGTEXT,
+    updated_at TIMESTAMP,
+    PRIMARY KEY (survey_id, response_id),
+    FOREIGN KEY (survey_id) REFERENCES Surveys(survey_id) ON DELETE CASCADE
+);
+
+-- Create the LLMUsage table
+-- Token and cost ledger of LLM calls, written in batches
+CREATE TABLE IF NOT EXISTS LLMUsage (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    survey_id INT,
+    response_id INT,
+    turn INT, -- Number of chat messages when the call was made
+    call_site VARCHAR(32), -- reply, exit_check, plan, summarise, moderation or other
+    model VARCHAR(64),
+    prompt_tokens INT,
+    completion_tokens INT,
+    cost_usd DECIMAL(12, 6),
+    latency_ms FLOAT,
+    created_at TIMESTAMP,
+    INDEX idx_llm_usage_response (survey_id, response_id, turn)
 );
+
+-- Create the SchemaMigrations table
+-- Versions of the scripts in migrations/ that have been applied, see src/migrations.py
+CREATE TABLE IF NOT EXISTS SchemaMigrations (
+    version INT PRIMARY KEY,
+    name VARCHAR(255),
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- This schema already contains every migration. Add a row here with each new migration.
+INSERT IGNORE INTO SchemaMigrations (version, name) VALUES
+    (1, 'response_ids'),
+    (2, 'survey_summaries'),
+    (3, 'chat_messages'),
+    (4, 'chat_summaries'),
+    (5, 'llm_usage'),
+    (6, 'survey_responses_index'),
+    (7, 'query_indexes');
@@ -164,6 +164,10 @@ VALUES (
         '["Slightly committed"]',
         NOW()
     );
+-- Keep the response ID counter in step with the inserted responses
+UPDATE Surveys
+SET last_response_id = 2
+WHERE survey_id = 1;
 -- Insert data into the ChatLog table
 INSERT INTO ChatLog (survey_id, response_id, chat_log, created_at)
 VALUES (
@@ -213,4 +217,16 @@ VALUES (
           ]
         }',
         NOW()
-    );
\ No newline at end of file
+    );
+-- Copy the dummy chat log into the ChatMessages table
+INSERT INTO ChatMessages (survey_id, response_id, seq, role, content, created_at)
+SELECT c.survey_id, c.response_id, m.seq - 1, m.role, m.content, c.created_at
+FROM ChatLog c,
+    JSON_TABLE(
+        c.chat_log,
+        '$.messages[*]' COLUMNS (
+            seq FOR ORDINALITY,
+            role VARCHAR(16) PATH '$.role',
+            content LONGTEXT PATH '$.content'
+        )
+    ) AS m;
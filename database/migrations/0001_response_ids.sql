@@ -0,0 +1,11 @@
+-- Allocate response IDs from a counter per survey
+USE ai_chat_survey_db;
+
+-- Counter used to allocate response IDs, starting after the responses already stored
+ALTER TABLE Surveys ADD COLUMN last_response_id INT NOT NULL DEFAULT 0;
+
+UPDATE Surveys s
+SET last_response_id = GREATEST(
+    s.last_response_id,
+    (SELECT COALESCE(MAX(sr.response_id), 0) FROM Survey_Responses sr WHERE sr.survey_id = s.survey_id)
+);
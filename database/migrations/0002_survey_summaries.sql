@@ -0,0 +1,13 @@
+-- Store the raw chat context of surveys, and its summary once the background job has made it
+USE ai_chat_survey_db;
+
+-- Raw chat contexts are no longer limited in length. Existing ones were stored summarised.
+ALTER TABLE Surveys MODIFY COLUMN chat_context TEXT;
+
+ALTER TABLE Surveys ADD COLUMN summarised_context VARCHAR(1500);
+
+ALTER TABLE Surveys ADD COLUMN summary_status VARCHAR(16) NOT NULL DEFAULT 'ready';
+
+UPDATE Surveys
+SET summarised_context = LEFT(chat_context, 1500)
+WHERE summarised_context IS NULL AND summary_status = 'ready';
@@ -0,0 +1,26 @@
+-- Store chat messages as one row per message instead of one JSON document per chat
+USE ai_chat_survey_db;
+
+CREATE TABLE IF NOT EXISTS ChatMessages (
+    survey_id INT,
+    response_id INT,
+    seq INT, -- Position of the message in the chat, starting from 0
+    role VARCHAR(16),
+    content LONGTEXT,
+    created_at TIMESTAMP,
+    PRIMARY KEY (survey_id, response_id, seq),
+    FOREIGN KEY (survey_id) REFERENCES Surveys(survey_id) ON DELETE CASCADE
+);
+
+-- Copy the messages of existing ChatLog documents. Messages that were already copied are skipped.
+INSERT IGNORE INTO ChatMessages (survey_id, response_id, seq, role, content, created_at)
+SELECT c.survey_id, c.response_id, m.seq - 1, m.role, m.content, c.created_at
+FROM ChatLog c,
+    JSON_TABLE(
+        c.chat_log,
+        '$.messages[*]' COLUMNS (
+            seq FOR ORDINALITY,
+            role VARCHAR(16) PATH '$.role',
+            content LONGTEXT PATH '$.content'
+        )
+    ) AS m;
@@ -0,0 +1,12 @@
+-- Store a rolling summary of the older messages of each chat
+USE ai_chat_survey_db;
+
+CREATE TABLE IF NOT EXISTS ChatSummaries (
+    survey_id INT,
+    response_id INT,
+    covered INT, -- Number of messages of the chat that the summary covers
+    content LONGTEXT,
+    updated_at TIMESTAMP,
+    PRIMARY KEY (survey_id, response_id),
+    FOREIGN KEY (survey_id) REFERENCES Surveys(survey_id) ON DELETE CASCADE
+);
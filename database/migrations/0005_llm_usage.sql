@@ -0,0 +1,17 @@
+-- Record the tokens, cost and latency of every LLM call
+USE ai_chat_survey_db;
+
+CREATE TABLE IF NOT EXISTS LLMUsage (
+    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    survey_id INT,
+    response_id INT,
+    turn INT, -- Number of chat messages when the call was made
+    call_site VARCHAR(32), -- reply, exit_check, plan, summarise, moderation or other
+    model VARCHAR(64),
+    prompt_tokens INT,
+    completion_tokens INT,
+    cost_usd DECIMAL(12, 6),
+    latency_ms FLOAT,
+    created_at TIMESTAMP,
+    INDEX idx_llm_usage_response (survey_id, response_id, turn)
+);
@@ -0,0 +1,5 @@
+-- Read the responses to a survey in pages, in the order of their response IDs
+USE ai_chat_survey_db;
+
+ALTER TABLE Survey_Responses
+    ADD INDEX idx_survey_responses_survey (survey_id, response_id);
@@ -0,0 +1,37 @@
+-- Index the lookups of the hot queries, and fix the keys of ChatLog
+USE ai_chat_survey_db;
+
+-- get_surveys() filters by admin and pages by survey ID
+ALTER TABLE Surveys
+    ADD INDEX idx_surveys_admin (admin_username, survey_id),
+    ALGORITHM = INPLACE, LOCK = NONE;
+
+-- Every chat turn looks up the legacy chat of a response. Keep the first of duplicate
+-- chats, which is the one that has been read so far and copied into ChatMessages.
+DELETE newer FROM ChatLog newer
+INNER JOIN ChatLog older
+    ON older.survey_id = newer.survey_id
+    AND older.response_id = newer.response_id
+    AND older.chat_id < newer.chat_id;
+
+ALTER TABLE ChatLog
+    ADD UNIQUE INDEX idx_chat_log_response (survey_id, response_id),
+    ALGORITHM = INPLACE, LOCK = NONE;
+
+-- The foreign key of ChatLog.response_id referenced Survey_Responses.response_id, which
+-- is not unique: the same response ID is used by every survey. Its name was generated
+-- by MySQL, so it is looked up.
+SET @fk = (
+    SELECT CONSTRAINT_NAME FROM information_schema.KEY_COLUMN_USAGE
+    WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'ChatLog'
+    AND COLUMN_NAME = 'response_id' AND REFERENCED_TABLE_NAME = 'Survey_Responses'
+    LIMIT 1
+);
+
+SET @drop_fk = IF(@fk IS NULL, 'DO 0', CONCAT('ALTER TABLE ChatLog DROP FOREIGN KEY ', @fk));
+
+PREPARE drop_fk FROM @drop_fk;
+
+EXECUTE drop_fk;
+
+DEALLOCATE PREPARE drop_fk;
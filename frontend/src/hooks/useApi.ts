@@ -1,4 +1,4 @@
-import axios, { AxiosResponse } from "axios"
+import axios, { AxiosInstance, AxiosResponse } from "axios"
 import { LoginResponse, LoginSignupData } from "../components/admin/login/constants"
 import { GetSurvey, Response, Survey } from "../components/admin/survey/constants"
 import dayjs from "dayjs"
@@ -15,6 +15,24 @@ export const AdminApiService = (token: string) =>
     headers: { Authorization: `Bearer ${token}` },
   })
 
+// Fetches every page of a paginated list, following the X-Next-Cursor header
+const getAllPages = async <T>(
+  service: AxiosInstance,
+  url: string,
+  params: Record<string, string> = {}
+): Promise<T[]> => {
+  const items: T[] = []
+  let after: string | undefined
+  do {
+    const res = await service.get<T[]>(url, {
+      params: after ? { ...params, after } : params,
+    })
+    items.push(...res.data)
+    after = res.headers["x-next-cursor"]
+  } while (after)
+  return items
+}
+
 export const signup = (data: LoginSignupData) =>
   ApiService.post("/admins", data)
 
@@ -49,9 +67,11 @@ export const submitSurvey = (data: Survey) =>
 
 export const getSurveys = async (): Promise<GetSurvey[]> => {
   const username = localStorage.getItem("username") ?? ""
-  return AdminApiService(localStorage.getItem("jwt") ?? "")
-    .get(`surveys?admin=${username}`)
-    .then((res) => res.data)
+  return getAllPages<GetSurvey>(
+    AdminApiService(localStorage.getItem("jwt") ?? ""),
+    "surveys",
+    { admin: username }
+  )
 }
 
 export const getUserSurvey = (survey_id: number): Promise<AxiosResponse> => {
@@ -72,9 +92,10 @@ export const getSurveyById = async (id: string): Promise<GetSurvey> => {
 export const getResponseBySurveyId = async (
   id: string
 ): Promise<Response[]> => {
-  return AdminApiService(localStorage.getItem("jwt") ?? "")
-    .get(`surveys/${id}/responses`)
-    .then((res) => res.data)
+  return getAllPages<Response>(
+    AdminApiService(localStorage.getItem("jwt") ?? ""),
+    `surveys/${id}/responses`
+  )
 }
 
 export const deleteSurvey = (id: string) =>